@@ -12,10 +12,12 @@ Agentic Workflow for Knowledge Extraction
 import json
 import logging
 from typing import List, Dict, Tuple, Optional
-import requests
 from dataclasses import dataclass
 import pandas as pd
 
+from llm_telemetry import telemetry
+from ollama_client import OllamaError, get_client
+
 logger = logging.getLogger(__name__)
 
 
@@ -48,6 +50,7 @@ class CriticAgent:
         self.model = model
         self.ollama_host = ollama_host
         self.api_endpoint = f"{ollama_host}/api/generate"
+        self.client = get_client(ollama_host)
         
         # 本体定义 (领域知识库)
         self.ontology = {
@@ -68,26 +71,16 @@ class CriticAgent:
     
     def _call_ollama(self, prompt: str, system_prompt: str = "", temperature: float = 0.1) -> Optional[str]:
         """调用 Ollama API"""
+        # Qwen 系列模型支持 format=json,可以直接要求返回 JSON,减少解析出错
+        json_format = "json" if 'qwen' in self.model.lower() else None
         try:
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "system": system_prompt,
-                "stream": False,
-                "temperature": temperature,
-                "num_ctx": 3072,  # 降低上下文窗口，减少内存占用
-            }
-            
-            # Qwen 系列模型支持 format=json,可以直接要求返回 JSON,减少解析出错
-            if 'qwen' in self.model.lower():
-                payload["format"] = "json"
-            
-            response = requests.post(self.api_endpoint, json=payload, timeout=180)
-            response.raise_for_status()
-            
-            result = response.json()
+            result = self.client.generate(
+                self.model, prompt, system=system_prompt,
+                options={"temperature": temperature, "num_ctx": 3072},  # 降低上下文窗口，减少内存占用
+                format=json_format, timeout=180, max_retries=1, component='critic'
+            )
             return result.get('response', '').strip()
-        except Exception as e:
+        except OllamaError as e:
             logger.error(f"Critic Agent API error: {e}")
             return None
     
@@ -163,9 +156,11 @@ class CriticAgent:
         
         try:
             review_report = json.loads(response)
+            telemetry.mark_json(True)
             logger.info(f"Critic Agent 审查完成: 质量评分 {review_report.get('overall_quality', 0)}")
             return review_report
         except json.JSONDecodeError:
+            telemetry.mark_json(False)
             logger.error("Critic Agent JSON 解析失败,使用默认审查")
             return self._default_review_report(extraction)
     
@@ -224,28 +219,19 @@ class RefineAgent:
         self.model = model
         self.ollama_host = ollama_host
         self.api_endpoint = f"{ollama_host}/api/generate"
+        self.client = get_client(ollama_host)
     
     def _call_ollama(self, prompt: str, system_prompt: str = "", temperature: float = 0.1) -> Optional[str]:
         """调用 Ollama API"""
+        json_format = "json" if 'qwen' in self.model.lower() else None
         try:
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "system": system_prompt,
-                "stream": False,
-                "temperature": temperature,
-                "num_ctx": 3072,  # 降低上下文窗口，减少内存占用
-            }
-            
-            if 'qwen' in self.model.lower():
-                payload["format"] = "json"
-            
-            response = requests.post(self.api_endpoint, json=payload, timeout=180)
-            response.raise_for_status()
-            
-            result = response.json()
+            result = self.client.generate(
+                self.model, prompt, system=system_prompt,
+                options={"temperature": temperature, "num_ctx": 3072},  # 降低上下文窗口，减少内存占用
+                format=json_format, timeout=180, max_retries=1, component='refine'
+            )
             return result.get('response', '').strip()
-        except Exception as e:
+        except OllamaError as e:
             logger.error(f"Refine Agent API error: {e}")
             return None
     
@@ -316,6 +302,7 @@ class RefineAgent:
         
         try:
             refined_data = json.loads(response)
+            telemetry.mark_json(True)
             
             # 标准化格式
             # 这里对 LLM 输出做一次严格清洗,确保字段完整、类型正确
@@ -350,6 +337,7 @@ class RefineAgent:
             )
         
         except json.JSONDecodeError:
+            telemetry.mark_json(False)
             logger.error("Refine Agent JSON 解析失败,使用规则修正")
             return self._rule_based_refine(extraction, review_report)
     
@@ -388,19 +376,22 @@ class AgenticExtractor:
     """
     
     def __init__(self, extract_agent, model: str, ollama_host: str, 
-                 review_threshold: Tuple[float, float] = (0.6, 0.85)):
+                 review_threshold: Tuple[float, float] = (0.6, 0.85), scorer=None):
         """
         Args:
             extract_agent: 已初始化的 ConceptExtractor
             model: LLM 模型名称
             ollama_host: Ollama 服务地址
             review_threshold: 需要审查的质量范围 (最小值, 最大值)
+            scorer: 可选的质量评分器 (extraction_cascade.ChunkQualityScorer), 用其评分作为初始置信度;
+                不提供时沿用固定的 0.7
         """
         self.extract_agent = extract_agent
         self.critic = CriticAgent(model, ollama_host)
         self.refiner = RefineAgent(model, ollama_host)
         # 只有置信度落在该区间内的结果才会进入审查与修正流程
         self.review_threshold = review_threshold
+        self.scorer = scorer
         
         logger.info(f"Agentic Extractor 已初始化: 审查阈值 {review_threshold}")
     
@@ -423,22 +414,26 @@ class AgenticExtractor:
             logger.debug(f"[{chunk_id}] 未抽取到概念")
             return None, None
         
+        # 初始置信度: 有评分器时按抽取结果本身评分, 否则为固定值
+        confidence = self.scorer.score(text, concepts, relationships).score if self.scorer else 0.7
         extraction = ExtractionResult(
             concepts=concepts or [],
             relationships=relationships or [],
-            confidence=0.7  # 初始置信度
+            confidence=confidence
         )
         
         # Step 2: Critic Agent 审查 (仅对中等质量结果审查)
-        # 这里用一个固定初始置信度配合 review_threshold 控制“是否值得审一轮”
+        # 初始置信度配合 review_threshold 控制“是否值得审一轮”
         if self.review_threshold[0] <= extraction.confidence <= self.review_threshold[1]:
             logger.debug(f"[{chunk_id}] Critic Agent 审查中...")
-            review_report = self.critic.review_extraction(extraction, text)
+            with telemetry.scope(chunk_id=chunk_id):
+                review_report = self.critic.review_extraction(extraction, text)
             
             # Step 3: 如果质量不佳,Refine Agent 修正
             if review_report.get('overall_quality', 0) < 0.85:
                 logger.debug(f"[{chunk_id}] Refine Agent 修正中...")
-                extraction = self.refiner.refine_extraction(extraction, review_report, text)
+                with telemetry.scope(chunk_id=chunk_id):
+                    extraction = self.refiner.refine_extraction(extraction, review_report, text)
         
         return extraction.concepts, extraction.relationships
 
@@ -0,0 +1 @@
+"""管道基准测试: 合成语料生成器、模拟 Ollama 服务器与分阶段计时脚本 (见 run_benchmarks.py)"""
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""模拟 Ollama 服务器
+
+基于标准库 http.server 的本地桩服务, 模仿 Ollama 的 HTTP 接口, 让基准测试在没有 GPU、
+没有真实模型的机器上也能跑通 LLM 相关阶段, 且耗时可控、可复现:
+
+- GET  /api/tags      返回模型列表 (ConceptExtractor 初始化时用于连通性检查)
+- POST /api/generate  支持 stream=true/false
+- POST /api/chat      支持 stream=true/false
+
+响应内容:
+- 抽取类提示词: 用合成词表从提示词正文中"识别"实体, 返回符合抽取 JSON Schema 的
+  {"concepts": [...], "relationships": [...]}; 多块打包提示词 (### [C1] 分隔) 返回以块编号为键的对象;
+- 审稿类提示词 (要求只回答 Yes/No): 返回 "Yes";
+- 其他: 返回固定短文本。
+
+延迟模型: 每次请求耗时 = latency + per_token_latency × 输出 token 数 (可选抖动)
++ prompt_token_latency × 实际计算的提示词 token 数; 每个模型的第一次请求额外加上 load_latency,
+模拟模型加载。与 Ollama 一样, 提示词与同一模型上一次请求的公共前缀视为命中 KV 缓存,
+不计入 prompt_eval_count; /api/generate 的响应带 context 数组, 再次携带时在其后续写。
+响应带有 Ollama 风格的统计字段 (total_duration/load_duration/prompt_eval_count/
+prompt_eval_duration/eval_count/eval_duration, 单位纳秒)。
+invalid_json_rate / error_rate 可按比例注入非法 JSON 和 HTTP 500, 用于测试容错路径;
+ramble_rate 按比例让抽取响应陷入重复循环 (同一对象反复输出且不闭合), 模拟小模型失控。
+流式响应按生成耗时逐段发送, 客户端断开连接后停止 "生成" (计入 aborted_count)。
+
+用法:
+    with MockOllamaServer(latency=0.05) as server:
+        extractor = ConceptExtractor(model="qwen2.5-coder:14b", ollama_host=server.url)
+
+    python -m benchmarks.mock_ollama --port 11435 --latency 0.2
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.synthetic import EDGES, category_of, entity_pattern
+
+# 提示词中标记正文结束的位置 (示例 JSON 与上下文提示里的实体不应被"抽取")
+_BODY_END_MARKERS = ("输出格式示例", "**前文提到的核心实体**")
+_YES_NO_MARKERS = ("只回答 Yes 或 No", "Yes or No")
+_PACKED_SECTION = re.compile(r"^### \[(C\d+)\]\n", re.MULTILINE)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class MockOllamaServer:
+    """可编程的 Ollama 桩服务器 (后台线程运行)"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 per_token_latency: float = 0.0, load_latency: float = 0.0, jitter: float = 0.0,
+                 prompt_token_latency: float = 0.0, max_parallel: Optional[int] = None,
+                 invalid_json_rate: float = 0.0, error_rate: float = 0.0, ramble_rate: float = 0.0,
+                 ramble_repeats: int = 200, max_entities: int = 12, seed: int = 42, models: Optional[List[str]] = None):
+        """
+        Args:
+            host, port: 监听地址; port=0 时由系统分配空闲端口
+            latency: 每次请求的固定延迟 (秒)
+            per_token_latency: 每个输出 token 的额外延迟 (秒)
+            load_latency: 每个模型第一次请求的加载延迟 (秒)
+            prompt_token_latency: 每个实际计算 (未命中前缀缓存) 的提示词 token 的延迟 (秒)
+            max_parallel: 同时处理的请求数上限 (相当于 OLLAMA_NUM_PARALLEL), None 表示不限制
+            jitter: 延迟的相对抖动幅度, 0.1 表示 ±10%
+            invalid_json_rate: 抽取响应中返回截断 JSON 的比例
+            error_rate: 返回 HTTP 500 的比例
+            ramble_rate: 抽取响应陷入重复循环的比例
+            ramble_repeats: 失控响应中重复对象的个数 (决定失控输出的长度与生成耗时)
+            max_entities: 每次抽取最多返回的实体数
+            seed: 抖动与故障注入的随机种子
+            models: /api/tags 返回的模型名列表
+        """
+        self.latency = latency
+        self.per_token_latency = per_token_latency
+        self.load_latency = load_latency
+        self.jitter = jitter
+        self.prompt_token_latency = prompt_token_latency
+        self.invalid_json_rate = invalid_json_rate
+        self.error_rate = error_rate
+        self.ramble_rate = ramble_rate
+        self.ramble_repeats = ramble_repeats
+        self.max_entities = max_entities
+        self.models = models or ["qwen2.5-coder:14b", "qwen2.5-coder:7b", "mistral"]
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._loaded_models = set()
+        self._slots = threading.BoundedSemaphore(max_parallel) if max_parallel else None
+        self._last_prompt: Dict[str, str] = {}
+        self._contexts: Dict[int, str] = {}
+        self.request_count = 0
+        self.aborted_count = 0
+
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockOllamaServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> 'MockOllamaServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # 响应生成
+    # ------------------------------------------------------------------
+
+    def _random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _extract(self, prompt: str) -> Dict:
+        """从提示词正文中识别合成实体, 构造抽取结果; 打包提示词按块编号分别抽取"""
+        sections = _PACKED_SECTION.split(prompt)
+        if len(sections) > 1:
+            # split 结果: [前言, 编号1, 正文1, 编号2, 正文2, ...]
+            return {
+                alias: self._extract_body(_cut_body(text))
+                for alias, text in zip(sections[1::2], sections[2::2])
+            }
+        return self._extract_body(_cut_body(prompt.split("\n\n", 1)[-1]))
+
+    def _extract_body(self, body: str) -> Dict:
+        entities: List[str] = []
+        seen = set()
+        for match in entity_pattern().finditer(body):
+            name = match.group(0)
+            key = name.lower()
+            if key not in seen:
+                seen.add(key)
+                entities.append(name)
+            if len(entities) >= self.max_entities:
+                break
+
+        concepts = [
+            {"entity": name, "importance": 5 - min(4, i // 3), "category": category_of(name)}
+            for i, name in enumerate(entities)
+        ]
+        # 相邻实体两两连边, 关系类型按位置循环取值 (确定性输出)
+        relationships = [
+            {"node_1": a, "node_2": b, "edge": EDGES[i % len(EDGES)]}
+            for i, (a, b) in enumerate(zip(entities, entities[1:]))
+        ]
+        return {"concepts": concepts, "relationships": relationships}
+
+    def respond(self, prompt: str, system: str = "") -> str:
+        """根据提示词生成响应文本"""
+        if any(marker in prompt or marker in system for marker in _YES_NO_MARKERS):
+            return "Yes"
+        if "concepts" in prompt or "concepts" in system:
+            data = self._extract(prompt)
+            text = json.dumps(data, ensure_ascii=False)
+            if self.ramble_rate and self._random() < self.ramble_rate:
+                # 模拟失控: 输出若干正常对象后反复输出同一个对象, 直到达到生成上限, JSON 不闭合
+                items = data.get('concepts') or [{"entity": "松材线虫", "importance": 5, "category": "pathogen"}]
+                repeated = json.dumps(items[-1], ensure_ascii=False)
+                body = ", ".join([json.dumps(item, ensure_ascii=False) for item in items]
+                                 + [repeated] * self.ramble_repeats)
+                return '{"concepts": [' + body
+            if self.invalid_json_rate and self._random() < self.invalid_json_rate:
+                # 模拟生成被截断的 JSON
+                text = text[: max(1, len(text) // 2)]
+            return text
+        return "模拟响应"
+
+    def simulate(self, model: str, prompt: str, response: str, sleep: bool = True) -> Dict[str, int]:
+        """按延迟模型休眠, 返回 Ollama 风格的统计字段 (纳秒); sleep=False 时只计算不休眠 (流式响应自行控制节奏)"""
+        with self._lock:
+            self.request_count += 1
+            first_load = model not in self._loaded_models
+            self._loaded_models.add(model)
+            previous = self._last_prompt.get(model, "")
+            self._last_prompt[model] = prompt
+
+        # 与上一次请求的公共前缀命中缓存, 只计算其余部分
+        cached_tokens = len(os.path.commonprefix([previous, prompt])) // 4
+        prompt_tokens = max(1, _estimate_tokens(prompt) - cached_tokens)
+        eval_tokens = _estimate_tokens(response)
+        load = self.load_latency if first_load else 0.0
+        prompt_eval = self.prompt_token_latency * prompt_tokens
+        generation = self.latency + self.per_token_latency * eval_tokens
+        if self.jitter:
+            generation *= 1.0 + self.jitter * (2 * self._random() - 1)
+        generation = max(0.0, generation)
+
+        if sleep and load + prompt_eval + generation > 0:
+            with self.slot():
+                time.sleep(load + prompt_eval + generation)
+
+        # 固定延迟按 1:9 拆给 prompt 评估与输出解码
+        return {
+            "total_duration": int((load + prompt_eval + generation) * 1e9),
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int((prompt_eval + generation * 0.1) * 1e9),
+            "eval_count": eval_tokens,
+            "eval_duration": int(generation * 0.9 * 1e9),
+        }
+
+    def slot(self):
+        """占用一个处理槽位; 超出并发上限的请求排队, 与单台 Ollama 的行为一致"""
+        return self._slots if self._slots is not None else contextlib.nullcontext()
+
+    def make_context(self, text: str) -> List[int]:
+        """模拟 context 数组: 首元素是会话编号, 长度等于会话 token 数"""
+        with self._lock:
+            context_id = len(self._contexts) + 1
+            self._contexts[context_id] = text
+        return [context_id] + [0] * (_estimate_tokens(text) - 1)
+
+    def context_text(self, context: List[int]) -> str:
+        with self._lock:
+            return self._contexts.get(context[0], "") if context else ""
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                # 基准测试时不输出访问日志
+                pass
+
+            def _send_json(self, status: int, payload: Dict):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_stream(self, lines: List[Dict], stats: Dict[str, int]):
+                """先休眠加载与提示词评估时间, 再按输出速度逐段发送; 客户端断开时停止"""
+                prefill = (stats["total_duration"] - stats["eval_duration"]) / 1e9
+                per_line = stats["eval_duration"] / 1e9 / max(1, len(lines))
+                with server.slot():
+                    time.sleep(prefill)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    try:
+                        for line in lines:
+                            time.sleep(per_line)
+                            data = json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n"
+                            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                            self.wfile.flush()
+                        self.wfile.write(b"0\r\n\r\n")
+                    except (BrokenPipeError, ConnectionResetError):
+                        with server._lock:
+                            server.aborted_count += 1
+                        self.close_connection = True
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/api/tags":
+                    self._send_json(200, {"models": [
+                        {"name": name, "model": name, "size": 0} for name in server.models
+                    ]})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json(400, {"error": "invalid json"})
+                    return
+
+                path = self.path.rstrip("/")
+                if path not in ("/api/generate", "/api/chat"):
+                    self._send_json(404, {"error": "not found"})
+                    return
+
+                if server.error_rate and server._random() < server.error_rate:
+                    self._send_json(500, {"error": "simulated failure"})
+                    return
+
+                model = request.get("model", "")
+                prompt, system = _prompt_of(request, chat=path == "/api/chat")
+                # 携带 context 时在之前的会话之后续写
+                system = server.context_text(request.get("context") or []) + system
+                response = server.respond(prompt, system)
+                stream = request.get("stream", True) is not False
+                stats = server.simulate(model, system + prompt, response, sleep=not stream)
+                created_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+                def piece(text: str, done: bool) -> Dict:
+                    payload = {"model": model, "created_at": created_at, "done": done}
+                    if path == "/api/chat":
+                        payload["message"] = {"role": "assistant", "content": text}
+                    else:
+                        payload["response"] = text
+                    if done:
+                        payload.update(stats, done_reason="stop")
+                        if path == "/api/generate":
+                            payload["context"] = server.make_context(system + prompt + response)
+                    return payload
+
+                if not stream:
+                    self._send_json(200, piece(response, True))
+                else:
+                    step = 16
+                    lines = [piece(response[i:i + step], False) for i in range(0, len(response), step)]
+                    lines.append(piece("", True))
+                    self._send_stream(lines, stats)
+
+        return Handler
+
+
+def _cut_body(body: str) -> str:
+    for marker in _BODY_END_MARKERS:
+        body = body.split(marker, 1)[0]
+    return body
+
+
+def _prompt_of(request: Dict, chat: bool) -> Tuple[str, str]:
+    """返回 (prompt, system); chat 接口把消息按角色拼接"""
+    if not chat:
+        return request.get("prompt", "") or "", request.get("system", "") or ""
+    prompt_parts, system_parts = [], []
+    for message in request.get("messages", []):
+        target = system_parts if message.get("role") == "system" else prompt_parts
+        target.append(message.get("content", "") or "")
+    return "\n\n".join(prompt_parts), "\n\n".join(system_parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟 Ollama 服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="每次请求的固定延迟 (秒)")
+    parser.add_argument("--per-token-latency", type=float, default=0.0, help="每个输出 token 的延迟 (秒)")
+    parser.add_argument("--load-latency", type=float, default=0.0, help="模型首次加载延迟 (秒)")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0,
+                        help="每个未命中缓存的提示词 token 的延迟 (秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟相对抖动幅度")
+    parser.add_argument("--max-parallel", type=int, default=None, help="同时处理的请求数上限")
+    parser.add_argument("--invalid-json-rate", type=float, default=0.0)
+    parser.add_argument("--ramble-rate", type=float, default=0.0, help="抽取响应陷入重复循环的比例")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    server = MockOllamaServer(
+        host=args.host, port=args.port, latency=args.latency,
+        per_token_latency=args.per_token_latency, load_latency=args.load_latency,
+        prompt_token_latency=args.prompt_token_latency, max_parallel=args.max_parallel,
+        jitter=args.jitter, invalid_json_rate=args.invalid_json_rate, ramble_rate=args.ramble_rate,
+        error_rate=args.error_rate, seed=args.seed,
+    )
+    print(f"Mock Ollama listening on {server.url} (Ctrl+C 退出)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""知识图谱构建管道基准测试
+
+在合成语料上逐阶段计时, 结果写成 JSON, 可与基线文件对比发现性能回退:
+
+    extract     ConceptExtractor.extract_from_chunks (连接模拟 Ollama 服务器)
+    proximity   ContextualProximityAnalyzer.extract_proximity_relationships
+    merge       ContextualProximityAnalyzer.merge_relationships
+    dedup       ConceptDeduplicator.deduplicate_concepts (TF-IDF 向量)
+    triples     convert_to_triples.convert_to_triples
+    review      bio_semantic_review.review_triples (规则体检)
+    review_llm  bio_semantic_review.review_triples (LLM 复核, 连接模拟服务器)
+    import      批量写入本地 Neo4j; 未指定 --neo4j-uri 时写入内存替身
+
+规模参数 --scale 为概念表行数, 可一次给出多个 (如 1000 10000 100000 1000000)。
+LLM 相关阶段的耗时由模拟服务器的延迟参数决定, 只处理 --llm-chunks 个块;
+去重阶段的相似度矩阵是 O(n²) 的, 只取前 --dedup-max 个不同实体。
+
+用法:
+    python benchmarks/run_benchmarks.py --scale 1000 10000
+    python benchmarks/run_benchmarks.py --scale 10000 --baseline output/benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --scale 100000 --neo4j-uri bolt://localhost:7687
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pandas as pd
+
+from benchmarks import synthetic
+from benchmarks.mock_ollama import MockOllamaServer
+from instrumentation import metrics
+from llm_telemetry import load_calls, summarize, telemetry
+
+try:
+    from neo4j import GraphDatabase
+    NEO4J_AVAILABLE = True
+except ImportError:
+    NEO4J_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ALL_STAGES = ["extract", "proximity", "merge", "dedup", "triples", "review", "review_llm", "import"]
+
+# 基准数据写入 Neo4j 时使用的独立标签, 不影响真实图谱
+BENCH_LABEL = "BenchConcept"
+BENCH_REL = "BENCH_REL"
+
+
+# ----------------------------------------------------------------------
+# 导入阶段
+# ----------------------------------------------------------------------
+
+class InMemoryGraph:
+    """Neo4j 的内存替身: 与 UNWIND + MERGE 批量导入相同的按批合并语义"""
+
+    def __init__(self):
+        self.nodes: Dict[str, Dict] = {}
+        self.relationships: Dict[tuple, Dict] = {}
+
+    def merge_batch(self, rows: List[Dict]):
+        for row in rows:
+            for name, node_type in ((row['node_1'], row['node_1_type']), (row['node_2'], row['node_2_type'])):
+                node = self.nodes.get(name)
+                if node is None:
+                    self.nodes[name] = {'name': name, 'type': node_type}
+            key = (row['node_1'], row['relationship'], row['node_2'])
+            self.relationships[key] = {'weight': row['weight']}
+
+
+def import_in_memory(triples_df: pd.DataFrame, batch_size: int) -> Dict[str, int]:
+    graph = InMemoryGraph()
+    rows = _import_rows(triples_df)
+    for start in range(0, len(rows), batch_size):
+        graph.merge_batch(rows[start:start + batch_size])
+    return {'nodes': len(graph.nodes), 'relationships': len(graph.relationships)}
+
+
+def import_neo4j(triples_df: pd.DataFrame, batch_size: int, uri: str, user: str,
+                 password: str) -> Dict[str, int]:
+    """按批 UNWIND + MERGE 写入 Neo4j; 结束后删除基准数据"""
+    driver = GraphDatabase.driver(uri, auth=(user, password))
+    rows = _import_rows(triples_df)
+    try:
+        with driver.session() as session:
+            _delete_bench_nodes(session)
+            session.run(
+                f"CREATE INDEX bench_concept_name IF NOT EXISTS FOR (n:{BENCH_LABEL}) ON (n.name)"
+            ).consume()
+            for start in range(0, len(rows), batch_size):
+                session.run(f"""
+                    UNWIND $rows AS row
+                    MERGE (s:{BENCH_LABEL} {{name: row.node_1}})
+                      ON CREATE SET s.type = row.node_1_type
+                    MERGE (t:{BENCH_LABEL} {{name: row.node_2}})
+                      ON CREATE SET t.type = row.node_2_type
+                    MERGE (s)-[r:{BENCH_REL} {{type: row.relationship}}]->(t)
+                    SET r.weight = row.weight
+                """, rows=rows[start:start + batch_size]).consume()
+            record = session.run(f"""
+                MATCH (n:{BENCH_LABEL})
+                OPTIONAL MATCH (n)-[r:{BENCH_REL}]->()
+                RETURN count(DISTINCT n) AS nodes, count(r) AS relationships
+            """).single()
+            counts = {'nodes': record['nodes'], 'relationships': record['relationships']}
+            _delete_bench_nodes(session)
+            return counts
+    finally:
+        driver.close()
+
+
+def _delete_bench_nodes(session):
+    session.run(f"""
+        MATCH (n:{BENCH_LABEL})
+        CALL {{ WITH n DETACH DELETE n }} IN TRANSACTIONS OF 10000 ROWS
+    """).consume()
+
+
+def _import_rows(triples_df: pd.DataFrame) -> List[Dict]:
+    columns = ['node_1', 'node_1_type', 'relationship', 'node_2', 'node_2_type', 'weight']
+    frame = triples_df[columns].copy()
+    frame['node_1_type'] = frame['node_1_type'].fillna('Other').astype(str)
+    frame['node_2_type'] = frame['node_2_type'].fillna('Other').astype(str)
+    frame['weight'] = frame['weight'].astype(float)
+    return frame.to_dict('records')
+
+
+# ----------------------------------------------------------------------
+# 计时
+# ----------------------------------------------------------------------
+
+class StageTimer:
+    """逐阶段计时, 同时记录到 instrumentation 的 bench.* 区间"""
+
+    def __init__(self):
+        self.results: Dict[str, Dict] = {}
+
+    def run(self, stage: str, func: Callable, items: Optional[int] = None):
+        with metrics.span(f"bench.{stage}"):
+            start = time.perf_counter()
+            value = func()
+            seconds = time.perf_counter() - start
+        self.results[stage] = {
+            'seconds': seconds,
+            'items': items,
+            'per_second': (items / seconds) if items and seconds > 0 else None,
+        }
+        logger.info(f"  {stage:<12s} {seconds:10.3f}s  items={items}")
+        return value
+
+
+def run_scale(scale: int, args, servers: List[MockOllamaServer]) -> Dict[str, Dict]:
+    """在一个规模上跑一遍所有选中的阶段"""
+    from concept_deduplicator import ConceptDeduplicator, TfidfEmbedding
+    from concept_extractor import ConceptExtractor, ContextualProximityAnalyzer
+    from convert_to_triples import convert_to_triples
+    from bio_semantic_review import review_triples
+
+    stages = set(args.stages)
+    timer = StageTimer()
+
+    corpus = synthetic.make_corpus(scale, seed=args.seed)
+    chunks = corpus['chunks']
+    concepts_df = corpus['concepts']
+    llm_relationships_df = corpus['relationships']
+    logger.info(
+        f"[scale={scale}] chunks={len(chunks)} concepts={len(concepts_df)} "
+        f"relationships={len(llm_relationships_df)}"
+    )
+
+    if 'extract' in stages and servers:
+        # 多台模拟主机时经 OllamaRouter 分发, 吞吐应随主机数增长
+        hosts = [{'url': s.url, 'max_concurrency': args.host_parallel} for s in servers] \
+            if len(servers) > 1 else servers[0].url
+        extractor = ConceptExtractor(model=args.model, ollama_host=hosts, timeout=60,
+                                     prefix_reuse=args.prefix_reuse, pack_max_chars=args.pack_max_chars,
+                                     pack_max_chunks=args.pack_max_chunks, stream_json=args.stream_json)
+        llm_chunks = [{'chunk_id': c['chunk_id'], 'text': c['text']} for c in chunks[:args.llm_chunks]]
+        timer.run(
+            'extract',
+            lambda: extractor.extract_from_chunks(llm_chunks),
+            items=len(llm_chunks),
+        )
+
+    proximity_df = pd.DataFrame()
+    if stages & {'proximity', 'merge', 'triples', 'review', 'review_llm', 'import'}:
+        concept_map: Dict[str, List[str]] = {}
+        for entity, chunk_id in zip(concepts_df['entity'], concepts_df['chunk_id']):
+            concept_map.setdefault(chunk_id, []).append(entity)
+        proximity_chunks = [
+            {'chunk_id': c['chunk_id'], 'concepts': concept_map.get(c['chunk_id'], [])} for c in chunks
+        ]
+        proximity_df = timer.run(
+            'proximity',
+            lambda: ContextualProximityAnalyzer.extract_proximity_relationships(proximity_chunks),
+            items=len(proximity_chunks),
+        )
+
+    relationships_df = llm_relationships_df
+    if stages & {'merge', 'triples', 'review', 'review_llm', 'import'}:
+        relationships_df = timer.run(
+            'merge',
+            lambda: ContextualProximityAnalyzer.merge_relationships(llm_relationships_df, proximity_df),
+            items=len(llm_relationships_df) + len(proximity_df),
+        )
+
+    if 'dedup' in stages:
+        unique_entities = concepts_df['entity'].drop_duplicates().head(args.dedup_max)
+        dedup_input = concepts_df[concepts_df['entity'].isin(set(unique_entities))]
+        deduplicator = ConceptDeduplicator(
+            embedding_provider=TfidfEmbedding(), similarity_threshold=0.85,
+            use_canonical_resolver=True, use_external_kb=False,
+        )
+        timer.run('dedup', lambda: deduplicator.deduplicate_concepts(dedup_input), items=len(dedup_input))
+
+    triples_df = pd.DataFrame()
+    if stages & {'triples', 'review', 'review_llm', 'import'}:
+        triples_df = timer.run(
+            'triples',
+            lambda: convert_to_triples(concepts_df, relationships_df),
+            items=len(relationships_df),
+        )
+
+    clean_df = triples_df
+    if 'review' in stages and not triples_df.empty:
+        clean_df = timer.run('review', lambda: review_triples(triples_df)[0], items=len(triples_df))
+
+    if 'review_llm' in stages and servers and not triples_df.empty and args.review_llm_max > 0:
+        # 只复核落在 LLM 区间内的三元组, 取前 review_llm_max 条
+        band = triples_df[(triples_df['weight'] >= 0.6) & (triples_df['weight'] < 0.8)]
+        if band.empty:
+            band = triples_df.assign(weight=0.7)
+        sample = band.head(args.review_llm_max)
+        timer.run(
+            'review_llm',
+            lambda: review_triples(sample, llm_model=args.model, llm_host=servers[0].url),
+            items=len(sample),
+        )
+
+    if 'import' in stages and not clean_df.empty:
+        import_df = clean_df
+        if 'node_1_type' not in import_df.columns:
+            types = dict(zip(concepts_df['entity'], concepts_df['category']))
+            import_df = import_df.assign(
+                node_1_type=import_df['node_1'].map(types), node_2_type=import_df['node_2'].map(types),
+            )
+        if args.neo4j_uri:
+            counts = timer.run(
+                'import',
+                lambda: import_neo4j(import_df, args.batch_size, args.neo4j_uri,
+                                     args.neo4j_user, args.neo4j_password),
+                items=len(import_df),
+            )
+        else:
+            counts = timer.run(
+                'import', lambda: import_in_memory(import_df, args.batch_size), items=len(import_df),
+            )
+        timer.results['import'].update(counts)
+
+    return timer.results
+
+
+def aggregate(runs: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """多次重复取中位数, 同时保留最小值"""
+    aggregated: Dict[str, Dict] = {}
+    for stage in ALL_STAGES:
+        samples = [run[stage] for run in runs if stage in run]
+        if not samples:
+            continue
+        seconds = [s['seconds'] for s in samples]
+        median = statistics.median(seconds)
+        items = samples[0].get('items')
+        result = dict(samples[0])
+        result.update({
+            'seconds': round(median, 6),
+            'min_seconds': round(min(seconds), 6),
+            'repeats': len(seconds),
+            'per_second': round(items / median, 2) if items and median > 0 else None,
+        })
+        aggregated[stage] = result
+    return aggregated
+
+
+# ----------------------------------------------------------------------
+# 结果与基线对比
+# ----------------------------------------------------------------------
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root,
+            capture_output=True, text=True, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment_info() -> Dict:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pd.__version__,
+        'git_commit': _git_commit(),
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float, min_delta: float) -> List[Dict]:
+    """
+    与基线逐阶段对比
+
+    只有当耗时比基线慢 tolerance 以上, 且绝对差值超过 min_delta 秒时才判为回退,
+    避免毫秒级阶段的抖动造成误报。
+    """
+    rows = []
+    for scale, stages in current['scales'].items():
+        base_stages = baseline.get('scales', {}).get(scale, {})
+        for stage, result in stages.items():
+            base = base_stages.get(stage)
+            if not base:
+                continue
+            ratio = result['seconds'] / base['seconds'] if base['seconds'] > 0 else float('inf')
+            delta = result['seconds'] - base['seconds']
+            rows.append({
+                'scale': scale,
+                'stage': stage,
+                'baseline': base['seconds'],
+                'current': result['seconds'],
+                'ratio': round(ratio, 3),
+                'regression': ratio > 1 + tolerance and delta > min_delta,
+            })
+    return rows
+
+
+def print_summary(report: Dict, comparison: Optional[List[Dict]]):
+    print("\n" + "=" * 72)
+    print("基准测试结果 (中位数)")
+    print("=" * 72)
+    for scale, stages in report['scales'].items():
+        print(f"\n规模 {scale}:")
+        for stage, result in stages.items():
+            rate = f"{result['per_second']:>12.1f}/s" if result.get('per_second') else " " * 14
+            print(f"  {stage:<12s} {result['seconds']:10.3f}s {rate}  items={result.get('items')}")
+
+    if comparison is not None:
+        print("\n与基线对比:")
+        for row in comparison:
+            flag = "  <-- 回退" if row['regression'] else ""
+            print(f"  [{row['scale']:>8s}] {row['stage']:<12s} {row['baseline']:9.3f}s -> "
+                  f"{row['current']:9.3f}s  x{row['ratio']:.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="知识图谱构建管道基准测试 (合成语料 + 模拟 Ollama)")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1000], help="概念表行数, 可给出多个")
+    parser.add_argument("--stages", nargs="+", default=ALL_STAGES, choices=ALL_STAGES)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=1, help="每个规模重复次数, 结果取中位数")
+    parser.add_argument("--model", default="qwen2.5-coder:14b")
+    parser.add_argument("--llm-chunks", type=int, default=20, help="抽取阶段处理的块数")
+    parser.add_argument("--review-llm-max", type=int, default=50, help="LLM 复核的三元组数")
+    parser.add_argument("--dedup-max", type=int, default=5000, help="去重阶段的最大不同实体数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务器每次请求的固定延迟 (秒)")
+    parser.add_argument("--per-token-latency", type=float, default=0.0)
+    parser.add_argument("--load-latency", type=float, default=0.0)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0,
+                        help="模拟服务器每个未命中前缀缓存的提示词 token 的延迟 (秒)")
+    parser.add_argument("--prefix-reuse", default="off", choices=["off", "chat", "context"],
+                        help="抽取阶段的提示词前缀复用方式")
+    parser.add_argument("--hosts", type=int, default=1, help="模拟 Ollama 主机数, 大于 1 时抽取阶段经路由器分发")
+    parser.add_argument("--host-parallel", type=int, default=1,
+                        help="每台模拟主机同时处理的请求数 (相当于 OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--pack-max-chars", type=int, default=0, help="抽取阶段短块打包的字符上限, 0 表示不打包")
+    parser.add_argument("--pack-max-chunks", type=int, default=3, help="每个打包请求最多包含的块数")
+    parser.add_argument("--ramble-rate", type=float, default=0.0,
+                        help="模拟服务器中抽取响应陷入重复循环的比例 (配合 --stream-json 比较浪费的生成时间)")
+    parser.add_argument("--stream-json", action="store_true", help="抽取阶段使用流式增量解析与提前中止")
+    parser.add_argument("--batch-size", type=int, default=5000, help="导入阶段每批行数")
+    parser.add_argument("--neo4j-uri", default=None, help="指定时导入真实 Neo4j, 否则使用内存替身")
+    parser.add_argument("--neo4j-user", default=os.getenv("NEO4J_USER", "neo4j"))
+    parser.add_argument("--neo4j-password", default=os.getenv("NEO4J_PASSWORD", "password"))
+    parser.add_argument("--output-dir", default="./output/benchmarks")
+    parser.add_argument("--baseline", default=None, help="基线结果 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的相对变慢比例")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="判为回退的最小绝对差值 (秒)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="发现回退时以非零状态退出")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    if args.neo4j_uri and not NEO4J_AVAILABLE:
+        parser.error("--neo4j-uri 需要安装 neo4j 驱动")
+
+    metrics.reset()
+    run_id = f"{datetime.now():%Y%m%d_%H%M%S}"
+    # LLM 调用日志写到基准结果目录, 不混入真实管道的日志
+    llm_log = os.path.join(args.output_dir, f"llm_calls_{run_id}.jsonl")
+    telemetry.configure(log_path=llm_log)
+    needs_llm = bool({'extract', 'review_llm'} & set(args.stages))
+    servers: List[MockOllamaServer] = []
+    if needs_llm:
+        servers = [
+            MockOllamaServer(
+                latency=args.latency, per_token_latency=args.per_token_latency,
+                load_latency=args.load_latency, prompt_token_latency=args.prompt_token_latency,
+                max_parallel=args.host_parallel, ramble_rate=args.ramble_rate, seed=args.seed + i,
+            ).start()
+            for i in range(max(1, args.hosts))
+        ]
+
+    try:
+        scales = {}
+        for scale in args.scale:
+            runs = [run_scale(scale, args, servers) for _ in range(max(1, args.repeat))]
+            scales[str(scale)] = aggregate(runs)
+    finally:
+        for server in servers:
+            server.stop()
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment_info(),
+        'parameters': {
+            key: value for key, value in vars(args).items()
+            if key not in ('neo4j_password', 'baseline', 'output_dir', 'verbose', 'fail_on_regression')
+        },
+        'import_backend': 'neo4j' if args.neo4j_uri else 'memory',
+        'scales': scales,
+        'metrics': metrics.report(),
+        'llm': summarize(load_calls(llm_log)) if os.path.exists(llm_log) else {},
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_path = os.path.join(args.output_dir, f"bench_{run_id}.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('parameters', {}).get('seed') != args.seed:
+            logger.warning("基线与本次使用的随机种子不同, 对比结果仅供参考")
+        comparison = compare(report, baseline, args.tolerance, args.min_delta)
+
+    print_summary(report, comparison)
+    print(f"\n结果已保存: {output_path}")
+
+    if comparison and args.fail_on_regression and any(row['regression'] for row in comparison):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""合成语料生成器
+
+按给定规模生成与真实管道中间产物结构一致的数据, 用于基准测试:
+
+- chunks: 文本块 (chunk_id/text, 以及生成时埋入的真实实体列表 entities);
+- concepts: 概念表 (entity/importance/category/chunk_id/type), 与 ConceptExtractor 输出同构;
+- relationships: LLM 关系表 (node_1/node_2/edge/weight/chunk_id/source), 与 W1 关系同构;
+- triples: 三元组表 (node_1/node_1_type/relationship/node_2/node_2_type/weight)。
+
+实体名称由领域词表派生: 词表原词 + "-编号" 变体, 另按比例混入大小写/空格不同的
+近似重复写法, 让去重阶段有真实的合并工作量。所有随机性都来自给定种子,
+同一种子与规模生成的数据完全一致, 保证基准结果可以逐次对比。
+"""
+
+import random
+import re
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# 领域词表: (名称, 类别); 类别与抽取提示词中的类别保持一致
+VOCABULARY: List[Tuple[str, str]] = [
+    ("松材线虫", "pathogen"),
+    ("Bursaphelenchus xylophilus", "pathogen"),
+    ("伴生细菌", "pathogen"),
+    ("马尾松", "host"),
+    ("黑松", "host"),
+    ("湿地松", "host"),
+    ("赤松", "host"),
+    ("云南松", "host"),
+    ("Pinus massoniana", "host"),
+    ("松褐天牛", "vector"),
+    ("云杉花墨天牛", "vector"),
+    ("Monochamus alternatus", "vector"),
+    ("针叶变色", "symptom"),
+    ("萎蔫", "symptom"),
+    ("树脂分泌异常", "symptom"),
+    ("枯死", "symptom"),
+    ("阿维菌素", "treatment"),
+    ("噻虫啉", "treatment"),
+    ("诱捕器", "treatment"),
+    ("生物防治", "treatment"),
+    ("温度", "environment"),
+    ("湿度", "environment"),
+    ("降水", "environment"),
+    ("海拔", "environment"),
+    ("疫区", "location"),
+    ("浙江省", "location"),
+    ("安徽省", "location"),
+    ("侵染途径", "mechanism"),
+    ("致病机理", "mechanism"),
+    ("萜烯", "compound"),
+    ("酚类", "compound"),
+    ("hyperspectral imaging", "technology"),
+    ("UAV detection", "technology"),
+]
+
+CATEGORY_OF: Dict[str, str] = {name: category for name, category in VOCABULARY}
+
+# 关系类型: 与抽取提示词中的关系词一致
+EDGES = ["感染", "传播", "携带", "引起", "导致", "防治", "控制", "影响", "分布于", "寄生于"]
+
+# 三元组关系类型: 与 bio_semantic_review.build_relation_schema 的关系名一致
+TRIPLE_RELATIONS = [
+    "INFECTS", "TRANSMITS", "CARRIES", "CAUSES", "CONTROLS", "AFFECTS",
+    "DISTRIBUTED_IN", "MONITORS", "SYMPTOM_OF", "CO_OCCURS_WITH", "RELATED_TO",
+]
+
+_SENTENCE_TEMPLATES = [
+    "{a}{edge}{b}，在调查样地中较为常见。",
+    "研究表明{a}与{b}之间存在明显关联，{edge}作用显著。",
+    "在{b}的发生过程中，{a}起到{edge}的作用。",
+    "{a}通常{edge}{b}，并在夏季达到高峰。",
+    "对{a}和{b}的监测数据显示二者{edge}关系稳定。",
+]
+
+_FILLER = [
+    "样地位于低山丘陵区，林分以针叶林为主。",
+    "采样时间为每年五月至十月。",
+    "统计分析采用广义线性模型。",
+    "结果与前人研究基本一致。",
+]
+
+_VARIANT_PATTERN = None
+
+
+def entity_pattern() -> "re.Pattern":
+    """匹配合成实体名 (词表原词 + 可选编号后缀) 的正则, mock 服务器据此从提示词中"抽取"实体"""
+    global _VARIANT_PATTERN
+    if _VARIANT_PATTERN is None:
+        names = sorted((name for name, _ in VOCABULARY), key=len, reverse=True)
+        alternation = "|".join(re.escape(name) for name in names)
+        _VARIANT_PATTERN = re.compile(rf"(?:{alternation})(?:-\d+)?", re.IGNORECASE)
+    return _VARIANT_PATTERN
+
+
+def base_name(entity: str) -> str:
+    """去掉编号后缀后的词表原词"""
+    return re.sub(r"-\d+$", "", entity.strip())
+
+
+def category_of(entity: str) -> str:
+    base = base_name(entity).lower()
+    for name, category in VOCABULARY:
+        if name.lower() == base:
+            return category
+    return "misc"
+
+
+def make_entities(n_entities: int, seed: int = 42) -> List[Tuple[str, str]]:
+    """
+    生成 n_entities 个互不相同的实体 (名称, 类别)
+
+    前 len(VOCABULARY) 个是词表原词, 之后依次追加 "-编号" 变体。
+    """
+    rng = random.Random(seed)
+    entities = list(VOCABULARY[:n_entities])
+    index = 1
+    while len(entities) < n_entities:
+        name, category = VOCABULARY[rng.randrange(len(VOCABULARY))]
+        entities.append((f"{name}-{index}", category))
+        index += 1
+    return entities
+
+
+def _surface_form(entity: str, rng: random.Random, variant_rate: float) -> str:
+    """按比例产生近似重复写法 (大小写/多余空格), 模拟 LLM 输出的不一致"""
+    if rng.random() >= variant_rate:
+        return entity
+    choice = rng.randrange(3)
+    if choice == 0:
+        return entity.upper()
+    if choice == 1:
+        return f" {entity} "
+    return entity.title()
+
+
+def make_chunks(n_chunks: int, entities: List[Tuple[str, str]], seed: int = 42,
+                entities_per_chunk: int = 8, sentences_per_chunk: int = 12) -> List[Dict]:
+    """
+    生成文本块
+
+    每个块随机抽取 entities_per_chunk 个实体, 用句子模板拼出约 sentences_per_chunk 句文本;
+    实体列表记录在 'entities' 字段中, 作为合成数据的真实标注。
+    """
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(n_chunks):
+        picked = rng.sample(entities, min(entities_per_chunk, len(entities)))
+        names = [name for name, _ in picked]
+        sentences = []
+        for s in range(sentences_per_chunk):
+            if s % 4 == 3:
+                sentences.append(rng.choice(_FILLER))
+                continue
+            a, b = rng.sample(names, 2) if len(names) >= 2 else (names[0], names[0])
+            template = rng.choice(_SENTENCE_TEMPLATES)
+            sentences.append(template.format(a=a, b=b, edge=rng.choice(EDGES)))
+        chunks.append({
+            'chunk_id': f"synthetic_doc{i // 50:04d}_chunk_{i:07d}",
+            'text': "".join(sentences),
+            'entities': names,
+        })
+    return chunks
+
+
+def make_concepts(chunks: List[Dict], seed: int = 42, variant_rate: float = 0.1) -> pd.DataFrame:
+    """由文本块的真实实体生成概念表 (与 ConceptExtractor.extract_from_chunks 输出同构)"""
+    rng = random.Random(seed)
+    rows = []
+    for chunk in chunks:
+        for name in chunk['entities']:
+            rows.append({
+                'entity': _surface_form(name, rng, variant_rate).lower(),
+                'importance': rng.randint(1, 5),
+                'category': category_of(name),
+                'chunk_id': chunk['chunk_id'],
+                'type': 'concept',
+            })
+    return pd.DataFrame(rows)
+
+
+def make_relationships(chunks: List[Dict], seed: int = 42,
+                       relationships_per_chunk: int = 6) -> pd.DataFrame:
+    """由文本块的真实实体生成 LLM 关系表 (W1)"""
+    rng = random.Random(seed)
+    rows = []
+    for chunk in chunks:
+        names = chunk['entities']
+        if len(names) < 2:
+            continue
+        for _ in range(relationships_per_chunk):
+            a, b = rng.sample(names, 2)
+            rows.append({
+                'node_1': a.lower(),
+                'node_2': b.lower(),
+                'edge': rng.choice(EDGES),
+                'weight': 0.8,
+                'chunk_id': chunk['chunk_id'],
+                'source': 'llm',
+            })
+    return pd.DataFrame(rows)
+
+
+def make_triples(n_triples: int, entities: List[Tuple[str, str]], seed: int = 42) -> pd.DataFrame:
+    """直接生成三元组表 (与 convert_to_triples 输出同构), 权重在 [0.5, 1.0) 均匀分布"""
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n_triples):
+        (a, a_type), (b, b_type) = rng.sample(entities, 2)
+        rows.append({
+            'node_1': a,
+            'node_1_type': a_type,
+            'relationship': rng.choice(TRIPLE_RELATIONS),
+            'node_2': b,
+            'node_2_type': b_type,
+            'weight': round(rng.uniform(0.5, 1.0), 3),
+        })
+    return pd.DataFrame(rows)
+
+
+def make_corpus(n_concepts: int, seed: int = 42, entities_per_chunk: int = 8,
+                n_entities: Optional[int] = None) -> Dict:
+    """
+    按概念表行数生成一整套合成数据
+
+    Args:
+        n_concepts: 概念表目标行数 (1k ~ 1M); 文本块数 = n_concepts / entities_per_chunk
+        seed: 随机种子
+        entities_per_chunk: 每个文本块包含的实体数
+        n_entities: 不同实体的个数, 默认为 n_concepts 的 1/4 (即每个实体平均出现 4 次)
+
+    Returns:
+        {'entities', 'chunks', 'concepts', 'relationships'}
+    """
+    n_chunks = max(1, n_concepts // entities_per_chunk)
+    n_entities = n_entities or max(entities_per_chunk, n_concepts // 4)
+    entities = make_entities(n_entities, seed)
+    chunks = make_chunks(n_chunks, entities, seed, entities_per_chunk=entities_per_chunk)
+    return {
+        'entities': entities,
+        'chunks': chunks,
+        'concepts': make_concepts(chunks, seed),
+        'relationships': make_relationships(chunks, seed),
+    }
@@ -21,8 +21,9 @@
 
 import os
 import pandas as pd
-from typing import Dict, List, Tuple
-import requests
+from typing import Dict, List, Optional, Tuple
+
+from ollama_client import get_client
 
 
 def _llm_decide(s: str, rel: str, t: str, s_type: str, t_type: str, weight: float,
@@ -45,29 +46,24 @@ def _llm_decide(s: str, rel: str, t: str, s_type: str, t_type: str, weight: floa
         True: 保留三元组, False: 拒绝三元组
     """
     try:
-        payload = {
-            "model": model,
-            "prompt": (
-                f"你是一位资深松材线虫病领域专家。判断以下知识三元组是否合理，只回答 Yes 或 No。\n\n"
-                f"【实体1】{s} (类型: {s_type})\n"
-                f"【关系】 {rel}\n"
-                f"【实体2】{t} (类型: {t_type})\n"
-                f"【置信度】{weight:.2f}\n\n"
-                f"判断依据:\n"
-                f"1. 生物学逻辑是否正确\n"
-                f"2. 实体类型与关系是否匹配\n"
-                f"3. 是否符合松材线虫病的专业知识\n\n"
-                f"只回答 Yes 或 No："
-            ),
-            "system": "你是松材线虫病专家。只回答 Yes 或 No，不要解释。",
-            "stream": False,
-            "temperature": 0.1,
-            "top_p": 0.9,
-            "top_k": 40,
-        }
-        resp = requests.post(f"{host}/api/generate", json=payload, timeout=timeout)
-        resp.raise_for_status()
-        text = (resp.json().get("response", "") or "").strip().lower()
+        prompt = (
+            f"你是一位资深松材线虫病领域专家。判断以下知识三元组是否合理，只回答 Yes 或 No。\n\n"
+            f"【实体1】{s} (类型: {s_type})\n"
+            f"【关系】 {rel}\n"
+            f"【实体2】{t} (类型: {t_type})\n"
+            f"【置信度】{weight:.2f}\n\n"
+            f"判断依据:\n"
+            f"1. 生物学逻辑是否正确\n"
+            f"2. 实体类型与关系是否匹配\n"
+            f"3. 是否符合松材线虫病的专业知识\n\n"
+            f"只回答 Yes 或 No："
+        )
+        resp = get_client(host).generate(
+            model, prompt, system="你是松材线虫病专家。只回答 Yes 或 No，不要解释。",
+            options={"temperature": 0.1, "top_p": 0.9, "top_k": 40},
+            timeout=timeout, max_retries=1, component="review",
+        )
+        text = (resp.get("response", "") or "").strip().lower()
         
         # 清理可能的 markdown 格式
         if text.startswith("```"):
@@ -304,43 +300,32 @@ def maybe_reverse(schema: Dict[str, List[Tuple[str, str]]], rel: str, s_type: st
     return False
 
 
-def main() -> None:
-    if not os.path.exists(TRIPLES_PATH):
-        print(f"[错误] 找不到输入文件: {TRIPLES_PATH}")
-        return
-
-    df = pd.read_csv(TRIPLES_PATH)
-    required_cols = {"node_1", "relationship", "node_2", "weight"}
-    if not required_cols.issubset(df.columns):
-        print(f"[错误] triples_export.csv 缺少必要列: {required_cols - set(df.columns)}")
-        return
+def review_triples(df: pd.DataFrame, llm_model: Optional[str] = None,
+                   llm_host: str = "http://localhost:11434",
+                   llm_band: Tuple[float, float] = (0.6, 0.8)
+                   ) -> Tuple[pd.DataFrame, List[Dict], Dict[str, str]]:
+    """
+    对三元组表做语义体检
 
-    print("=" * 80)
-    print("语义体检: 读取三元组")
-    print("=" * 80)
-    print(f"  总三元组数: {len(df)}")
+    Args:
+        df: 至少包含 node_1, relationship, node_2, weight 列
+        llm_model: 指定时, 置信度落在 llm_band 区间内的三元组交给 LLM 审稿人复核, 被拒绝的丢弃
+        llm_host: Ollama 服务地址
+        llm_band: LLM 复核的置信度区间 [low, high)
 
+    Returns:
+        (清洗后的三元组, 问题列表, 节点类型映射)
+    """
     schema = build_relation_schema()
 
     # 预推断所有节点类型
-    print("\n推断节点类型(label)...")
     nodes = sorted(set(df["node_1"].astype(str)) | set(df["node_2"].astype(str)))
     node_type_map: Dict[str, str] = {n: infer_node_type(n) for n in nodes}
 
-    # 统计节点类型分布
-    type_counts: Dict[str, int] = {}
-    for t in node_type_map.values():
-        type_counts[t] = type_counts.get(t, 0) + 1
-    print("  节点类型分布:")
-    for t, c in sorted(type_counts.items(), key=lambda x: -x[1]):
-        print(f"    {t:20s}: {c}")
-
-    # 逐条检查
-    print("\n开始检查三元组语义...")
     issues = []
     fixed_rows = []
 
-    for idx, row in df.iterrows():
+    for row in df.to_dict("records"):
         s = str(row["node_1"])
         t = str(row["node_2"])
         rel = str(row["relationship"])
@@ -350,13 +335,11 @@ def main() -> None:
         t_type = node_type_map.get(t, "Other")
 
         allowed = is_allowed(schema, rel, s_type, t_type)
-        reversed_flag = False
         note = ""
 
         if not allowed:
             # 尝试反转
             if maybe_reverse(schema, rel, s_type, t_type):
-                reversed_flag = True
                 s, t = t, s
                 s_type, t_type = t_type, s_type
                 note = "auto_reverse"
@@ -377,6 +360,15 @@ def main() -> None:
                 "new_node_2_type": t_type,
             })
 
+        if llm_model and llm_band[0] <= float(w) < llm_band[1]:
+            if not _llm_decide(s, rel, t, s_type, t_type, float(w), model=llm_model, host=llm_host):
+                issues.append({
+                    "node_1": s, "node_1_type": s_type, "relationship": rel,
+                    "node_2": t, "node_2_type": t_type, "weight": w, "action": "llm_reject",
+                    "new_node_1": "", "new_node_1_type": "", "new_node_2": "", "new_node_2_type": "",
+                })
+                continue
+
         fixed_rows.append({
             "node_1": s,
             "relationship": rel,
@@ -384,7 +376,36 @@ def main() -> None:
             "weight": w,
         })
 
-    clean_df = pd.DataFrame(fixed_rows)
+    return pd.DataFrame(fixed_rows), issues, node_type_map
+
+
+def main() -> None:
+    if not os.path.exists(TRIPLES_PATH):
+        print(f"[错误] 找不到输入文件: {TRIPLES_PATH}")
+        return
+
+    df = pd.read_csv(TRIPLES_PATH)
+    required_cols = {"node_1", "relationship", "node_2", "weight"}
+    if not required_cols.issubset(df.columns):
+        print(f"[错误] triples_export.csv 缺少必要列: {required_cols - set(df.columns)}")
+        return
+
+    print("=" * 80)
+    print("语义体检: 读取三元组")
+    print("=" * 80)
+    print(f"  总三元组数: {len(df)}")
+
+    print("\n推断节点类型(label)并检查三元组语义...")
+    clean_df, issues, node_type_map = review_triples(df)
+
+    # 统计节点类型分布
+    type_counts: Dict[str, int] = {}
+    for t in node_type_map.values():
+        type_counts[t] = type_counts.get(t, 0) + 1
+    print("  节点类型分布:")
+    for t, c in sorted(type_counts.items(), key=lambda x: -x[1]):
+        print(f"    {t:20s}: {c}")
+
     os.makedirs(os.path.dirname(OUTPUT_CLEAN_PATH), exist_ok=True)
     clean_df.to_csv(OUTPUT_CLEAN_PATH, index=False)
     print(f"\n已生成语义清洗后的三元组文件: {OUTPUT_CLEAN_PATH} (共 {len(clean_df)} 条)")
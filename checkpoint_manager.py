@@ -19,6 +19,7 @@ from datetime import datetime
 from typing import List, Dict, Any
 import pandas as pd
 from logger_config import get_logger
+from instrumentation import metrics
 
 logger = get_logger('CheckpointManager')
 
@@ -97,6 +98,7 @@ class CheckpointManager:
             "last_update": None
         }
     
+    @metrics.timed('checkpoint.save_progress')
     def _save_progress(self):
         """保存当前进度到 `.progress.json`
 
@@ -119,6 +121,23 @@ class CheckpointManager:
         """获取已处理的文本块列表(原始 `chunk_id` 列表)"""
         return self.progress["processed_chunks"]
     
+    def matches_chunker(self, signature: Dict[str, Any]) -> bool:
+        """已有进度是否由同样的分块方式产生
+
+        `chunk_id` 只在分块方式 (分块器版本与参数) 相同时才指向同一段文本; 没有任何已处理块时总是兼容,
+        旧版本写入的进度没有 `chunker` 字段, 视为不兼容。
+        """
+        if not self.progress["processed_chunks"]:
+            return True
+        return self.progress.get("chunker") == signature
+    
+    def set_chunker(self, signature: Dict[str, Any]):
+        """记录本次运行的分块方式, 供下次续跑时校验"""
+        if self.progress.get("chunker") != signature:
+            self.progress["chunker"] = signature
+            self._save_progress()
+    
+    @metrics.timed('checkpoint.save_chunk')
     def save_chunk_results(self, chunk_id: str, concepts: List[Dict], 
                           relationships: List[Dict]):
         """保存单个文本块的处理结果(增量模式)
@@ -155,6 +174,7 @@ class CheckpointManager:
         
         # 每次保存都刷新进度文件，保证中断时进度尽量最新
         self._save_progress()
+        metrics.incr('checkpoint.chunks')
         
         logger.debug(f"Saved results for chunk: {chunk_id}")
     
@@ -179,6 +199,7 @@ class CheckpointManager:
             df.to_csv(filepath, mode='w', header=True, index=False, 
                      encoding='utf-8-sig')
     
+    @metrics.timed('checkpoint.save_snapshot')
     def save_checkpoint(self, chunk_index: int, concepts_df: pd.DataFrame, 
                        relationships_df: pd.DataFrame):
         """保存完整 checkpoint(定期调用)
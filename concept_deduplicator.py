@@ -22,6 +22,8 @@ import pandas as pd
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.cluster import AgglomerativeClustering
 
+from instrumentation import metrics
+
 logger = logging.getLogger(__name__)
 
 
@@ -776,24 +778,25 @@ class ConceptDeduplicator:
         logger.info(f"Deduplicating {len(concepts_df)} concepts...")
         
         # Step 1: 使用 CanonicalResolver 进行规则优先的标准化
-        if self.canonical_resolver:
-            logger.info("Applying rule-based entity linking...")
-            canonical_mapping = {}
+        with metrics.span('dedup.canonical_resolve'):
+            if self.canonical_resolver:
+                logger.info("Applying rule-based entity linking...")
+                canonical_mapping = {}
             
-            for _, row in concepts_df.iterrows():
-                entity = row['entity']
-                category = row.get('category', None)
-                canonical = self.canonical_resolver.resolve(entity, category)
+                for _, row in concepts_df.iterrows():
+                    entity = row['entity']
+                    category = row.get('category', None)
+                    canonical = self.canonical_resolver.resolve(entity, category)
                 
-                if canonical != entity:
-                    canonical_mapping[entity] = canonical
+                    if canonical != entity:
+                        canonical_mapping[entity] = canonical
             
-            if canonical_mapping:
-                logger.info(f"Rule-based linking: {len(canonical_mapping)} entities standardized")
-                # 应用规则映射
-                concepts_df['entity'] = concepts_df['entity'].map(
-                    lambda x: canonical_mapping.get(x, x)
-                )
+                if canonical_mapping:
+                    logger.info(f"Rule-based linking: {len(canonical_mapping)} entities standardized")
+                    # 应用规则映射
+                    concepts_df['entity'] = concepts_df['entity'].map(
+                        lambda x: canonical_mapping.get(x, x)
+                    )
         
         # Step 2: 对剩余实体使用 Embedding 相似度聚类
         
@@ -805,13 +808,17 @@ class ConceptDeduplicator:
             return concepts_df, {concept: concept for concept in unique_concepts}
         
         # Generate embeddings: 为所有唯一概念生成向量表示
-        embeddings = self.embedding_provider.embed(list(unique_concepts))
+        with metrics.span('dedup.embed'):
+            embeddings = self.embedding_provider.embed(list(unique_concepts))
+        metrics.incr('dedup.embedded_concepts', len(unique_concepts))
         
         # Calculate similarity matrix: 计算任意两概念向量之间的余弦相似度,得到 N×N 的相似度矩阵
-        similarity_matrix = cosine_similarity(embeddings)
+        with metrics.span('dedup.similarity'):
+            similarity_matrix = cosine_similarity(embeddings)
         
         # Find duplicate clusters: 根据相似度矩阵做聚类,得到若干“同义概念簇”
-        clusters = self._cluster_similar_concepts(similarity_matrix, unique_concepts)
+        with metrics.span('dedup.cluster'):
+            clusters = self._cluster_similar_concepts(similarity_matrix, unique_concepts)
         
         # Create mapping from original to canonical concept: 为每个簇生成“原名 -> 规范名”的映射
         mapping = self._create_concept_mapping(clusters, unique_concepts, concepts_df)
@@ -12,13 +12,23 @@
 
 import json
 import logging
-from typing import List, Dict, Optional, Tuple
-import requests
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 from tqdm import tqdm
 import pandas as pd
 
+from instrumentation import metrics
+from llm_telemetry import telemetry
+from ollama_client import OllamaError, abort_stream, get_client
+from streaming_json import StreamingJSONParser
+
 logger = logging.getLogger(__name__)
 
+# 提示词/响应字符数的统计分桶
+_CHAR_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
 
 class ConceptExtractor:
     """基于 LLM 的概念和关系提取器（使用 Ollama 本地模型）
@@ -34,18 +44,124 @@ class ConceptExtractor:
     - llama3: Meta官方模型
     """
     
-    def __init__(self, model: str = "mistral", ollama_host: str = "http://localhost:11434", timeout: int = 600):
+    # 联合抽取 (extract_concepts_and_relationships) 的固定提示词; 前缀复用模式下二者合并为
+    # 每次请求完全相同的系统消息, 只有文本块本身随请求变化
+    JOINT_SYSTEM_PROMPT = """你是专业的松材线虫病知识图谱构建系统。你的任务是从科学文献中同时提取概念和关系。
+
+## 输出要求
+严格按照以下 JSON Schema 输出，不得添加任何解释或 markdown：
+
+{
+  "concepts": [
+    {"entity": "概念名称", "importance": 1-5整数, "category": "类别"}
+  ],
+  "relationships": [
+    {"node_1": "源实体", "node_2": "目标实体", "edge": "关系类型"}
+  ]
+}
+
+## 概念提取范围
+**病原** (pathogen): 松材线虫、Bursaphelenchus xylophilus、伴生细菌
+**寄主** (host): 马尾松、黑松、湿地松、赤松、云南松
+**媒介** (vector): 松褐天牛、云杉花墨天牛、Monochamus alternatus
+**症状** (symptom): 萎蔫、针叶变色、树脂分泌异常、枯死
+**防治** (treatment): 阿维菌素、噻虫啉、诱捕器、生物防治
+**环境** (environment): 温度、湿度、降水、海拔
+**地点** (location): 疫区、省份、分布区
+**机制** (mechanism): 侵染途径、致病机理
+**化合物** (compound): 萜烯、酚类、杀虫剂成分
+
+## 关系类型
+**因果**: 引起、导致、诱发
+**传播**: 传播、携带、扩散
+**寄生**: 感染、寄生于、侵染
+**防治**: 防治、控制、抑制、杀灭
+**影响**: 影响、促进、抑制
+**分布**: 分布于、发生于
+
+## 重要性评分
+5-核心概念, 4-重要概念, 3-一般概念, 2-次要概念, 1-边缘概念
+
+只输出 JSON 对象！"""
+    
+    JOINT_OUTPUT_EXAMPLE = """{
+  "concepts": [
+    {"entity": "松材线虫", "importance": 5, "category": "pathogen"},
+    {"entity": "松褐天牛", "importance": 5, "category": "vector"},
+    {"entity": "马尾松", "importance": 4, "category": "host"}
+  ],
+  "relationships": [
+    {"node_1": "松材线虫", "node_2": "马尾松", "edge": "感染"},
+    {"node_1": "松褐天牛", "node_2": "松材线虫", "edge": "传播"}
+  ]
+}"""
+    
+    PREFIX_REUSE_MODES = ('off', 'chat', 'context')
+    
+    # 多块打包请求的输出示例: 以块编号为键, 值为单块的抽取结果
+    BATCH_OUTPUT_EXAMPLE = """{
+  "C1": {"concepts": [{"entity": "松材线虫", "importance": 5, "category": "pathogen"}],
+         "relationships": [{"node_1": "松材线虫", "node_2": "马尾松", "edge": "感染"}]},
+  "C2": {"concepts": [], "relationships": []}
+}"""
+    
+    # 前缀复用的探测消息: 只发送固定前缀, 测量前缀 token 数与冷启动 prompt eval 耗时
+    _PREFIX_PROBE = "收到请回复 OK"
+    
+    # 流式解析的默认上限 (单块请求; 打包请求按块数放大): 超过即中止生成, 只保留已完整输出的对象
+    DEFAULT_STREAM_CAPS = {'max_concepts': 60, 'max_relationships': 80, 'max_chars': 16000, 'max_repeats': 3}
+    
+    def __init__(self, model: str = "mistral", ollama_host: str = "http://localhost:11434", timeout: int = 600,
+                 prefix_reuse: str = 'off', pack_max_chars: int = 0, pack_max_chunks: int = 3,
+                 pack_short_chars: int = 600, max_workers: Optional[int] = None, cascade=None,
+                 stream_json: bool = False, stream_caps: Optional[Dict[str, int]] = None):
         """初始化概念提取器
 
         参数:
             model: Ollama 模型名称(需提前拉取: ollama pull <model>)
-            ollama_host: Ollama 服务地址(本地运行一般为 http://localhost:11434)
+            ollama_host: Ollama 服务地址(本地运行一般为 http://localhost:11434); 传入地址列表
+                (或 {"url", "weight", "max_concurrency"} 字典列表) 时在多台主机间负载均衡
             timeout: 单次请求超时时间(秒), 大模型需要更长时间(默认 10 分钟)
+            prefix_reuse: 联合抽取时的提示词前缀复用方式:
+                - 'off': 每个块完整发送系统提示词(原有行为);
+                - 'chat': 走 /api/chat, 固定的系统消息在前、文本块在后, Ollama 命中 KV 缓存时
+                  不再重新计算前缀 token;
+                - 'context': 先用系统提示词预热一次, 之后每个块携带返回的 context 数组续写。
+                服务端不支持时自动退回 'off'。
+            pack_max_chars: 多块打包请求中文本的总字符上限, 0 表示不打包 (每块一次请求);
+            pack_max_chunks: 每个打包请求最多包含的块数;
+            pack_short_chars: 只有长度低于该值的块才参与打包, 长块仍单独请求;
+            max_workers: 同时在途的抽取请求数, 默认取客户端的并发容量 (单机为 1,
+                多主机时为各主机 max_concurrency 之和);
+            cascade: 可选的 extraction_cascade.ModelCascade; 设置后每个块的结果先经质量评分,
+                低分块升级到大模型或审稿循环重新处理;
+            stream_json: 联合抽取改用流式生成, 边接收边校验 JSON 结构, 输出失控 (结构错误、
+                条目数或长度超限、重复循环) 时立即中止生成, 截断的响应只保留已完整输出的对象;
+            stream_caps: 流式解析上限, 键同 DEFAULT_STREAM_CAPS, 缺省的键取默认值。
         """
+        if prefix_reuse not in self.PREFIX_REUSE_MODES:
+            raise ValueError(f"不支持的前缀复用方式: {prefix_reuse}")
         self.model = model
         self.ollama_host = ollama_host
         self.api_endpoint = f"{ollama_host}/api/generate"
         self.timeout = timeout
+        self.client = get_client(ollama_host)
+        self.prefix_reuse = prefix_reuse
+        # 前缀复用的探测结果与累计节省量 (见 _prime_prefix / prefix_reuse_summary)
+        self._prefix_primed = False
+        self._prefix_context: Optional[List[int]] = None
+        self._prefix_tokens = 0
+        self._prefix_chars_per_token = 0.0
+        self._prompt_eval_s_per_token = 0.0
+        self._prefix_stats = {'calls': 0, 'reused_tokens': 0, 'saved_s': 0.0}
+        self._prefix_lock = threading.Lock()
+        self.pack_max_chars = pack_max_chars
+        self.pack_max_chunks = max(1, pack_max_chunks)
+        self.pack_short_chars = pack_short_chars
+        self.max_workers = max(1, max_workers or getattr(self.client, 'capacity', 1))
+        self.cascade = cascade
+        self.stream_json = stream_json
+        self.stream_caps = dict(self.DEFAULT_STREAM_CAPS, **(stream_caps or {}))
         self._verify_ollama_connection()
     
     def _verify_ollama_connection(self):
@@ -59,20 +175,17 @@ class ConceptExtractor:
         如果失败，会抛出异常并提示运行 'ollama serve'
         """
         try:
-            response = requests.get(f"{self.ollama_host}/api/tags", timeout=5)
-            if response.status_code == 200:
-                logger.info(f"Connected to Ollama at {self.ollama_host}")
-                models = response.json().get('models', [])
-                model_names = [m.get('name', '').split(':')[0] for m in models]
-                logger.info(f"Available models: {', '.join(model_names)}")
-            else:
-                raise ConnectionError(f"Ollama returned status {response.status_code}")
+            models = self.client.tags(timeout=5)
+            logger.info(f"Connected to Ollama at {self.ollama_host}")
+            model_names = [m.get('name', '').split(':')[0] for m in models]
+            logger.info(f"Available models: {', '.join(model_names)}")
         except Exception as e:
             logger.error(f"Cannot connect to Ollama: {e}")
             logger.error("Please ensure Ollama is running: ollama serve")
             raise
     
-    def _call_ollama(self, prompt: str, system_prompt: str = "", temperature: float = 0.1, max_retries: int = 3, json_mode: bool = True) -> Optional[str]:
+    def _call_ollama(self, prompt: str, system_prompt: str = "", temperature: float = 0.1, max_retries: int = 3, json_mode: bool = True,
+                     stream_chunks: int = 0) -> Optional[str]:
         """调用 Ollama API 生成文本(带重试机制)
 
         参数:
@@ -81,6 +194,7 @@ class ConceptExtractor:
             temperature: 采样温度,0 表示基本确定性输出,1 表示随机性最大; 概念/关系提取通常使用 0.1 保证稳定性
             max_retries: 超时或网络异常时的最大重试次数
             json_mode: 是否启用严格 JSON 模式(Qwen 模型支持, 输出更接近预期的 JSON 结构)
+            stream_chunks: 大于 0 时以流式方式生成并增量解析 (见 _stream_json), 值为请求包含的块数
 
         返回:
             LLM 生成的文本(字符串), 失败返回 None
@@ -90,44 +204,294 @@ class ConceptExtractor:
         - 当 json_mode 为 True 且模型名称包含 qwen 时, 会在请求 payload 中设置 format="json", 限制模型必须输出合法 JSON;
         - 超过 max_retries 次仍失败时, 函数返回 None, 由上层决定当前 chunk 是否跳过。
         """
-        # 简单重试机制: 防止偶发超时/网络抖动直接导致整块解析失败
-        for attempt in range(max_retries):
-            try:
-                payload = {
-                    "model": self.model,
-                    "prompt": prompt,
-                    "system": system_prompt,
-                    "stream": False,
-                    "temperature": temperature,
-                    "top_p": 0.8,
-                    "top_k": 20,
-                    "repeat_penalty": 1.1,
-                    "num_ctx": 4096,  # 降低上下文窗口减少内存占用
-                }
-                
-                # Qwen 模型专属：强制 JSON 格式输出
-                # Ollama 的 format="json" 会约束模型输出符合JSON规范
-                if json_mode and 'qwen' in self.model.lower():
-                    payload["format"] = "json"  # 严格模式，非法JSON会自动重试
-                
-                # 使用配置的超时时间（默认600秒，支持大模型）
-                response = requests.post(self.api_endpoint, json=payload, timeout=self.timeout)
-                response.raise_for_status()
-                
-                result = response.json()
-                return result.get('response', '').strip()
-            except requests.exceptions.Timeout:
-                if attempt < max_retries - 1:
-                    logger.warning(f"Ollama timeout (attempt {attempt + 1}/{max_retries}), retrying...")
-                    continue
+        options = self._options(temperature)
+        json_format = self._json_format(json_mode)
+        
+        # 重试(指数退避)、连接复用与熔断由共享客户端负责; 使用配置的超时时间（默认600秒，支持大模型）
+        try:
+            if stream_chunks:
+                text, _ = self._stream_json(
+                    lambda on_done: self.client.stream_generate(
+                        self.model, prompt, system=system_prompt, options=options, format=json_format,
+                        timeout=self.timeout, component='extract', on_done=on_done
+                    ),
+                    stream_chunks
+                )
+                if text is None:
+                    return None
+            else:
+                result = self.client.generate(
+                    self.model, prompt, system=system_prompt, options=options, format=json_format,
+                    timeout=self.timeout, max_retries=max_retries, component='extract'
+                )
+                text = result.get('response', '').strip()
+        except OllamaError as e:
+            logger.error(f"Ollama API error: {e}")
+            return None
+        
+        metrics.observe('llm.prompt_chars', len(prompt) + len(system_prompt), buckets=_CHAR_BUCKETS)
+        metrics.observe('llm.response_chars', len(text), buckets=_CHAR_BUCKETS)
+        return text
+    
+    @staticmethod
+    def _options(temperature: float) -> Dict:
+        """抽取请求的采样参数; 前缀复用的探测请求必须使用相同的 num_ctx, 否则 Ollama 会重新加载模型"""
+        return {
+            "temperature": temperature,
+            "top_p": 0.8,
+            "top_k": 20,
+            "repeat_penalty": 1.1,
+            "num_ctx": 4096,  # 降低上下文窗口减少内存占用
+        }
+    
+    def _json_format(self, json_mode: bool) -> Optional[str]:
+        # Qwen 模型专属：强制 JSON 格式输出
+        # Ollama 的 format="json" 会约束模型输出符合JSON规范
+        return "json" if json_mode and 'qwen' in self.model.lower() else None
+    
+    def _prefix_system_prompt(self) -> str:
+        """前缀复用模式的系统消息: 固定规则 + 输出示例 (原先位于用户提示词末尾)"""
+        return f"{self.JOINT_SYSTEM_PROMPT}\n\n输出格式示例：\n{self.JOINT_OUTPUT_EXAMPLE}"
+    
+    def _disable_prefix_reuse(self, reason: str):
+        logger.warning(f"Prefix reuse ({self.prefix_reuse}) unavailable, falling back to full prompts: {reason}")
+        self.prefix_reuse = 'off'
+    
+    def _prime_prefix(self) -> bool:
+        """
+        只发送固定前缀做一次探测 (num_predict=1)
+        
+        - 记录前缀 token 数与冷启动时每个 prompt token 的计算耗时, 作为估算节省量的基准;
+        - context 模式同时保存返回的 context 数组, 后续请求在其后续写;
+        - 探测请求本身也让 Ollama 缓存住前缀。
+        
+        服务端不支持 (chat 接口 404、响应中没有 context) 时退回 'off', 返回 False。
+        """
+        system_prompt = self._prefix_system_prompt()
+        options = dict(self._options(0.1), num_predict=1)
+        try:
+            with telemetry.scope(prefix_reuse=self.prefix_reuse, probe=True):
+                if self.prefix_reuse == 'chat':
+                    result = self.client.chat(
+                        self.model,
+                        [{"role": "system", "content": system_prompt},
+                         {"role": "user", "content": self._PREFIX_PROBE}],
+                        options=options, timeout=self.timeout, component='extract_prime'
+                    )
                 else:
-                    logger.error(f"Ollama API timeout after {max_retries} attempts")
+                    result = self.client.generate(
+                        self.model, self._PREFIX_PROBE, system=system_prompt, options=options,
+                        timeout=self.timeout, component='extract_prime'
+                    )
+        except OllamaError as e:
+            if e.status_code is not None:
+                self._disable_prefix_reuse(str(e))
+            else:
+                # 连接类错误: 本次退回完整提示词, 下次调用再探测
+                logger.warning(f"Prefix probe failed: {e}")
+            return False
+        
+        if self.prefix_reuse == 'context':
+            context = result.get('context')
+            if not context:
+                self._disable_prefix_reuse("response has no context array")
+                return False
+            self._prefix_context = context
+        
+        eval_count = result.get('prompt_eval_count') or 0
+        eval_duration = result.get('prompt_eval_duration') or 0
+        self._prefix_tokens = len(self._prefix_context) if self._prefix_context else eval_count
+        if eval_count and eval_duration:
+            self._prompt_eval_s_per_token = eval_duration / 1e9 / eval_count
+            self._prefix_chars_per_token = (len(system_prompt) + len(self._PREFIX_PROBE)) / eval_count
+        self._prefix_primed = True
+        logger.info(
+            f"Prefix reuse ({self.prefix_reuse}) primed: prefix ~{self._prefix_tokens} tokens, "
+            f"cold prompt eval {self._prompt_eval_s_per_token * 1000:.2f} ms/token"
+        )
+        return True
+    
+    def _call_with_prefix(self, user_prompt: str, temperature: float = 0.1, max_retries: int = 3,
+                          json_mode: bool = True, fallback_prompt: Optional[str] = None,
+                          stream_chunks: int = 0) -> Optional[str]:
+        """
+        以前缀复用方式调用联合抽取 (chat 或 context 模式), 返回 LLM 文本
+        
+        首次调用先探测前缀; 服务端不支持时本次及之后的调用都退回 _call_ollama,
+        发送 fallback_prompt (默认为 user_prompt + 输出示例) 与原系统提示词。
+        """
+        with self._prefix_lock:
+            primed = self._prefix_primed or self._prime_prefix()
+        if not primed:
+            return self._call_ollama(fallback_prompt or self._full_user_prompt(user_prompt),
+                                     self.JOINT_SYSTEM_PROMPT, temperature=temperature,
+                                     max_retries=max_retries, json_mode=json_mode,
+                                     stream_chunks=stream_chunks)
+        
+        options = self._options(temperature)
+        json_format = self._json_format(json_mode)
+        messages = [{"role": "system", "content": self._prefix_system_prompt()},
+                    {"role": "user", "content": user_prompt}]
+        try:
+            if stream_chunks:
+                if self.prefix_reuse == 'chat':
+                    def open_stream(on_done):
+                        return self.client.stream_chat(
+                            self.model, messages, options=options, format=json_format,
+                            timeout=self.timeout, component='extract', on_done=on_done
+                        )
+                else:
+                    def open_stream(on_done):
+                        return self.client.stream_generate(
+                            self.model, user_prompt, context=self._prefix_context, options=options,
+                            format=json_format, timeout=self.timeout, component='extract', on_done=on_done
+                        )
+                text, result = self._stream_json(open_stream, stream_chunks)
+                if text is None:
                     return None
-            except Exception as e:
-                logger.error(f"Ollama API error (attempt {attempt + 1}/{max_retries}): {e}")
-                if attempt < max_retries - 1:
-                    continue
-                return None
+            elif self.prefix_reuse == 'chat':
+                result = self.client.chat(
+                    self.model, messages, options=options, format=json_format, timeout=self.timeout,
+                    max_retries=max_retries, component='extract'
+                )
+                text = (result.get('message') or {}).get('content', '').strip()
+            else:
+                result = self.client.generate(
+                    self.model, user_prompt, context=self._prefix_context, options=options,
+                    format=json_format, timeout=self.timeout, max_retries=max_retries, component='extract'
+                )
+                text = result.get('response', '').strip()
+        except OllamaError as e:
+            logger.error(f"Ollama API error: {e}")
+            return None
+        
+        self._record_prefix_saving(result, user_prompt)
+        metrics.observe('llm.prompt_chars', len(user_prompt), buckets=_CHAR_BUCKETS)
+        metrics.observe('llm.response_chars', len(text), buckets=_CHAR_BUCKETS)
+        return text
+    
+    def _full_user_prompt(self, user_prompt: str) -> str:
+        """前缀复用模式的用户提示词 + 输出示例, 即 'off' 模式下的完整用户提示词"""
+        return f"{user_prompt}\n\n输出格式示例：\n{self.JOINT_OUTPUT_EXAMPLE}"
+    
+    def _joint_call(self, user_prompt: str, with_example: bool = True, n_chunks: int = 1) -> Optional[str]:
+        """
+        发送联合抽取请求, 按 prefix_reuse 选择调用方式
+        
+        with_example 为 True 时, 'off' 模式在用户提示词末尾附上单块输出示例 (前缀复用模式的示例已在系统消息中);
+        多块打包请求自带示例, 传 False。n_chunks 为请求包含的块数, 流式解析的上限按它放大。
+        """
+        full_prompt = self._full_user_prompt(user_prompt) if with_example else user_prompt
+        stream_chunks = n_chunks if self.stream_json else 0
+        with telemetry.scope(prefix_reuse=self.prefix_reuse):
+            if self.prefix_reuse != 'off':
+                return self._call_with_prefix(user_prompt, temperature=0.1, json_mode=True,
+                                              fallback_prompt=full_prompt, stream_chunks=stream_chunks)
+            return self._call_ollama(full_prompt, self.JOINT_SYSTEM_PROMPT, temperature=0.1, json_mode=True,
+                                     stream_chunks=stream_chunks)
+    
+    def _stream_json(self, open_stream: Callable[[Callable[[Dict], None]], Iterator[str]],
+                     n_chunks: int = 1) -> Tuple[Optional[str], Dict]:
+        """
+        流式接收联合抽取响应并增量解析, 返回 (JSON 文本, 最后一条 done 记录)
+        
+        open_stream(on_done) 返回文本片段迭代器。解析器判定输出失控 (结构错误、条目数或长度超限、
+        重复循环) 或总耗时超过 timeout 时关闭流, Ollama 随即停止生成; 中止、截断或中途断开的响应
+        只用已完整输出的对象重建 JSON。没有任何可用内容时返回 (None, {})。
+        """
+        caps = self.stream_caps
+        parser = StreamingJSONParser(
+            max_items={'concepts': caps['max_concepts'] * n_chunks,
+                       'relationships': caps['max_relationships'] * n_chunks},
+            max_chars=caps['max_chars'] * n_chunks, max_repeats=caps['max_repeats']
+        )
+        final: Dict = {}
+        started = time.perf_counter()
+        trailing = 0
+        stream = open_stream(final.update)
+        stop_reason = None
+        try:
+            for piece in stream:
+                parser.feed(piece)
+                if parser.abort_reason:
+                    stop_reason = parser.abort_reason
+                    break
+                if parser.complete:
+                    # JSON 已完整: 继续读到 done 记录 (token 统计、连接复用), 但不等待大段多余输出
+                    trailing += len(piece)
+                    if trailing > 200:
+                        stop_reason = 'trailing_output'
+                        break
+                elif time.perf_counter() - started > self.timeout:
+                    parser.abort('timeout')
+                    stop_reason = 'timeout'
+                    break
+        except OllamaError as e:
+            if not parser.items:
+                raise
+            parser.abort('stream_error')
+            logger.warning(f"Stream interrupted after {len(parser.text)} chars: {e}")
+        finally:
+            # 提前中止时由客户端按 reason 计入 llm.stream.aborted
+            if stop_reason:
+                abort_stream(stream, stop_reason)
+            else:
+                stream.close()
+        
+        if parser.complete:
+            text = parser.json_text()
+            try:
+                json.loads(text)
+                return text, final
+            except json.JSONDecodeError:
+                parser.abort('invalid_json')
+        
+        # 中止或截断: 只保留已完整输出的对象
+        reason = parser.abort_reason or 'truncated'
+        data = parser.salvage()
+        salvaged = sum(parser.counts.values()) if data else 0
+        metrics.observe('llm.stream.incomplete_chars', len(parser.text), buckets=_CHAR_BUCKETS)
+        logger.warning(f"Extraction stream stopped ({reason}) after {len(parser.text)} chars, "
+                       f"{time.perf_counter() - started:.1f}s; salvaged {salvaged} complete objects")
+        if not data:
+            return None, final
+        metrics.incr('llm.stream.salvaged', reason=reason)
+        return json.dumps(data, ensure_ascii=False), final
+    
+    def _record_prefix_saving(self, result: Dict, user_prompt: str):
+        """
+        估算本次请求因前缀复用少计算的 prompt token 数与节省的 prompt eval 时间
+        
+        Ollama 的 prompt_eval_count 只统计实际计算的 token; 不复用时应为 前缀 + 用户消息,
+        两者之差 (不超过前缀长度) 即被缓存跳过的 token, 按探测时测得的冷启动单价折算为秒。
+        用户消息的 token 数按探测得到的字符/token 比例估算。
+        """
+        eval_count = result.get('prompt_eval_count')
+        if eval_count is None or not self._prefix_chars_per_token:
+            return
+        expected = self._prefix_tokens + len(user_prompt) / self._prefix_chars_per_token
+        reused = int(min(self._prefix_tokens, max(0.0, expected - eval_count)))
+        saved = reused * self._prompt_eval_s_per_token
+        with self._prefix_lock:
+            self._prefix_stats['calls'] += 1
+            self._prefix_stats['reused_tokens'] += reused
+            self._prefix_stats['saved_s'] += saved
+        metrics.incr('llm.prefix_tokens_reused', reused, mode=self.prefix_reuse)
+        metrics.observe('llm.prompt_eval_saved_s', saved, mode=self.prefix_reuse)
+    
+    def prefix_reuse_summary(self) -> Dict:
+        """前缀复用的累计效果: 调用数、复用 token 数、估算节省的 prompt eval 时间 (总计与每块平均)"""
+        with self._prefix_lock:
+            stats = dict(self._prefix_stats)
+        calls = stats['calls']
+        return {
+            'mode': self.prefix_reuse,
+            'prefix_tokens': self._prefix_tokens,
+            'calls': calls,
+            'reused_tokens': stats['reused_tokens'],
+            'saved_s': round(stats['saved_s'], 3),
+            'saved_s_per_chunk': round(stats['saved_s'] / calls, 4) if calls else 0.0,
+        }
     
     def extract_concepts(self, text: str, chunk_id: str = "") -> Optional[List[Dict]]:
         """从文本块中提取领域概念(使用严格的 JSON Schema)
@@ -207,7 +571,8 @@ class ConceptExtractor:
   {{"entity": "马尾松", "importance": 4, "category": "host"}}
 ]"""
         
-        response = self._call_ollama(user_prompt, system_prompt, temperature=0.1, json_mode=True)
+        with telemetry.scope(chunk_id=chunk_id):
+            response = self._call_ollama(user_prompt, system_prompt, temperature=0.1, json_mode=True)
         
         if not response:
             return None
@@ -216,6 +581,7 @@ class ConceptExtractor:
             # 直接解析JSON（Qwen模型开启json_mode后输出必定是合法JSON）
             # 不需要清理markdown代码块（```json...```）
             concepts = json.loads(response)
+            telemetry.mark_json(True)
             
             # 验证和标准化每个概念
             valid_concepts = []
@@ -241,6 +607,7 @@ class ConceptExtractor:
             
             return valid_concepts if valid_concepts else None
         except json.JSONDecodeError as e:
+            telemetry.mark_json(False)
             logger.error(f"JSON 解析失败 [{chunk_id}] - Qwen 可能未正确输出 JSON")
             logger.error(f"错误: {str(e)}")
             logger.error(f"原始响应（前500字符）:\n{response[:500]}")
@@ -330,7 +697,8 @@ class ConceptExtractor:
   {{"node_1": "阿维菌素", "node_2": "松褐天牛", "edge": "防治"}}
 ]"""
         
-        response = self._call_ollama(user_prompt, system_prompt, temperature=0.1, json_mode=True)
+        with telemetry.scope(chunk_id=chunk_id):
+            response = self._call_ollama(user_prompt, system_prompt, temperature=0.1, json_mode=True)
         
         if not response:
             return None
@@ -338,6 +706,7 @@ class ConceptExtractor:
         try:
             # 直接解析 JSON
             relationships = json.loads(response)
+            telemetry.mark_json(True)
             
             valid_relationships = []
             for rel in relationships:
@@ -353,6 +722,7 @@ class ConceptExtractor:
             
             return valid_relationships if valid_relationships else None
         except json.JSONDecodeError as e:
+            telemetry.mark_json(False)
             logger.warning(f"关系 JSON 解析失败 [{chunk_id}]: {str(e)}")
             return None
     
@@ -364,6 +734,9 @@ class ConceptExtractor:
         一次性返回 concepts 与 relationships, 可以减少网络往返并提高整体一致性,
         也是上层 extract_from_chunks 默认使用的路径。
 
+        prefix_reuse 不为 'off' 时, 固定的规则与输出示例全部放在系统消息中, 用户消息只包含文本块,
+        各块请求共享同一前缀, 由 _call_with_prefix 发送。
+
         参数:
             text: 待处理的文本块;
             chunk_id: 文本块唯一标识符;
@@ -374,62 +747,11 @@ class ConceptExtractor:
             - concepts_list: 概念字典列表, 结构与 extract_concepts 返回值一致, 无结果时为 None;
             - relationships_list: 关系字典列表, 结构与 extract_relationships 返回值一致, 无结果时为 None。
         """
-        system_prompt = """你是专业的松材线虫病知识图谱构建系统。你的任务是从科学文献中同时提取概念和关系。
-
-## 输出要求
-严格按照以下 JSON Schema 输出，不得添加任何解释或 markdown：
-
-{
-  "concepts": [
-    {"entity": "概念名称", "importance": 1-5整数, "category": "类别"}
-  ],
-  "relationships": [
-    {"node_1": "源实体", "node_2": "目标实体", "edge": "关系类型"}
-  ]
-}
-
-## 概念提取范围
-**病原** (pathogen): 松材线虫、Bursaphelenchus xylophilus、伴生细菌
-**寄主** (host): 马尾松、黑松、湿地松、赤松、云南松
-**媒介** (vector): 松褐天牛、云杉花墨天牛、Monochamus alternatus
-**症状** (symptom): 萎蔫、针叶变色、树脂分泌异常、枯死
-**防治** (treatment): 阿维菌素、噻虫啉、诱捕器、生物防治
-**环境** (environment): 温度、湿度、降水、海拔
-**地点** (location): 疫区、省份、分布区
-**机制** (mechanism): 侵染途径、致病机理
-**化合物** (compound): 萜烯、酚类、杀虫剂成分
-
-## 关系类型
-**因果**: 引起、导致、诱发
-**传播**: 传播、携带、扩散
-**寄生**: 感染、寄生于、侵染
-**防治**: 防治、控制、抑制、杀灭
-**影响**: 影响、促进、抑制
-**分布**: 分布于、发生于
-
-## 重要性评分
-5-核心概念, 4-重要概念, 3-一般概念, 2-次要概念, 1-边缘概念
-
-只输出 JSON 对象！"""
-        
         user_prompt = f"""从以下松材线虫病科学文本中提取概念和关系：
 
-{text}{context_hint}
-
-输出格式示例：
-{{
-  "concepts": [
-    {{"entity": "松材线虫", "importance": 5, "category": "pathogen"}},
-    {{"entity": "松褐天牛", "importance": 5, "category": "vector"}},
-    {{"entity": "马尾松", "importance": 4, "category": "host"}}
-  ],
-  "relationships": [
-    {{"node_1": "松材线虫", "node_2": "马尾松", "edge": "感染"}},
-    {{"node_1": "松褐天牛", "node_2": "松材线虫", "edge": "传播"}}
-  ]
-}}"""
-        
-        response = self._call_ollama(user_prompt, system_prompt, temperature=0.1, json_mode=True)
+{text}{context_hint}"""
+        with telemetry.scope(chunk_id=chunk_id):
+            response = self._joint_call(user_prompt)
         
         if not response:
             return None, None
@@ -437,48 +759,200 @@ class ConceptExtractor:
         try:
             # 直接解析 JSON
             data = json.loads(response)
-            
-            # 解析概念
-            concepts = []
-            for c in data.get('concepts', []):
-                if isinstance(c, dict) and 'entity' in c:
-                    importance_val = c.get('importance', 3)
-                    if importance_val is None:
-                        importance_val = 3
-                    try:
-                        importance = min(5, max(1, int(importance_val)))
-                    except (ValueError, TypeError):
-                        importance = 3
-                    
-                    concepts.append({
-                        'entity': str(c.get('entity', '')).lower().strip(),
-                        'importance': importance,
-                        'category': str(c.get('category', 'misc')).lower(),
-                        'chunk_id': chunk_id,
-                        'type': 'concept'
-                    })
-            
-            # 解析关系
-            relationships = []
-            for r in data.get('relationships', []):
-                if isinstance(r, dict) and 'node_1' in r and 'node_2' in r:
-                    relationships.append({
-                        'node_1': str(r.get('node_1', '')).lower().strip(),
-                        'node_2': str(r.get('node_2', '')).lower().strip(),
-                        'edge': str(r.get('edge', 'related to')).strip(),
-                        'weight': 0.8,
-                        'chunk_id': chunk_id,
-                        'source': 'llm'
-                    })
-            
-            return (concepts if concepts else None, 
-                    relationships if relationships else None)
+            telemetry.mark_json(True)
+            return self._parse_joint_result(data, chunk_id)
         except json.JSONDecodeError as e:
+            telemetry.mark_json(False)
             logger.error(f"JSON 解析失败 [{chunk_id}] - Qwen 未正确输出 JSON")
             logger.error(f"错误: {str(e)}")
             logger.error(f"原始响应（前500字符）:\n{response[:500]}")
             return None, None
     
+    @staticmethod
+    def _parse_joint_result(data: Dict, chunk_id: str) -> Tuple[Optional[List[Dict]], Optional[List[Dict]]]:
+        """把单个文本块的 {"concepts": [...], "relationships": [...]} 规范化为概念/关系字典列表"""
+        # 解析概念
+        concepts = []
+        for c in data.get('concepts', []):
+            if isinstance(c, dict) and 'entity' in c:
+                importance_val = c.get('importance', 3)
+                if importance_val is None:
+                    importance_val = 3
+                try:
+                    importance = min(5, max(1, int(importance_val)))
+                except (ValueError, TypeError):
+                    importance = 3
+                
+                concepts.append({
+                    'entity': str(c.get('entity', '')).lower().strip(),
+                    'importance': importance,
+                    'category': str(c.get('category', 'misc')).lower(),
+                    'chunk_id': chunk_id,
+                    'type': 'concept'
+                })
+        
+        # 解析关系
+        relationships = []
+        for r in data.get('relationships', []):
+            if isinstance(r, dict) and 'node_1' in r and 'node_2' in r:
+                relationships.append({
+                    'node_1': str(r.get('node_1', '')).lower().strip(),
+                    'node_2': str(r.get('node_2', '')).lower().strip(),
+                    'edge': str(r.get('edge', 'related to')).strip(),
+                    'weight': 0.8,
+                    'chunk_id': chunk_id,
+                    'source': 'llm'
+                })
+        
+        return (concepts if concepts else None, 
+                relationships if relationships else None)
+    
+    def pack_chunks(self, chunks: List[Dict]) -> List[List[Dict]]:
+        """
+        把相邻的短块分组, 每组合并为一次 LLM 请求
+        
+        长度不低于 pack_short_chars 的块单独成组; 短块依次累积, 直到总字符数超过 pack_max_chars
+        或块数达到 pack_max_chunks。保持原有顺序, 以便滑动窗口上下文与断点续传按块推进。
+        pack_max_chars 为 0 时每块单独成组。
+        """
+        if self.pack_max_chars <= 0 or self.pack_max_chunks <= 1:
+            return [[chunk] for chunk in chunks]
+        
+        groups: List[List[Dict]] = []
+        current: List[Dict] = []
+        current_chars = 0
+        for chunk in chunks:
+            length = len(chunk.get('text', ''))
+            if length >= self.pack_short_chars:
+                if current:
+                    groups.append(current)
+                    current, current_chars = [], 0
+                groups.append([chunk])
+                continue
+            if current and (current_chars + length > self.pack_max_chars
+                            or len(current) >= self.pack_max_chunks):
+                groups.append(current)
+                current, current_chars = [], 0
+            current.append(chunk)
+            current_chars += length
+        if current:
+            groups.append(current)
+        return groups
+    
+    def extract_packed(self, chunks: List[Dict], context_hint: str = ""
+                       ) -> Dict[str, Tuple[Optional[List[Dict]], Optional[List[Dict]]]]:
+        """
+        用一次 LLM 请求抽取一组短块, 返回 {chunk_id: (concepts, relationships)}
+        
+        每个块在提示词中以 "### [C1]" 形式的编号分隔, 要求模型输出以编号为键的 JSON 对象;
+        响应按编号拆回各块并校验结构。整体解析失败时全部块、缺失或结构不对的块单独
+        回退到 extract_concepts_and_relationships 重新请求。只有一个块时直接走单块路径。
+        """
+        if len(chunks) == 1:
+            chunk = chunks[0]
+            return {chunk.get('chunk_id', ''): self.extract_concepts_and_relationships(
+                chunk.get('text', ''), chunk.get('chunk_id', ''), context_hint=context_hint
+            )}
+        
+        aliases = {f"C{i}": chunk for i, chunk in enumerate(chunks, 1)}
+        sections = "\n\n".join(f"### [{alias}]\n{chunk.get('text', '')}" for alias, chunk in aliases.items())
+        user_prompt = f"""以下包含 {len(chunks)} 个相互独立的松材线虫病科学文本块, 以 ### [C1] 形式的编号分隔。
+请对每个块分别提取概念和关系, 输出一个 JSON 对象: 键为块编号 ({', '.join(aliases)}),
+值为该块的 {{"concepts": [...], "relationships": [...]}}。每个编号都必须出现, 没有内容时给出空列表,
+不得把不同块的实体和关系混在一起。
+
+{sections}{context_hint}
+
+输出格式示例：
+{self.BATCH_OUTPUT_EXAMPLE}"""
+        
+        chunk_ids = [chunk.get('chunk_id', '') for chunk in chunks]
+        with telemetry.scope(chunk_id=",".join(chunk_ids), packed=len(chunks)):
+            response = self._joint_call(user_prompt, with_example=False, n_chunks=len(chunks))
+        metrics.incr('llm.packed_requests')
+        metrics.incr('llm.packed_chunks', len(chunks))
+        
+        results: Dict[str, Tuple[Optional[List[Dict]], Optional[List[Dict]]]] = {}
+        data = None
+        if response:
+            try:
+                data = json.loads(response)
+                telemetry.mark_json(True)
+            except json.JSONDecodeError as e:
+                telemetry.mark_json(False)
+                logger.warning(f"打包请求 JSON 解析失败 [{', '.join(chunk_ids)}]: {e}, 回退为逐块请求")
+        
+        if isinstance(data, dict):
+            # 编号容错: 接受 "C1" / "[C1]" / "c1"
+            keyed = {str(key).strip().strip('[]').strip().upper(): value for key, value in data.items()}
+            for alias, chunk in aliases.items():
+                value = keyed.get(alias)
+                if isinstance(value, dict) and isinstance(value.get('concepts', []), list) \
+                        and isinstance(value.get('relationships', []), list):
+                    results[chunk.get('chunk_id', '')] = self._parse_joint_result(value, chunk.get('chunk_id', ''))
+        
+        missing = [chunk for chunk in chunks if chunk.get('chunk_id', '') not in results]
+        if missing:
+            metrics.incr('llm.pack_fallbacks', len(missing))
+            if data is not None:
+                logger.warning(f"打包响应缺少 {len(missing)}/{len(chunks)} 个块, 回退为逐块请求")
+            for chunk in missing:
+                results[chunk.get('chunk_id', '')] = self.extract_concepts_and_relationships(
+                    chunk.get('text', ''), chunk.get('chunk_id', ''), context_hint=context_hint
+                )
+        return results
+    
+    def extract_groups(self, groups: List[List[Dict]], context_hint_fn: Optional[Callable[[], str]] = None
+                       ) -> Iterator[Tuple[List[Dict], Optional[Dict]]]:
+        """
+        按原顺序逐组产出 (group, {chunk_id: (concepts, relationships)})
+        
+        max_workers > 1 时同时保持最多 max_workers 个请求在途 (多主机时由路由器分发到各主机),
+        任一请求完成即补充下一组; 结果仍按组的原顺序产出, 调用方可以照常按块推进
+        滑动窗口上下文与 checkpoint。context_hint_fn 在提交每组时调用, 返回该组的上下文提示,
+        因此并发时新提交的组使用的是截至当时已产出结果的上下文。
+        
+        启用级联 (cascade) 时, 组内每个块的结果在同一工作线程中评分并按需升级后再产出。
+        
+        某组抽取抛出异常时记录日志并产出 (group, None)。
+        """
+        def run(group: List[Dict], hint: str) -> Optional[Dict]:
+            try:
+                results = self.extract_packed(group, context_hint=hint)
+                if self.cascade is not None:
+                    for chunk in group:
+                        chunk_id = chunk.get('chunk_id', '')
+                        results[chunk_id] = self.cascade.review(
+                            chunk, results.get(chunk_id, (None, None)), context_hint=hint
+                        )
+                return results
+            except Exception as e:
+                logger.error(f"Failed to process chunks {[c.get('chunk_id', '') for c in group]}: {e}")
+                return None
+        
+        def hint() -> str:
+            return context_hint_fn() if context_hint_fn else ""
+        
+        if self.max_workers <= 1:
+            for group in groups:
+                yield group, run(group, hint())
+            return
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending: Dict[int, Future] = {}
+            finished: Dict[int, Future] = {}
+            next_submit = next_yield = 0
+            while next_yield < len(groups):
+                while next_submit < len(groups) and len(pending) < self.max_workers:
+                    pending[next_submit] = pool.submit(run, groups[next_submit], hint())
+                    next_submit += 1
+                wait(list(pending.values()), return_when=FIRST_COMPLETED)
+                for index in [i for i, future in pending.items() if future.done()]:
+                    finished[index] = pending.pop(index)
+                while next_yield in finished:
+                    yield groups[next_yield], finished.pop(next_yield).result()
+                    next_yield += 1
+    
     def extract_from_chunks(self, chunks: List[Dict], max_chunks: int = None, 
                            use_context_window: bool = True, 
                            context_window_size: int = 5) -> Tuple[pd.DataFrame, pd.DataFrame]:
@@ -499,6 +973,9 @@ class ConceptExtractor:
         - 在处理 Chunk N 时，将 Chunk N-1 中提取的高重要性实体作为上下文提示
         - 帮助 LLM 识别跨块的实体指代（如代词、简称等）
         - 提高实体抽取的一致性和准确性
+        
+        短块打包 (pack_max_chars > 0):
+        - 相邻短块按 pack_chunks 分组, 每组一次请求, 同组的块共用组开始时的上下文提示
         """
         import gc  # 导入垃圾回收模块
         import time  # 导入时间模块用于添加延迟
@@ -527,67 +1004,84 @@ class ConceptExtractor:
         successful_chunks = 0
         failed_chunks = 0
         
-        for i, chunk in enumerate(tqdm(chunks, desc="Processing chunks"), 1):
-            text = chunk.get('text', '')
-            chunk_id = chunk.get('chunk_id', '')
-            
-            if not text or len(text.strip()) < 20:
-                continue
-            
-            logger.debug(f"[{i}/{len(chunks)}] Processing chunk: {chunk_id}")
-            
+        # 短块打包为一次请求 (pack_max_chars > 0 时); 同组的块共用组开始时的上下文提示
+        valid_chunks = [c for c in chunks if c.get('text') and len(c['text'].strip()) >= 20]
+        groups = self.pack_chunks(valid_chunks)
+        if len(groups) < len(valid_chunks):
+            logger.info(f"Packing: {len(valid_chunks)} chunks -> {len(groups)} requests")
+        
+        def context_hint() -> str:
             # 构建上下文提示（如果启用滑动窗口）
-            context_hint = ""
             if use_context_window and context_entities:
-                context_hint = f"\n\n**前文提到的核心实体**: {', '.join(context_entities[:context_window_size])}\n请注意保持实体名称的一致性。"
-            
-            # Extract both concepts and relationships in ONE call
-            concepts, relationships = self.extract_concepts_and_relationships(
-                text, chunk_id, context_hint=context_hint
-            )
-            
-            if concepts:
-                all_concepts.extend(concepts)
-                logger.debug(f"Extracted {len(concepts)} concepts")
+                return f"\n\n**前文提到的核心实体**: {', '.join(context_entities[:context_window_size])}\n请注意保持实体名称的一致性。"
+            return ""
+        
+        i = 0
+        # Extract both concepts and relationships in ONE call per group (max_workers 个请求并发在途)
+        for group, group_results in tqdm(self.extract_groups(groups, context_hint), total=len(groups),
+                                         desc="Processing chunks"):
+            group_results = group_results or {}
+            for chunk in group:
+                i += 1
+                chunk_id = chunk.get('chunk_id', '')
+                logger.debug(f"[{i}/{len(valid_chunks)}] Processed chunk: {chunk_id}")
+                concepts, relationships = group_results.get(chunk_id, (None, None))
                 
-                # 更新滑动窗口上下文：保留高重要性实体
-                if use_context_window:
-                    chunk_core_entities = [
-                        c['entity'] for c in concepts 
-                        if c.get('importance', 0) >= 4  # 只保留重要性 >= 4 的实体
-                    ][:context_window_size]
-                    
-                    # 合并到上下文列表，去重并保持顺序
-                    for entity in chunk_core_entities:
-                        if entity not in context_entities:
-                            context_entities.insert(0, entity)
-                    
-                    # 限制上下文窗口大小
-                    context_entities = context_entities[:context_window_size]
+                if concepts:
+                    all_concepts.extend(concepts)
+                    logger.debug(f"Extracted {len(concepts)} concepts")
                     
-                    if chunk_core_entities:
-                        logger.debug(f"Context updated: {context_entities}")
-            else:
-                logger.debug("No concepts extracted")
-                # 单块失败只计数并跳过,让管道尽量在其余块上继续跑完
-                failed_chunks += 1
-                continue
-            
-            if relationships:
-                all_relationships.extend(relationships)
-                logger.debug(f"Extracted {len(relationships)} relationships")
-            
-            successful_chunks += 1
+                    # 更新滑动窗口上下文：保留高重要性实体
+                    if use_context_window:
+                        chunk_core_entities = [
+                            c['entity'] for c in concepts 
+                            if c.get('importance', 0) >= 4  # 只保留重要性 >= 4 的实体
+                        ][:context_window_size]
+                        
+                        # 合并到上下文列表，去重并保持顺序
+                        for entity in chunk_core_entities:
+                            if entity not in context_entities:
+                                context_entities.insert(0, entity)
+                        
+                        # 限制上下文窗口大小
+                        context_entities = context_entities[:context_window_size]
+                        
+                        if chunk_core_entities:
+                            logger.debug(f"Context updated: {context_entities}")
+                else:
+                    logger.debug("No concepts extracted")
+                    # 单块失败只计数并跳过,让管道尽量在其余块上继续跑完
+                    failed_chunks += 1
+                    continue
+                
+                if relationships:
+                    all_relationships.extend(relationships)
+                    logger.debug(f"Extracted {len(relationships)} relationships")
+                
+                successful_chunks += 1
             
-            # 添加延迟避免Ollama过载（内存不足时尤其重要）
-            time.sleep(0.5)
+            # 添加延迟避免Ollama过载（内存不足时尤其重要）; 并发时由在途请求数限流
+            if self.max_workers <= 1:
+                time.sleep(0.5)
             
             # 每10个chunk执行一次垃圾回收，防止内存累积
-            if i % 10 == 0:
+            if i % 10 < len(group):
                 gc.collect()
                 logger.debug(f"[Memory] Garbage collection executed at chunk {i}")
         
         logger.info(f"Extraction complete: {successful_chunks} successful, {failed_chunks} failed")
+        if self.prefix_reuse != 'off':
+            summary = self.prefix_reuse_summary()
+            logger.info(
+                f"Prefix reuse ({summary['mode']}): {summary['reused_tokens']} prompt tokens reused, "
+                f"~{summary['saved_s']:.1f}s prompt eval saved ({summary['saved_s_per_chunk']:.2f}s/chunk)"
+            )
+        if self.cascade is not None:
+            summary = self.cascade.summary()
+            logger.info(
+                f"Model cascade: {summary['escalated']}/{summary['chunks']} chunks escalated to "
+                f"{summary['target']}, {summary['improved']} improved"
+            )
         logger.info(f"Total concepts: {len(all_concepts)}")
         logger.info(f"Total relationships: {len(all_relationships)}")
         
@@ -6,6 +6,40 @@
 import pandas as pd
 from pathlib import Path
 
+
+def convert_to_triples(concepts_df: pd.DataFrame, relationships_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    概念表 + 关系表 -> 三元组表
+
+    同名 (不区分大小写) 概念取第一次出现的记录; 端点不在概念表中的关系被丢弃。
+    概念按小写名称预先建立字典, 每条关系 O(1) 查找, 避免逐条扫描整个概念表。
+    """
+    concept_by_name = {}
+    for concept in concepts_df.to_dict('records'):
+        concept_by_name.setdefault(str(concept['entity']).lower(), concept)
+    
+    triples = []
+    has_weight = 'weight' in relationships_df.columns
+    
+    for rel in relationships_df.to_dict('records'):
+        concept1 = concept_by_name.get(str(rel['node_1']).lower())
+        concept2 = concept_by_name.get(str(rel['node_2']).lower())
+        if concept1 is None or concept2 is None:
+            continue
+        
+        triples.append({
+            'node_1': concept1['entity'],
+            'node_1_type': concept1.get('category', 'other'),
+            'relationship': rel['edge'],
+            'node_2': concept2['entity'],
+            'node_2_type': concept2.get('category', 'other'),
+            # 获取权重（如果有的话）
+            'weight': rel['weight'] if has_weight else 0.8
+        })
+    
+    return pd.DataFrame(triples)
+
+
 def main():
     print("="*60)
     print("转换为三元组格式")
@@ -19,39 +53,9 @@ def main():
     print(f"  - 概念: {len(concepts_df)}")
     print(f"  - 关系: {len(relationships_df)}")
     
-    # 创建实体ID映射
-    entity_to_id = {
-        row['entity'].lower(): f"E{i+1:04d}" 
-        for i, row in concepts_df.iterrows()
-    }
-    
-    # 转换为三元组格式
-    triples = []
-    
-    for _, rel in relationships_df.iterrows():
-        node1 = rel['node_1'].lower()
-        node2 = rel['node_2'].lower()
-        edge = rel['edge']
-        
-        if node1 in entity_to_id and node2 in entity_to_id:
-            # 获取概念信息
-            concept1 = concepts_df[concepts_df['entity'].str.lower() == node1].iloc[0]
-            concept2 = concepts_df[concepts_df['entity'].str.lower() == node2].iloc[0]
-            
-            # 获取权重（如果有的话）
-            weight = rel.get('weight', 0.8)
-            
-            triples.append({
-                'node_1': concept1['entity'],
-                'node_1_type': concept1.get('category', 'other'),
-                'relationship': edge,
-                'node_2': concept2['entity'],
-                'node_2_type': concept2.get('category', 'other'),
-                'weight': weight
-            })
+    triples_df = convert_to_triples(concepts_df, relationships_df)
     
     # 保存三元组
-    triples_df = pd.DataFrame(triples)
     output_file = "output/triples_export.csv"
     triples_df.to_csv(output_file, index=False, encoding='utf-8-sig')
     
@@ -12,6 +12,8 @@ from datetime import datetime
 
 from pdf_extractor import PDFExtractor
 from concept_extractor import ConceptExtractor, ContextualProximityAnalyzer
+from extraction_cascade import build_cascade
+from text_chunker import StructureAwareChunker
 from concept_deduplicator import (
     ConceptDeduplicator, 
     RelationshipDeduplicator,
@@ -23,6 +25,8 @@ from concept_deduplicator import (
 # from neo4j_generator import Neo4jGenerator  # 未使用,已注释
 from config_loader import load_config
 from logger_config import get_logger
+from llm_telemetry import telemetry
+from ollama_client import configure_defaults
 
 logger = get_logger('EnhancedPipeline')
 
@@ -59,12 +63,47 @@ class EnhancedKnowledgeGraphPipeline:
         self.config = config
         self.output_dir = config.get('output.base_directory', './output')
         self.ollama_model = config.get('llm.model', 'mistral')
-        self.ollama_host = config.get('llm.ollama_host', 'http://localhost:11434')
+        # 配置了 llm.ollama_hosts (多台主机) 时在各主机间负载均衡, 否则使用单个 ollama_host
+        self.ollama_host = config.get('llm.ollama_hosts') or config.get('llm.ollama_host', 'http://localhost:11434')
         self.similarity_threshold = config.get('deduplication.similarity_threshold', 0.85)
         self.min_concept_importance = config.get('filtering.min_importance', 2)
         self.min_connections = config.get('filtering.min_connections', 1)
         self.max_chunks = config.get('llm.max_chunks', 100)  # Limit chunks for faster processing
         self.llm_timeout = config.get('llm.timeout', 600)
+        self.prefix_reuse = config.get('llm.prefix_reuse', 'off')
+        # 短块打包: max_chars 为 0 (或未启用) 时每块一次请求
+        self.pack_max_chars = config.get('llm.chunk_packing.max_chars', 0) \
+            if config.get('llm.chunk_packing.enabled', False) else 0
+        self.pack_max_chunks = config.get('llm.chunk_packing.max_chunks', 3)
+        self.pack_short_chars = config.get('llm.chunk_packing.short_chunk_chars', 600)
+        self.llm_workers = config.get('llm.max_workers')  # 为空时取各主机并发上限之和
+        # 流式增量解析: 输出失控时提前中止生成
+        self.stream_json = config.get('llm.stream_parsing.enabled', False)
+        self.stream_caps = {key: config.get(f'llm.stream_parsing.{key}', default)
+                            for key, default in ConceptExtractor.DEFAULT_STREAM_CAPS.items()}
+        # 结构感知分块: 按章节与句子边界在 token 预算内装箱, chunk_id 按文档内序号生成
+        self.chunker = StructureAwareChunker(
+            max_tokens=config.get('chunking.max_tokens', 1024),
+            overlap_sentences=config.get('chunking.overlap_sentences', 1),
+            section_break_ratio=config.get('chunking.section_break_ratio', 0.5),
+            min_chars=config.get('chunking.min_chars', 50),
+            tokenizer=config.get('chunking.tokenizer'),
+            reference_keywords=config.get('pdf.reference_keywords')
+        )
+        
+        # 逐次 LLM 调用日志 (token 数、耗时、模型加载、JSON 解析结果), 汇总见 `python llm_telemetry.py summary`
+        telemetry.configure(
+            log_path=config.get('instrumentation.llm_log', './output/metrics/llm_calls.jsonl'),
+            enabled=config.get('instrumentation.enabled', True)
+        )
+        
+        # 所有 Ollama 调用共用按服务地址划分的客户端 (连接池、keep_alive、重试退避与熔断)
+        configure_defaults(
+            timeout=self.llm_timeout,
+            keep_alive=config.get('llm.keep_alive', '30m'),
+            failure_threshold=config.get('llm.circuit_failure_threshold', 5),
+            reset_timeout=config.get('llm.circuit_reset_timeout', 30)
+        )
         
         # Initialize components
         self.concept_extractor = None
@@ -77,10 +116,20 @@ class EnhancedKnowledgeGraphPipeline:
         """Initialize LLM and embedding components"""
         try:
             logger.info("Initializing concept extractor...")
+            # llm.cascade.enabled 时 llm.model 作为小模型, 低质量块升级到 llm.cascade.large_model
+            cascade = build_cascade(self.config, self.ollama_host, self.llm_timeout, self.prefix_reuse)
             self.concept_extractor = ConceptExtractor(
                 model=self.ollama_model,
                 ollama_host=self.ollama_host,
-                timeout=self.llm_timeout
+                timeout=self.llm_timeout,
+                prefix_reuse=self.prefix_reuse,
+                pack_max_chars=self.pack_max_chars,
+                pack_max_chunks=self.pack_max_chunks,
+                pack_short_chars=self.pack_short_chars,
+                max_workers=self.llm_workers,
+                cascade=cascade,
+                stream_json=self.stream_json,
+                stream_caps=self.stream_caps
             )
             logger.info(f"Concept extractor initialized (timeout: {self.llm_timeout}s)")
         except Exception as e:
@@ -191,37 +240,18 @@ class EnhancedKnowledgeGraphPipeline:
         )
         return extractor.extract_from_directory(pdf_dir)
     
-    def _create_chunks(self, pdf_texts: Dict[str, str], chunk_size: int = 3000, 
-                      overlap: int = 300) -> List[Dict]:
+    def _create_chunks(self, pdf_texts: Dict[str, str]) -> List[Dict]:
         """
-        Split texts into chunks
+        Split texts into chunks along section and sentence boundaries
+        (see StructureAwareChunker; chunk ids are numbered per document)
         
         Args:
             pdf_texts: Dictionary of PDF texts
-            chunk_size: Size of each chunk
-            overlap: Overlap between chunks
         
         Returns:
             List of chunk dictionaries
         """
-        chunks = []
-        chunk_id_counter = 0
-        
-        for pdf_name, text in pdf_texts.items():
-            # Split text into chunks with overlap
-            for i in range(0, len(text), chunk_size - overlap):
-                chunk_text = text[i:i + chunk_size]
-                
-                if len(chunk_text.strip()) > 50:  # Skip very small chunks
-                    chunks.append({
-                        'text': chunk_text,
-                        'chunk_id': f"{pdf_name}_{chunk_id_counter}",
-                        'source_pdf': pdf_name,
-                        'concepts': []
-                    })
-                    chunk_id_counter += 1
-        
-        return chunks
+        return self.chunker.chunk_documents(pdf_texts)
     
     def _extract_proximity_relationships(self, chunks: List[Dict], 
                                         concepts_df: pd.DataFrame) -> pd.DataFrame:
@@ -12,7 +12,7 @@
 1) `run_safe_pipeline` / `__main__` 作为统一入口, 读取配置与命令行参数;
 2) `EnhancedKnowledgeGraphPipelineSafe.run` 依次执行 6 个步骤:
    - Step1: `_extract_pdf_texts` → 调用 `PDFExtractor` 完成 PDF 文本提取与清洗;
-   - Step2: `_create_chunks` → 按固定窗口+重叠切分文本, 生成带 `chunk_id` 的块列表;
+   - Step2: `_create_chunks` → 按章节与句子边界在 token 预算内切分文本, 生成带 `chunk_id` 的块列表;
    - Step3: `_extract_with_checkpoints` → 对每个块调用 LLM 抽取 concepts/relationships, 同时增量保存;
    - Step4: `_extract_proximity_relationships` → 基于共现生成 W2 近邻关系;
    - Step5: `_merge_and_deduplicate` → 合并 W1/W2 关系, 对概念做语义去重并更新关系端点;
@@ -30,6 +30,8 @@ from tqdm import tqdm
 
 from pdf_extractor import PDFExtractor
 from concept_extractor import ConceptExtractor, ContextualProximityAnalyzer
+from extraction_cascade import build_cascade
+from text_chunker import StructureAwareChunker
 from concept_deduplicator import (
     ConceptDeduplicator,
     RelationshipDeduplicator,
@@ -40,6 +42,9 @@ from concept_deduplicator import (
 from config_loader import load_config
 from logger_config import get_logger
 from checkpoint_manager import CheckpointManager
+from instrumentation import metrics
+from llm_telemetry import telemetry
+from ollama_client import configure_defaults
 
 # 多模态支持：图片提取和描述
 try:
@@ -84,7 +89,8 @@ class EnhancedKnowledgeGraphPipelineSafe:
         self.output_dir = config.get('output.base_directory', './output')
         # LLM 相关配置：模型名称和 Ollama 服务地址
         self.ollama_model = config.get('llm.model', 'mistral')
-        self.ollama_host = config.get('llm.ollama_host', 'http://localhost:11434')
+        # 配置了 llm.ollama_hosts (多台主机) 时在各主机间负载均衡, 否则使用单个 ollama_host
+        self.ollama_host = config.get('llm.ollama_hosts') or config.get('llm.ollama_host', 'http://localhost:11434')
         # 去重与过滤相关阈值，从配置中拿，方便之后按项目需求微调
         self.similarity_threshold = config.get('deduplication.similarity_threshold', 0.85)
         self.min_concept_importance = config.get('filtering.min_importance', 2)
@@ -93,6 +99,40 @@ class EnhancedKnowledgeGraphPipelineSafe:
         self.max_chunks = config.get('llm.max_chunks', 100)
         # LLM 超时时间统一从配置读取，和概念抽取模块保持一致
         self.llm_timeout = config.get('llm.timeout', 600)
+        self.prefix_reuse = config.get('llm.prefix_reuse', 'off')
+        # 短块打包: max_chars 为 0 (或未启用) 时每块一次请求
+        self.pack_max_chars = config.get('llm.chunk_packing.max_chars', 0) \
+            if config.get('llm.chunk_packing.enabled', False) else 0
+        self.pack_max_chunks = config.get('llm.chunk_packing.max_chunks', 3)
+        self.pack_short_chars = config.get('llm.chunk_packing.short_chunk_chars', 600)
+        self.llm_workers = config.get('llm.max_workers')  # 为空时取各主机并发上限之和
+        # 流式增量解析: 输出失控时提前中止生成
+        self.stream_json = config.get('llm.stream_parsing.enabled', False)
+        self.stream_caps = {key: config.get(f'llm.stream_parsing.{key}', default)
+                            for key, default in ConceptExtractor.DEFAULT_STREAM_CAPS.items()}
+        # 结构感知分块: 按章节与句子边界在 token 预算内装箱, chunk_id 按文档内序号生成
+        self.chunker = StructureAwareChunker(
+            max_tokens=config.get('chunking.max_tokens', 1024),
+            overlap_sentences=config.get('chunking.overlap_sentences', 1),
+            section_break_ratio=config.get('chunking.section_break_ratio', 0.5),
+            min_chars=config.get('chunking.min_chars', 50),
+            tokenizer=config.get('chunking.tokenizer'),
+            reference_keywords=config.get('pdf.reference_keywords')
+        )
+        
+        # 逐次 LLM 调用日志 (token 数、耗时、模型加载、JSON 解析结果), 汇总见 `python llm_telemetry.py summary`
+        telemetry.configure(
+            log_path=config.get('instrumentation.llm_log', './output/metrics/llm_calls.jsonl'),
+            enabled=config.get('instrumentation.enabled', True)
+        )
+        
+        # 所有 Ollama 调用共用按服务地址划分的客户端 (连接池、keep_alive、重试退避与熔断)
+        configure_defaults(
+            timeout=self.llm_timeout,
+            keep_alive=config.get('llm.keep_alive', '30m'),
+            failure_threshold=config.get('llm.circuit_failure_threshold', 5),
+            reset_timeout=config.get('llm.circuit_reset_timeout', 30)
+        )
         
         # Checkpoint 设置：每处理多少个块写一次完整快照
         self.checkpoint_interval = checkpoint_interval
@@ -121,10 +161,20 @@ class EnhancedKnowledgeGraphPipelineSafe:
         try:
             logger.info("Initializing concept extractor...")
             # LLM 模型和 Ollama 服务地址从配置中读取
+            # llm.cascade.enabled 时 llm.model 作为小模型, 低质量块升级到 llm.cascade.large_model
+            cascade = build_cascade(self.config, self.ollama_host, self.llm_timeout, self.prefix_reuse)
             self.concept_extractor = ConceptExtractor(
                 model=self.ollama_model,
                 ollama_host=self.ollama_host,
-                timeout=self.llm_timeout
+                timeout=self.llm_timeout,
+                prefix_reuse=self.prefix_reuse,
+                pack_max_chars=self.pack_max_chars,
+                pack_max_chunks=self.pack_max_chunks,
+                pack_short_chars=self.pack_short_chars,
+                max_workers=self.llm_workers,
+                cascade=cascade,
+                stream_json=self.stream_json,
+                stream_caps=self.stream_caps
             )
             logger.info(f"Concept extractor initialized (timeout: {self.llm_timeout}s)")
         except Exception as e:
@@ -161,7 +211,8 @@ class EnhancedKnowledgeGraphPipelineSafe:
         参数:
             pdf_dir: 待处理 PDF 所在目录(通常为 `./文献`);
             resume: 是否从上次中断处继续(默认 True, 会根据 `.progress.json` 跳过已处理块);
-            clear_checkpoint: 是否清除旧的 checkpoint(如需“从头再跑一遍”或更换配置时建议设为 True)。
+            clear_checkpoint: 是否清除旧的 checkpoint(如需“从头再跑一遍”或更换配置时建议设为 True);
+                已有进度的分块方式 (`chunking.*` 配置或分块器版本) 与本次不同时必须清除, 否则抛出 RuntimeError。
 
         返回:
             (concepts_df, relationships_df):
@@ -186,6 +237,17 @@ class EnhancedKnowledgeGraphPipelineSafe:
             # 一般在“重头再跑一遍”或更换配置时才会打开该开关
             self.checkpoint_manager.clear()
         
+        # chunk_id 只在分块方式相同时才指向同一段文本: 进度来自其他分块方式 (含旧版固定窗口) 时
+        # 续跑会按 id 误跳过新块并混入旧块的增量结果, 直接拒绝
+        chunker_signature = self.chunker.signature()
+        if not self.checkpoint_manager.matches_chunker(chunker_signature):
+            raise RuntimeError(
+                f"Checkpoint in {self.checkpoint_manager.checkpoint_dir} was created with a different chunker "
+                f"({self.checkpoint_manager.progress.get('chunker') or 'fixed-window'}), current: {chunker_signature}. "
+                "Its chunk ids do not match the new chunks; rerun with --clear (clear_checkpoint=True) to start over."
+            )
+        self.checkpoint_manager.set_chunker(chunker_signature)
+        
         # 检查是否有未完成的任务
         if resume:
             # 从 .progress.json 里读一个简要摘要，用于在日志中给出“续跑提示”
@@ -203,7 +265,8 @@ class EnhancedKnowledgeGraphPipelineSafe:
         try:
             # Step 1: 提取 PDF 文本
             logger.info("\n[Step 1/6] Extracting text from PDFs...")
-            pdf_texts = self._extract_pdf_texts(pdf_dir)
+            with metrics.span('pipeline.extract_pdf'):
+                pdf_texts = self._extract_pdf_texts(pdf_dir)
             
             if not pdf_texts:
                 logger.error("No PDF texts extracted")
@@ -212,7 +275,8 @@ class EnhancedKnowledgeGraphPipelineSafe:
             # Step 1.5: 提取并描述图片（如果启用）
             if self.config.get('pdf.enable_image_captions', False):
                 logger.info("\n[Step 1.5/6] Extracting and describing images from PDFs...")
-                pdf_images = self._extract_and_describe_images(pdf_dir)
+                with metrics.span('pipeline.image_captions'):
+                    pdf_images = self._extract_and_describe_images(pdf_dir)
                 
                 if pdf_images:
                     logger.info(f"Extracted images from {len(pdf_images)} PDFs")
@@ -223,8 +287,10 @@ class EnhancedKnowledgeGraphPipelineSafe:
             
             # Step 2: 分块
             logger.info("\n[Step 2/6] Splitting texts into chunks...")
-            chunks = self._create_chunks(pdf_texts)
+            with metrics.span('pipeline.chunking'):
+                chunks = self._create_chunks(pdf_texts)
             logger.info(f"Created {len(chunks)} chunks")
+            metrics.incr('pipeline.chunks', len(chunks))
             
             # 过滤已处理的块（断点续传）
             if resume:
@@ -240,25 +306,30 @@ class EnhancedKnowledgeGraphPipelineSafe:
             
             # Step 3: LLM 抽取（带增量保存）
             logger.info("\n[Step 3/6] Extracting concepts with checkpoint support...")
-            concepts_df, llm_relationships_df = self._extract_with_checkpoints(chunks)
+            with metrics.span('pipeline.llm_extract'):
+                concepts_df, llm_relationships_df = self._extract_with_checkpoints(chunks)
             
             # Step 4: 近邻关系
             logger.info("\n[Step 4/6] Analyzing contextual proximity...")
-            proximity_relationships_df = self._extract_proximity_relationships(chunks, concepts_df)
+            with metrics.span('pipeline.proximity'):
+                proximity_relationships_df = self._extract_proximity_relationships(chunks, concepts_df)
             logger.info(f"Extracted {len(proximity_relationships_df)} proximity relationships")
             
             # Step 5: 去重
             logger.info("\n[Step 5/6] Merging and deduplicating concepts...")
-            concepts_df, relationships_df = self._merge_and_deduplicate(
-                concepts_df, llm_relationships_df, proximity_relationships_df
-            )
+            with metrics.span('pipeline.deduplicate'):
+                concepts_df, relationships_df = self._merge_and_deduplicate(
+                    concepts_df, llm_relationships_df, proximity_relationships_df
+                )
             
             # Step 6: 过滤
             logger.info("\n[Step 6/6] Filtering and finalizing...")
-            concepts_df, relationships_df = self._filter_and_finalize(concepts_df, relationships_df)
+            with metrics.span('pipeline.filter'):
+                concepts_df, relationships_df = self._filter_and_finalize(concepts_df, relationships_df)
             
             # 最终保存
-            self._save_results(concepts_df, relationships_df)
+            with metrics.span('pipeline.save'):
+                self._save_results(concepts_df, relationships_df)
             
             # 清除 checkpoint（任务完成）
             logger.info("\nCleaning up checkpoints...")
@@ -291,6 +362,24 @@ class EnhancedKnowledgeGraphPipelineSafe:
             logger.info("Checkpoint已自动保存，可尝试重新运行恢复")
             logger.info(f"进度保存位置: {self.checkpoint_manager.checkpoint_dir}")
             raise
+        
+        finally:
+            self._write_metrics_report()
+    
+    def _write_metrics_report(self):
+        """输出本次运行的阶段耗时报告 (中断或出错时同样输出, 便于定位耗时阶段)"""
+        if not self.config.get('instrumentation.enabled', True):
+            return
+        try:
+            report_path = metrics.write_report(
+                self.config.get('instrumentation.report_dir', './output/metrics'),
+                prometheus=self.config.get('instrumentation.prometheus', False),
+                run_name='pipeline'
+            )
+            if report_path:
+                logger.info(f"Metrics report saved to {report_path}")
+        except Exception as e:
+            logger.warning(f"Failed to write metrics report: {e}")
     
     def _extract_with_checkpoints(self, chunks: List[Dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """
@@ -307,18 +396,24 @@ class EnhancedKnowledgeGraphPipelineSafe:
         
         logger.info(f"Processing {len(chunks)} chunks with checkpoint interval: {self.checkpoint_interval}")
         
-        for i, chunk in enumerate(tqdm(chunks, desc="Extracting concepts")):
-            text = chunk.get('text', '')
-            chunk_id = chunk.get('chunk_id', '')
-            
-            if not text or len(text.strip()) < 20:
+        # 短块按配置打包为一次请求; 结果仍逐块写入 checkpoint
+        valid_chunks = [c for c in chunks if c.get('text') and len(c['text'].strip()) >= 20]
+        groups = self.concept_extractor.pack_chunks(valid_chunks)
+        if len(groups) < len(valid_chunks):
+            logger.info(f"Packing short chunks: {len(valid_chunks)} chunks -> {len(groups)} LLM requests")
+        
+        i = 0
+        # LLM 抽取: 多主机/多并发时同时保持多个请求在途, 结果按原顺序返回
+        for group, group_results in tqdm(self.concept_extractor.extract_groups(groups), total=len(groups),
+                                         desc="Extracting concepts"):
+            if group_results is None:
+                # 单组失败不会中断整个流程 (已记录错误), 这些块不写 checkpoint, 续跑时重新处理
+                i += len(group)
                 continue
             
-            # LLM 抽取
-            try:
-                concepts, relationships = self.concept_extractor.extract_concepts_and_relationships(
-                    text, chunk_id
-                )
+            for chunk in group:
+                chunk_id = chunk.get('chunk_id', '')
+                concepts, relationships = group_results.get(chunk_id, (None, None))
                 
                 if concepts:
                     all_concepts.extend(concepts)
@@ -327,26 +422,22 @@ class EnhancedKnowledgeGraphPipelineSafe:
                 
                 # 无论当前块是否抽取成功，都会把结果写入 checkpoint，保证进度单调前进
                 self.checkpoint_manager.save_chunk_results(chunk_id, concepts, relationships)
+                i += 1
                 
                 # 定期保存完整 checkpoint，方便中途查看“当前全局效果”
-                if (i + 1) % self.checkpoint_interval == 0:
+                if i % self.checkpoint_interval == 0:
                     temp_concepts_df = pd.DataFrame(all_concepts) if all_concepts else pd.DataFrame()
                     temp_relationships_df = pd.DataFrame(all_relationships) if all_relationships else pd.DataFrame()
                     
                     self.checkpoint_manager.save_checkpoint(
-                        i + 1, temp_concepts_df, temp_relationships_df
+                        i, temp_concepts_df, temp_relationships_df
                     )
                     
-                    logger.info(f"Checkpoint: {i+1}/{len(chunks)} chunks processed")
+                    logger.info(f"Checkpoint: {i}/{len(valid_chunks)} chunks processed")
                     
                     # 在checkpoint时清理内存
                     gc.collect()
-                    logger.debug(f"[Memory] Garbage collection at checkpoint {i+1}")
-            
-            except Exception as e:
-                # 单个文本块失败不会中断整个流程，只记录错误并继续下一个
-                logger.error(f"Failed to process chunk {chunk_id}: {e}")
-                continue
+                    logger.debug(f"[Memory] Garbage collection at checkpoint {i}")
         
         # 最终数据
         concepts_df = pd.DataFrame(all_concepts) if all_concepts else pd.DataFrame()
@@ -358,6 +449,8 @@ class EnhancedKnowledgeGraphPipelineSafe:
         gc.collect()
         
         logger.info(f"Extraction complete: {len(concepts_df)} concepts, {len(relationships_df)} relationships")
+        if self.concept_extractor.cascade is not None:
+            logger.info(f"Model cascade: {self.concept_extractor.cascade.summary()}")
         
         return concepts_df, relationships_df
     
@@ -496,36 +589,23 @@ class EnhancedKnowledgeGraphPipelineSafe:
         
         return enhanced_texts
     
-    def _create_chunks(self, pdf_texts: Dict[str, str], chunk_size: int = 3000,
-                      overlap: int = 300) -> List[Dict]:
+    def _create_chunks(self, pdf_texts: Dict[str, str]) -> List[Dict]:
         """将每篇 PDF 文本切分为多个 chunk
 
         参数:
-            pdf_texts: `{pdf_name: text}` 形式的清洗后文本字典;
-            chunk_size: 每个块的目标长度(字符数, 默认 3000);
-            overlap: 相邻块之间的重叠长度(默认 300), 保障跨块语境连续性。
+            pdf_texts: `{pdf_name: text}` 形式的清洗后文本字典。
 
         说明:
-        - 按 `chunk_size - overlap` 的步长滑动窗口截取文本;
-        - 过滤过短片段(长度 < 50), 避免把页眉/脚或噪声当作有效块;
-        - 为每个块生成唯一 `chunk_id = {pdf_name}_{counter}` 作为后续追踪的主键。
+        - 由 `StructureAwareChunker` 按 `#` 章节与句子边界切分, 以整句为单位在 `chunking.max_tokens` 预算内装箱;
+        - 跳过参考文献章节, 表格按行切分并在续写块中补表头, 同一段落内续写只重叠 `chunking.overlap_sentences` 句;
+        - 过滤正文过短的块(<= `chunking.min_chars`), 避免把页眉/脚或噪声当作有效块;
+        - `chunk_id = {pdf_name}_{文档内序号}`, 同一文档的 id 不受其他文档增删影响, 断点续传时保持稳定。
         """
-        chunks = []
-        chunk_id_counter = 0
-        
-        for pdf_name, text in pdf_texts.items():
-            for i in range(0, len(text), chunk_size - overlap):
-                chunk_text = text[i:i + chunk_size]
-                
-                if len(chunk_text.strip()) > 50:
-                    chunks.append({
-                        'text': chunk_text,
-                        'chunk_id': f"{pdf_name}_{chunk_id_counter}",
-                        'source_pdf': pdf_name,
-                        'concepts': []
-                    })
-                    chunk_id_counter += 1
-        
+        chunks = self.chunker.chunk_documents(pdf_texts)
+        if chunks:
+            logger.info(f"Chunk tokens ({self.chunker.counter.name}): "
+                        f"avg {sum(c['tokens'] for c in chunks) / len(chunks):.0f}, "
+                        f"max {max(c['tokens'] for c in chunks)} / budget {self.chunker.max_tokens}")
         return chunks
     
     def _extract_proximity_relationships(self, chunks: List[Dict],
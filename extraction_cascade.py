@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""小模型优先的抽取级联
+
+所有文本块先由小模型 (llm.model, 如 llama3.2:3b) 抽取, 再由一个不调用 LLM 的质量评分器
+判断结果是否可信; 只有低分块才升级到大模型 (如 qwen2.5-coder:14b) 重新抽取, 或交给
+Critic → Refine 审稿循环修正。多数块在小模型上完成, 难块仍能得到大模型的质量。
+
+评分信号 (ChunkQualityScorer):
+- JSON 有效性: 请求失败、JSON 无效或没有抽出任何概念时直接记 0 分;
+- 实体密度: 每千字符的概念数, 与 target_density 相比;
+- 词典命中率: 抽出的概念中命中 config/domain_dict.json 术语的比例;
+- 词典召回率: 文本中出现的词典术语有多少被抽了出来 (文本中没有词典术语时不计)。
+各项按权重取加权几何平均 (任一项偏低都会明显拉低总分); 概念较多却没有任何关系时再乘以惩罚系数。
+
+用法:
+    cascade = build_cascade(config, ollama_host, timeout)
+    extractor = ConceptExtractor(model=config.get('llm.model'), ..., cascade=cascade)
+    concepts_df, relationships_df = extractor.extract_from_chunks(chunks)
+    logger.info(cascade.summary())
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from agentic_extractor import CriticAgent, ExtractionResult, RefineAgent
+from concept_extractor import ConceptExtractor
+from instrumentation import metrics
+from llm_telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DOMAIN_DICT = './config/domain_dict.json'
+
+# 质量分的统计分桶
+_SCORE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+
+@dataclass
+class QualityScore:
+    """单个文本块抽取结果的质量评分"""
+    score: float
+    json_ok: bool
+    entity_density: float = 0.0               # 每千字符的概念数
+    dict_hit_rate: Optional[float] = None     # 概念中命中领域词典的比例
+    dict_recall: Optional[float] = None       # 文本中的词典术语被抽出的比例
+    reasons: List[str] = field(default_factory=list)
+
+
+class ChunkQualityScorer:
+    """
+    抽取结果的廉价质量评分 (纯字符串匹配, 不调用 LLM)
+
+    分数在 [0, 1] 之间, 只用于决定是否升级, 不作为概念的置信度写入图谱。
+    """
+
+    DEFAULT_WEIGHTS = {'density': 0.3, 'dict_hit': 0.3, 'dict_recall': 0.4}
+    # 几何平均前各项的下限, 避免某一项为 0 (如文本主题不在词典中) 时总分直接归零
+    _COMPONENT_FLOOR = 0.05
+
+    def __init__(self, domain_dict_path: str = DEFAULT_DOMAIN_DICT, target_density: float = 4.0,
+                 weights: Optional[Dict[str, float]] = None, no_relation_penalty: float = 0.8):
+        """
+        Args:
+            domain_dict_path: 领域词典 (类别 -> 术语列表); 文件不存在时只按实体密度评分
+            target_density: 视为满分的实体密度 (每千字符概念数)
+            weights: 各评分项权重, 键为 density / dict_hit / dict_recall
+            no_relation_penalty: 抽出 3 个以上概念却没有任何关系时的分数系数
+        """
+        self.terms = self.load_terms(domain_dict_path)
+        self.target_density = target_density
+        self.weights = dict(weights or self.DEFAULT_WEIGHTS)
+        self.no_relation_penalty = no_relation_penalty
+
+    @staticmethod
+    def load_terms(path: str) -> List[str]:
+        """读取领域词典中的全部术语 (小写, 去重, 忽略单字符术语)"""
+        if not path or not os.path.exists(path):
+            logger.warning(f"Domain dictionary not found: {path}, quality score uses entity density only")
+            return []
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        terms = set()
+        for values in data.values():
+            for term in values if isinstance(values, list) else []:
+                term = str(term).lower().strip()
+                if len(term) >= 2:
+                    terms.add(term)
+        return sorted(terms)
+
+    def _matches(self, entity: str) -> bool:
+        return any(term in entity or entity in term for term in self.terms)
+
+    def score(self, text: str, concepts: Optional[List[Dict]],
+              relationships: Optional[List[Dict]] = None) -> QualityScore:
+        if not concepts:
+            return QualityScore(score=0.0, json_ok=False, reasons=['no_concepts'])
+
+        entities = [str(c.get('entity', '')).lower().strip() for c in concepts]
+        entities = [e for e in entities if len(e) >= 2]
+        density = len(concepts) * 1000.0 / max(len(text), 1)
+        components = {'density': min(1.0, density / self.target_density) if self.target_density > 0 else 1.0}
+        result = QualityScore(score=0.0, json_ok=True, entity_density=round(density, 3))
+
+        if self.terms:
+            hits = sum(1 for e in entities if self._matches(e))
+            result.dict_hit_rate = round(hits / len(entities), 4) if entities else 0.0
+            components['dict_hit'] = result.dict_hit_rate
+
+            lowered = text.lower()
+            present = [term for term in self.terms if term in lowered]
+            if present:
+                found = sum(1 for term in present if any(term in e or e in term for e in entities))
+                result.dict_recall = round(found / len(present), 4)
+                components['dict_recall'] = result.dict_recall
+
+        total_weight = sum(self.weights.get(name, 0.0) for name in components)
+        score = math.exp(sum(self.weights.get(name, 0.0) * math.log(max(value, self._COMPONENT_FLOOR))
+                             for name, value in components.items()) / total_weight) if total_weight > 0 else 0.0
+        for name, value in components.items():
+            if value < 0.5:
+                result.reasons.append(f"low_{name}")
+        if len(concepts) >= 3 and not relationships:
+            score *= self.no_relation_penalty
+            result.reasons.append('no_relationships')
+
+        result.score = round(score, 4)
+        return result
+
+
+class ModelCascade:
+    """
+    小模型结果的质量闸门: 低于 min_score 的块升级到大模型或审稿循环
+
+    review 在 ConceptExtractor.extract_groups 的工作线程中逐块调用, 可以并发执行。
+    升级后的结果只有在评分更高时才替换小模型的结果。
+    """
+
+    ESCALATION_TARGETS = ('large', 'critic')
+
+    def __init__(self, scorer: ChunkQualityScorer, min_score: float = 0.5, escalate_to: str = 'large',
+                 large_extractor=None, critic=None, refiner=None):
+        """
+        Args:
+            scorer: 质量评分器
+            min_score: 低于该分数的块升级
+            escalate_to: 'large' 由 large_extractor (大模型 ConceptExtractor) 重新抽取;
+                'critic' 由 critic/refiner (agentic_extractor 的 CriticAgent/RefineAgent) 审稿修正
+        """
+        if escalate_to not in self.ESCALATION_TARGETS:
+            raise ValueError(f"不支持的升级方式: {escalate_to}")
+        if escalate_to == 'large' and large_extractor is None:
+            raise ValueError("escalate_to='large' 需要 large_extractor")
+        if escalate_to == 'critic' and (critic is None or refiner is None):
+            raise ValueError("escalate_to='critic' 需要 critic 与 refiner")
+        self.scorer = scorer
+        self.min_score = min_score
+        self.escalate_to = escalate_to
+        self.large_extractor = large_extractor
+        self.critic = critic
+        self.refiner = refiner
+        self._stats = {'chunks': 0, 'accepted': 0, 'escalated': 0, 'improved': 0}
+        self._lock = threading.Lock()
+
+    def review(self, chunk: Dict, result: Tuple[Optional[List[Dict]], Optional[List[Dict]]],
+               context_hint: str = "") -> Tuple[Optional[List[Dict]], Optional[List[Dict]]]:
+        """对小模型的 (concepts, relationships) 评分, 必要时升级, 返回最终采用的结果"""
+        text = chunk.get('text', '')
+        chunk_id = chunk.get('chunk_id', '')
+        concepts, relationships = result
+        first = self.scorer.score(text, concepts, relationships)
+        metrics.observe('llm.cascade.score', first.score, buckets=_SCORE_BUCKETS)
+
+        if first.score >= self.min_score:
+            self._count(accepted=1)
+            metrics.incr('llm.cascade.accepted')
+            return result
+
+        metrics.incr('llm.cascade.escalated', target=self.escalate_to)
+        logger.debug(f"[{chunk_id}] quality {first.score:.2f} < {self.min_score} "
+                     f"({', '.join(first.reasons)}), escalating to {self.escalate_to}")
+        try:
+            with telemetry.scope(chunk_id=chunk_id, cascade=self.escalate_to, quality=first.score):
+                if self.escalate_to == 'large':
+                    escalated = self.large_extractor.extract_concepts_and_relationships(
+                        text, chunk_id, context_hint=context_hint
+                    )
+                else:
+                    escalated = self._critic_loop(text, chunk_id, concepts, relationships)
+        except Exception as e:
+            # 升级失败不影响小模型的结果
+            logger.warning(f"[{chunk_id}] Escalation to {self.escalate_to} failed: {e}")
+            escalated = (None, None)
+
+        second = self.scorer.score(text, *escalated)
+        improved = second.score > first.score
+        self._count(escalated=1, improved=int(improved))
+        if improved:
+            metrics.incr('llm.cascade.improved')
+            return escalated
+        return result
+
+    def _critic_loop(self, text: str, chunk_id: str, concepts: Optional[List[Dict]],
+                     relationships: Optional[List[Dict]]) -> Tuple[Optional[List[Dict]], Optional[List[Dict]]]:
+        """Critic 审查后由 Refine 修正; 小模型没有抽出任何概念时无从审查, 原样返回"""
+        if not concepts:
+            return concepts, relationships
+        extraction = ExtractionResult(concepts=concepts, relationships=relationships or [], confidence=0.0)
+        review_report = self.critic.review_extraction(extraction, text)
+        refined = self.refiner.refine_extraction(extraction, review_report, text)
+        # Refine Agent 重写的条目不带 chunk_id, 补回以便 checkpoint 与共现分析按块关联
+        for item in refined.concepts + refined.relationships:
+            item.setdefault('chunk_id', chunk_id)
+        return refined.concepts or None, refined.relationships or None
+
+    def _count(self, **increments):
+        with self._lock:
+            self._stats['chunks'] += 1
+            for key, value in increments.items():
+                self._stats[key] += value
+
+    def summary(self) -> Dict:
+        """升级统计: 评分块数、直接采纳数、升级数、升级后评分提高 (被采用) 的块数"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['escalation_rate'] = round(stats['escalated'] / stats['chunks'], 4) if stats['chunks'] else 0.0
+        stats['target'] = self.escalate_to
+        return stats
+
+
+def build_cascade(config, ollama_host, timeout: int = 600, prefix_reuse: str = 'off') -> Optional[ModelCascade]:
+    """
+    按 llm.cascade 配置构建级联; 未启用时返回 None
+
+    大模型抽取器与小模型共用 Ollama 主机、超时、前缀复用方式与流式解析设置,
+    但不打包短块 (升级总是逐块进行)。
+    """
+    if not config.get('llm.cascade.enabled', False):
+        return None
+
+    scorer = ChunkQualityScorer(
+        domain_dict_path=config.get('llm.cascade.domain_dict', DEFAULT_DOMAIN_DICT),
+        target_density=config.get('llm.cascade.target_density', 4.0),
+    )
+    large_model = config.get('llm.cascade.large_model', 'qwen2.5-coder:14b')
+    escalate_to = config.get('llm.cascade.escalate_to', 'large')
+    large_extractor = critic = refiner = None
+    if escalate_to == 'critic':
+        critic = CriticAgent(large_model, ollama_host)
+        refiner = RefineAgent(large_model, ollama_host)
+    else:
+        large_extractor = ConceptExtractor(
+            model=large_model, ollama_host=ollama_host, timeout=timeout, prefix_reuse=prefix_reuse,
+            stream_json=config.get('llm.stream_parsing.enabled', False),
+            stream_caps={key: config.get(f'llm.stream_parsing.{key}', default)
+                         for key, default in ConceptExtractor.DEFAULT_STREAM_CAPS.items()}
+        )
+
+    logger.info(f"Model cascade enabled: escalate chunks scoring < {config.get('llm.cascade.min_score', 0.5)} "
+                f"to {escalate_to} ({large_model})")
+    return ModelCascade(scorer, min_score=config.get('llm.cascade.min_score', 0.5), escalate_to=escalate_to,
+                        large_extractor=large_extractor, critic=critic, refiner=refiner)
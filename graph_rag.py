@@ -14,14 +14,23 @@ GraphRAG Module - Community Detection & Summarization
 - 支持更复杂的知识推理
 """
 
+import hashlib
+import heapq
 import json
 import logging
-from typing import List, Dict, Tuple, Optional, Set
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, List, Dict, Tuple, Optional, Set, Iterator
 import pandas as pd
 import numpy as np
-import requests
 from collections import defaultdict
 
+from ollama_client import OllamaError, get_client
+
 logger = logging.getLogger(__name__)
 
 # 尝试导入图分析库
@@ -40,6 +49,13 @@ except ImportError:
     IGRAPH_AVAILABLE = False
     logger.warning("igraph 不可用,Leiden 算法不可用")
 
+try:
+    from scipy import sparse as sp
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+    logger.warning("scipy 不可用,混合检索退化为纯稠密检索")
+
 
 class CommunityDetector:
     """
@@ -50,15 +66,28 @@ class CommunityDetector:
     - Leiden: 改进的 Louvain 算法 (需要 igraph)
     - Label Propagation: 标签传播算法 (需要 NetworkX)
     - Connected Components: 连通分量 (基础算法,无需额外依赖)
+    
+    增量模式 (指定 partition_path):
+    - 划分结果连同图谱版本、每个节点的邻接签名一起持久化
+    - 图谱版本未变化时直接复用上次划分
+    - 图谱有少量变化时, 只对受影响的社区重新划分 (Leiden 以上次划分为初始划分整体细化)
     """
     
-    def __init__(self, algorithm: str = 'louvain'):
+    # 受影响节点占比超过该阈值时直接全量重算
+    FULL_RECOMPUTE_RATIO = 0.5
+    
+    def __init__(self, algorithm: str = 'louvain', resolution: float = 1.0,
+                 partition_path: Optional[str] = None):
         """
         Args:
             algorithm: 社区检测算法 ('louvain', 'leiden', 'label_propagation', 'connected_components')
+            resolution: 模块度分辨率参数 (louvain/leiden), 越大社区越小
+            partition_path: 划分结果持久化路径, 为空时每次全量计算
         """
         # 统一转为小写,方便后续分支判断
         self.algorithm = algorithm.lower()
+        self.resolution = resolution
+        self.partition_path = partition_path
         
         # 如果环境缺少 NetworkX/igraph,自动降级到可用算法,保证功能可用性
         if self.algorithm == 'louvain' and not NETWORKX_AVAILABLE:
@@ -67,18 +96,23 @@ class CommunityDetector:
         
         if self.algorithm == 'leiden' and not IGRAPH_AVAILABLE:
             logger.warning("igraph 不可用,回退到 louvain")
-            self.algorithm = 'louvain'
+            self.algorithm = 'louvain' if NETWORKX_AVAILABLE else 'connected_components'
+        
+        if self.algorithm == 'label_propagation' and not NETWORKX_AVAILABLE:
+            self.algorithm = 'connected_components'
         
         logger.info(f"社区检测算法: {self.algorithm}")
     
     def detect_communities(self, concepts_df: pd.DataFrame, 
-                          relationships_df: pd.DataFrame) -> Dict[int, List[str]]:
+                          relationships_df: pd.DataFrame,
+                          graph_version: Optional[str] = None) -> Dict[int, List[str]]:
         """
         检测知识图谱中的社区
         
         Args:
             concepts_df: 概念 DataFrame
             relationships_df: 关系 DataFrame
+            graph_version: 图谱版本号 (增量模式下用于判断是否可直接复用)
         
         Returns:
             社区字典 {community_id: [entity_list]}
@@ -89,161 +123,324 @@ class CommunityDetector:
         
         logger.info(f"开始社区检测: {len(concepts_df)} 概念, {len(relationships_df)} 关系")
         
-        # 根据初始化时确定的算法分支到对应实现
-        if self.algorithm == 'louvain':
-            return self._detect_louvain(concepts_df, relationships_df)
-        elif self.algorithm == 'leiden':
-            return self._detect_leiden(concepts_df, relationships_df)
-        elif self.algorithm == 'label_propagation':
-            return self._detect_label_propagation(concepts_df, relationships_df)
+        entities, src, dst, weights = self._edge_arrays(concepts_df, relationships_df)
+        
+        previous = self._load_partition() if self.partition_path else None
+        if previous is None:
+            communities = self._detect(entities, src, dst, weights)
+            membership = {e: cid for cid, members in communities.items() for e in members}
+        elif graph_version is not None and previous.get('graph_version') == graph_version:
+            logger.info(f"图谱版本未变化 ({graph_version}), 复用已保存的社区划分")
+            return self._group(previous['membership'])
         else:
-            return self._detect_connected_components(concepts_df, relationships_df)
+            membership = self._update_partition(previous, entities, src, dst, weights)
+            communities = self._group(membership)
+        
+        if self.partition_path:
+            self._save_partition(membership, self._signatures(entities, src, dst, weights), graph_version)
+        
+        return communities
     
-    def _build_networkx_graph(self, concepts_df: pd.DataFrame, 
-                             relationships_df: pd.DataFrame) -> nx.Graph:
-        """构建 NetworkX 图"""
-        G = nx.Graph()
+    # ------------------------------------------------------------------
+    # 图构建: 整数边数组, 不逐行遍历 DataFrame
+    # ------------------------------------------------------------------
+    
+    def _edge_arrays(self, concepts_df: pd.DataFrame,
+                     relationships_df: pd.DataFrame) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+        """
+        将概念/关系表转换为 (实体列表, 源下标数组, 目标下标数组, 权重数组)
         
-        # 添加节点: 只要在概念表里出现过的 entity 都作为节点加入,同时记录重要性和类别
-        for _, row in concepts_df.iterrows():
-            G.add_node(
-                row['entity'],
-                importance=row.get('importance', 1),
-                category=row.get('category', 'misc')
-            )
+        仅保留两端都在概念表中的关系, 避免脏数据引入孤立引用。
+        """
+        entities = list(pd.unique(concepts_df['entity']))
+        index = pd.Series(np.arange(len(entities)), index=entities)
         
-        # 添加边: 仅当两端节点都存在于图中时才连边,避免脏数据引入孤立引用
-        for _, row in relationships_df.iterrows():
-            node1 = row['node_1']
-            node2 = row['node_2']
-            weight = row.get('weight', 1.0)
-            
-            if node1 in G.nodes and node2 in G.nodes:
-                G.add_edge(node1, node2, weight=weight, edge_type=row.get('edge', 'related'))
+        src = relationships_df['node_1'].map(index)
+        dst = relationships_df['node_2'].map(index)
+        if 'weight' in relationships_df.columns:
+            weights = relationships_df['weight'].fillna(1.0)
+        else:
+            weights = pd.Series(1.0, index=relationships_df.index)
+        valid = src.notna() & dst.notna()
         
+        return (
+            entities,
+            src[valid].to_numpy(dtype=np.int64),
+            dst[valid].to_numpy(dtype=np.int64),
+            weights[valid].to_numpy(dtype=float),
+        )
+    
+    def _build_networkx_graph(self, n: int, src: np.ndarray, dst: np.ndarray,
+                              weights: np.ndarray) -> 'nx.Graph':
+        """从整数边数组构建 NetworkX 图 (节点为 0..n-1)"""
+        G = nx.Graph()
+        G.add_nodes_from(range(n))
+        G.add_weighted_edges_from(zip(src.tolist(), dst.tolist(), weights.tolist()))
         logger.info(f"构建图谱: {G.number_of_nodes()} 节点, {G.number_of_edges()} 边")
         return G
     
-    def _detect_louvain(self, concepts_df: pd.DataFrame, 
-                       relationships_df: pd.DataFrame) -> Dict[int, List[str]]:
-        """Louvain 社区检测"""
-        if not NETWORKX_AVAILABLE:
-            return self._detect_connected_components(concepts_df, relationships_df)
-        
-        G = self._build_networkx_graph(concepts_df, relationships_df)
-        
-        # Louvain 算法
-        communities_generator = nx_community.louvain_communities(G, weight='weight', seed=42)
-        
-        # 转换为字典格式
-        communities = {}
-        for i, community_set in enumerate(communities_generator):
-            communities[i] = list(community_set)
-        
-        logger.info(f"Louvain 检测到 {len(communities)} 个社区")
+    def _detect(self, entities: List[str], src: np.ndarray, dst: np.ndarray,
+                weights: np.ndarray, initial_membership: Optional[List[int]] = None) -> Dict[int, List[str]]:
+        """在给定的边数组上运行社区检测, 返回以实体名表示的社区"""
+        n = len(entities)
+        if self.algorithm == 'leiden':
+            groups = self._detect_leiden(n, src, dst, weights, initial_membership)
+        elif self.algorithm == 'louvain':
+            groups = self._detect_louvain(n, src, dst, weights)
+        elif self.algorithm == 'label_propagation':
+            groups = self._detect_label_propagation(n, src, dst, weights)
+        else:
+            groups = self._detect_connected_components(n, src, dst)
         
-        # 打印社区统计
+        communities = {i: [entities[idx] for idx in group] for i, group in enumerate(groups)}
+        logger.info(f"{self.algorithm} 检测到 {len(communities)} 个社区")
         for comm_id, members in communities.items():
             logger.debug(f"  社区 {comm_id}: {len(members)} 个节点")
-        
         return communities
     
-    def _detect_leiden(self, concepts_df: pd.DataFrame, 
-                      relationships_df: pd.DataFrame) -> Dict[int, List[str]]:
-        """Leiden 社区检测 (需要 igraph)"""
-        if not IGRAPH_AVAILABLE:
-            return self._detect_louvain(concepts_df, relationships_df)
-        
-        # 构建 igraph 图
-        entities = list(concepts_df['entity'].unique())
-        entity_to_idx = {e: i for i, e in enumerate(entities)}
-        
-        edges = []
-        weights = []
-        for _, row in relationships_df.iterrows():
-            node1 = row['node_1']
-            node2 = row['node_2']
-            if node1 in entity_to_idx and node2 in entity_to_idx:
-                edges.append((entity_to_idx[node1], entity_to_idx[node2]))
-                weights.append(row.get('weight', 1.0))
-        
-        g = ig.Graph(edges=edges)
-        g.vs["name"] = entities
-        
-        # Leiden 算法
-        partition = g.community_leiden(weights=weights, objective_function='modularity')
-        
-        # 转换为字典格式
-        communities = {}
-        for i, community_indices in enumerate(partition):
-            communities[i] = [entities[idx] for idx in community_indices]
-        
-        logger.info(f"Leiden 检测到 {len(communities)} 个社区")
-        return communities
+    def _detect_louvain(self, n: int, src: np.ndarray, dst: np.ndarray,
+                        weights: np.ndarray) -> List[List[int]]:
+        """Louvain 社区检测"""
+        G = self._build_networkx_graph(n, src, dst, weights)
+        return [
+            list(c) for c in nx_community.louvain_communities(
+                G, weight='weight', resolution=self.resolution, seed=42
+            )
+        ]
     
-    def _detect_label_propagation(self, concepts_df: pd.DataFrame, 
-                                  relationships_df: pd.DataFrame) -> Dict[int, List[str]]:
+    def _detect_leiden(self, n: int, src: np.ndarray, dst: np.ndarray, weights: np.ndarray,
+                       initial_membership: Optional[List[int]] = None) -> List[List[int]]:
+        """Leiden 社区检测 (需要 igraph), 支持以上次划分作为初始划分"""
+        g = ig.Graph(n=n, edges=np.column_stack([src, dst]).tolist())
+        partition = g.community_leiden(
+            weights=weights.tolist(),
+            objective_function='modularity',
+            resolution=self.resolution,
+            initial_membership=initial_membership,
+            n_iterations=2
+        )
+        return [list(c) for c in partition]
+    
+    def _detect_label_propagation(self, n: int, src: np.ndarray, dst: np.ndarray,
+                                  weights: np.ndarray) -> List[List[int]]:
         """标签传播社区检测"""
-        if not NETWORKX_AVAILABLE:
-            return self._detect_connected_components(concepts_df, relationships_df)
-        
-        G = self._build_networkx_graph(concepts_df, relationships_df)
-        
-        # 标签传播算法
-        communities_generator = nx_community.label_propagation_communities(G)
-        
-        communities = {}
-        for i, community_set in enumerate(communities_generator):
-            communities[i] = list(community_set)
-        
-        logger.info(f"Label Propagation 检测到 {len(communities)} 个社区")
-        return communities
+        G = self._build_networkx_graph(n, src, dst, weights)
+        return [list(c) for c in nx_community.label_propagation_communities(G)]
     
-    def _detect_connected_components(self, concepts_df: pd.DataFrame, 
-                                    relationships_df: pd.DataFrame) -> Dict[int, List[str]]:
-        """连通分量检测 (基础算法,无需额外库)"""
-        # 构建邻接表: 简单 undirected 图,用来在没有图算法库时兜底
-        adjacency = defaultdict(set)
-        
-        for _, row in relationships_df.iterrows():
-            node1 = row['node_1']
-            node2 = row['node_2']
-            adjacency[node1].add(node2)
-            adjacency[node2].add(node1)
-        
-        # 添加孤立节点
-        for entity in concepts_df['entity']:
-            if entity not in adjacency:
-                adjacency[entity] = set()
+    def _detect_connected_components(self, n: int, src: np.ndarray,
+                                     dst: np.ndarray) -> List[List[int]]:
+        """连通分量检测 (并查集, 基础算法,无需额外库)"""
+        parent = list(range(n))
+        
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+        
+        for a, b in zip(src.tolist(), dst.tolist()):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[ra] = rb
+        
+        components = defaultdict(list)
+        for i in range(n):
+            components[find(i)].append(i)
+        return list(components.values())
+    
+    # ------------------------------------------------------------------
+    # 增量更新
+    # ------------------------------------------------------------------
+    
+    def _signatures(self, entities: List[str], src: np.ndarray, dst: np.ndarray,
+                    weights: np.ndarray) -> Dict[str, str]:
+        """每个节点的邻接签名 (邻居名称 + 权重的哈希), 用于识别发生变化的节点"""
+        neighbors = defaultdict(list)
+        for a, b, w in zip(src.tolist(), dst.tolist(), weights.tolist()):
+            neighbors[a].append(f"{entities[b]}:{w:.4f}")
+            neighbors[b].append(f"{entities[a]}:{w:.4f}")
+        return {
+            entity: hashlib.md5("|".join(sorted(neighbors.get(i, []))).encode('utf-8')).hexdigest()[:16]
+            for i, entity in enumerate(entities)
+        }
+    
+    def _update_partition(self, previous: Dict, entities: List[str], src: np.ndarray,
+                          dst: np.ndarray, weights: np.ndarray) -> Dict[str, int]:
+        """
+        基于上次划分增量更新
         
-        # BFS 查找连通分量: 每次从一个未访问节点出发,扩展出一个社区
-        visited = set()
-        communities = {}
-        community_id = 0
+        - 邻接签名变化或新增的节点视为受影响节点
+        - Leiden: 以上次划分为初始划分在全图上细化
+        - 其他算法: 只在受影响社区 (含受影响节点) 的诱导子图上重新划分, 其余社区编号保持不变
+        """
+        prev_membership: Dict[str, int] = previous['membership']
+        prev_signatures: Dict[str, str] = previous.get('signatures', {})
+        signatures = self._signatures(entities, src, dst, weights)
         
-        for entity in adjacency:
-            if entity in visited:
-                continue
-            
-            # BFS
-            component = []
-            queue = [entity]
-            visited.add(entity)
-            
-            while queue:
-                current = queue.pop(0)
-                component.append(current)
-                
-                for neighbor in adjacency[current]:
-                    if neighbor not in visited:
-                        visited.add(neighbor)
-                        queue.append(neighbor)
-            
-            communities[community_id] = component
-            community_id += 1
+        affected = {
+            e for e in entities
+            if e not in prev_membership or prev_signatures.get(e) != signatures[e]
+        }
+        removed = set(prev_membership) - set(entities)
+        
+        if not affected and not removed:
+            logger.info("图结构未变化, 复用已保存的社区划分")
+            return {e: prev_membership[e] for e in entities}
+        
+        if len(affected) > self.FULL_RECOMPUTE_RATIO * len(entities):
+            logger.info(f"受影响节点过多 ({len(affected)}/{len(entities)}), 全量重新计算")
+            communities = self._detect(entities, src, dst, weights)
+            return {e: cid for cid, members in communities.items() for e in members}
+        
+        next_id = max(prev_membership.values(), default=-1) + 1
+        
+        if self.algorithm == 'leiden':
+            # 新节点各自作为单独社区, 其余节点沿用上次社区编号
+            initial = []
+            for e in entities:
+                if e in prev_membership:
+                    initial.append(prev_membership[e])
+                else:
+                    initial.append(next_id)
+                    next_id += 1
+            # igraph 要求初始划分编号连续
+            remap = {cid: i for i, cid in enumerate(sorted(set(initial)))}
+            communities = self._detect(
+                entities, src, dst, weights, initial_membership=[remap[c] for c in initial]
+            )
+            logger.info(f"增量 Leiden: {len(affected)} 个受影响节点")
+            return {e: cid for cid, members in communities.items() for e in members}
+        
+        # 受影响区域 = 受影响节点 + 它们原先所在社区的全部成员
+        dirty_communities = {prev_membership[e] for e in affected if e in prev_membership}
+        dirty_communities |= {prev_membership[e] for e in removed}
+        region = {
+            e for e in entities
+            if e in affected or prev_membership.get(e) in dirty_communities
+        }
         
-        logger.info(f"Connected Components 检测到 {len(communities)} 个社区")
-        return communities
+        if not region:
+            # 仅删除了整个社区, 其余划分保持不变
+            return {e: prev_membership[e] for e in entities}
+        
+        region_list = sorted(region)
+        region_index = {e: i for i, e in enumerate(region_list)}
+        index = np.array([region_index.get(e, -1) for e in entities], dtype=np.int64)
+        sub_src, sub_dst = index[src], index[dst]
+        mask = (sub_src >= 0) & (sub_dst >= 0)
+        sub_communities = self._detect(region_list, sub_src[mask], sub_dst[mask], weights[mask])
+        
+        membership = {e: prev_membership[e] for e in entities if e not in region}
+        for members in sub_communities.values():
+            for e in members:
+                membership[e] = next_id
+            next_id += 1
+        
+        logger.info(
+            f"增量更新: {len(affected)} 个受影响节点, 重新划分 {len(region)} 个节点 "
+            f"({len(dirty_communities)} 个旧社区)"
+        )
+        return membership
+    
+    @staticmethod
+    def _group(membership: Dict[str, int]) -> Dict[int, List[str]]:
+        communities = defaultdict(list)
+        for entity, cid in membership.items():
+            communities[int(cid)].append(entity)
+        return dict(communities)
+    
+    def _load_partition(self) -> Optional[Dict]:
+        """加载已保存的划分; 算法或分辨率不一致时视为不存在"""
+        if not self.partition_path or not os.path.exists(self.partition_path):
+            return None
+        try:
+            with open(self.partition_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"加载社区划分失败: {e}")
+            return None
+        if data.get('algorithm') != self.algorithm or data.get('resolution') != self.resolution:
+            return None
+        return data
+    
+    def _save_partition(self, membership: Dict[str, int], signatures: Dict[str, str],
+                        graph_version: Optional[str]):
+        """保存划分结果 (含图谱版本和邻接签名)"""
+        directory = os.path.dirname(self.partition_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.partition_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'algorithm': self.algorithm,
+                    'resolution': self.resolution,
+                    'graph_version': graph_version,
+                    'membership': {e: int(c) for e, c in membership.items()},
+                    'signatures': signatures,
+                }, f, ensure_ascii=False)
+        except Exception as e:
+            logger.error(f"保存社区划分失败: {e}")
+
+
+class SummaryCache:
+    """
+    社区摘要持久化缓存
+    
+    以 (成员集合, 核心关系, 模型, 提示词版本) 的哈希为键保存 LLM 生成的摘要,
+    重新运行时成员没有变化的社区直接复用, 只有发生变化的社区才重新调用 LLM。
+    缓存文件格式: output/cache/community_summary_cache.json
+    """
+    
+    def __init__(self, cache_dir: str = "./output/cache",
+                 filename: str = "community_summary_cache.json"):
+        self.cache_file = os.path.join(cache_dir, filename)
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.cache = self._load_cache()
+        self.hits = 0
+        self.misses = 0
+    
+    def _load_cache(self) -> Dict[str, Dict]:
+        """从磁盘加载缓存"""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.warning(f"加载摘要缓存失败: {e}，将创建新缓存")
+        return {}
+    
+    def save(self):
+        """保存缓存到磁盘"""
+        with self._lock:
+            try:
+                with open(self.cache_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.cache, f, ensure_ascii=False, indent=2)
+            except Exception as e:
+                logger.error(f"保存摘要缓存失败: {e}")
+    
+    @staticmethod
+    def make_key(members: List[str], relations: List[Tuple[str, str, str]],
+                 model: str, prompt_version: str) -> str:
+        """计算缓存键: 成员与关系排序后哈希, 与遍历顺序无关"""
+        payload = json.dumps(
+            [sorted(members), sorted(relations), model, prompt_version],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            value = self.cache.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+    
+    def set(self, key: str, value: Dict):
+        with self._lock:
+            self.cache[key] = value
 
 
 class CommunitySummarizer:
@@ -254,31 +451,46 @@ class CommunitySummarizer:
     1. 提取社区内的核心概念和关系
     2. 调用 LLM 生成自然语言摘要
     3. 生成社区标题和关键主题
+    
+    性能:
+    - 多个社区并发调用 LLM (max_workers), 大社区优先调度
+    - 摘要按成员/关系哈希缓存, 未变化的社区不重复生成
+    - 小于 min_llm_size 的社区直接使用规则摘要
     """
     
-    def __init__(self, model: str, ollama_host: str):
+    # 修改提示词后需递增版本号, 使旧缓存失效
+    PROMPT_VERSION = "community-summary-v1"
+    
+    def __init__(self, model: str, ollama_host: str, max_workers: int = 4,
+                 min_llm_size: int = 3, use_cache: bool = True,
+                 cache_dir: str = "./output/cache"):
+        """
+        Args:
+            model: LLM 模型名称
+            ollama_host: Ollama 服务地址
+            max_workers: 并发摘要的最大线程数
+            min_llm_size: 成员数低于该值的社区走规则摘要, 不调用 LLM
+            use_cache: 是否启用摘要缓存
+            cache_dir: 缓存目录
+        """
         self.model = model
         self.ollama_host = ollama_host
         self.api_endpoint = f"{ollama_host}/api/generate"
+        self.client = get_client(ollama_host)
+        self.max_workers = max(1, max_workers)
+        self.min_llm_size = min_llm_size
+        self.cache = SummaryCache(cache_dir) if use_cache else None
     
     def _call_ollama(self, prompt: str, system_prompt: str = "", temperature: float = 0.3) -> Optional[str]:
         """调用 Ollama API"""
         try:
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "system": system_prompt,
-                "stream": False,
-                "temperature": temperature,
-                "num_ctx": 8192,
-            }
-            
-            response = requests.post(self.api_endpoint, json=payload, timeout=180)
-            response.raise_for_status()
-            
-            result = response.json()
+            result = self.client.generate(
+                self.model, prompt, system=system_prompt,
+                options={"temperature": temperature, "num_ctx": 8192},
+                timeout=180, max_retries=1, component='community_summary'
+            )
             return result.get('response', '').strip()
-        except Exception as e:
+        except OllamaError as e:
             logger.error(f"Community Summarizer API error: {e}")
             return None
     
@@ -314,12 +526,31 @@ class CommunitySummarizer:
             (relationships_df['node_2'].isin(community_entities))
         ]
         
+        # 小社区信息量有限, 直接走规则摘要, 节省 LLM 调用
+        if len(community_entities) < self.min_llm_size:
+            return self._rule_based_summary(community_entities, community_concepts, community_relations)
+        
         # 识别核心概念: 直接按 importance 排序取前几名,作为摘要里的“主角”
         core_concepts = community_concepts.nlargest(
             min(5, len(community_concepts)), 
             'importance'
         )['entity'].tolist()
         
+        # 缓存键: 成员集合 + 提示词中使用的关系 + 模型 + 提示词版本
+        cache_key = None
+        if self.cache is not None:
+            top_relations = [
+                (str(row['node_1']), str(row['edge']), str(row['node_2']))
+                for _, row in community_relations.head(15).iterrows()
+            ]
+            cache_key = SummaryCache.make_key(
+                [str(e) for e in community_entities], top_relations,
+                self.model, self.PROMPT_VERSION
+            )
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return {**cached, 'core_concepts': core_concepts, 'size': len(community_entities)}
+        
         # 构建社区知识上下文: 选取部分概念和关系,作为 LLM 摘要的输入提示
         concepts_info = []
         for _, row in community_concepts.head(10).iterrows():
@@ -366,13 +597,21 @@ class CommunitySummarizer:
         try:
             summary_data = json.loads(response)
             
-            return {
+            result = {
                 'title': summary_data.get('title', f"社区 (含 {len(community_entities)} 个概念)"),
                 'summary': summary_data.get('summary', ''),
                 'core_concepts': core_concepts,
                 'themes': summary_data.get('themes', []),
                 'size': len(community_entities)
             }
+            # 只缓存 LLM 成功生成的摘要, 规则兜底的结果下次仍会重试
+            if cache_key is not None:
+                self.cache.set(cache_key, {
+                    'title': result['title'],
+                    'summary': result['summary'],
+                    'themes': result['themes']
+                })
+            return result
         except json.JSONDecodeError:
             # 当 LLM 没有按预期返回 JSON 时,退回到规则摘要,保证功能可用
             logger.error("JSON 解析失败,使用规则生成")
@@ -413,20 +652,37 @@ class CommunitySummarizer:
         Returns:
             DataFrame with columns: [community_id, title, summary, core_concepts, themes, size]
         """
-        logger.info(f"为 {len(communities)} 个社区生成摘要...")
+        logger.info(f"为 {len(communities)} 个社区生成摘要 (并发数: {self.max_workers})...")
         
-        summaries = []
+        # 大社区优先调度: 最重要的主题最先返回
+        ordered = sorted(communities.items(), key=lambda item: len(item[1]), reverse=True)
+        results: Dict[int, Dict] = {}
         
-        for comm_id, members in communities.items():
-            logger.debug(f"处理社区 {comm_id} ({len(members)} 成员)...")
-            
-            summary = self.summarize_community(members, concepts_df, relationships_df)
-            
-            if summary:
-                summaries.append({
-                    'community_id': comm_id,
-                    **summary
-                })
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self.summarize_community, members, concepts_df, relationships_df): comm_id
+                for comm_id, members in ordered
+            }
+            for future in as_completed(futures):
+                comm_id = futures[future]
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    logger.error(f"社区 {comm_id} 摘要失败: {e}")
+                    continue
+                if summary:
+                    results[comm_id] = summary
+                    logger.debug(f"社区 {comm_id} 摘要完成 ({summary.get('size', 0)} 成员)")
+        
+        if self.cache is not None:
+            self.cache.save()
+            logger.info(f"摘要缓存: 命中 {self.cache.hits}, 未命中 {self.cache.misses}")
+        
+        # 输出顺序与调度顺序一致 (按社区规模降序)
+        summaries = [
+            {'community_id': comm_id, **results[comm_id]}
+            for comm_id, _ in ordered if comm_id in results
+        ]
         
         summaries_df = pd.DataFrame(summaries)
         logger.info(f"社区摘要生成完成: {len(summaries_df)} 个社区")
@@ -434,6 +690,375 @@ class CommunitySummarizer:
         return summaries_df
 
 
+class LRUCache:
+    """线程安全的定长 LRU 缓存"""
+    
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._data: "OrderedDict" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+    
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def items(self) -> List[Tuple]:
+        with self._lock:
+            return list(self._data.items())
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class HybridNodeIndex:
+    """
+    节点混合检索索引 (BGE-M3 稠密向量 + 稀疏词项权重)
+    
+    - 稠密向量: L2 归一化后的 (n, d) 矩阵, 查询得分 = 矩阵 @ 查询向量 (余弦相似度)
+    - 稀疏权重: BGE-M3 lexical_weights 组成的 (n, vocab) CSR 矩阵, 查询得分 = CSR @ 查询稀疏向量
+    - 融合方式:
+        linear: alpha * dense + (1 - alpha) * sparse (稀疏得分按本次查询最大值归一化到 [0, 1])
+        rrf:    Reciprocal Rank Fusion, sum(1 / (rrf_k + rank))
+    
+    对拉丁学名 (如 Bursaphelenchus xylophilus) 这类稠密向量区分度不高的词,
+    稀疏词项匹配能显著提升召回, 而一次查询只需一次稠密和一次稀疏矩阵乘法。
+    """
+    
+    FUSIONS = ('linear', 'rrf')
+    
+    def __init__(self, entities: List[str], dense: np.ndarray,
+                 lexical_weights: Optional[List[Dict]] = None):
+        """
+        Args:
+            entities: 节点名称列表
+            dense: 稠密向量 (n, d)
+            lexical_weights: 每个节点的 {token_id: weight}, 为空时只做稠密检索
+        """
+        self.entities = list(entities)
+        self.positions = {entity: i for i, entity in enumerate(self.entities)}
+        dense = np.asarray(dense, dtype=np.float32)
+        norms = np.linalg.norm(dense, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.dense = dense / norms
+        
+        self.sparse = None
+        self.vocab_size = 0
+        if lexical_weights is not None and SCIPY_AVAILABLE:
+            self.sparse = self._build_sparse(lexical_weights)
+    
+    def __len__(self) -> int:
+        return len(self.entities)
+    
+    @property
+    def has_sparse(self) -> bool:
+        return self.sparse is not None and self.sparse.nnz > 0
+    
+    def _build_sparse(self, lexical_weights: List[Dict]) -> 'sp.csr_matrix':
+        """将 lexical_weights 列表一次性组装为 CSR 矩阵"""
+        indptr = [0]
+        indices: List[int] = []
+        values: List[float] = []
+        for weights in lexical_weights:
+            for token_id, weight in weights.items():
+                indices.append(int(token_id))
+                values.append(float(weight))
+            indptr.append(len(indices))
+        
+        self.vocab_size = (max(indices) + 1) if indices else 1
+        matrix = sp.csr_matrix(
+            (np.asarray(values, dtype=np.float32), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+            shape=(len(lexical_weights), self.vocab_size)
+        )
+        matrix.sum_duplicates()
+        return matrix
+    
+    def dense_scores(self, query_dense: np.ndarray) -> np.ndarray:
+        query = np.asarray(query_dense, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        return self.dense @ query
+    
+    def sparse_scores(self, query_weights: Optional[Dict]) -> Optional[np.ndarray]:
+        """稀疏得分; 索引或查询没有稀疏权重时返回 None"""
+        if not self.has_sparse or not query_weights:
+            return None
+        # 只保留索引词表中出现过的 token, 其余 token 不可能命中任何节点
+        pairs = [(int(t), float(w)) for t, w in query_weights.items() if int(t) < self.vocab_size]
+        if not pairs:
+            return np.zeros(len(self.entities), dtype=np.float32)
+        cols, vals = zip(*pairs)
+        query = sp.csr_matrix(
+            (np.asarray(vals, dtype=np.float32), (np.asarray(cols), np.zeros(len(cols), dtype=np.int64))),
+            shape=(self.vocab_size, 1)
+        )
+        return (self.sparse @ query).toarray().ravel()
+    
+    def search(self, query_dense: np.ndarray, query_weights: Optional[Dict] = None,
+               top_k: int = 5, fusion: str = 'linear', alpha: float = 0.7,
+               rrf_k: int = 60) -> List[Tuple[str, float]]:
+        """
+        对全部节点打分并返回 Top-K
+        
+        Returns:
+            [(entity, score), ...] 按得分降序
+        """
+        if not self.entities:
+            return []
+        
+        dense = self.dense_scores(query_dense)
+        sparse = self.sparse_scores(query_weights)
+        
+        if sparse is None:
+            scores = dense
+        elif fusion == 'rrf':
+            scores = self._rrf(dense, rrf_k) + self._rrf(sparse, rrf_k)
+        else:
+            peak = float(sparse.max())
+            if peak > 0:
+                sparse = sparse / peak
+            scores = alpha * dense + (1 - alpha) * sparse
+        
+        top_k = min(top_k, len(self.entities))
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        ranked = candidates[np.argsort(-scores[candidates])]
+        return [(self.entities[i], float(scores[i])) for i in ranked]
+    
+    def search_batch(self, query_dense: np.ndarray, query_weights: Optional[List[Optional[Dict]]] = None,
+                     top_k: int = 5, fusion: str = 'linear', alpha: float = 0.7,
+                     rrf_k: int = 60) -> List[List[Tuple[str, float]]]:
+        """
+        批量检索: 稠密得分一次 (m, d) @ (d, n) 矩阵乘法, 稀疏得分一次 CSR 乘法
+        
+        Returns:
+            每个查询的 [(entity, score), ...]
+        """
+        if not self.entities:
+            return [[] for _ in range(len(query_dense))]
+        
+        queries = np.asarray(query_dense, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        dense = (queries / norms) @ self.dense.T
+        
+        sparse = None
+        if self.has_sparse and query_weights is not None:
+            rows, cols, vals = [], [], []
+            for row, weights in enumerate(query_weights):
+                for token_id, weight in (weights or {}).items():
+                    if int(token_id) < self.vocab_size:
+                        rows.append(row)
+                        cols.append(int(token_id))
+                        vals.append(float(weight))
+            query_matrix = sp.csr_matrix(
+                (np.asarray(vals, dtype=np.float32), (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))),
+                shape=(len(queries), self.vocab_size)
+            )
+            sparse = (query_matrix @ self.sparse.T).toarray()
+        
+        top_k = min(top_k, len(self.entities))
+        results = []
+        for i in range(len(queries)):
+            if sparse is None:
+                scores = dense[i]
+            elif fusion == 'rrf':
+                scores = self._rrf(dense[i], rrf_k) + self._rrf(sparse[i], rrf_k)
+            else:
+                row = sparse[i]
+                peak = float(row.max())
+                scores = alpha * dense[i] + (1 - alpha) * (row / peak if peak > 0 else row)
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+            ranked = candidates[np.argsort(-scores[candidates])]
+            results.append([(self.entities[j], float(scores[j])) for j in ranked])
+        return results
+    
+    @staticmethod
+    def _rrf(scores: np.ndarray, rrf_k: int) -> np.ndarray:
+        ranks = np.empty(len(scores), dtype=np.float64)
+        ranks[np.argsort(-scores)] = np.arange(1, len(scores) + 1)
+        return 1.0 / (rrf_k + ranks)
+
+
+class ContextBuilder:
+    """
+    Local Search 提示词上下文组装
+    
+    按相关度对子图节点和关系排序, 在 token 预算内尽量填充:
+    - 节点得分 = max(查询相似度, 0) × hop_decay ^ 距种子节点跳数
+    - 关系得分 = 关系权重 × 两端节点得分均值
+    节点属性通过预先构建的字典查询, 不再逐节点过滤 DataFrame。
+    """
+    
+    _CJK = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]')
+    
+    def __init__(self, token_budget: int, hop_decay: float = 0.6):
+        self.token_budget = token_budget
+        self.hop_decay = hop_decay
+    
+    @classmethod
+    def estimate_tokens(cls, text: str) -> int:
+        """粗略估算 token 数: 中日韩字符约 1 token/字, 其余约 4 字符/token"""
+        cjk = len(cls._CJK.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+    
+    @staticmethod
+    def hop_distances(seed_nodes: List[str], subgraph_rels: pd.DataFrame) -> Dict[str, int]:
+        """在子图内从种子节点做 BFS, 返回各节点跳数"""
+        adjacency = defaultdict(set)
+        for a, b in zip(subgraph_rels['node_1'], subgraph_rels['node_2']):
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+        
+        distances = {node: 0 for node in seed_nodes}
+        frontier = list(seed_nodes)
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                for neighbor in adjacency[node]:
+                    if neighbor not in distances:
+                        distances[neighbor] = distances[node] + 1
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        return distances
+    
+    def build(self, node_similarity: Dict[str, float], seed_nodes: List[str],
+              subgraph_nodes: Set[str], subgraph_rels: pd.DataFrame,
+              node_attributes: Dict[str, Tuple[str, float]]) -> Tuple[List[str], List[str]]:
+        """
+        Args:
+            node_similarity: {entity: 查询相似度}
+            seed_nodes: 种子节点
+            subgraph_nodes: 子图节点
+            subgraph_rels: 子图关系
+            node_attributes: {entity: (category, importance)}
+        
+        Returns:
+            (节点行列表, 关系行列表), 总 token 数不超过预算
+        """
+        distances = self.hop_distances(seed_nodes, subgraph_rels)
+        max_hop = max(distances.values(), default=0) + 1
+        
+        node_scores = {
+            node: max(node_similarity.get(node, 0.0), 0.0)
+            * self.hop_decay ** distances.get(node, max_hop)
+            for node in subgraph_nodes
+        }
+        
+        candidates = []
+        for node, score in node_scores.items():
+            category, importance = node_attributes.get(node, ('unknown', 1))
+            candidates.append((score, 0, f"- {node} ({category or 'unknown'}类, 重要性: {importance})"))
+        
+        if not subgraph_rels.empty:
+            if 'weight' in subgraph_rels.columns:
+                weights = subgraph_rels['weight'].fillna(1.0)
+            else:
+                weights = [1.0] * len(subgraph_rels)
+            for a, edge, b, weight in zip(subgraph_rels['node_1'], subgraph_rels['edge'],
+                                          subgraph_rels['node_2'], weights):
+                score = float(weight) * (node_scores.get(a, 0.0) + node_scores.get(b, 0.0)) / 2
+                candidates.append((score, 1, f"- {a} → {edge} → {b}"))
+        
+        # 得分高的先入选, 超出预算的条目跳过 (后面较短的条目仍可能放得下)
+        candidates.sort(key=lambda item: item[0], reverse=True)
+        node_lines, rel_lines = [], []
+        remaining = self.token_budget
+        for _, kind, line in candidates:
+            cost = self.estimate_tokens(line) + 1
+            if cost > remaining:
+                continue
+            remaining -= cost
+            (node_lines if kind == 0 else rel_lines).append(line)
+        
+        logger.debug(
+            f"Context: {len(node_lines)}/{len(subgraph_nodes)} nodes, "
+            f"{len(rel_lines)}/{len(subgraph_rels)} relations, "
+            f"{self.token_budget - remaining}/{self.token_budget} tokens"
+        )
+        return node_lines, rel_lines
+
+
+class AdjacencyIndex:
+    """
+    关系邻接索引: entity -> [(neighbor, 归一化权重, 关系行号)]
+    
+    由关系表一次性构建, 子图扩展时按节点直接取邻居, 不再对整个关系表做布尔过滤。
+    """
+    
+    def __init__(self, relationships_df: pd.DataFrame):
+        self.relationships_df = relationships_df
+        self.neighbors: Dict[str, List[Tuple[str, float, int]]] = defaultdict(list)
+        
+        if 'weight' in relationships_df.columns:
+            weights = relationships_df['weight'].fillna(1.0).to_numpy(dtype=float)
+        else:
+            weights = np.ones(len(relationships_df))
+        peak = float(weights.max()) if len(weights) else 1.0
+        if peak > 0:
+            weights = weights / peak
+        
+        for row, (a, b, w) in enumerate(zip(relationships_df['node_1'], relationships_df['node_2'], weights)):
+            w = float(w)
+            self.neighbors[a].append((b, w, row))
+            if b != a:
+                self.neighbors[b].append((a, w, row))
+    
+    def expand_from(self, seed: str, max_hops: int, max_nodes: int,
+                    hop_decay: float) -> Dict[str, float]:
+        """
+        从单个种子做加权最优优先扩展
+        
+        优先级 = 路径上边权之积 × hop_decay ^ 跳数, 始终先扩展得分最高的节点,
+        接受 max_nodes 个节点后停止, 因此枢纽节点的邻居数不会撑大子图。
+        
+        Returns:
+            {entity: 相对得分}, 种子为 1.0
+        """
+        scores: Dict[str, float] = {}
+        heap = [(-1.0, 0, seed)]
+        while heap and len(scores) < max_nodes:
+            neg_score, hops, node = heapq.heappop(heap)
+            if node in scores:
+                continue
+            scores[node] = -neg_score
+            if hops >= max_hops:
+                continue
+            for neighbor, weight, _ in self.neighbors.get(node, ()):
+                if neighbor not in scores:
+                    heapq.heappush(heap, (neg_score * weight * hop_decay, hops + 1, neighbor))
+        return scores
+    
+    def edges_within(self, node_scores: Dict[str, float], max_edges: int) -> List[int]:
+        """子图内部的关系行号, 按 权重 × 两端得分较小值 排序后取前 max_edges 条"""
+        ranked = {}
+        for node, score in node_scores.items():
+            for neighbor, weight, row in self.neighbors.get(node, ()):
+                if row in ranked or neighbor not in node_scores:
+                    continue
+                ranked[row] = weight * min(score, node_scores[neighbor])
+        return sorted(ranked, key=ranked.get, reverse=True)[:max_edges]
+
+
 class LocalSearchEngine:
     """
     Local Search 引擎 - 基于向量索引的精确检索
@@ -446,16 +1071,45 @@ class LocalSearchEngine:
     """
     
     def __init__(self, model: str, ollama_host: str = "http://localhost:11434",
-                 embedding_model: str = "BAAI/bge-m3"):
+                 embedding_model: str = "BAAI/bge-m3",
+                 retrieval_mode: str = 'hybrid', fusion: str = 'linear',
+                 alpha: float = 0.7, rrf_k: int = 60,
+                 embedding_cache_size: int = 256, answer_cache_size: int = 256,
+                 semantic_cache_threshold: Optional[float] = None,
+                 num_ctx: int = 8192, context_token_budget: Optional[int] = None,
+                 answer_token_reserve: int = 1024,
+                 max_subgraph_nodes: int = 60, max_subgraph_edges: int = 120,
+                 hop_decay: float = 0.6):
         """
         Args:
             model: LLM 模型名称
             ollama_host: Ollama 服务地址
             embedding_model: Embedding 模型名称
+            retrieval_mode: 'hybrid' (稠密 + 稀疏) 或 'dense'
+            fusion: 混合检索融合方式 ('linear' 或 'rrf')
+            alpha: linear 融合时稠密得分的权重
+            rrf_k: rrf 融合的平滑常数
+            embedding_cache_size: 查询 Embedding LRU 容量 (0 表示关闭)
+            answer_cache_size: 答案缓存容量 (0 表示关闭)
+            semantic_cache_threshold: 近似问题复用答案的查询相似度阈值 (None 表示只做精确匹配)
+            num_ctx: LLM 上下文窗口大小
+            context_token_budget: 子图上下文的 token 预算, 为空时按 num_ctx 扣除提示词模板和答案预留自动计算
+            answer_token_reserve: 为答案预留的 token 数
+            max_subgraph_nodes: 子图扩展的节点预算
+            max_subgraph_edges: 子图扩展的关系预算
+            hop_decay: 子图扩展每多一跳的得分衰减
         """
         self.model = model
         self.ollama_host = ollama_host
         self.api_endpoint = f"{ollama_host}/api/generate"
+        self.client = get_client(ollama_host)
+        
+        if fusion not in HybridNodeIndex.FUSIONS:
+            raise ValueError(f"不支持的融合方式: {fusion}")
+        self.retrieval_mode = retrieval_mode
+        self.fusion = fusion
+        self.alpha = alpha
+        self.rrf_k = rrf_k
         
         # 初始化 Embedding 模型
         try:
@@ -471,35 +1125,116 @@ class LocalSearchEngine:
             logger.error(f"Failed to load embedding model: {e}")
             raise
         
-        # 节点索引：{entity: embedding}
-        self.node_index = {}
+        # 节点索引 (build_node_index 构建)
+        self.node_index: Optional[HybridNodeIndex] = None
+        self.graph_version: Optional[str] = None
+        
+        # 两级缓存: 规范化查询 -> (dense, lexical); 答案键 -> 答案
+        self.embedding_cache = LRUCache(embedding_cache_size)
+        self.answer_cache = LRUCache(answer_cache_size)
+        self.semantic_cache_threshold = semantic_cache_threshold
+        
+        # 上下文预算与节点属性字典 (build_node_index 时构建)
+        self.num_ctx = num_ctx
+        self.context_token_budget = context_token_budget
+        self.answer_token_reserve = answer_token_reserve
+        self.node_attributes: Dict[str, Tuple[str, float]] = {}
+        
+        # 子图扩展: 邻接索引 (按关系表对象缓存) 与单种子扩展结果缓存
+        self.max_subgraph_nodes = max_subgraph_nodes
+        self.max_subgraph_edges = max_subgraph_edges
+        self.hop_decay = hop_decay
+        self.adjacency: Optional[AdjacencyIndex] = None
+        self.expansion_cache = LRUCache(4096)
+    
+    @property
+    def use_sparse(self) -> bool:
+        return self.retrieval_mode == 'hybrid' and SCIPY_AVAILABLE
+    
+    def _encode(self, texts: List[str], batch_size: int = 32) -> Tuple[np.ndarray, Optional[List[Dict]]]:
+        """一次 encode 同时得到稠密向量和 (混合模式下的) 稀疏词项权重"""
+        output = self.embedder.encode(
+            texts,
+            batch_size=batch_size,
+            max_length=512,
+            return_dense=True,
+            return_sparse=self.use_sparse,
+            return_colbert_vecs=False
+        )
+        lexical = output.get('lexical_weights') if self.use_sparse else None
+        return np.asarray(output['dense_vecs']), lexical
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """规范化查询文本: 全半角统一、去首尾空白和结尾标点、合并空白、小写"""
+        text = unicodedata.normalize('NFKC', query).strip().lower()
+        text = " ".join(text.split())
+        return text.rstrip("?？.。!！ ")
+    
+    def _encode_query(self, query: str) -> Tuple[np.ndarray, Optional[Dict]]:
+        """查询 Embedding (带 LRU 缓存, 重复问题无需再次编码)"""
+        key = self.normalize_query(query)
+        cached = self.embedding_cache.get(key)
+        if cached is not None:
+            return cached
+        dense, lexical = self._encode([query], batch_size=1)
+        result = (dense[0], lexical[0] if lexical else None)
+        self.embedding_cache.set(key, result)
+        return result
+    
+    def _encode_queries(self, queries: List[str]) -> Tuple[np.ndarray, List[Optional[Dict]]]:
+        """批量查询 Embedding: 未命中缓存的查询合并为一次 encode 调用"""
+        keys = [self.normalize_query(q) for q in queries]
+        cached = [self.embedding_cache.get(key) for key in keys]
+        missing = [i for i, item in enumerate(cached) if item is None]
+        if missing:
+            dense, lexical = self._encode([queries[i] for i in missing])
+            for pos, i in enumerate(missing):
+                cached[i] = (dense[pos], lexical[pos] if lexical else None)
+                self.embedding_cache.set(keys[i], cached[i])
+        return np.vstack([item[0] for item in cached]), [item[1] for item in cached]
+    
+    def clear_caches(self) -> None:
+        """清空查询与答案缓存 (图谱版本变化时调用)"""
+        self.embedding_cache.clear()
+        self.answer_cache.clear()
+    
+    def cache_stats(self) -> Dict:
+        return {
+            'graph_version': self.graph_version,
+            'embedding_cache': {'size': len(self.embedding_cache), 'hits': self.embedding_cache.hits,
+                                'misses': self.embedding_cache.misses},
+            'answer_cache': {'size': len(self.answer_cache), 'hits': self.answer_cache.hits,
+                             'misses': self.answer_cache.misses},
+        }
     
-    def build_node_index(self, concepts_df: pd.DataFrame) -> None:
+    def build_node_index(self, concepts_df: pd.DataFrame,
+                         graph_version: Optional[str] = None) -> None:
         """
-        为所有节点构建 Embedding 索引
+        为所有节点构建混合检索索引
+        
+        重建索引意味着图谱已变化, 同时清空答案缓存。
         
         Args:
             concepts_df: 概念 DataFrame
+            graph_version: 图谱版本号
         """
         logger.info(f"Building node index for {len(concepts_df)} concepts...")
+        self.answer_cache.clear()
+        self.graph_version = graph_version
         
         entities = concepts_df['entity'].tolist()
         
-        # 批量生成 Embedding
-        embeddings = self.embedder.encode(
-            entities,
-            batch_size=32,
-            max_length=512,
-            return_dense=True,
-            return_sparse=False,
-            return_colbert_vecs=False
-        )['dense_vecs']
+        # 批量生成 Embedding (稠密 + 稀疏一次完成)
+        dense, lexical = self._encode(entities)
+        self.node_index = HybridNodeIndex(entities, dense, lexical)
         
-        # 构建索引
-        for entity, embedding in zip(entities, embeddings):
-            self.node_index[entity] = embedding
+        self.node_attributes = self._node_attributes(concepts_df)
         
-        logger.info(f"✓ Node index built: {len(self.node_index)} nodes")
+        logger.info(
+            f"✓ Node index built: {len(self.node_index)} nodes "
+            f"({'hybrid' if self.node_index.has_sparse else 'dense'})"
+        )
     
     def search_relevant_nodes(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
         """
@@ -517,119 +1252,213 @@ class LocalSearchEngine:
             return []
         
         # 生成查询 Embedding
-        query_embedding = self.embedder.encode(
-            [query],
-            batch_size=1,
-            max_length=512,
-            return_dense=True,
-            return_sparse=False,
-            return_colbert_vecs=False
-        )['dense_vecs'][0]
+        dense, lexical = self._encode_query(query)
         
-        # 计算相似度
-        similarities = []
-        for entity, node_embedding in self.node_index.items():
-            # 余弦相似度
-            similarity = np.dot(query_embedding, node_embedding) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(node_embedding)
-            )
-            similarities.append((entity, float(similarity)))
+        return self.node_index.search(
+            dense, lexical, top_k,
+            fusion=self.fusion, alpha=self.alpha, rrf_k=self.rrf_k
+        )
+    
+    # ------------------------------------------------------------------
+    # 答案缓存
+    # ------------------------------------------------------------------
+    
+    def _answer_cache_key(self, query: str, relevant_nodes: List[Tuple[str, float]],
+                          subgraph_nodes: Set[str], subgraph_rels: pd.DataFrame) -> Tuple:
+        """答案缓存键: (规范化查询, Top-K 节点集合, 子图哈希, 模型)"""
+        return (
+            self.normalize_query(query),
+            self._subgraph_key(relevant_nodes, subgraph_nodes, subgraph_rels),
+            self.model,
+        )
+    
+    @staticmethod
+    def _node_attributes(concepts_df: pd.DataFrame) -> Dict[str, Tuple[str, Any]]:
+        """实体 -> (类别, 重要性); 缺少 category/importance 列时使用默认值"""
+        entities = concepts_df['entity'].tolist()
+        categories = concepts_df['category'] if 'category' in concepts_df.columns else ['unknown'] * len(entities)
+        importances = concepts_df['importance'] if 'importance' in concepts_df.columns else [1] * len(entities)
+        return {
+            entity: (category, importance)
+            for entity, category, importance in zip(entities, categories, importances)
+        }
+    
+    @staticmethod
+    def _subgraph_key(relevant_nodes: List[Tuple[str, float]], subgraph_nodes: Set[str],
+                      subgraph_rels: pd.DataFrame) -> Tuple:
+        digest = hashlib.sha1()
+        for node in sorted(subgraph_nodes):
+            digest.update(node.encode('utf-8'))
+            digest.update(b'\0')
+        if not subgraph_rels.empty:
+            triples = sorted(zip(
+                subgraph_rels['node_1'].astype(str),
+                subgraph_rels['edge'].astype(str),
+                subgraph_rels['node_2'].astype(str)
+            ))
+            for triple in triples:
+                digest.update("\t".join(triple).encode('utf-8'))
+                digest.update(b'\n')
+        return frozenset(node for node, _ in relevant_nodes), digest.hexdigest()
+    
+    def lookup_answer(self, retrieval: Dict) -> Optional[str]:
+        """
+        查找缓存答案
         
-        # 按相似度排序
-        similarities.sort(key=lambda x: x[1], reverse=True)
+        先按完整键精确匹配; 开启语义匹配时, 再查找检索到相同子图且查询
+        Embedding 相似度不低于阈值的已缓存问题 (换一种问法的同一问题)。
+        """
+        key = retrieval.get('cache_key')
+        if key is None:
+            return None
+        entry = self.answer_cache.get(key)
+        if entry is not None:
+            return entry['answer']
         
-        return similarities[:top_k]
+        if self.semantic_cache_threshold is None:
+            return None
+        query_vec, _ = self._encode_query(retrieval['query'])
+        query_vec = query_vec / (np.linalg.norm(query_vec) or 1.0)
+        for (_, subgraph_key, model), entry in self.answer_cache.items():
+            if subgraph_key != key[1] or model != key[2]:
+                continue
+            if float(np.dot(query_vec, entry['query_vec'])) >= self.semantic_cache_threshold:
+                self.answer_cache.hits += 1
+                return entry['answer']
+        return None
+    
+    def store_answer(self, retrieval: Dict, answer: str) -> None:
+        key = retrieval.get('cache_key')
+        if key is None or not answer:
+            return
+        query_vec, _ = self._encode_query(retrieval['query'])
+        self.answer_cache.set(key, {
+            'answer': answer,
+            'query_vec': query_vec / (np.linalg.norm(query_vec) or 1.0),
+        })
+    
+    def _get_adjacency(self, relationships_df: pd.DataFrame) -> AdjacencyIndex:
+        """获取关系表对应的邻接索引, 关系表对象变化时重建"""
+        if self.adjacency is None or self.adjacency.relationships_df is not relationships_df:
+            self.adjacency = AdjacencyIndex(relationships_df)
+            self.expansion_cache.clear()
+        return self.adjacency
     
     def expand_subgraph(self, seed_nodes: List[str], 
                        relationships_df: pd.DataFrame,
-                       max_hops: int = 2) -> Tuple[Set[str], pd.DataFrame]:
+                       max_hops: int = 2,
+                       seed_scores: Optional[Dict[str, float]] = None) -> Tuple[Set[str], pd.DataFrame, Dict[str, float]]:
         """
-        从种子节点扩展子图
+        从种子节点做加权最优优先扩展
+        
+        每个种子单独扩展 (结果按种子缓存, 多个查询共享相同种子的扩展),
+        节点得分 = 种子得分 × 相对得分, 多个种子取最大值;
+        最终按得分保留 max_subgraph_nodes 个节点和 max_subgraph_edges 条关系。
         
         Args:
             seed_nodes: 种子节点列表
             relationships_df: 关系 DataFrame
             max_hops: 最大跳数
+            seed_scores: 种子节点得分 (检索相似度), 缺省为 1.0
         
         Returns:
-            (subgraph_nodes, subgraph_relationships)
+            (subgraph_nodes, subgraph_relationships, node_scores)
         """
-        subgraph_nodes = set(seed_nodes)
-        current_nodes = set(seed_nodes)
-        
-        # 多跳扩展
-        for hop in range(max_hops):
-            next_nodes = set()
-            
-            for node in current_nodes:
-                # 查找直接连接的节点
-                neighbors = relationships_df[
-                    (relationships_df['node_1'] == node) | 
-                    (relationships_df['node_2'] == node)
-                ]
-                
-                for _, row in neighbors.iterrows():
-                    next_nodes.add(row['node_1'])
-                    next_nodes.add(row['node_2'])
-            
-            subgraph_nodes.update(next_nodes)
-            current_nodes = next_nodes
-            
-            if not next_nodes:
-                break
-        
-        # 提取子图关系
-        subgraph_rels = relationships_df[
-            (relationships_df['node_1'].isin(subgraph_nodes)) &
-            (relationships_df['node_2'].isin(subgraph_nodes))
-        ]
+        adjacency = self._get_adjacency(relationships_df)
+        seed_scores = seed_scores or {}
+        
+        node_scores: Dict[str, float] = {}
+        for seed in seed_nodes:
+            key = (seed, max_hops, self.max_subgraph_nodes, self.hop_decay)
+            expansion = self.expansion_cache.get(key)
+            if expansion is None:
+                expansion = adjacency.expand_from(seed, max_hops, self.max_subgraph_nodes, self.hop_decay)
+                self.expansion_cache.set(key, expansion)
+            base = max(seed_scores.get(seed, 1.0), 1e-6)
+            for node, score in expansion.items():
+                combined = base * score
+                if combined > node_scores.get(node, 0.0):
+                    node_scores[node] = combined
+        
+        # 种子节点总是保留
+        budget = max(self.max_subgraph_nodes, len(seed_nodes))
+        if len(node_scores) > budget:
+            kept = sorted(node_scores, key=node_scores.get, reverse=True)[:budget]
+            kept_set = set(kept) | set(seed_nodes)
+            node_scores = {node: node_scores[node] for node in kept_set if node in node_scores}
+        
+        rows = adjacency.edges_within(node_scores, self.max_subgraph_edges)
+        subgraph_rels = relationships_df.iloc[rows]
+        subgraph_nodes = set(node_scores)
         
         logger.debug(f"Expanded subgraph: {len(subgraph_nodes)} nodes, {len(subgraph_rels)} relationships")
         
-        return subgraph_nodes, subgraph_rels
+        return subgraph_nodes, subgraph_rels, node_scores
     
     def _call_ollama(self, prompt: str, system_prompt: str = "", temperature: float = 0.3) -> Optional[str]:
         """调用 Ollama API"""
         try:
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "system": system_prompt,
-                "stream": False,
-                "temperature": temperature,
-                "num_ctx": 8192,
-            }
-            
-            response = requests.post(self.api_endpoint, json=payload, timeout=180)
-            response.raise_for_status()
-            
-            result = response.json()
+            result = self.client.generate(
+                self.model, prompt, system=system_prompt,
+                options={"temperature": temperature, "num_ctx": self.num_ctx},
+                timeout=180, max_retries=1, component='local_search'
+            )
             return result.get('response', '').strip()
-        except Exception as e:
+        except OllamaError as e:
             logger.error(f"Local Search API error: {e}")
             return None
     
-    def answer_query(self, query: str, 
-                    concepts_df: pd.DataFrame,
-                    relationships_df: pd.DataFrame,
-                    top_k: int = 5,
-                    max_hops: int = 2) -> Dict:
+    def _stream_ollama(self, prompt: str, system_prompt: str = "",
+                       temperature: float = 0.3) -> Iterator[str]:
         """
-        基于 Local Search 回答用户查询
+        以流式方式调用 Ollama API, 逐个产出生成的文本片段
         
-        Args:
-            query: 用户查询
-            concepts_df: 概念 DataFrame
-            relationships_df: 关系 DataFrame
-            top_k: 检索节点数
-            max_hops: 子图扩展跳数
+        调用方提前关闭生成器 (generator.close()) 时会同时关闭 HTTP 连接,
+        Ollama 检测到连接断开后会停止生成, 不再为已放弃的请求占用算力。
+        """
+        yield from self.client.stream_generate(
+            self.model, prompt, system=system_prompt,
+            options={"temperature": temperature, "num_ctx": self.num_ctx},
+            timeout=180, component='local_search'
+        )
+    
+    _USER_PROMPT_OVERHEAD = 40  # 用户提示词模板中固定文字的 token 数
+    
+    def _context_budget(self, query: str, system_prompt: str) -> int:
+        """子图上下文可用的 token 数"""
+        if self.context_token_budget is not None:
+            return self.context_token_budget
+        used = (
+            ContextBuilder.estimate_tokens(system_prompt)
+            + ContextBuilder.estimate_tokens(query)
+            + self._USER_PROMPT_OVERHEAD
+            + self.answer_token_reserve
+        )
+        return max(self.num_ctx - used, 256)
+    
+    def _node_similarity(self, query: str, nodes: Set[str]) -> Dict[str, float]:
+        """子图节点与查询的稠密相似度 (查询 Embedding 来自缓存)"""
+        dense, _ = self._encode_query(query)
+        scores = self.node_index.dense_scores(dense)
+        positions = self.node_index.positions
+        return {node: float(scores[positions[node]]) for node in nodes if node in positions}
+    
+    def retrieve(self, query: str,
+                 concepts_df: pd.DataFrame,
+                 relationships_df: pd.DataFrame,
+                 top_k: int = 5,
+                 max_hops: int = 2) -> Dict:
+        """
+        检索阶段: 相关节点检索 + 子图扩展 + 构建提示词
         
         Returns:
             {
                 'query': str,
                 'relevant_nodes': List[Tuple[str, float]],
-                'subgraph_size': int,
-                'answer': str
+                'subgraph_nodes': Set[str],
+                'subgraph_relations': pd.DataFrame,
+                'system_prompt': str,   # 未检索到节点时为空
+                'user_prompt': str
             }
         """
         logger.info(f"Processing query: {query}")
@@ -641,8 +1470,10 @@ class LocalSearchEngine:
             return {
                 'query': query,
                 'relevant_nodes': [],
-                'subgraph_size': 0,
-                'answer': '未找到相关信息。'
+                'subgraph_nodes': set(),
+                'subgraph_relations': relationships_df.iloc[0:0],
+                'system_prompt': '',
+                'user_prompt': ''
             }
         
         logger.info(f"Found {len(relevant_nodes)} relevant nodes")
@@ -651,27 +1482,21 @@ class LocalSearchEngine:
         
         # 2. 扩展子图
         seed_nodes = [node for node, _ in relevant_nodes]
-        subgraph_nodes, subgraph_rels = self.expand_subgraph(
-            seed_nodes, relationships_df, max_hops
+        subgraph_nodes, subgraph_rels, _ = self.expand_subgraph(
+            seed_nodes, relationships_df, max_hops, seed_scores=dict(relevant_nodes)
         )
         
-        # 3. 构建上下文
-        context_nodes = []
-        for node in list(subgraph_nodes)[:20]:  # 限制上下文大小
-            node_info = concepts_df[concepts_df['entity'] == node]
-            if not node_info.empty:
-                row = node_info.iloc[0]
-                context_nodes.append(
-                    f"- {row['entity']} ({row.get('category', 'unknown')}类, 重要性: {row.get('importance', 1)})"
-                )
-        
-        context_rels = []
-        for _, row in subgraph_rels.head(30).iterrows():  # 限制关系数量
-            context_rels.append(
-                f"- {row['node_1']} → {row['edge']} → {row['node_2']}"
-            )
+        return self._assemble_retrieval(
+            query, relevant_nodes, subgraph_nodes, subgraph_rels, concepts_df
+        )
+    
+    def _assemble_retrieval(self, query: str, relevant_nodes: List[Tuple[str, float]],
+                            subgraph_nodes: Set[str], subgraph_rels: pd.DataFrame,
+                            concepts_df: pd.DataFrame) -> Dict:
+        """根据检索到的节点和子图构建提示词, 返回 retrieve() 格式的结果"""
+        seed_nodes = [node for node, _ in relevant_nodes]
         
-        # 4. 生成答案
+        # 3. 构建提示词模板
         system_prompt = """你是松材线虫病知识图谱问答助手。你的任务是基于提供的知识子图回答用户问题。
 
 ## 任务
@@ -685,25 +1510,516 @@ class LocalSearchEngine:
 - 引用具体的实体和关系来支持你的答案
 - 如果有多个相关实体，请列举说明"""
         
+        # 4. 在 token 预算内按相关度组装上下文
+        # 种子节点取检索得分与稠密相似度的较大值 (稀疏命中的种子稠密相似度可能偏低)
+        similarity = self._node_similarity(query, subgraph_nodes)
+        for node, score in relevant_nodes:
+            similarity[node] = max(similarity.get(node, 0.0), score)
+        
+        node_attributes = self.node_attributes or self._node_attributes(concepts_df)
+        builder = ContextBuilder(self._context_budget(query, system_prompt))
+        context_nodes, context_rels = builder.build(
+            similarity, seed_nodes, subgraph_nodes, subgraph_rels, node_attributes
+        )
+        
         user_prompt = f"""用户问题: {query}
 
 **相关概念**:
-{chr(10).join(context_nodes[:15])}
+{chr(10).join(context_nodes)}
 
 **相关关系**:
-{chr(10).join(context_rels[:20])}
+{chr(10).join(context_rels)}
 
 请基于以上知识图谱信息回答问题。"""
         
-        answer = self._call_ollama(user_prompt, system_prompt, temperature=0.2)
+        return {
+            'query': query,
+            'relevant_nodes': relevant_nodes,
+            'subgraph_nodes': subgraph_nodes,
+            'subgraph_relations': subgraph_rels,
+            'system_prompt': system_prompt,
+            'user_prompt': user_prompt,
+            'cache_key': self._answer_cache_key(query, relevant_nodes, subgraph_nodes, subgraph_rels)
+        }
+    
+    def answer_query(self, query: str, 
+                    concepts_df: pd.DataFrame,
+                    relationships_df: pd.DataFrame,
+                    top_k: int = 5,
+                    max_hops: int = 2) -> Dict:
+        """
+        基于 Local Search 回答用户查询
+        
+        Args:
+            query: 用户查询
+            concepts_df: 概念 DataFrame
+            relationships_df: 关系 DataFrame
+            top_k: 检索节点数
+            max_hops: 子图扩展跳数
+        
+        Returns:
+            {
+                'query': str,
+                'relevant_nodes': List[Tuple[str, float]],
+                'subgraph_size': int,
+                'subgraph_relations': pd.DataFrame,
+                'answer': str,
+                'cached': bool   # 答案是否来自缓存
+            }
+        """
+        retrieval = self.retrieve(query, concepts_df, relationships_df, top_k, max_hops)
+        
+        if not retrieval['relevant_nodes']:
+            return {
+                'query': query,
+                'relevant_nodes': [],
+                'subgraph_size': 0,
+                'subgraph_relations': retrieval['subgraph_relations'],
+                'answer': '未找到相关信息。',
+                'cached': False
+            }
+        
+        answer = self.lookup_answer(retrieval)
+        cached = answer is not None
+        if not cached:
+            answer = self._call_ollama(
+                retrieval['user_prompt'], retrieval['system_prompt'], temperature=0.2
+            )
+            # 只缓存成功生成的答案
+            self.store_answer(retrieval, answer)
         
         if not answer:
             answer = "抱歉，生成答案失败。请稍后重试。"
         
         return {
             'query': query,
-            'relevant_nodes': relevant_nodes,
-            'subgraph_size': len(subgraph_nodes),
+            'relevant_nodes': retrieval['relevant_nodes'],
+            'subgraph_size': len(retrieval['subgraph_nodes']),
+            'subgraph_relations': retrieval['subgraph_relations'],
+            'answer': answer,
+            'cached': cached
+        }
+    
+    def stream_answer(self, retrieval: Dict) -> Iterator[str]:
+        """
+        基于 retrieve() 的结果流式生成答案
+        
+        先调用 retrieve() 拿到检索结果并立即返回给用户, 再迭代本方法逐段输出答案。
+        提前关闭返回的生成器即可取消生成。
+        
+        Args:
+            retrieval: retrieve() 的返回值
+        
+        Yields:
+            答案文本片段
+        """
+        if not retrieval['relevant_nodes']:
+            yield '未找到相关信息。'
+            return
+        
+        cached = self.lookup_answer(retrieval)
+        if cached is not None:
+            yield cached
+            return
+        
+        # 完整生成结束后才写入缓存, 中途取消的答案不缓存
+        parts = []
+        for token in self._stream_ollama(
+            retrieval['user_prompt'], retrieval['system_prompt'], temperature=0.2
+        ):
+            parts.append(token)
+            yield token
+        self.store_answer(retrieval, "".join(parts).strip())
+
+
+    # ------------------------------------------------------------------
+    # 批量问答
+    # ------------------------------------------------------------------
+    
+    def answer_queries(self, queries: List[str],
+                       concepts_df: pd.DataFrame,
+                       relationships_df: pd.DataFrame,
+                       top_k: int = 5,
+                       max_hops: int = 2,
+                       max_workers: int = 4,
+                       output_path: Optional[str] = None) -> List[Dict]:
+        """
+        批量问答 (评测/报告生成)
+        
+        - 所有查询的 Embedding 在一次 encode 调用中完成
+        - 检索为一次矩阵乘法
+        - 子图扩展基于邻接索引并按种子节点缓存, 多个问题共享相同种子的扩展结果
+        - LLM 调用使用有界线程池并发执行, 结果完成一条写一条 (JSONL)
+        
+        Args:
+            queries: 问题列表
+            concepts_df: 概念 DataFrame
+            relationships_df: 关系 DataFrame
+            top_k: 检索节点数
+            max_hops: 子图扩展跳数
+            max_workers: 并发 LLM 请求数
+            output_path: JSONL 输出路径 (可选)
+        
+        Returns:
+            与 queries 顺序一致的结果列表, 每项包含 query/answer/relevant_nodes/subgraph_size/cached
+        """
+        if not queries:
+            return []
+        if not self.node_index:
+            logger.error("Node index not built. Call build_node_index() first.")
+            return []
+        
+        # 1. 批量编码 + 批量检索
+        dense, lexical = self._encode_queries(queries)
+        all_relevant = self.node_index.search_batch(
+            dense, lexical, top_k, fusion=self.fusion, alpha=self.alpha, rrf_k=self.rrf_k
+        )
+        
+        # 2. 子图扩展 (邻接索引只构建一次, 相同种子的扩展结果在查询间共享)
+        retrievals = []
+        for query, relevant_nodes in zip(queries, all_relevant):
+            seed_nodes = [node for node, _ in relevant_nodes]
+            subgraph_nodes, subgraph_rels, _ = self.expand_subgraph(
+                seed_nodes, relationships_df, max_hops, seed_scores=dict(relevant_nodes)
+            )
+            retrievals.append(self._assemble_retrieval(
+                query, relevant_nodes, subgraph_nodes, subgraph_rels, concepts_df
+            ))
+        logger.info(
+            f"Batch retrieval done: {len(queries)} queries, "
+            f"{len(self.expansion_cache)} cached seed expansions"
+        )
+        
+        # 3. 并发生成答案
+        def generate(retrieval: Dict) -> Tuple[str, bool]:
+            answer = self.lookup_answer(retrieval)
+            if answer is not None:
+                return answer, True
+            answer = self._call_ollama(
+                retrieval['user_prompt'], retrieval['system_prompt'], temperature=0.2
+            )
+            self.store_answer(retrieval, answer)
+            return answer or "抱歉，生成答案失败。请稍后重试。", False
+        
+        results: List[Optional[Dict]] = [None] * len(queries)
+        output = open(output_path, 'w', encoding='utf-8') if output_path else None
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(generate, retrieval): i
+                    for i, retrieval in enumerate(retrievals)
+                }
+                for future in as_completed(futures):
+                    i = futures[future]
+                    retrieval = retrievals[i]
+                    try:
+                        answer, cached = future.result()
+                    except Exception as e:
+                        logger.error(f"Batch query {i} failed: {e}")
+                        answer, cached = "抱歉，生成答案失败。请稍后重试。", False
+                    results[i] = {
+                        'index': i,
+                        'query': retrieval['query'],
+                        'answer': answer,
+                        'relevant_nodes': retrieval['relevant_nodes'],
+                        'subgraph_size': len(retrieval['subgraph_nodes']),
+                        'cached': cached
+                    }
+                    if output:
+                        output.write(json.dumps(results[i], ensure_ascii=False) + "\n")
+                        output.flush()
+        finally:
+            if output:
+                output.close()
+        
+        return results
+
+
+class GlobalSearchEngine:
+    """
+    Global Search 引擎 - 基于社区摘要的 Map-Reduce 问答
+    
+    适用于"主要防治措施体系有哪些?"这类需要全局视角的问题:
+    1. 预先为社区摘要生成 Embedding (按文本哈希持久化, 摘要不变则不重复编码)
+    2. 按查询相似度选出相关社区
+    3. Map: 并发地让 LLM 从每个社区摘要中提取与问题相关的要点并打分 (每次调用受 token 预算约束)
+    4. Reduce: 按得分汇总要点, 在预算内生成最终答案
+    全程只使用已缓存的社区摘要, 不扫描原始图谱。
+    """
+    
+    MAP_SYSTEM_PROMPT = """你是松材线虫病知识图谱分析专家。你将看到知识图谱中一个社区(主题集群)的摘要。
+
+## 任务
+从摘要中提取与用户问题相关的要点, 并为每个要点给出 0-100 的相关度评分。
+与问题无关时返回空列表。
+
+## 输出格式
+{
+  "points": [
+    {"description": "要点描述", "score": 80}
+  ]
+}"""
+    
+    REDUCE_SYSTEM_PROMPT = """你是松材线虫病知识图谱问答助手。你将看到从多个知识社区中提取的要点(按相关度排序)。
+
+## 任务
+1. 综合这些要点回答用户问题
+2. 归纳成有条理的结构, 合并重复内容
+3. 如果要点不足以回答问题, 请明确说明
+
+## 输出要求
+- 直接回答问题，不要添加额外的客套话
+- 按主题分条列出"""
+    
+    def __init__(self, model: str, embedder, ollama_host: str = "http://localhost:11434",
+                 max_workers: int = 4, map_token_budget: int = 1500,
+                 reduce_token_budget: int = 4000, num_ctx: int = 8192,
+                 cache_dir: Optional[str] = "./output/cache"):
+        """
+        Args:
+            model: LLM 模型名称
+            embedder: BGE-M3 模型 (与 LocalSearchEngine 共享)
+            ollama_host: Ollama 服务地址
+            max_workers: Map 阶段并发 LLM 请求数
+            map_token_budget: 每次 Map 调用中社区摘要的 token 上限
+            reduce_token_budget: Reduce 调用中要点的 token 上限
+            num_ctx: LLM 上下文窗口大小
+            cache_dir: 摘要 Embedding 缓存目录, 为空时不持久化
+        """
+        self.model = model
+        self.embedder = embedder
+        self.api_endpoint = f"{ollama_host}/api/generate"
+        self.client = get_client(ollama_host)
+        self.max_workers = max(1, max_workers)
+        self.map_token_budget = map_token_budget
+        self.reduce_token_budget = reduce_token_budget
+        self.num_ctx = num_ctx
+        self.cache_path = os.path.join(cache_dir, "community_summary_embeddings.npz") if cache_dir else None
+        
+        self.summaries: List[Dict] = []
+        self.embeddings: Optional[np.ndarray] = None
+    
+    def _call_ollama(self, prompt: str, system_prompt: str = "", temperature: float = 0.2) -> Optional[str]:
+        """调用 Ollama API"""
+        try:
+            result = self.client.generate(
+                self.model, prompt, system=system_prompt,
+                options={"temperature": temperature, "num_ctx": self.num_ctx},
+                timeout=180, max_retries=1, component='global_search'
+            )
+            return result.get('response', '').strip()
+        except OllamaError as e:
+            logger.error(f"Global Search API error: {e}")
+            return None
+    
+    @staticmethod
+    def summary_text(summary: Dict) -> str:
+        """社区摘要的检索文本: 标题 + 主题 + 摘要 + 核心概念"""
+        parts = [str(summary.get('title') or ''), str(summary.get('summary') or '')]
+        themes = summary.get('themes') or []
+        concepts = summary.get('core_concepts') or []
+        if len(themes):
+            parts.append("主题: " + "、".join(map(str, themes)))
+        if len(concepts):
+            parts.append("核心概念: " + "、".join(map(str, concepts)))
+        return "\n".join(p for p in parts if p)
+    
+    def _load_embedding_cache(self) -> Dict[str, np.ndarray]:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            data = np.load(self.cache_path)
+            return dict(zip(data['keys'].tolist(), data['vectors']))
+        except Exception as e:
+            logger.warning(f"加载摘要 Embedding 缓存失败: {e}")
+            return {}
+    
+    def _save_embedding_cache(self, cache: Dict[str, np.ndarray]):
+        if not self.cache_path or not cache:
+            return
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        try:
+            np.savez(self.cache_path, keys=np.array(list(cache.keys())),
+                     vectors=np.vstack(list(cache.values())))
+        except Exception as e:
+            logger.error(f"保存摘要 Embedding 缓存失败: {e}")
+    
+    def index_summaries(self, summaries_df: pd.DataFrame) -> None:
+        """
+        为社区摘要建立检索索引
+        
+        Args:
+            summaries_df: build_community_summaries() 的输出
+        """
+        self.summaries = summaries_df.to_dict('records')
+        if not self.summaries:
+            self.embeddings = None
+            return
+        
+        texts = [self.summary_text(summary) for summary in self.summaries]
+        keys = [hashlib.sha1(text.encode('utf-8')).hexdigest() for text in texts]
+        cache = self._load_embedding_cache()
+        missing = [i for i, key in enumerate(keys) if key not in cache]
+        
+        if missing:
+            vectors = self.embedder.encode(
+                [texts[i] for i in missing],
+                batch_size=16,
+                max_length=1024,
+                return_dense=True,
+                return_sparse=False,
+                return_colbert_vecs=False
+            )['dense_vecs']
+            for i, vector in zip(missing, vectors):
+                cache[keys[i]] = np.asarray(vector, dtype=np.float32)
+            self._save_embedding_cache({key: cache[key] for key in keys})
+        
+        embeddings = np.vstack([cache[key] for key in keys]).astype(np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.embeddings = embeddings / norms
+        logger.info(
+            f"✓ Community summary index built: {len(self.summaries)} summaries "
+            f"({len(missing)} newly embedded)"
+        )
+    
+    def select_communities(self, query: str, top_n: int = 8,
+                           min_similarity: float = 0.3) -> List[Tuple[Dict, float]]:
+        """按查询相似度选出相关社区; 至少返回得分最高的一个"""
+        if self.embeddings is None:
+            return []
+        query_vec = self.embedder.encode(
+            [query],
+            batch_size=1,
+            max_length=512,
+            return_dense=True,
+            return_sparse=False,
+            return_colbert_vecs=False
+        )['dense_vecs'][0]
+        query_vec = np.asarray(query_vec, dtype=np.float32)
+        query_vec /= (np.linalg.norm(query_vec) or 1.0)
+        
+        scores = self.embeddings @ query_vec
+        order = np.argsort(-scores)[:top_n]
+        selected = [(self.summaries[i], float(scores[i])) for i in order if scores[i] >= min_similarity]
+        if not selected and len(order):
+            selected = [(self.summaries[order[0]], float(scores[order[0]]))]
+        return selected
+    
+    @staticmethod
+    def _truncate(text: str, budget: int) -> str:
+        """按估算 token 数截断文本"""
+        if ContextBuilder.estimate_tokens(text) <= budget:
+            return text
+        low, high = 0, len(text)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if ContextBuilder.estimate_tokens(text[:mid]) <= budget:
+                low = mid
+            else:
+                high = mid - 1
+        return text[:low]
+    
+    @staticmethod
+    def _parse_json(response: str) -> Optional[Dict]:
+        start, end = response.find('{'), response.rfind('}')
+        if start < 0 or end <= start:
+            return None
+        try:
+            return json.loads(response[start:end + 1])
+        except json.JSONDecodeError:
+            return None
+    
+    def _map(self, query: str, summary: Dict) -> List[Dict]:
+        """Map: 从单个社区摘要中提取与问题相关的要点"""
+        context = self._truncate(self.summary_text(summary), self.map_token_budget)
+        prompt = f"""用户问题: {query}
+
+**社区摘要**:
+{context}
+
+请输出 JSON 格式的要点列表。"""
+        response = self._call_ollama(prompt, self.MAP_SYSTEM_PROMPT)
+        data = self._parse_json(response) if response else None
+        if not data:
+            return []
+        
+        points = []
+        for point in data.get('points', []) or []:
+            if not isinstance(point, dict) or not point.get('description'):
+                continue
+            try:
+                score = float(point.get('score', 0))
+            except (TypeError, ValueError):
+                score = 0.0
+            if score > 0:
+                points.append({
+                    'description': str(point['description']),
+                    'score': score,
+                    'community_id': summary.get('community_id'),
+                    'community_title': summary.get('title', '')
+                })
+        return points
+    
+    def _reduce(self, query: str, points: List[Dict]) -> Optional[str]:
+        """Reduce: 按得分在预算内汇总要点生成答案"""
+        lines = []
+        remaining = self.reduce_token_budget
+        for point in sorted(points, key=lambda p: p['score'], reverse=True):
+            line = f"- [{point['community_title']}] {point['description']} (相关度: {point['score']:.0f})"
+            cost = ContextBuilder.estimate_tokens(line) + 1
+            if cost > remaining:
+                continue
+            remaining -= cost
+            lines.append(line)
+        
+        prompt = f"""用户问题: {query}
+
+**各知识社区的相关要点**:
+{chr(10).join(lines)}
+
+请基于以上要点回答问题。"""
+        return self._call_ollama(prompt, self.REDUCE_SYSTEM_PROMPT)
+    
+    def search(self, query: str, top_n: int = 8, min_similarity: float = 0.3) -> Dict:
+        """
+        Global Search 问答
+        
+        Returns:
+            {
+                'query': str,
+                'communities': List[Tuple[community_id, title, similarity]],
+                'points': List[Dict],   # Map 阶段提取的要点
+                'answer': str
+            }
+        """
+        selected = self.select_communities(query, top_n, min_similarity)
+        if not selected:
+            return {'query': query, 'communities': [], 'points': [], 'answer': '未找到相关信息。'}
+        
+        logger.info(f"Global search: {len(selected)} communities selected")
+        
+        points: List[Dict] = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._map, query, summary) for summary, _ in selected]
+            for future in as_completed(futures):
+                try:
+                    points.extend(future.result())
+                except Exception as e:
+                    logger.error(f"Global search map step failed: {e}")
+        
+        if not points:
+            answer = '相关社区中没有找到与问题直接相关的信息。'
+        else:
+            answer = self._reduce(query, points) or "抱歉，生成答案失败。请稍后重试。"
+        
+        return {
+            'query': query,
+            'communities': [
+                (summary.get('community_id'), summary.get('title', ''), score)
+                for summary, score in selected
+            ],
+            'points': sorted(points, key=lambda p: p['score'], reverse=True),
             'answer': answer
         }
 
@@ -718,6 +2034,9 @@ class GraphRAG:
     graph_rag = GraphRAG(model="qwen2.5-coder:14b", algorithm="louvain")
     communities_df = graph_rag.build_community_summaries(concepts_df, relationships_df)
     
+    # Global Search (基于社区摘要的 Map-Reduce)
+    result = graph_rag.global_search("主要防治措施体系有哪些？")
+    
     # Local Search (精确检索)
     graph_rag.build_local_search_index(concepts_df)
     result = graph_rag.local_search("阿维菌素对松褐天牛有什么作用？", concepts_df, relationships_df)
@@ -725,10 +2044,21 @@ class GraphRAG:
     """
     
     def __init__(self, model: str, ollama_host: str = "http://localhost:11434",
-                 algorithm: str = 'louvain', embedding_model: str = "BAAI/bge-m3"):
+                 algorithm: str = 'louvain', embedding_model: str = "BAAI/bge-m3",
+                 summary_workers: int = 4, retrieval_mode: str = 'hybrid',
+                 fusion: str = 'linear', alpha: float = 0.7,
+                 summaries_path: Optional[str] = "./output/cache/community_summaries.json"):
         self.detector = CommunityDetector(algorithm)
-        self.summarizer = CommunitySummarizer(model, ollama_host)
-        self.local_search_engine = LocalSearchEngine(model, ollama_host, embedding_model)
+        self.summarizer = CommunitySummarizer(model, ollama_host, max_workers=summary_workers)
+        self.local_search_engine = LocalSearchEngine(
+            model, ollama_host, embedding_model,
+            retrieval_mode=retrieval_mode, fusion=fusion, alpha=alpha
+        )
+        # 与 Local Search 共享 Embedding 模型
+        self.global_search_engine = GlobalSearchEngine(
+            model, self.local_search_engine.embedder, ollama_host, max_workers=summary_workers
+        )
+        self.summaries_path = summaries_path
     
     def build_community_summaries(self, concepts_df: pd.DataFrame,
                                   relationships_df: pd.DataFrame) -> pd.DataFrame:
@@ -750,8 +2080,53 @@ class GraphRAG:
             communities, concepts_df, relationships_df
         )
         
+        # 3. 持久化并建立 Global Search 索引
+        self._save_community_summaries(summaries_df)
+        self.global_search_engine.index_summaries(summaries_df)
+        
+        return summaries_df
+    
+    def _save_community_summaries(self, summaries_df: pd.DataFrame) -> None:
+        if not self.summaries_path:
+            return
+        directory = os.path.dirname(self.summaries_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        summaries_df.to_json(self.summaries_path, orient='records', force_ascii=False)
+    
+    def load_community_summaries(self) -> pd.DataFrame:
+        """
+        加载已持久化的社区摘要并建立 Global Search 索引
+        
+        Returns:
+            社区摘要 DataFrame (文件不存在时为空)
+        """
+        if not self.summaries_path or not os.path.exists(self.summaries_path):
+            logger.warning("社区摘要文件不存在, 请先调用 build_community_summaries()")
+            return pd.DataFrame()
+        summaries_df = pd.read_json(self.summaries_path, orient='records')
+        self.global_search_engine.index_summaries(summaries_df)
         return summaries_df
     
+    def global_search(self, query: str, top_n: int = 8,
+                      min_similarity: float = 0.3) -> Dict:
+        """
+        Global Search - 基于社区摘要回答全局性问题
+        
+        未建立索引时自动加载已持久化的社区摘要。
+        
+        Args:
+            query: 用户查询
+            top_n: 参与 Map 阶段的最大社区数
+            min_similarity: 社区入选的最低相似度
+        
+        Returns:
+            见 GlobalSearchEngine.search
+        """
+        if self.global_search_engine.embeddings is None:
+            self.load_community_summaries()
+        return self.global_search_engine.search(query, top_n, min_similarity)
+    
     def build_local_search_index(self, concepts_df: pd.DataFrame) -> None:
         """
         为 Local Search 构建节点索引
@@ -787,6 +2162,21 @@ class GraphRAG:
         return self.local_search_engine.answer_query(
             query, concepts_df, relationships_df, top_k, max_hops
         )
+    
+    def local_search_batch(self, queries: List[str],
+                           concepts_df: pd.DataFrame,
+                           relationships_df: pd.DataFrame,
+                           top_k: int = 5,
+                           max_hops: int = 2,
+                           max_workers: int = 4,
+                           output_path: Optional[str] = None) -> List[Dict]:
+        """
+        批量 Local Search, 参数与返回值见 LocalSearchEngine.answer_queries
+        """
+        return self.local_search_engine.answer_queries(
+            queries, concepts_df, relationships_df, top_k, max_hops,
+            max_workers=max_workers, output_path=output_path
+        )
 
 
 if __name__ == "__main__":
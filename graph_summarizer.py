@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict, Optional
-import requests
+from typing import List, Dict, Optional, Tuple
 from neo4j import GraphDatabase
 
+from graph_rag import SummaryCache
+from ollama_client import OllamaError, get_client
+
 NEO4J_URI = os.environ.get("NEO4J_URI", "bolt://localhost:7687")
 NEO4J_USER = os.environ.get("NEO4J_USER", "neo4j")
 NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD", "12345678")
@@ -13,6 +16,16 @@ NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD", "12345678")
 OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "mistral")
 
+# 并发摘要线程数; 成员数低于 SUMMARY_MIN_LLM_SIZE 的社区直接用规则摘要
+SUMMARY_WORKERS = int(os.environ.get("SUMMARY_WORKERS", "4"))
+SUMMARY_MIN_LLM_SIZE = int(os.environ.get("SUMMARY_MIN_LLM_SIZE", "3"))
+
+# 修改提示词后需递增版本号, 使旧的摘要缓存失效
+PROMPT_VERSION = "theme-summary-v2"
+
+# Theme 写回时每个事务包含的行数
+WRITE_BATCH_SIZE = int(os.environ.get("THEME_WRITE_BATCH_SIZE", "1000"))
+
 def _call_llm(prompt: str, system: str = "") -> Optional[str]:
     """简单的 LLM 包装函数,用于社区主题摘要
     
@@ -21,22 +34,21 @@ def _call_llm(prompt: str, system: str = "") -> Optional[str]:
     - 这里不做重试,失败直接返回 None,由调用方走规则摘要兜底
     """
     try:
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "system": system,
-            "stream": False,
-            "temperature": 0.1,
-            "top_p": 0.9,
-            "top_k": 40,
-        }
-        resp = requests.post(f"{OLLAMA_HOST}/api/generate", json=payload, timeout=180)
-        resp.raise_for_status()
-        return (resp.json().get("response", "") or "").strip()
-    except Exception:
+        resp = get_client(OLLAMA_HOST).generate(
+            OLLAMA_MODEL, prompt, system=system,
+            options={"temperature": 0.1, "top_p": 0.9, "top_k": 40},
+            timeout=180, max_retries=1, component="theme_summary",
+        )
+        return (resp.get("response", "") or "").strip()
+    except OllamaError:
         return None
 
-def _summarize_community(cid: int, members: List[Dict]) -> Dict:
+def _summarize_community(cid: int, members: List[Dict]) -> Tuple[Dict, bool]:
+    """调用 LLM 生成社区摘要, 返回 (摘要, 是否按 JSON 解析成功)
+
+    提示词只包含成员名称和类型, 不含社区 ID (GDS 每次运行分配的 ID 不稳定),
+    以便相同成员的社区在不同运行之间复用缓存。
+    """
     # 从 GDS 返回的成员列表中拆出名称和类型,后续用于构造“社区特征概要”
     names = [m.get("name", "") for m in members if m.get("name")]
     types = [m.get("type", "") for m in members]
@@ -51,7 +63,6 @@ def _summarize_community(cid: int, members: List[Dict]) -> Dict:
     top_nodes = names[:20]
     system = "你是生物学知识图谱专家，为社区生成中文主题摘要。"
     user = (
-        f"社区ID: {cid}\n"
         f"节点类型分布: {type_desc}\n"
         f"代表节点: {', '.join(top_nodes)}\n\n"
         "请给出:\n"
@@ -63,7 +74,7 @@ def _summarize_community(cid: int, members: List[Dict]) -> Dict:
     # 调用上面的简单 LLM 包装,让下游只关心结果文本
     resp = _call_llm(user, system)
     if not resp:
-        return {"title": f"社区{cid}", "summary": "", "keywords": []}
+        return {"title": f"社区{cid}", "summary": "", "keywords": []}, False
     text = resp.strip()
     # 兼容部分模型自动包上一层 ```json / ``` 代码块的情况
     if text.startswith("```json"):
@@ -80,28 +91,156 @@ def _summarize_community(cid: int, members: List[Dict]) -> Dict:
         keywords = data.get("keywords", []) or []
         if not isinstance(keywords, list):
             keywords = [str(keywords)]
-        return {"title": title, "summary": summary, "keywords": keywords}
+        return {"title": title, "summary": summary, "keywords": keywords}, True
     except Exception:
-        return {"title": f"社区{cid}", "summary": text[:300], "keywords": []}
+        return {"title": f"社区{cid}", "summary": text[:300], "keywords": []}, False
+
+def _rule_based_summary(cid: int, members: List[Dict]) -> Dict:
+    """小社区的规则摘要: 以度数最高的成员命名, 列出类型分布"""
+    ranked = sorted(members, key=lambda m: -(m.get("degree") or 0))
+    names = [m.get("name") for m in ranked if m.get("name")]
+    freq = {}
+    for m in members:
+        t = m.get("type")
+        if t:
+            freq[t] = freq.get(t, 0) + 1
+    types = [t for t, _ in sorted(freq.items(), key=lambda x: -x[1])]
+    title = names[0] if names else f"社区{cid}"
+    summary = f"该社区包含 {len(members)} 个节点: {', '.join(names[:5])}。" if names else ""
+    return {"title": title, "summary": summary, "keywords": types[:3]}
+
+def _summarize_cached(cid: int, members: List[Dict], cache: SummaryCache) -> Dict:
+    """带缓存和小社区快速通道的社区摘要"""
+    if len(members) < SUMMARY_MIN_LLM_SIZE:
+        return _rule_based_summary(cid, members)
+    # 提示词由成员名称和类型构成 (不含社区 ID), 以此作为缓存键
+    key = SummaryCache.make_key(
+        [f"{m.get('name', '')}|{m.get('type', '')}" for m in members], [],
+        OLLAMA_MODEL, PROMPT_VERSION
+    )
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    summary, parsed = _summarize_community(cid, members)
+    # 只缓存按 JSON 解析成功的结果; LLM 失败或输出非 JSON 时不写入缓存,
+    # 否则带有本次社区 ID 的兜底标题会被其他运行复用, 且下次无法重试
+    if parsed and summary.get("summary"):
+        cache.set(key, summary)
+    return summary
+
+def _summarize_all(communities: List) -> Dict:
+    """并发生成所有社区摘要, 大社区优先调度"""
+    cache = SummaryCache(filename="theme_summary_cache.json")
+    ordered = sorted(communities, key=lambda item: len(item[1]), reverse=True)
+    summaries = {}
+    with ThreadPoolExecutor(max_workers=max(1, SUMMARY_WORKERS)) as executor:
+        futures = {
+            executor.submit(_summarize_cached, cid, members, cache): cid
+            for cid, members in ordered
+        }
+        for future in as_completed(futures):
+            cid = futures[future]
+            try:
+                summaries[cid] = future.result()
+            except Exception:
+                summaries[cid] = {"title": f"社区{cid}", "summary": "", "keywords": []}
+    cache.save()
+    print(f"摘要缓存: 命中 {cache.hits}, 未命中 {cache.misses}")
+    return summaries
 
 def _ensure_theme_indexes(session):
     """确保 Theme 节点上存在基本索引,提升后续主题查询性能
     
     出错直接忽略,避免因为图数据库版本兼容性问题影响主流程
     """
-    try:
-        session.run("CREATE INDEX theme_name IF NOT EXISTS FOR (t:Theme) ON (t.name)")
-    except Exception:
-        pass
+    for query in (
+        "CREATE INDEX theme_name IF NOT EXISTS FOR (t:Theme) ON (t.name)",
+        # 批量写回时按 communityId 定位 Theme 节点
+        "CREATE INDEX theme_community IF NOT EXISTS FOR (t:Theme) ON (t.communityId)",
+    ):
+        try:
+            session.run(query)
+        except Exception:
+            pass
+
+def _project_graph(session, name: str) -> bool:
+    """将图投影为 GDS 内存图
+    
+    导入脚本为所有概念节点打上 :Concept 标签, 此时使用原生投影 (直接读存储层,
+    比 Cypher 投影快得多, 且自动排除 Theme 节点); 否则退回 Cypher 投影。
+    
+    Returns:
+        是否使用了原生投影
+    """
+    labels = {r["label"] for r in session.run("CALL db.labels() YIELD label RETURN label")}
+    if "Concept" in labels:
+        session.run(
+            """
+            CALL gds.graph.project(
+              $name,
+              'Concept',
+              {ALL: {type: '*', orientation: 'NATURAL',
+                     properties: {weight: {property: 'weight', defaultValue: 1.0}}}}
+            )
+            """,
+            name=name,
+        )
+        return True
+    session.run(
+        """
+        CALL gds.graph.project.cypher(
+          $name,
+          'MATCH (n) WHERE NOT n:Theme RETURN id(n) AS id, labels(n) AS labels',
+          'MATCH (n)-[r]->(m) WHERE NOT n:Theme AND NOT m:Theme RETURN id(n) AS source, id(m) AS target, type(r) AS type, r.weight AS weight'
+        )
+        """,
+        name=name,
+    )
+    return False
+
+def _write_themes(tx, rows: List[Dict]):
+    """批量创建/更新 Theme 节点"""
+    tx.run(
+        """
+        UNWIND $rows AS row
+        MERGE (t:Theme {communityId: row.cid})
+        ON CREATE SET t.name=row.name, t.type='Theme', t.created_at=row.ts, t.summary=row.summary, t.keywords=row.keywords
+        ON MATCH SET t.name=row.name, t.summary=row.summary, t.keywords=row.keywords
+        """,
+        rows=rows,
+    )
+
+def _link_members(tx, rows: List[Dict]):
+    """批量建立成员归属关系
+    
+    成员按 elementId 定位 (无需扫描); 同时删除指向其他社区的旧归属关系,
+    避免重复运行后节点同时属于多个主题。
+    """
+    tx.run(
+        """
+        UNWIND $rows AS row
+        MATCH (a) WHERE elementId(a) = row.id
+        MATCH (t:Theme {communityId: row.cid})
+        OPTIONAL MATCH (a)-[old:BELONGS_TO]->(other:Theme)
+        WHERE other.communityId <> row.cid
+        DELETE old
+        MERGE (a)-[:BELONGS_TO]->(t)
+        """,
+        rows=rows,
+    )
+
+def _batched(rows: List[Dict], size: int):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
 
 def run():
     """主入口: 基于 Neo4j + GDS 进行社区检测,并为每个社区生成 Theme 主题节点
     
     步骤概览:
-    1) 使用 gds.graph.project.cypher 将当前图投影为 GDS 内存图
+    1) 将当前图投影为 GDS 内存图 (有 :Concept 标签时使用原生投影)
     2) 运行 Louvain 社区检测,写回 communityId
-    3) 按 communityId 聚合节点,调用 LLM 生成摘要
-    4) 为每个社区创建 Theme 节点并建立 BELONGS_TO 关系
+    3) 按 communityId 聚合节点,并发调用 LLM 生成摘要 (按成员哈希缓存, 小社区走规则摘要)
+    4) 以 UNWIND 批量创建 Theme 节点并建立 BELONGS_TO 关系 (每批一个显式事务)
     """
     driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASSWORD))
     with driver.session() as session:
@@ -110,17 +249,9 @@ def run():
             session.run("CALL gds.graph.drop($name, false)", name="pwd_graph")
         except Exception:
             pass
-        # 使用 Cypher 方式将现有 Neo4j 图投影为 GDS 图,带上关系权重
-        session.run(
-            """
-            CALL gds.graph.project.cypher(
-              $name,
-              'MATCH (n) RETURN id(n) AS id, labels(n) AS labels',
-              'MATCH (n)-[r]->(m) RETURN id(n) AS source, id(m) AS target, type(r) AS type, r.weight AS weight'
-            )
-            """,
-            name="pwd_graph",
-        )
+        # 将现有 Neo4j 图投影为 GDS 图,带上关系权重
+        native = _project_graph(session, "pwd_graph")
+        print(f"GDS 投影方式: {'原生投影' if native else 'Cypher 投影'}")
         # 在投影图上运行 Louvain 社区检测,并把社区编号写回节点属性 communityId
         session.run(
             """
@@ -128,51 +259,47 @@ def run():
             """,
             name="pwd_graph",
         )
-        # 将同一 communityId 的节点聚合为一个成员列表,后面逐个送入 LLM 生成摘要
+        # 投影图用完即释放,避免长期占用 GDS 内存
+        try:
+            session.run("CALL gds.graph.drop($name, false)", name="pwd_graph")
+        except Exception:
+            pass
+        # 将同一 communityId 的节点聚合为一个成员列表,后面送入 LLM 生成摘要
         records = session.run(
             """
             MATCH (n)
-            WITH n.communityId AS community, collect({name:n.name, type:n.type, degree:n.total_degree}) AS members
+            WHERE n.communityId IS NOT NULL AND NOT n:Theme
+            WITH n.communityId AS community,
+                 collect({id:elementId(n), name:n.name, type:n.type, degree:n.total_degree}) AS members
             RETURN community, members ORDER BY community
             """
         )
         communities = [(r["community"], r["members"]) for r in records]
         _ensure_theme_indexes(session)
-        created = 0
-        linked = 0
+        summaries = _summarize_all(communities)
+        
+        ts = datetime.now().isoformat()
+        theme_rows = []
+        member_rows = []
         for cid, members in communities:
-            summary = _summarize_community(cid, members)
-            title = summary.get("title") or f"社区{cid}"
-            name = f"{title}"
-            session.run(
-                """
-                MERGE (t:Theme {communityId:$cid})
-                ON CREATE SET t.name=$name, t.type='Theme', t.created_at=$ts, t.summary=$summary, t.keywords=$keywords
-                ON MATCH SET t.name=$name, t.summary=$summary, t.keywords=$keywords
-                """,
-                cid=cid,
-                name=name,
-                ts=datetime.now().isoformat(),
-                summary=summary.get("summary", ""),
-                keywords=summary.get("keywords", []),
-            )
-            created += 1
-            for m in members:
-                n = m.get("name")
-                if not n:
-                    continue
-                session.run(
-                    """
-                    MATCH (a {name:$n})
-                    MATCH (t:Theme {communityId:$cid})
-                    MERGE (a)-[:BELONGS_TO]->(t)
-                    """,
-                    n=n,
-                    cid=cid,
-                )
-                linked += 1
-        print(f"创建主题节点: {created}")
-        print(f"建立归属关系: {linked}")
+            summary = summaries[cid]
+            theme_rows.append({
+                "cid": cid,
+                "name": summary.get("title") or f"社区{cid}",
+                "ts": ts,
+                "summary": summary.get("summary", ""),
+                "keywords": summary.get("keywords", []),
+            })
+            member_rows.extend({"id": m["id"], "cid": cid} for m in members if m.get("name"))
+        
+        # 每批在一个显式写事务中提交: 往返次数 = 批数, 而不是节点数
+        for batch in _batched(theme_rows, WRITE_BATCH_SIZE):
+            session.execute_write(_write_themes, batch)
+        for batch in _batched(member_rows, WRITE_BATCH_SIZE):
+            session.execute_write(_link_members, batch)
+        
+        print(f"创建主题节点: {len(theme_rows)}")
+        print(f"建立归属关系: {len(member_rows)}")
     driver.close()
 
 if __name__ == "__main__":
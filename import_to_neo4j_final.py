@@ -36,15 +36,18 @@
    - 执行 `MATCH ... CREATE (s)-[r:RELTYPE {...}]->(t)` 创建加权有向边, 写入 `weight/color/style/label/created_at`。
 
 6. **步骤4: 创建索引**
-   - 预创建常用查询字段索引, 如 `n.name`、`n.type`、`r.weight`;
+   - 预创建常用查询字段索引, 如 `n.name`、`n.type`、`r.weight`、`Concept.total_degree`;
    - 目的是加快前端可视化加载和交互式查询的响应速度。
 
 7. **步骤5: 添加统计信息**
    - 通过 Cypher 计算每个节点的出度、入度与总度数, 写回 `out_degree/in_degree/total_degree` 属性;
    - 统计不同关系类型的权重均值/最大值/最小值, 用于后续分析和调参。
+   - 使用 `CommunityDetector` 划分社区, 节点写回 `community_id`;
+     汇总社区超级节点、社区间聚合边和代表节点, 写出 `output/overview_graph.json` 作为前端概览图。
 
 8. **步骤6: 最终验证与汇总输出**
    - 统计图中节点数、关系数, 以及节点/关系类型分布和度数最高的节点;
+   - 写出 `output/graph_version.json`, 通知 Web 后端的响应缓存失效;
    - 在控制台打印导入概览、常用查询示例和 Neo4j Browser 访问方式, 方便人工快速验证导入结果。
 
 脚本设计为“一次性运行”的导入工具: 从读取 CSV 到关闭驱动, 按照上述步骤线性执行,
@@ -53,12 +56,28 @@
 from neo4j import GraphDatabase
 import pandas as pd
 from datetime import datetime
+import json
 import os
 
+from graph_rag import CommunityDetector
+from instrumentation import metrics
+
 NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "12345678"
 
+# 图谱版本文件: Web 后端据此判断响应缓存是否失效 (docker 中 ./output 挂载到 /app/output)
+GRAPH_VERSION_FILE = "output/graph_version.json"
+
+# 概览图: 以社区为超级节点的粗化图, 供前端首屏直接加载
+OVERVIEW_GRAPH_FILE = "output/overview_graph.json"
+OVERVIEW_TOP_MEMBERS = 5  # 每个社区保留的代表节点数
+# 社区划分持久化: 重新导入 (如新增少量论文) 时只重算受影响的社区, 社区编号保持稳定
+COMMUNITY_PARTITION_FILE = "output/cache/community_partition_louvain.json"
+
+# 阶段耗时报告目录 (见 instrumentation.py)
+METRICS_DIR = "output/metrics"
+
 print("="*80)
 print("导入三元组到Neo4j数据库")
 print("="*80)
@@ -91,6 +110,7 @@ with driver.session() as session:
     print("\n" + "="*80)
     print("步骤1: 清空现有数据")
     print("="*80)
+    stage = metrics.start('import.clear')
     
     session.run("MATCH (n) DETACH DELETE n")
     print("  已清空所有节点和关系")
@@ -101,6 +121,8 @@ with driver.session() as session:
     print("\n" + "="*80)
     print("步骤2: 创建节点（带样式）")
     print("="*80)
+    stage.stop()
+    stage = metrics.start('import.nodes')
     
     # 节点分类和颜色（去除图标中的表情符号，只保留类型标签）
     node_styles = {
@@ -290,6 +312,8 @@ with driver.session() as session:
     print("\n" + "="*80)
     print("步骤3: 创建关系")
     print("="*80)
+    stage.stop()
+    stage = metrics.start('import.relationships')
     
     # 关系样式
     relation_styles = {
@@ -419,6 +443,8 @@ with driver.session() as session:
     print("\n" + "="*80)
     print("步骤4: 创建索引")
     print("="*80)
+    stage.stop()
+    stage = metrics.start('import.indexes')
     
     # 为常用查询字段预创建索引,加快交互式探索和可视化加载速度
     index_queries = [
@@ -426,6 +452,11 @@ with driver.session() as session:
         "CREATE INDEX node_type IF NOT EXISTS FOR (n) ON (n.type)",
         "CREATE INDEX node_primary_label IF NOT EXISTS FOR (n) ON (n.primary_label)",
         "CREATE INDEX rel_weight IF NOT EXISTS FOR ()-[r]-() ON (r.weight)",
+        # 所有节点都带有 :Concept 标签, 度数范围索引用于 Web 后端的游标分页
+        "CREATE INDEX concept_total_degree IF NOT EXISTS FOR (n:Concept) ON (n.total_degree)",
+        "CREATE INDEX concept_name IF NOT EXISTS FOR (n:Concept) ON (n.name)",
+        # 概览图下钻时按社区编号取成员
+        "CREATE INDEX concept_community IF NOT EXISTS FOR (n:Concept) ON (n.community_id)",
     ]
     
     for query in index_queries:
@@ -441,6 +472,8 @@ with driver.session() as session:
     print("\n" + "="*80)
     print("步骤5: 添加统计信息")
     print("="*80)
+    stage.stop()
+    stage = metrics.start('import.statistics')
     
     # 计算节点度数
     session.run("""
@@ -475,12 +508,116 @@ with driver.session() as session:
     
     print("  已计算关系权重统计")
     
+    # ========================================================================
+    # 步骤5.5: 构建概览图
+    # ========================================================================
+    print("\n" + "="*80)
+    print("步骤5.5: 构建概览图")
+    print("="*80)
+    stage.stop()
+    stage = metrics.start('import.overview')
+    
+    # 社区检测: 节点名即实体, 关系表沿用 CommunityDetector 的 node_1/node_2/edge/weight 列
+    concepts_df = pd.DataFrame({'entity': sorted(all_nodes)})
+    relationships_df = df[['node_1', 'node_2', 'weight']].copy()
+    relationships_df['edge'] = df['relationship']
+    relationships_df['weight'] = relationships_df['weight'].fillna(1.0)
+    
+    communities = CommunityDetector(
+        'louvain', partition_path=COMMUNITY_PARTITION_FILE
+    ).detect_communities(concepts_df, relationships_df)
+    membership = {name: cid for cid, members in communities.items() for name in members}
+    
+    # 成员节点写回社区编号 (批量 UNWIND), 供后端下钻查询
+    session.run("""
+        UNWIND $rows AS row
+        MATCH (n:Concept {name: row.name})
+        SET n.community_id = row.cid
+    """, rows=[{'name': name, 'cid': cid} for name, cid in membership.items()])
+    
+    # 节点度数与类型 (从库中读取, 与步骤5的计算保持一致)
+    node_info = {
+        record['name']: (record['degree'] or 0, record['type'])
+        for record in session.run(
+            "MATCH (n:Concept) RETURN n.name as name, n.total_degree as degree, n.type as type"
+        )
+    }
+    
+    # 聚合社区间的边: 无向合并, 累加权重和条数; 社区内部的边计入 internal_edges
+    edge_frame = relationships_df.assign(
+        c1=relationships_df['node_1'].map(membership),
+        c2=relationships_df['node_2'].map(membership),
+    ).dropna(subset=['c1', 'c2'])
+    edge_frame['c1'] = edge_frame['c1'].astype(int)
+    edge_frame['c2'] = edge_frame['c2'].astype(int)
+    internal = edge_frame[edge_frame['c1'] == edge_frame['c2']].groupby('c1').size().to_dict()
+    cross = edge_frame[edge_frame['c1'] != edge_frame['c2']].copy()
+    cross['a'] = cross[['c1', 'c2']].min(axis=1)
+    cross['b'] = cross[['c1', 'c2']].max(axis=1)
+    aggregated = cross.groupby(['a', 'b']).agg(weight=('weight', 'sum'), count=('weight', 'size'))
+    
+    overview_nodes = []
+    for cid, members in communities.items():
+        ranked = sorted(members, key=lambda m: -node_info.get(m, (0, None))[0])
+        type_counts = {}
+        for m in members:
+            node_type = node_info.get(m, (0, 'Other'))[1] or 'Other'
+            type_counts[node_type] = type_counts.get(node_type, 0) + 1
+        dominant_type = max(type_counts.items(), key=lambda x: x[1])[0] if type_counts else 'Other'
+        top_members = [
+            {'name': m, 'total_degree': int(node_info.get(m, (0, None))[0])}
+            for m in ranked[:OVERVIEW_TOP_MEMBERS]
+        ]
+        overview_nodes.append({
+            'id': f"community:{cid}",
+            'name': ranked[0] if ranked else f"社区{cid}",
+            'category': dominant_type,
+            'importance': None,
+            'total_degree': len(members),
+            'properties': {
+                'community_id': int(cid),
+                'size': len(members),
+                'internal_edges': int(internal.get(cid, 0)),
+                'type_distribution': type_counts,
+                'top_members': top_members,
+            },
+        })
+    overview_nodes.sort(key=lambda n: -n['properties']['size'])
+    
+    overview_edges = [
+        {
+            'id': f"community:{a}-community:{b}",
+            'source': f"community:{a}",
+            'target': f"community:{b}",
+            'relationship': 'INTER_COMMUNITY',
+            'weight': round(float(row['weight']), 4),
+            'properties': {'count': int(row['count'])},
+        }
+        for (a, b), row in aggregated.iterrows()
+    ]
+    
+    overview = {
+        'nodes': overview_nodes,
+        'edges': overview_edges,
+        'total_nodes': len(overview_nodes),
+        'total_edges': len(overview_edges),
+        'created_at': datetime.now().isoformat(),
+    }
+    os.makedirs(os.path.dirname(OVERVIEW_GRAPH_FILE), exist_ok=True)
+    with open(OVERVIEW_GRAPH_FILE, 'w', encoding='utf-8') as f:
+        json.dump(overview, f, ensure_ascii=False)
+    
+    print(f"  社区数: {len(overview_nodes)}, 社区间连接: {len(overview_edges)}")
+    print(f"  概览图已写入: {OVERVIEW_GRAPH_FILE}")
+    
     # ========================================================================
     # 步骤6: 最终验证
     # ========================================================================
     print("\n" + "="*80)
     print("步骤6: 最终验证")
     print("="*80)
+    stage.stop()
+    stage = metrics.start('import.verify')
     
     result = session.run("MATCH (n) RETURN count(n) as count").single()
     node_count = result['count']
@@ -492,6 +629,19 @@ with driver.session() as session:
     print(f"    节点数: {node_count}")
     print(f"    关系数: {rel_count}")
     
+    # 更新图谱版本, 使 Web 后端的响应缓存失效
+    graph_version = {
+        "version": datetime.now().strftime("%Y%m%d%H%M%S%f"),
+        "updated_at": datetime.now().isoformat(),
+        "source": csv_path,
+        "node_count": node_count,
+        "rel_count": rel_count,
+    }
+    os.makedirs(os.path.dirname(GRAPH_VERSION_FILE), exist_ok=True)
+    with open(GRAPH_VERSION_FILE, 'w', encoding='utf-8') as f:
+        json.dump(graph_version, f, ensure_ascii=False, indent=2)
+    print(f"    图谱版本: {graph_version['version']} (已写入 {GRAPH_VERSION_FILE})")
+    
     # 显示节点类型分布
     result = session.run("""
         MATCH (n)
@@ -540,9 +690,17 @@ with driver.session() as session:
     print(f"\n  度数最高的节点:")
     for record in result:
         print(f"    {record['name']:40s}: {record['degree']}")
+    stage.stop()
 
 driver.close()
 
+# 输出导入阶段耗时报告
+metrics.incr('import.nodes_created', created_nodes)
+metrics.incr('import.relationships_created', created_rels)
+report_path = metrics.write_report(METRICS_DIR, run_name='import')
+if report_path:
+    print(f"\n阶段耗时报告: {report_path}")
+
 print("\n" + "="*80)
 print("导入完成")
 print("="*80)
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""运行时性能埋点模块
+
+为整个构建管道提供轻量级的阶段耗时与吞吐量统计, 回答"时间都花在哪里":
+
+- span: 上下文管理器/装饰器形式的计时区间 (time.perf_counter 单调计时), 支持嵌套,
+  嵌套区间以 "父/子" 路径记录, 例如 `pipeline.extract/llm.call`;
+- counter: 单调递增计数器, 例如处理的 PDF 数、LLM 重试次数;
+- histogram: 数值分布 (count/sum/min/max/p50/p95 + Prometheus 风格分桶), 例如响应字符数;
+- 运行结束时输出 JSON 报告, 可选输出 Prometheus 文本格式 (node_exporter textfile collector 可直接采集)。
+
+所有接口都是线程安全的, 关闭 (`configure(enabled=False)`) 后开销可忽略。
+
+用法:
+    from instrumentation import metrics
+
+    with metrics.span('pdf.parse', parser='pdfplumber'):
+        ...
+
+    @metrics.timed('dedup.embed')
+    def embed(...): ...
+
+    metrics.incr('llm.retries')
+    metrics.observe('llm.response_chars', len(text))
+    metrics.write_report('./output/metrics')
+"""
+
+import functools
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 默认分桶 (秒): 覆盖从毫秒级的缓存命中到十几分钟的大模型调用
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+    10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 900.0,
+)
+
+# 每个直方图保留的样本数上限 (用于计算分位数); 超出后按步长抽样保留
+MAX_SAMPLES = 10000
+
+
+class Histogram:
+    """数值分布统计"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self._samples: List[float] = []
+        self._stride = 1
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+
+        # 样本过多时减半并加大抽样步长, 内存占用保持有界
+        if self.count % self._stride == 0:
+            self._samples.append(value)
+            if len(self._samples) >= MAX_SAMPLES:
+                self._samples = self._samples[::2]
+                self._stride *= 2
+
+    def percentile(self, q: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def to_dict(self) -> Dict:
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6),
+            'min': round(self.min, 6),
+            'p50': round(self.percentile(0.5), 6),
+            'p95': round(self.percentile(0.95), 6),
+            'max': round(self.max, 6),
+        }
+
+
+def _label_key(name: str, labels: Dict[str, object]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f"{k}={labels[k]}" for k in sorted(labels))
+    return f"{name}{{{rendered}}}"
+
+
+class Instrumentation:
+    """埋点注册表 (进程内单例见模块级 `metrics`)"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def configure(self, enabled: Optional[bool] = None):
+        if enabled is not None:
+            self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self.started_at = datetime.now()
+            self._started = time.perf_counter()
+            self.spans: Dict[str, Histogram] = {}
+            self.counters: Dict[str, float] = {}
+            self.histograms: Dict[str, Histogram] = {}
+
+    # ------------------------------------------------------------------
+    # 记录接口
+    # ------------------------------------------------------------------
+
+    def _stack(self) -> List[str]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """计时区间; 嵌套时以 "父/子" 路径记录"""
+        if not self.enabled:
+            yield
+            return
+        stack = self._stack()
+        path = f"{stack[-1]}/{name}" if stack else name
+        stack.append(path)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            self._record_span(_label_key(path, labels), elapsed)
+
+    def _record_span(self, key: str, elapsed: float):
+        with self._lock:
+            histogram = self.spans.get(key)
+            if histogram is None:
+                histogram = self.spans[key] = Histogram()
+            histogram.observe(elapsed)
+
+    def start(self, name: str, **labels) -> 'SpanHandle':
+        """手动开始计时区间, 适用于无法用 with 包裹的线性脚本 (如导入脚本); 调用返回值的 stop() 结束
+
+        函数内部的计时应优先使用 span(), 异常退出时同样会结束计时。
+        """
+        return SpanHandle(self, name, labels)
+
+    def timed(self, name: Optional[str] = None, **labels) -> Callable:
+        """计时装饰器, 默认以 `模块.函数名` 命名"""
+        def decorator(func: Callable) -> Callable:
+            span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def incr(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Optional[Tuple[float, ...]] = None, **labels):
+        if not self.enabled:
+            return
+        key = _label_key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets or DEFAULT_BUCKETS)
+            histogram.observe(value)
+
+    # ------------------------------------------------------------------
+    # 输出
+    # ------------------------------------------------------------------
+
+    def report(self) -> Dict:
+        """当前统计快照 (JSON 可序列化)"""
+        with self._lock:
+            wall = time.perf_counter() - self._started
+            spans = {key: h.to_dict() for key, h in self.spans.items()}
+            # 顶层区间按总耗时排序, 并给出占整个运行时长的比例
+            for stats in spans.values():
+                stats['share_of_wall'] = round(stats.get('sum', 0.0) / wall, 4) if wall > 0 else 0.0
+            return {
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'wall_seconds': round(wall, 3),
+                'spans': dict(sorted(spans.items(), key=lambda item: -item[1].get('sum', 0.0))),
+                'counters': dict(sorted(self.counters.items())),
+                'histograms': {key: h.to_dict() for key, h in sorted(self.histograms.items())},
+            }
+
+    def to_prometheus(self, prefix: str = 'pwd_kg') -> str:
+        """Prometheus 文本格式 (exposition format 0.0.4)
+
+        同名指标的不同标签组合属于一个指标族, 只写一行 # TYPE 且各行连续输出, 否则采集端拒绝整个文件。
+        """
+        lines: List[str] = []
+        with self._lock:
+            spans = [({'span': name, **labels}, histogram)
+                     for name, labels, histogram in _families(self.spans)]
+            self._render_histograms(lines, f"{prefix}_span_seconds", spans)
+            counters: Dict[str, List[Tuple[Dict[str, str], float]]] = {}
+            for name, labels, value in _families(self.counters):
+                counters.setdefault(f"{prefix}_{_metric_name(name)}_total", []).append((labels, value))
+            for metric, series in counters.items():
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in series:
+                    lines.append(f"{metric}{_prom_labels(labels)} {value}")
+            histograms: Dict[str, List[Tuple[Dict[str, str], Histogram]]] = {}
+            for name, labels, histogram in _families(self.histograms):
+                histograms.setdefault(f"{prefix}_{_metric_name(name)}", []).append((labels, histogram))
+            for metric, series in histograms.items():
+                self._render_histograms(lines, metric, series)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histograms(lines: List[str], metric: str, series: List[Tuple[Dict[str, str], Histogram]]):
+        """一个直方图指标族: 一行 # TYPE, 随后每个标签组合的 bucket/sum/count"""
+        if not series:
+            return
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, histogram in series:
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{_prom_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{metric}_bucket{_prom_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+            lines.append(f"{metric}_sum{_prom_labels(labels)} {histogram.sum}")
+            lines.append(f"{metric}_count{_prom_labels(labels)} {histogram.count}")
+
+    def write_report(self, output_dir: str = './output/metrics', prometheus: bool = False,
+                     run_name: str = 'run') -> Optional[str]:
+        """
+        写出 JSON 运行报告 (以及可选的 Prometheus 文本文件)
+
+        Returns:
+            JSON 报告路径; 埋点关闭时返回 None
+        """
+        if not self.enabled:
+            return None
+        os.makedirs(output_dir, exist_ok=True)
+        timestamp = self.started_at.strftime('%Y%m%d_%H%M%S')
+        report_path = os.path.join(output_dir, f"{run_name}_{timestamp}.json")
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+        if prometheus:
+            # 先写临时文件再改名, 避免采集端读到半个文件
+            prom_path = os.path.join(output_dir, f"{run_name}.prom")
+            tmp_path = prom_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, prom_path)
+        return report_path
+
+
+class SpanHandle:
+    """
+    start() 返回的手动计时句柄, 也可作为上下文管理器使用
+
+    直接维护调用栈而不是手动驱动 span() 生成器: 未 stop 的句柄被回收时,
+    生成器的 finally 会在回收时刻 (可能是其他线程) 弹出调用栈并记录错误的耗时。
+    """
+
+    def __init__(self, owner: Instrumentation, name: str, labels: Dict):
+        self._owner = owner
+        self._labels = labels
+        self._stopped = not owner.enabled
+        if self._stopped:
+            return
+        self._stack = owner._stack()
+        self._path = f"{self._stack[-1]}/{name}" if self._stack else name
+        self._stack.append(self._path)
+        self._start = time.perf_counter()
+
+    def stop(self):
+        """结束计时; 重复调用无效果"""
+        if self._stopped:
+            return
+        self._stopped = True
+        elapsed = time.perf_counter() - self._start
+        try:
+            self._owner._record_span(_label_key(self._path, self._labels), elapsed)
+        finally:
+            # 连同其后未结束的内层区间一并出栈, 避免后续区间挂在错误的父路径下
+            for index in range(len(self._stack) - 1, -1, -1):
+                if self._stack[index] == self._path:
+                    del self._stack[index:]
+                    break
+
+    def __enter__(self) -> 'SpanHandle':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+_KEY_PATTERN = re.compile(r'^(?P<name>[^{]*)(?:\{(?P<labels>.*)\})?$')
+
+
+def _families(values: Dict) -> List[Tuple[str, Dict[str, str], object]]:
+    """把 'name{k=v}' 键拆开并按指标名排序, 同名 (同一指标族) 的标签组合相邻"""
+    items = [(*_split_key(key), value) for key, value in values.items()]
+    return sorted(items, key=lambda item: (item[0], sorted(item[1].items())))
+
+
+def _split_key(key: str) -> Tuple[str, Dict[str, str]]:
+    match = _KEY_PATTERN.match(key)
+    labels = {}
+    if match.group('labels'):
+        for pair in match.group('labels').split(','):
+            k, _, v = pair.partition('=')
+            labels[k] = v
+    return match.group('name'), labels
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def _prom_labels(labels: Dict[str, object]) -> str:
+    if not labels:
+        return ''
+    rendered = ",".join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in labels.items()
+    )
+    return '{' + rendered + '}'
+
+
+# 进程内全局实例
+metrics = Instrumentation(enabled=os.environ.get('PWD_METRICS', '1') != '0')
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""LLM 调用遥测
+
+Ollama 的每个响应都带有模型侧统计 (单位纳秒):
+    total_duration / load_duration / prompt_eval_count / prompt_eval_duration /
+    eval_count / eval_duration
+本模块把它们连同调用方信息 (chunk_id、模型、重试次数、JSON 解析是否成功) 逐条写入
+结构化日志 (JSON Lines), 并提供汇总命令, 按模型报告延迟分位数、生成速度 (tokens/s)
+以及模型重新加载所占的时间比例, 用于在吞吐量层面比较不同模型。
+
+日志只追加不改写: 调用记录 (event=call) 在请求返回时立即写出; 调用方解析 JSON 后
+再追加一条解析结果 (event=parse, 以 call_id 关联), 中途崩溃也不会丢失已完成的调用。
+
+用法:
+    from llm_telemetry import telemetry
+
+    with telemetry.scope(chunk_id=chunk_id):
+        text = self._call_ollama(prompt)          # 内部调用 telemetry.record_call(...)
+    try:
+        data = json.loads(text)
+        telemetry.mark_json(True)
+    except json.JSONDecodeError:
+        telemetry.mark_json(False)
+
+    python llm_telemetry.py summary --log ./output/metrics/llm_calls.jsonl
+
+环境变量:
+    PWD_LLM_LOG   日志路径 (默认 ./output/metrics/llm_calls.jsonl)
+    PWD_METRICS=0 与 instrumentation 一起关闭
+"""
+
+import argparse
+import json
+import os
+import threading
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+DEFAULT_LOG_PATH = './output/metrics/llm_calls.jsonl'
+
+# Ollama 响应中以纳秒计的时长字段
+_DURATION_FIELDS = ('total_duration', 'load_duration', 'prompt_eval_duration', 'eval_duration')
+
+
+class LLMTelemetry:
+    """LLM 调用日志 (进程内单例见模块级 `telemetry`)"""
+
+    def __init__(self, log_path: Optional[str] = None, enabled: bool = True):
+        self.log_path = log_path or DEFAULT_LOG_PATH
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def configure(self, log_path: Optional[str] = None, enabled: Optional[bool] = None):
+        if log_path:
+            self.log_path = log_path
+        if enabled is not None:
+            self.enabled = enabled
+
+    # ------------------------------------------------------------------
+    # 记录接口
+    # ------------------------------------------------------------------
+
+    def _fields(self) -> Dict:
+        fields = getattr(self._local, 'fields', None)
+        if fields is None:
+            fields = self._local.fields = {}
+        return fields
+
+    @contextmanager
+    def scope(self, **fields):
+        """为区间内发生的调用附加字段 (如 chunk_id), 可嵌套, 内层覆盖外层"""
+        current = self._fields()
+        saved = dict(current)
+        current.update(fields)
+        try:
+            yield
+        finally:
+            current.clear()
+            current.update(saved)
+
+    def record_call(self, model: str, response: Optional[Dict], latency: float,
+                    retries: int = 0, error: Optional[str] = None, component: str = '',
+                    **fields) -> Optional[str]:
+        """
+        记录一次 LLM 调用
+
+        Args:
+            model: 模型名
+            response: Ollama 响应 JSON (非流式响应, 或流式响应的最后一条 done=true 记录); 失败时为 None
+            latency: 调用方测得的墙钟耗时 (秒, 含网络与排队)
+            retries: 本次调用之前已经重试的次数
+            error: 失败原因; 为 None 表示成功
+            component: 调用方 (extract/critic/refine/caption/...)
+
+        Returns:
+            call_id, 供 mark_json 关联; 遥测关闭时返回 None
+        """
+        if not self.enabled:
+            return None
+
+        call_id = uuid.uuid4().hex[:16]
+        entry = {
+            'event': 'call',
+            'call_id': call_id,
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'component': component,
+            'model': model,
+            'ok': error is None,
+            'error': error,
+            'retries': retries,
+            'latency_s': round(latency, 4),
+        }
+        entry.update(self._fields())
+        entry.update(fields)
+
+        response = response or {}
+        for key in _DURATION_FIELDS:
+            if key in response:
+                entry[f"{key}_s"] = round(response[key] / 1e9, 4)
+        for key in ('prompt_eval_count', 'eval_count'):
+            if key in response:
+                entry[key] = response[key]
+
+        # 生成速度按模型侧的 eval_duration 计算, 不含网络与加载时间
+        if response.get('eval_count') and response.get('eval_duration'):
+            entry['tokens_per_s'] = round(response['eval_count'] / (response['eval_duration'] / 1e9), 2)
+        if response.get('prompt_eval_count') and response.get('prompt_eval_duration'):
+            entry['prompt_tokens_per_s'] = round(
+                response['prompt_eval_count'] / (response['prompt_eval_duration'] / 1e9), 2
+            )
+
+        self._write(entry)
+        self._local.last_call_id = call_id
+        return call_id
+
+    def mark_json(self, ok: bool, call_id: Optional[str] = None):
+        """记录本线程最近一次调用 (或指定 call_id) 的 JSON 解析结果"""
+        if not self.enabled:
+            return
+        call_id = call_id or getattr(self._local, 'last_call_id', None)
+        if not call_id:
+            return
+        self._local.last_call_id = None
+        self._write({'event': 'parse', 'call_id': call_id, 'json_ok': bool(ok)})
+
+    def _write(self, entry: Dict):
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            try:
+                directory = os.path.dirname(self.log_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            except OSError:
+                # 遥测失败不影响主流程
+                pass
+
+
+# ----------------------------------------------------------------------
+# 读取与汇总
+# ----------------------------------------------------------------------
+
+def load_calls(log_path: str) -> List[Dict]:
+    """读取日志, 把解析结果并入对应的调用记录"""
+    calls: Dict[str, Dict] = {}
+    parses: Dict[str, bool] = {}
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('event') == 'parse':
+                parses[entry.get('call_id')] = entry.get('json_ok')
+            elif entry.get('event') == 'call':
+                calls[entry['call_id']] = entry
+    for call_id, ok in parses.items():
+        if call_id in calls:
+            calls[call_id]['json_ok'] = ok
+    return list(calls.values())
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(calls: List[Dict], group_by: str = 'model') -> Dict[str, Dict]:
+    """
+    按模型 (或 component) 汇总
+
+    - latency_p50/p95: 墙钟延迟分位数 (秒), 只统计成功调用
+    - tokens_per_s: 输出 token 总数 / 模型侧 eval_duration 总和
+    - load_fraction: load_duration 总和 / total_duration 总和, 即模型重新加载占模型侧耗时的比例
+    - prompt_eval_per_call: 平均每次调用的提示词计算耗时 (秒), 用于比较前缀复用方式 (--by prefix_reuse)
+    - json_ok_rate: 调用方报告了解析结果的调用中, 解析成功的比例
+    """
+    groups: Dict[str, List[Dict]] = defaultdict(list)
+    for call in calls:
+        groups[str(call.get(group_by) or 'unknown')].append(call)
+
+    summary = {}
+    for key, items in sorted(groups.items()):
+        ok_calls = [c for c in items if c.get('ok')]
+        latencies = [c['latency_s'] for c in ok_calls if 'latency_s' in c]
+        eval_tokens = sum(c.get('eval_count', 0) for c in ok_calls)
+        eval_seconds = sum(c.get('eval_duration_s', 0.0) for c in ok_calls)
+        prompt_tokens = sum(c.get('prompt_eval_count', 0) for c in ok_calls)
+        prompt_seconds = sum(c.get('prompt_eval_duration_s', 0.0) for c in ok_calls)
+        load_seconds = sum(c.get('load_duration_s', 0.0) for c in ok_calls)
+        total_seconds = sum(c.get('total_duration_s', 0.0) for c in ok_calls)
+        parsed = [c['json_ok'] for c in items if c.get('json_ok') is not None]
+
+        summary[key] = {
+            'calls': len(items),
+            'failures': len(items) - len(ok_calls),
+            'retries': sum(c.get('retries', 0) for c in items),
+            'latency_p50': _round(_percentile(latencies, 0.5)),
+            'latency_p95': _round(_percentile(latencies, 0.95)),
+            'latency_total': round(sum(latencies), 3),
+            'prompt_tokens': prompt_tokens,
+            'output_tokens': eval_tokens,
+            'tokens_per_s': round(eval_tokens / eval_seconds, 2) if eval_seconds > 0 else None,
+            'prompt_eval_seconds': round(prompt_seconds, 3),
+            'prompt_eval_per_call': round(prompt_seconds / len(ok_calls), 4) if ok_calls else None,
+            'load_seconds': round(load_seconds, 3),
+            'load_fraction': round(load_seconds / total_seconds, 4) if total_seconds > 0 else None,
+            'json_ok_rate': round(sum(parsed) / len(parsed), 4) if parsed else None,
+        }
+    return summary
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 3) if value is not None else None
+
+
+def _format_table(summary: Dict[str, Dict], group_by: str) -> Iterator[str]:
+    header = (f"{group_by:<28s} {'calls':>6s} {'fail':>5s} {'retry':>5s} {'p50(s)':>8s} "
+              f"{'p95(s)':>8s} {'tok/s':>8s} {'pe(s)':>7s} {'load%':>7s} {'json_ok':>8s}")
+    yield header
+    yield '-' * len(header)
+
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else '-'
+
+    for key, s in summary.items():
+        load = s['load_fraction'] * 100 if s['load_fraction'] is not None else None
+        json_ok = s['json_ok_rate'] * 100 if s['json_ok_rate'] is not None else None
+        yield (f"{key[:28]:<28s} {s['calls']:>6d} {s['failures']:>5d} {s['retries']:>5d} "
+               f"{fmt(s['latency_p50'], '8.2f'):>8s} {fmt(s['latency_p95'], '8.2f'):>8s} "
+               f"{fmt(s['tokens_per_s'], '8.1f'):>8s} {fmt(s['prompt_eval_per_call'], '7.3f'):>7s} "
+               f"{fmt(load, '6.1f'):>7s} {fmt(json_ok, '7.1f'):>8s}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 调用遥测")
+    sub = parser.add_subparsers(dest='command', required=True)
+    summary_parser = sub.add_parser('summary', help="按模型汇总延迟、吞吐与模型加载占比")
+    summary_parser.add_argument('--log', default=os.environ.get('PWD_LLM_LOG', DEFAULT_LOG_PATH))
+    summary_parser.add_argument('--by', default='model', choices=['model', 'component', 'prefix_reuse'])
+    summary_parser.add_argument('--json', action='store_true', help="输出 JSON 而不是表格")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        parser.error(f"日志不存在: {args.log}")
+
+    summary = summarize(load_calls(args.log), group_by=args.by)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        for line in _format_table(summary, args.by):
+            print(line)
+
+
+# 进程内全局实例
+telemetry = LLMTelemetry(
+    log_path=os.environ.get('PWD_LLM_LOG'),
+    enabled=os.environ.get('PWD_METRICS', '1') != '0',
+)
+
+
+if __name__ == "__main__":
+    main()
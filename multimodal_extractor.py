@@ -17,14 +17,14 @@ Multimodal Knowledge Extraction Module
 
 import os
 import io
-import json
 import logging
 from typing import List, Dict, Tuple, Optional
 from pathlib import Path
-import requests
 from PIL import Image
 import base64
 
+from ollama_client import get_client
+
 logger = logging.getLogger(__name__)
 
 # 尝试导入 PDF 库
@@ -205,18 +205,14 @@ class VisionLanguageModel:
     def _verify_ollama_vlm(self):
         """验证 Ollama VLM 可用性"""
         try:
-            response = requests.get(f"{self.ollama_host}/api/tags", timeout=5)
-            if response.status_code == 200:
-                models = response.json().get('models', [])
-                model_names = [m.get('name', '').split(':')[0] for m in models]
-                
-                if self.model not in model_names:
-                    logger.warning(f"Ollama 中未找到模型 {self.model}")
-                    logger.warning(f"可用模型: {', '.join(model_names)}")
-                else:
-                    logger.info(f"Ollama VLM 已就绪: {self.model}")
+            models = get_client(self.ollama_host).tags(timeout=5)
+            model_names = [m.get('name', '').split(':')[0] for m in models]
+            
+            if self.model not in model_names:
+                logger.warning(f"Ollama 中未找到模型 {self.model}")
+                logger.warning(f"可用模型: {', '.join(model_names)}")
             else:
-                raise ConnectionError(f"Ollama 返回状态 {response.status_code}")
+                logger.info(f"Ollama VLM 已就绪: {self.model}")
         except Exception as e:
             logger.error(f"Ollama 连接失败: {e}")
             raise
@@ -254,25 +250,11 @@ class VisionLanguageModel:
             image_base64 = base64.b64encode(image_bytes).decode('utf-8')
             
             # 调用 Ollama VLM API
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "images": [image_base64],
-                "stream": False,
-                "options": {
-                    "temperature": 0.3,
-                    "num_ctx": 4096
-                }
-            }
-            
-            response = requests.post(
-                f"{self.ollama_host}/api/generate",
-                json=payload,
-                timeout=180
+            result = get_client(self.ollama_host).generate(
+                self.model, prompt, images=[image_base64],
+                options={"temperature": 0.3, "num_ctx": 4096},
+                timeout=180, component='vlm'
             )
-            response.raise_for_status()
-            
-            result = response.json()
             caption = result.get('response', '').strip()
             
             logger.debug(f"图片描述生成成功: {len(caption)} 字符")
@@ -0,0 +1,865 @@
+#!/usr/bin/env python3
+"""统一的 Ollama 客户端
+
+项目中各模块 (概念抽取、审稿/修正 Agent、社区摘要、本地/全局检索、主题摘要、图片描述)
+原先各自用 requests.post 直接调用 Ollama, 每次请求新建 TCP 连接, 重试策略各不相同,
+也没有设置 keep_alive, Ollama 在阶段之间卸载模型后下一阶段要重新加载。本模块统一提供:
+
+- 连接池: 每个 Ollama 地址共享一个 requests.Session (HTTP keep-alive, 可并发复用连接);
+- 模型常驻: 请求携带 keep_alive (默认 30m, 环境变量 OLLAMA_KEEP_ALIVE 或 configure_defaults 修改);
+- 重试: 连接错误、超时、5xx/429 按指数退避 + 随机抖动重试, 4xx 直接失败;
+- 熔断: 连续多次连接失败/5xx 后在冷却期内快速失败, 冷却后放行一个探测请求;
+- 同步 (generate/chat/stream_generate/stream_chat) 与异步 (agenerate/achat) 接口, 异步接口优先使用 httpx;
+- 每次调用自动记录 instrumentation 埋点与 llm_telemetry 调用日志;
+- 多主机路由 (OllamaRouter): 按权重与最少在途请求数分发, 限制每台主机并发,
+  后台 /api/tags 健康检查, 请求失败时透明切换到其他主机。get_client 传入地址列表
+  (或逗号分隔的地址字符串) 时返回路由器, 接口与单机客户端相同。
+
+用法:
+    from ollama_client import OllamaError, get_client
+
+    client = get_client("http://localhost:11434")
+    result = client.generate("qwen2.5-coder:7b", prompt, system=system_prompt,
+                             options={"temperature": 0.1, "num_ctx": 4096}, format="json",
+                             component="extract")
+    text = result["response"]
+
+    client = get_client([
+        {"url": "http://10.0.0.11:11434", "weight": 2, "max_concurrency": 2},
+        "http://10.0.0.12:11434",
+    ])
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import metrics
+from llm_telemetry import telemetry
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+DEFAULT_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+
+# 可重试的 HTTP 状态码: 服务端错误 (如模型加载失败) 与限流
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class OllamaError(RuntimeError):
+    """请求最终失败 (重试用尽或不可重试的错误); status_code 为不可重试的 HTTP 状态码 (如有)"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(OllamaError):
+    """熔断打开, 请求未发出即失败"""
+
+
+class StreamAborted(Exception):
+    """调用方主动中止流式生成, 由 abort_stream 抛入生成器, 携带中止原因"""
+
+
+def abort_stream(stream: Iterator[str], reason: str):
+    """
+    以指定原因中止 stream_generate/stream_chat 返回的生成器
+
+    与 generator.close() 一样关闭 HTTP 连接, 但中止原因会写入 llm.stream.aborted 的 reason 标签
+    与调用日志 (直接 close() 时记为 closed)。
+    """
+    try:
+        stream.throw(StreamAborted(reason))
+    except (StopIteration, StreamAborted):
+        pass
+    finally:
+        stream.close()
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    CLOSED: 正常放行; 连续 failure_threshold 次失败后转为 OPEN。
+    OPEN: 拒绝所有请求; reset_timeout 秒后转为 HALF_OPEN。
+    HALF_OPEN: 只放行一个探测请求, 成功则恢复 CLOSED, 失败则重新 OPEN。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Ollama circuit opened after {self.failures} consecutive failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release_probe(self):
+        """探测请求以不影响熔断判断的方式结束 (如超时、4xx) 时释放探测名额"""
+        with self._lock:
+            self._probe_in_flight = False
+
+
+class _RetryableError(Exception):
+    """单次尝试失败且允许重试; breaker_failure 表示是否计入熔断"""
+
+    def __init__(self, cause: Exception, breaker_failure: bool):
+        super().__init__(str(cause))
+        self.cause = cause
+        self.breaker_failure = breaker_failure
+
+
+class OllamaClient:
+    """共享连接池的 Ollama HTTP 客户端 (线程安全)"""
+
+    def __init__(self, host: str = DEFAULT_HOST, timeout: float = 600,
+                 keep_alive: Optional[str] = DEFAULT_KEEP_ALIVE, max_retries: int = 3,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0, pool_size: int = 16,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            host: Ollama 服务地址
+            timeout: 默认请求超时 (秒), 可按调用覆盖
+            keep_alive: 模型在显存中保留的时长 (如 "30m"、"-1" 表示常驻), None 表示使用服务端默认值
+            max_retries: 默认最大尝试次数, 可按调用覆盖
+            backoff_base: 退避基数 (秒), 第 n 次重试等待约 backoff_base * 2^n
+            backoff_max: 单次退避上限 (秒)
+            pool_size: 连接池大小 (应不小于并发线程数)
+            failure_threshold: 熔断阈值 (连续失败次数)
+            reset_timeout: 熔断冷却时间 (秒)
+        """
+        self.host = host.rstrip("/")
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.max_retries = max(1, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_size = pool_size
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        # 重试由本类控制, 连接池层面不再重试
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._async_client = None
+
+    # ------------------------------------------------------------------
+    # 同步接口
+    # ------------------------------------------------------------------
+
+    def generate(self, model: str, prompt: str, system: str = "",
+                 options: Optional[Dict[str, Any]] = None, format: Optional[str] = None,
+                 images: Optional[List[str]] = None, timeout: Optional[float] = None,
+                 max_retries: Optional[int] = None, component: str = "", **extra) -> Dict:
+        """
+        调用 /api/generate (非流式)
+
+        Args:
+            model: 模型名
+            prompt: 用户提示词
+            system: 系统提示词
+            options: 采样参数 (temperature/top_p/top_k/num_ctx/...)
+            format: "json" 或 JSON Schema, 约束输出格式
+            images: base64 编码的图片列表 (视觉模型)
+            timeout: 本次调用超时 (秒)
+            max_retries: 本次调用最大尝试次数
+            component: 调用方名称, 写入调用日志
+            **extra: 其他请求字段 (如 context、raw)
+
+        Returns:
+            Ollama 响应 JSON
+
+        Raises:
+            OllamaError: 重试用尽、不可重试的错误或熔断打开
+        """
+        payload = self._payload(model, prompt=prompt, system=system, options=options,
+                                format=format, images=images, **extra)
+        return self._request("/api/generate", payload, timeout, max_retries, component)
+
+    def chat(self, model: str, messages: List[Dict[str, str]],
+             options: Optional[Dict[str, Any]] = None, format: Optional[str] = None,
+             timeout: Optional[float] = None, max_retries: Optional[int] = None,
+             component: str = "", **extra) -> Dict:
+        """调用 /api/chat (非流式), 返回响应 JSON (文本在 result["message"]["content"])"""
+        payload = self._payload(model, messages=messages, options=options, format=format, **extra)
+        return self._request("/api/chat", payload, timeout, max_retries, component)
+
+    def stream_generate(self, model: str, prompt: str, system: str = "",
+                        options: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+                        component: str = "", format: Optional[str] = None,
+                        on_done: Optional[Callable[[Dict], None]] = None, **extra) -> Iterator[str]:
+        """
+        流式调用 /api/generate, 逐个产出文本片段
+
+        只在建立连接阶段重试; 开始输出后出错抛出 OllamaError, 避免重复内容。
+        调用方提前关闭生成器 (generator.close()) 时会同时关闭 HTTP 连接,
+        Ollama 检测到连接断开后会停止生成。on_done 收到最后一条 done=true 记录 (含 token 统计)。
+        """
+        payload = self._payload(model, prompt=prompt, system=system, options=options, format=format,
+                                stream=True, **extra)
+        return self._stream("/api/generate", payload, timeout, component, on_done)
+
+    def stream_chat(self, model: str, messages: List[Dict[str, str]],
+                    options: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+                    component: str = "", format: Optional[str] = None,
+                    on_done: Optional[Callable[[Dict], None]] = None, **extra) -> Iterator[str]:
+        """流式调用 /api/chat, 逐个产出 message.content 片段; 语义与 stream_generate 相同"""
+        payload = self._payload(model, messages=messages, options=options, format=format, stream=True, **extra)
+        return self._stream("/api/chat", payload, timeout, component, on_done)
+
+    def _stream(self, path: str, payload: Dict, timeout: Optional[float], component: str,
+                on_done: Optional[Callable[[Dict], None]]) -> Iterator[str]:
+        model = payload["model"]
+        started = time.perf_counter()
+        response, retries = self._send(path, payload, timeout, None, component, stream=True)
+        pieces = 0
+        done = False
+        error = "closed"
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                token = chunk.get("response") or (chunk.get("message") or {}).get("content", "")
+                if token:
+                    pieces += 1
+                    yield token
+                if chunk.get("done"):
+                    done = True
+                    metrics.incr("llm.calls", model=model)
+                    telemetry.record_call(model, chunk, time.perf_counter() - started,
+                                          retries=retries, component=component)
+                    if on_done is not None:
+                        on_done(chunk)
+                # 不在 done 后 break: 读完分块结束标记, 连接才能回到连接池复用
+        except StreamAborted as e:
+            error = str(e) or error
+        except (requests.exceptions.RequestException, ValueError) as e:
+            error = type(e).__name__
+            raise OllamaError(f"Ollama stream interrupted: {e}") from e
+        finally:
+            response.close()
+            if not done:
+                # 调用方提前中止或中途断开: 记录已消耗的时间, 便于统计被浪费的生成耗时
+                metrics.incr("llm.stream.aborted", model=model, reason=error)
+                telemetry.record_call(model, None, time.perf_counter() - started, retries=retries,
+                                      error=error, component=component, streamed_pieces=pieces)
+
+    def tags(self, timeout: float = 5) -> List[Dict]:
+        """已安装的模型列表 (/api/tags)"""
+        try:
+            response = self.session.get(f"{self.host}/api/tags", timeout=timeout)
+            response.raise_for_status()
+            return response.json().get("models", [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise OllamaError(f"Cannot list Ollama models at {self.host}: {e}") from e
+
+    def is_healthy(self, timeout: float = 5) -> bool:
+        try:
+            self.tags(timeout=timeout)
+            return True
+        except OllamaError:
+            return False
+
+    def unload(self, model: str):
+        """立即从显存卸载模型 (keep_alive=0)"""
+        try:
+            self.session.post(
+                f"{self.host}/api/generate", json={"model": model, "keep_alive": 0}, timeout=30
+            ).raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Failed to unload {model}: {e}")
+
+    def close(self):
+        self.session.close()
+
+    # ------------------------------------------------------------------
+    # 异步接口
+    # ------------------------------------------------------------------
+
+    async def agenerate(self, model: str, prompt: str, system: str = "",
+                        options: Optional[Dict[str, Any]] = None, format: Optional[str] = None,
+                        images: Optional[List[str]] = None, timeout: Optional[float] = None,
+                        max_retries: Optional[int] = None, component: str = "", **extra) -> Dict:
+        """generate 的异步版本; 未安装 httpx 时在线程池中执行同步请求"""
+        if not HTTPX_AVAILABLE:
+            return await asyncio.to_thread(
+                self.generate, model, prompt, system, options, format, images,
+                timeout, max_retries, component, **extra
+            )
+        payload = self._payload(model, prompt=prompt, system=system, options=options,
+                                format=format, images=images, **extra)
+        return await self._arequest("/api/generate", payload, timeout, max_retries, component)
+
+    async def achat(self, model: str, messages: List[Dict[str, str]],
+                    options: Optional[Dict[str, Any]] = None, format: Optional[str] = None,
+                    timeout: Optional[float] = None, max_retries: Optional[int] = None,
+                    component: str = "", **extra) -> Dict:
+        """chat 的异步版本"""
+        if not HTTPX_AVAILABLE:
+            return await asyncio.to_thread(
+                self.chat, model, messages, options, format, timeout, max_retries, component, **extra
+            )
+        payload = self._payload(model, messages=messages, options=options, format=format, **extra)
+        return await self._arequest("/api/chat", payload, timeout, max_retries, component)
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    # ------------------------------------------------------------------
+    # 内部实现
+    # ------------------------------------------------------------------
+
+    def _payload(self, model: str, options: Optional[Dict[str, Any]] = None,
+                 format: Optional[str] = None, stream: bool = False, **fields) -> Dict:
+        payload: Dict[str, Any] = {"model": model, "stream": stream}
+        for key, value in fields.items():
+            if value not in (None, "", []):
+                payload[key] = value
+        if options:
+            payload["options"] = options
+        if format:
+            payload["format"] = format
+        if self.keep_alive is not None and "keep_alive" not in payload:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _backoff(self, attempt: int) -> float:
+        """指数退避 + 抖动: 在 [delay/2, delay] 内均匀取值, 避免多个线程同时重试"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _attempt(self, path: str, payload: Dict, timeout: float, stream: bool) -> requests.Response:
+        """发出一次请求; 可重试的失败包装为 _RetryableError"""
+        try:
+            response = self.session.post(f"{self.host}{path}", json=payload, timeout=timeout, stream=stream)
+        except requests.exceptions.Timeout as e:
+            # 超时说明服务在线但生成慢, 不计入熔断
+            metrics.incr("llm.timeouts", model=payload["model"])
+            raise _RetryableError(e, breaker_failure=False)
+        except requests.exceptions.ConnectionError as e:
+            raise _RetryableError(e, breaker_failure=True)
+
+        if response.status_code in _RETRYABLE_STATUS:
+            error = requests.exceptions.HTTPError(
+                f"{response.status_code} from Ollama: {response.text[:200]}", response=response
+            )
+            response.close()
+            raise _RetryableError(error, breaker_failure=response.status_code >= 500)
+        if response.status_code >= 400:
+            message = response.text[:200]
+            response.close()
+            self.breaker.release_probe()
+            raise OllamaError(f"Ollama returned {response.status_code}: {message}",
+                              status_code=response.status_code)
+        return response
+
+    def _send(self, path: str, payload: Dict, timeout: Optional[float], max_retries: Optional[int],
+              component: str, stream: bool = False) -> Tuple[requests.Response, int]:
+        """带重试与熔断地发出请求, 返回 (成功的响应对象, 之前失败的尝试次数)"""
+        model = payload["model"]
+        timeout = timeout or self.timeout
+        attempts = max(1, max_retries or self.max_retries)
+        started = time.perf_counter()
+        last_error: Optional[Exception] = None
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                metrics.incr("llm.circuit_open", model=model)
+                telemetry.record_call(model, None, time.perf_counter() - started, retries=attempt,
+                                      error="circuit_open", component=component)
+                raise CircuitOpenError(f"Ollama at {self.host} is unavailable (circuit open)")
+            if attempt > 0:
+                metrics.incr("llm.retries", model=model)
+            try:
+                response = self._attempt(path, payload, timeout, stream)
+            except _RetryableError as e:
+                last_error = e.cause
+                if e.breaker_failure:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release_probe()
+                if attempt < attempts - 1:
+                    delay = self._backoff(attempt)
+                    logger.warning(
+                        f"Ollama request failed (attempt {attempt + 1}/{attempts}): {e}; "
+                        f"retrying in {delay:.1f}s"
+                    )
+                    time.sleep(delay)
+                continue
+            except OllamaError:
+                telemetry.record_call(model, None, time.perf_counter() - started, retries=attempt,
+                                      error="http_error", component=component)
+                raise
+            self.breaker.record_success()
+            return response, attempt
+
+        metrics.incr("llm.failures", model=model)
+        telemetry.record_call(model, None, time.perf_counter() - started, retries=attempts - 1,
+                              error=type(last_error).__name__, component=component)
+        raise OllamaError(f"Ollama request failed after {attempts} attempts: {last_error}") from last_error
+
+    def _request(self, path: str, payload: Dict, timeout: Optional[float],
+                 max_retries: Optional[int], component: str) -> Dict:
+        started = time.perf_counter()
+        with metrics.span("llm.call", model=payload["model"]):
+            response, retries = self._send(path, payload, timeout, max_retries, component)
+            try:
+                result = response.json()
+            except ValueError as e:
+                telemetry.record_call(payload["model"], None, time.perf_counter() - started,
+                                      retries=retries, error="invalid_json", component=component)
+                raise OllamaError(f"Invalid JSON from Ollama: {e}") from e
+        metrics.incr("llm.calls", model=payload["model"])
+        telemetry.record_call(payload["model"], result, time.perf_counter() - started,
+                              retries=retries, component=component)
+        return result
+
+    async def _arequest(self, path: str, payload: Dict, timeout: Optional[float],
+                        max_retries: Optional[int], component: str) -> Dict:
+        """异步请求 (httpx), 重试与熔断策略与同步接口相同"""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            )
+        model = payload["model"]
+        timeout = timeout or self.timeout
+        attempts = max(1, max_retries or self.max_retries)
+        started = time.perf_counter()
+        last_error: Optional[Exception] = None
+
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                metrics.incr("llm.circuit_open", model=model)
+                raise CircuitOpenError(f"Ollama at {self.host} is unavailable (circuit open)")
+            if attempt > 0:
+                metrics.incr("llm.retries", model=model)
+            attempt_started = time.perf_counter()
+            try:
+                response = await self._async_client.post(f"{self.host}{path}", json=payload, timeout=timeout)
+            except httpx.TimeoutException as e:
+                metrics.incr("llm.timeouts", model=model)
+                self.breaker.release_probe()
+                last_error = e
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                last_error = e
+            else:
+                if response.status_code in _RETRYABLE_STATUS:
+                    if response.status_code >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.release_probe()
+                    last_error = OllamaError(f"{response.status_code} from Ollama: {response.text[:200]}")
+                elif response.status_code >= 400:
+                    self.breaker.release_probe()
+                    telemetry.record_call(model, None, time.perf_counter() - started, retries=attempt,
+                                          error="http_error", component=component)
+                    raise OllamaError(f"Ollama returned {response.status_code}: {response.text[:200]}",
+                                      status_code=response.status_code)
+                else:
+                    # 与同步接口一致: HTTP 交互成功即计入熔断器, 响应体不是 JSON 时直接抛出不重试
+                    self.breaker.record_success()
+                    try:
+                        result = response.json()
+                    except ValueError as e:
+                        telemetry.record_call(model, None, time.perf_counter() - started, retries=attempt,
+                                              error="invalid_json", component=component)
+                        raise OllamaError(f"Invalid JSON from Ollama: {e}") from e
+                    metrics.incr("llm.calls", model=model)
+                    telemetry.record_call(model, result, time.perf_counter() - attempt_started,
+                                          retries=attempt, component=component)
+                    return result
+            if attempt < attempts - 1:
+                await asyncio.sleep(self._backoff(attempt))
+
+        metrics.incr("llm.failures", model=model)
+        telemetry.record_call(model, None, time.perf_counter() - started, retries=attempts - 1,
+                              error=type(last_error).__name__, component=component)
+        raise OllamaError(f"Ollama request failed after {attempts} attempts: {last_error}") from last_error
+
+
+class _Backend:
+    """路由器中的一台 Ollama 主机"""
+
+    def __init__(self, url: str, weight: float, max_concurrency: int, client: OllamaClient):
+        self.url = url
+        self.weight = max(weight, 1e-6)
+        self.max_concurrency = max(1, max_concurrency)
+        self.client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.dispatched = 0
+        self.failures = 0
+
+    def load(self) -> float:
+        """加权负载: 加入一个请求后的在途数 / 权重, 越小越优先"""
+        return (self.outstanding + 1) / self.weight
+
+
+class OllamaRouter:
+    """
+    多台 Ollama 主机的负载均衡客户端 (线程安全, 接口与 OllamaClient 相同)
+
+    - 分发: 在健康且未达并发上限的主机中选 (在途请求数 + 1) / 权重 最小者;
+      全部满载时等待空位;
+    - 健康检查: 后台线程每 health_interval 秒用 /api/tags 探测所有主机 (与 OllamaClient.is_healthy
+      相同的探测), 请求失败的主机立即标记为不健康, 探测恢复后重新加入;
+    - 故障切换: 连接错误、超时、5xx、熔断打开时换到其他主机重试 (每台主机每次调用最多一次),
+      4xx 说明请求本身有问题, 直接抛出; 所有主机都失败时抛出 OllamaError。
+    """
+
+    def __init__(self, endpoints: List[Union[str, Dict[str, Any]]], health_interval: float = 10.0,
+                 acquire_timeout: Optional[float] = None):
+        """
+        Args:
+            endpoints: 主机列表, 元素为地址字符串或 {"url", "weight" (默认 1), "max_concurrency" (默认 1)}
+            health_interval: 后台健康检查间隔 (秒), 0 表示不启动后台检查
+            acquire_timeout: 等待空闲主机的最长时间 (秒), None 表示一直等待
+        """
+        self.backends: List[_Backend] = []
+        for endpoint in endpoints:
+            if isinstance(endpoint, str):
+                endpoint = {"url": endpoint}
+            url = endpoint["url"].rstrip("/")
+            self.backends.append(_Backend(
+                url, float(endpoint.get("weight", 1)), int(endpoint.get("max_concurrency", 1)),
+                _client_for(url),
+            ))
+        if not self.backends:
+            raise ValueError("OllamaRouter 至少需要一个主机")
+        self.host = ",".join(b.url for b in self.backends)
+        self.health_interval = health_interval
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+    @property
+    def capacity(self) -> int:
+        """所有主机的并发上限之和, 即值得同时提交的请求数"""
+        return sum(b.max_concurrency for b in self.backends)
+
+    # ------------------------------------------------------------------
+    # 分发与健康检查
+    # ------------------------------------------------------------------
+
+    def _ensure_health_thread(self):
+        if self.health_interval <= 0 or self._health_thread is not None:
+            return
+        with self._cond:
+            if self._health_thread is None:
+                self._health_thread = threading.Thread(
+                    target=self._health_loop, name="ollama-router-health", daemon=True
+                )
+                self._health_thread.start()
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def check_health(self, timeout: float = 5) -> Dict[str, bool]:
+        """探测所有主机, 更新健康状态, 返回 {url: healthy}"""
+        status = {b.url: b.client.is_healthy(timeout=timeout) for b in self.backends}
+        with self._cond:
+            for backend in self.backends:
+                if backend.healthy != status[backend.url]:
+                    logger.info(f"Ollama host {backend.url} is {'up' if status[backend.url] else 'down'}")
+                backend.healthy = status[backend.url]
+            self._cond.notify_all()
+        return status
+
+    def _mark_unhealthy(self, backend: _Backend, error: Exception):
+        with self._cond:
+            backend.failures += 1
+            if backend.healthy:
+                logger.warning(f"Ollama host {backend.url} failed, routing around it: {error}")
+            backend.healthy = False
+            self._cond.notify_all()
+
+    def _acquire(self, exclude: set) -> _Backend:
+        """选出负载最低的可用主机并占用一个并发名额; 没有健康主机时先同步探测一次"""
+        self._ensure_health_thread()
+        deadline = None if self.acquire_timeout is None else time.monotonic() + self.acquire_timeout
+        probed = False
+        with self._cond:
+            while True:
+                candidates = [b for b in self.backends if b.healthy and b.url not in exclude]
+                if not candidates:
+                    if probed:
+                        raise OllamaError(f"No healthy Ollama host available ({self.host})")
+                    # 全部不健康时在锁外探测一次, 避免在健康检查周期内白白失败
+                    self._cond.release()
+                    try:
+                        self.check_health()
+                    finally:
+                        self._cond.acquire()
+                    probed = True
+                    continue
+                free = [b for b in candidates if b.outstanding < b.max_concurrency]
+                if free:
+                    backend = min(free, key=_Backend.load)
+                    backend.outstanding += 1
+                    backend.dispatched += 1
+                    metrics.incr("llm.router.dispatch", host=backend.url)
+                    return backend
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise OllamaError(f"Timed out waiting for a free Ollama host ({self.host})")
+                self._cond.wait(remaining)
+
+    def _release(self, backend: _Backend):
+        with self._cond:
+            backend.outstanding -= 1
+            self._cond.notify()
+
+    def _route(self, call, max_retries: Optional[int] = None):
+        """
+        在各主机间执行 call(client), 失败时切换主机
+
+        每台主机每次调用只试一次 (主机内部不再重试, 由切换代替); 所有主机都失败后
+        按 max_retries 轮次退避再来一遍。
+        """
+        rounds = max(1, max_retries or 1)
+        last_error: Optional[Exception] = None
+        for round_index in range(rounds):
+            tried: set = set()
+            while len(tried) < len(self.backends):
+                try:
+                    backend = self._acquire(tried)
+                except OllamaError as e:
+                    last_error = last_error or e
+                    break
+                try:
+                    with telemetry.scope(host=backend.url):
+                        return call(backend.client)
+                except OllamaError as e:
+                    if e.status_code is not None:
+                        raise
+                    tried.add(backend.url)
+                    last_error = e
+                    self._mark_unhealthy(backend, e)
+                    metrics.incr("llm.router.failover", host=backend.url)
+                finally:
+                    self._release(backend)
+            if round_index < rounds - 1:
+                time.sleep(self.backends[0].client._backoff(round_index))
+        raise OllamaError(f"All Ollama hosts failed: {last_error}") from last_error
+
+    # ------------------------------------------------------------------
+    # 与 OllamaClient 相同的接口
+    # ------------------------------------------------------------------
+
+    def generate(self, model: str, prompt: str, system: str = "",
+                 options: Optional[Dict[str, Any]] = None, format: Optional[str] = None,
+                 images: Optional[List[str]] = None, timeout: Optional[float] = None,
+                 max_retries: Optional[int] = None, component: str = "", **extra) -> Dict:
+        return self._route(
+            lambda client: client.generate(model, prompt, system, options, format, images,
+                                           timeout, 1, component, **extra),
+            max_retries,
+        )
+
+    def chat(self, model: str, messages: List[Dict[str, str]],
+             options: Optional[Dict[str, Any]] = None, format: Optional[str] = None,
+             timeout: Optional[float] = None, max_retries: Optional[int] = None,
+             component: str = "", **extra) -> Dict:
+        return self._route(
+            lambda client: client.chat(model, messages, options, format, timeout, 1, component, **extra),
+            max_retries,
+        )
+
+    def stream_generate(self, model: str, prompt: str, system: str = "",
+                        options: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+                        component: str = "", format: Optional[str] = None,
+                        on_done: Optional[Callable[[Dict], None]] = None, **extra) -> Iterator[str]:
+        """流式生成; 只在收到第一个片段之前切换主机, 之后出错直接抛出"""
+        return self._route_stream(
+            lambda client: client.stream_generate(model, prompt, system, options, timeout, component,
+                                                  format, on_done, **extra)
+        )
+
+    def stream_chat(self, model: str, messages: List[Dict[str, str]],
+                    options: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None,
+                    component: str = "", format: Optional[str] = None,
+                    on_done: Optional[Callable[[Dict], None]] = None, **extra) -> Iterator[str]:
+        return self._route_stream(
+            lambda client: client.stream_chat(model, messages, options, timeout, component,
+                                              format, on_done, **extra)
+        )
+
+    def _route_stream(self, open_stream) -> Iterator[str]:
+        tried: set = set()
+        while True:
+            backend = self._acquire(tried)
+            stream = open_stream(backend.client)
+            try:
+                try:
+                    first = next(stream, None)
+                except OllamaError as e:
+                    if e.status_code is not None:
+                        raise
+                    tried.add(backend.url)
+                    self._mark_unhealthy(backend, e)
+                    metrics.incr("llm.router.failover", host=backend.url)
+                    if len(tried) >= len(self.backends):
+                        raise OllamaError(f"All Ollama hosts failed: {e}") from e
+                    continue
+                if first is not None:
+                    try:
+                        yield first
+                    except StreamAborted as e:
+                        # 在首个片段处中止: 转交给主机的流, 以便记录中止原因
+                        abort_stream(stream, str(e))
+                        return
+                    yield from stream
+                return
+            finally:
+                stream.close()
+                self._release(backend)
+
+    def tags(self, timeout: float = 5) -> List[Dict]:
+        """第一台可达主机的模型列表; 各主机应部署相同的模型"""
+        last_error: Optional[Exception] = None
+        for backend in self.backends:
+            try:
+                return backend.client.tags(timeout=timeout)
+            except OllamaError as e:
+                last_error = e
+        raise OllamaError(f"Cannot list Ollama models on any host ({self.host}): {last_error}")
+
+    def is_healthy(self, timeout: float = 5) -> bool:
+        return any(self.check_health(timeout=timeout).values())
+
+    def unload(self, model: str):
+        for backend in self.backends:
+            backend.client.unload(model)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """各主机的状态与累计分发数"""
+        with self._cond:
+            return [
+                {"url": b.url, "weight": b.weight, "max_concurrency": b.max_concurrency,
+                 "healthy": b.healthy, "outstanding": b.outstanding,
+                 "dispatched": b.dispatched, "failures": b.failures}
+                for b in self.backends
+            ]
+
+    def close(self):
+        self._stop.set()
+
+    async def agenerate(self, *args, **kwargs) -> Dict:
+        return await asyncio.to_thread(self.generate, *args, **kwargs)
+
+    async def achat(self, *args, **kwargs) -> Dict:
+        return await asyncio.to_thread(self.chat, *args, **kwargs)
+
+    async def aclose(self):
+        self.close()
+
+
+# ----------------------------------------------------------------------
+# 进程内共享实例
+# ----------------------------------------------------------------------
+
+_clients: Dict[str, OllamaClient] = {}
+_routers: Dict[str, OllamaRouter] = {}
+_clients_lock = threading.RLock()
+_defaults: Dict[str, Any] = {}
+
+
+def configure_defaults(**kwargs):
+    """
+    设置之后新建客户端的默认参数 (keep_alive/max_retries/backoff_base/pool_size/...)
+
+    keep_alive 同时应用到已创建的客户端。
+    """
+    with _clients_lock:
+        _defaults.update({k: v for k, v in kwargs.items() if v is not None})
+        if kwargs.get("keep_alive") is not None:
+            for client in _clients.values():
+                client.keep_alive = kwargs["keep_alive"]
+
+
+def _client_for(host: str) -> OllamaClient:
+    """返回 (必要时创建) 单机共享客户端"""
+    with _clients_lock:
+        client = _clients.get(host)
+        if client is None:
+            client = _clients[host] = OllamaClient(host, **_defaults)
+        return client
+
+
+def get_client(host: Union[str, List[Union[str, Dict[str, Any]]], None] = None
+               ) -> Union[OllamaClient, OllamaRouter]:
+    """
+    按服务地址返回共享客户端, 同一地址的所有调用方复用同一个连接池与熔断器
+
+    host 为地址列表 (或逗号分隔的多个地址) 时返回这些主机上的共享 OllamaRouter。
+    """
+    if isinstance(host, str) and "," in host:
+        host = [h.strip() for h in host.split(",") if h.strip()]
+    if isinstance(host, (list, tuple)):
+        endpoints = [{"url": h} if isinstance(h, str) else dict(h) for h in host]
+        if len(endpoints) == 1 and set(endpoints[0]) == {"url"}:
+            host = endpoints[0]["url"]
+        else:
+            key = json.dumps(endpoints, sort_keys=True)
+            with _clients_lock:
+                router = _routers.get(key)
+                if router is None:
+                    router = _routers[key] = OllamaRouter(endpoints)
+                return router
+    return _client_for((host or DEFAULT_HOST).rstrip("/"))
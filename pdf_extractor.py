@@ -26,6 +26,8 @@ from tqdm import tqdm
 # 移除 parallel_processor 依赖（原项目未提供，简化为串行处理）
 import pandas as pd
 
+from instrumentation import metrics
+
 # 智能文档解析支持
 try:
     import marker  # Marker解析库（需要GPU）
@@ -496,6 +498,7 @@ class PDFExtractor:
             cached_text = self.cache.get_pdf_cache(pdf_path)
             if cached_text:
                 self.logger.info(f"使用缓存: {os.path.basename(pdf_path)}")
+                metrics.incr('pdf.cache_hits')
                 return cached_text
         
         self.logger.info(f"开始提取: {os.path.basename(pdf_path)}")
@@ -503,20 +506,25 @@ class PDFExtractor:
         try:
             # 选择解析方式：优先使用 Marker，其次 pdfplumber，最后回退到 PyMuPDF 基础解析
             if self.use_marker:
-                raw_text, sections = self._parse_with_marker(pdf_path)
+                with metrics.span('pdf.parse', parser='marker'):
+                    raw_text, sections = self._parse_with_marker(pdf_path)
             elif PDFPLUMBER_AVAILABLE:
-                raw_text, sections = self._parse_with_pdfplumber(pdf_path)
+                with metrics.span('pdf.parse', parser='pdfplumber'):
+                    raw_text, sections = self._parse_with_pdfplumber(pdf_path)
             else:
-                raw_text, sections = self._parse_with_fitz(pdf_path)
+                with metrics.span('pdf.parse', parser='fitz'):
+                    raw_text, sections = self._parse_with_fitz(pdf_path)
             
             # 处理结构化内容：统一做页眉页脚/参考文献剔除和 Markdown 合并
-            processed_text = self._process_sections(sections)
+            with metrics.span('pdf.process_sections'):
+                processed_text = self._process_sections(sections)
             
             # 如果提取的文本很少，认为可能是扫描版 PDF，再退一步尝试 OCR
             if self.enable_ocr and self.ocr_processor and len(processed_text) < 500:
                 self.logger.info(f"文本量过少（{len(processed_text)}字符），可能为扫描版PDF，尝试OCR...")
                 try:
-                    ocr_text = self.ocr_processor.extract_text_from_pdf(pdf_path)
+                    with metrics.span('pdf.ocr'):
+                        ocr_text = self.ocr_processor.extract_text_from_pdf(pdf_path)
                     if ocr_text and len(ocr_text) > len(processed_text):
                         self.logger.info(f"OCR提取成功: {len(ocr_text)} 字符")
                         processed_text = ocr_text
@@ -530,10 +538,13 @@ class PDFExtractor:
                 self.cache.set_pdf_cache(pdf_path, processed_text)
             
             self.logger.info(f"提取完成: {os.path.basename(pdf_path)}, {len(processed_text)} 字符")
+            metrics.incr('pdf.files')
+            metrics.incr('pdf.chars', len(processed_text))
             return processed_text
         
         except Exception as e:
             self.logger.error(f"提取失败: {pdf_path}, 错误: {str(e)}")
+            metrics.incr('pdf.failures')
             return ""
     
     def extract_from_directory(self, directory: str) -> Dict[str, str]:
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""流式 JSON 增量解析
+
+抽取响应以流式方式到达时, 逐字符跟踪 JSON 结构 (括号栈、字符串与转义状态、当前键),
+在 token 到达的同时做三件事:
+
+- 结构校验: 开头不是 JSON 对象、括号不匹配、出现非法字符时立即判定为不可恢复;
+- 上限检查: concepts / relationships 数组中已完成的对象数超过上限、响应总长度超过上限、
+  同一对象反复出现 (小模型陷入重复循环) 时判定为失控;
+- 记录完整对象: 数组中每个闭合的对象连同其所在路径 (如 ('concepts',) 或 ('C1', 'relationships'))
+  保存下来, 响应被中止或截断时用 salvage() 重新组装出只含完整对象的结果。
+
+调用方在 abort_reason 非空时关闭流, Ollama 随即停止生成, 不再为注定丢弃的输出付出生成时间。
+
+用法:
+    parser = StreamingJSONParser(max_items={'concepts': 60, 'relationships': 80}, max_chars=16000)
+    for piece in client.stream_generate(...):
+        parser.feed(piece)
+        if parser.finished:
+            break
+    data = json.loads(parser.json_text()) if parser.complete else parser.salvage()
+"""
+
+import json
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# 字符串之外允许出现的字面量字符 (数字、true/false/null)
+_LITERAL_CHARS = set("0123456789+-.eEtrufalsn")
+
+
+class _Frame:
+    """括号栈中的一层: 对象记录当前键, 数组记录其所在的键"""
+    __slots__ = ('kind', 'key', 'expect_key', 'item_start')
+
+    def __init__(self, kind: str, key: Optional[str] = None, item_start: Optional[int] = None):
+        self.kind = kind
+        self.key = key
+        self.expect_key = kind == '{'
+        self.item_start = item_start
+
+
+class StreamingJSONParser:
+    """抽取响应的增量结构校验器 (不构建完整的解析树)"""
+
+    def __init__(self, item_keys: Tuple[str, ...] = ('concepts', 'relationships'),
+                 max_items: Optional[Dict[str, int]] = None, max_chars: int = 0, max_repeats: int = 0):
+        """
+        Args:
+            item_keys: 需要逐项记录的数组键名
+            max_items: 各数组键名的对象数上限 (整个响应累计), 超过即中止; 0 或缺省表示不限
+            max_chars: 响应总字符数上限, 0 表示不限
+            max_repeats: 同一路径下完全相同的对象允许出现的次数, 超过视为重复循环; 0 表示不检查
+        """
+        self.item_keys = set(item_keys)
+        self.max_items = dict(max_items or {})
+        self.max_chars = max_chars
+        self.max_repeats = max_repeats
+
+        self.text = ""
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.items: List[Tuple[Tuple[str, ...], str]] = []
+        self.complete = False
+        self.abort_reason: Optional[str] = None
+
+        self._pos = 0
+        self._end = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        self._in_fence = False
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._seen: Dict[Tuple[Tuple[str, ...], str], int] = defaultdict(int)
+
+    @property
+    def finished(self) -> bool:
+        """已读到顶层对象结束, 或已判定需要中止"""
+        return self.complete or self.abort_reason is not None
+
+    def abort(self, reason: str):
+        if self.abort_reason is None:
+            self.abort_reason = reason
+
+    def feed(self, piece: str):
+        """追加一段文本并推进状态; finished 之后的输入被忽略"""
+        if self.finished:
+            return
+        self.text += piece
+        if self.max_chars and len(self.text) > self.max_chars:
+            self.abort('too_long')
+            return
+        text = self.text
+        for i in range(self._pos, len(text)):
+            self._step(text, i)
+            if self.finished:
+                break
+        self._pos = len(text)
+
+    def _step(self, text: str, i: int):
+        ch = text[i]
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == '\\':
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                frame = self._stack[-1]
+                if frame.kind == '{' and frame.expect_key:
+                    try:
+                        frame.key = json.loads(text[self._string_start:i + 1])
+                    except ValueError:
+                        self.abort('invalid_string')
+            return
+
+        if not self._started:
+            # 允许前导空白与 ```json 代码块标记, 其余内容说明模型没有按要求输出 JSON
+            if self._in_fence:
+                self._in_fence = ch != '\n'
+            elif ch == '`':
+                self._in_fence = True
+            elif ch == '{':
+                self._started = True
+                self._stack.append(_Frame('{'))
+            elif not ch.isspace():
+                self.abort('not_json')
+            return
+
+        if ch.isspace():
+            return
+        frame = self._stack[-1]
+        if ch == '"':
+            self._in_string = True
+            self._string_start = i
+        elif ch == '{' or ch == '[':
+            item_start = i if ch == '{' and frame.kind == '[' and frame.key in self.item_keys else None
+            self._stack.append(_Frame(ch, key=frame.key if ch == '[' else None, item_start=item_start))
+        elif ch == '}' or ch == ']':
+            if frame.kind != ('{' if ch == '}' else '['):
+                self.abort('mismatched_bracket')
+                return
+            self._stack.pop()
+            if not self._stack:
+                self.complete = True
+                self._end = i + 1
+            elif frame.item_start is not None:
+                self._add_item(text[frame.item_start:i + 1])
+        elif ch == ':':
+            if frame.kind != '{' or not frame.expect_key:
+                self.abort('unexpected_colon')
+            frame.expect_key = False
+        elif ch == ',':
+            if frame.kind == '{':
+                frame.expect_key = True
+        elif ch not in _LITERAL_CHARS:
+            self.abort('unexpected_char')
+
+    def _add_item(self, raw: str):
+        # 每层对象的当前键即通向下一层的键, 最后一个是数组的键名
+        path = tuple(frame.key for frame in self._stack if frame.kind == '{')
+        kind = path[-1]
+        # 先检查上限与重复, 触发中止的对象本身不保留, salvage() 的结果不会超过上限
+        limit = self.max_items.get(kind)
+        if limit and self.counts[kind] >= limit:
+            self.abort(f'too_many_{kind}')
+            return
+        if self.max_repeats:
+            key = (path, "".join(raw.split()))
+            if self._seen[key] >= self.max_repeats:
+                self.abort('repetition')
+                return
+            self._seen[key] += 1
+        self.items.append((path, raw))
+        self.counts[kind] += 1
+
+    def json_text(self) -> str:
+        """完整响应中顶层对象部分 (去掉代码块标记等前后缀); 仅在 complete 时有意义"""
+        start = self.text.find('{')
+        return self.text[start:self._end] if self.complete else self.text[start:]
+
+    def salvage(self) -> Dict:
+        """
+        只用已完整输出的对象重建结果
+
+        按记录的路径放回嵌套对象, 如 {'concepts': [...], 'relationships': [...]} 或
+        {'C1': {'concepts': [...]}, ...}; 单个对象本身无法解析时跳过。
+        """
+        result: Dict = {}
+        for path, raw in self.items:
+            try:
+                item = json.loads(raw)
+            except ValueError:
+                continue
+            node = result
+            for key in path[:-1]:
+                node = node.setdefault(key, {})
+                if not isinstance(node, dict):
+                    break
+            else:
+                node.setdefault(path[-1], []).append(item)
+        return result
@@ -0,0 +1,179 @@
+"""StreamingJSONParser 与 ConceptExtractor._stream_json 的行为测试"""
+import json
+
+import pytest
+
+from streaming_json import StreamingJSONParser
+
+
+def feed_all(parser, text, step=7):
+    """按固定长度切片喂入, 模拟 token 逐段到达"""
+    for i in range(0, len(text), step):
+        parser.feed(text[i:i + step])
+        if parser.finished:
+            break
+    return parser
+
+
+def concept(name):
+    return {"entity": name, "importance": 3, "category": "organism"}
+
+
+def test_code_fence_prefix_is_skipped():
+    body = json.dumps({"concepts": [concept("松材线虫")], "relationships": []}, ensure_ascii=False)
+    parser = feed_all(StreamingJSONParser(), f"```json\n{body}\n```")
+
+    assert parser.complete
+    assert parser.abort_reason is None
+    assert json.loads(parser.json_text()) == json.loads(body)
+    assert parser.counts["concepts"] == 1
+
+
+def test_leading_prose_is_not_json():
+    parser = feed_all(StreamingJSONParser(), 'Here is the JSON: {"concepts": []}')
+
+    assert parser.abort_reason == "not_json"
+    assert not parser.complete
+
+
+def test_mismatched_bracket_aborts_and_keeps_complete_items():
+    text = '{"concepts": [{"entity": "A"}, {"entity": "B"}}'
+    parser = feed_all(StreamingJSONParser(), text)
+
+    assert parser.abort_reason == "mismatched_bracket"
+    assert parser.salvage() == {"concepts": [{"entity": "A"}, {"entity": "B"}]}
+
+
+def test_brackets_inside_strings_are_ignored():
+    text = '{"concepts": [{"entity": "a]b}c", "note": "x\\"]"}]}'
+    parser = feed_all(StreamingJSONParser(), text)
+
+    assert parser.complete
+    assert parser.salvage() == {"concepts": [{"entity": "a]b}c", "note": 'x"]'}]}
+
+
+def test_count_cap_drops_the_tripping_item():
+    items = [concept(f"C{i}") for i in range(5)]
+    text = json.dumps({"concepts": items, "relationships": []})
+    parser = feed_all(StreamingJSONParser(max_items={"concepts": 3}), text)
+
+    assert parser.abort_reason == "too_many_concepts"
+    assert parser.counts["concepts"] == 3
+    assert [c["entity"] for c in parser.salvage()["concepts"]] == ["C0", "C1", "C2"]
+
+
+def test_max_chars_aborts():
+    text = json.dumps({"concepts": [concept(f"C{i}") for i in range(20)]})
+    parser = feed_all(StreamingJSONParser(max_chars=100), text)
+
+    assert parser.abort_reason == "too_long"
+
+
+def test_repetition_detection_ignores_whitespace():
+    text = '{"concepts": [{"entity": "A"}, { "entity" : "A" }, {"entity":"A"}, {"entity": "B"}]}'
+    parser = feed_all(StreamingJSONParser(max_repeats=2), text)
+
+    assert parser.abort_reason == "repetition"
+    assert parser.salvage() == {"concepts": [{"entity": "A"}, {"entity": "A"}]}
+
+
+def test_repeats_under_different_paths_are_counted_separately():
+    text = '{"C1": {"concepts": [{"entity": "A"}]}, "C2": {"concepts": [{"entity": "A"}]}}'
+    parser = feed_all(StreamingJSONParser(max_repeats=1), text)
+
+    assert parser.complete
+    assert parser.abort_reason is None
+
+
+def test_salvage_packed_response_paths():
+    # 多块打包请求: 结果按块编号嵌套, 第二个块的关系数组在中途被截断
+    text = (
+        '{"C1": {"concepts": [{"entity": "A"}], "relationships": [{"node_1": "A", "node_2": "B"}]},'
+        ' "C2": {"concepts": [{"entity": "C"}, {"entity": "D"}], "relationships": [{"node_1": "C", "no'
+    )
+    parser = feed_all(StreamingJSONParser(), text)
+
+    assert not parser.finished
+    assert [path for path, _ in parser.items] == [
+        ("C1", "concepts"), ("C1", "relationships"), ("C2", "concepts"), ("C2", "concepts"),
+    ]
+    assert parser.salvage() == {
+        "C1": {"concepts": [{"entity": "A"}], "relationships": [{"node_1": "A", "node_2": "B"}]},
+        "C2": {"concepts": [{"entity": "C"}, {"entity": "D"}]},
+    }
+
+
+def test_input_after_finish_is_ignored():
+    parser = StreamingJSONParser()
+    parser.feed('{"concepts": []}')
+    parser.feed(' trailing {"x": 1')
+
+    assert parser.complete
+    assert parser.json_text() == '{"concepts": []}'
+
+
+# ----------------------------------------------------------------------
+# ConceptExtractor._stream_json
+# ----------------------------------------------------------------------
+
+@pytest.fixture
+def extractor(monkeypatch):
+    pytest.importorskip("pandas")
+    pytest.importorskip("tqdm")
+    import concept_extractor
+    from concept_extractor import ConceptExtractor
+
+    monkeypatch.setattr(ConceptExtractor, "_verify_ollama_connection", lambda self: None)
+    aborted = []
+    monkeypatch.setattr(concept_extractor, "abort_stream", lambda stream, reason: aborted.append(reason))
+    instance = ConceptExtractor(stream_json=True)
+    instance.aborted = aborted
+    return instance
+
+
+def stream_of(pieces, error=None, done=None):
+    """open_stream 替身: 依次产出 pieces, 之后可选地抛出 error"""
+    def open_stream(on_done):
+        def generate():
+            yield from pieces
+            if error is not None:
+                raise error
+            if done is not None:
+                on_done(done)
+        return generate()
+    return open_stream
+
+
+def test_stream_json_returns_complete_text(extractor):
+    body = '{"concepts": [{"entity": "A"}], "relationships": []}'
+    text, final = extractor._stream_json(stream_of([body[:10], body[10:]], done={"eval_count": 5}))
+
+    assert json.loads(text) == json.loads(body)
+    assert final == {"eval_count": 5}
+    assert extractor.aborted == []
+
+
+def test_stream_json_salvages_after_mid_stream_error(extractor):
+    from ollama_client import OllamaError
+
+    pieces = ['{"concepts": [{"entity": "A"}, ', '{"entity": "B"}, {"enti']
+    text, final = extractor._stream_json(stream_of(pieces, error=OllamaError("connection reset")))
+
+    assert json.loads(text) == {"concepts": [{"entity": "A"}, {"entity": "B"}]}
+    assert final == {}
+
+
+def test_stream_json_reraises_error_without_items(extractor):
+    from ollama_client import OllamaError
+
+    with pytest.raises(OllamaError):
+        extractor._stream_json(stream_of(['{"concepts": [{"ent'], error=OllamaError("connection reset")))
+
+
+def test_stream_json_aborts_on_cap_with_parser_reason(extractor):
+    extractor.stream_caps = dict(extractor.stream_caps, max_concepts=2)
+    body = json.dumps({"concepts": [concept(f"C{i}") for i in range(4)]})
+    text, _ = extractor._stream_json(stream_of([body]))
+
+    assert extractor.aborted == ["too_many_concepts"]
+    assert [c["entity"] for c in json.loads(text)["concepts"]] == ["C0", "C1"]
@@ -0,0 +1,152 @@
+"""StructureAwareChunker 的行为测试: 固定小预算下的块边界与 chunk_id"""
+import pytest
+
+from text_chunker import StructureAwareChunker
+
+
+DOC = """# 1 引言
+
+松材线虫病是松树的毁灭性病害。病原为松材线虫 B. xylophilus，由松褐天牛传播。该病在 1982 年首次在南京发现。发病松树针叶在 40 天内全部枯黄。病木需在 3.5 个月内清理完毕[3]。
+
+## 1.1 症状
+
+感病松树先是针叶失水褪绿。随后树脂分泌停止，全株枯死。
+
+表格内容：   0     1
+0  防治方法  药剂
+1  注干  阿维菌素
+2  喷雾  噻虫啉
+3  熏蒸  磷化铝
+
+[1] Mamiya Y. Pathology of the pine wilt disease[J]. Annu Rev Phytopathol, 1983.
+[2] Zhao B G, et al. Pine Wilt Disease[M]. Tokyo: Springer, 2008.
+
+# 2 防治
+
+清理病木并熏蒸处理。
+
+# 参考文献
+
+[3] 杨宝君. 松材线虫病[M]. 北京: 中国林业出版社, 2003.
+"""
+
+
+@pytest.fixture
+def chunker():
+    return StructureAwareChunker(max_tokens=60, min_chars=10)
+
+
+def test_sentence_split_keeps_abbreviations_and_decimals(chunker):
+    text = ("The pine wood nematode B. xylophilus was first found in 1905. Its body length is 0.8 mm "
+            "on average. It spreads via M. alternatus! 松材线虫病危害严重。防治需要综合措施；包括清理病木。")
+
+    assert chunker._sentences(text) == [
+        "The pine wood nematode B. xylophilus was first found in 1905. ",
+        "Its body length is 0.8 mm on average. ",
+        "It spreads via M. alternatus! ",
+        "松材线虫病危害严重。",
+        "防治需要综合措施；",
+        "包括清理病木。",
+    ]
+
+
+def test_sentence_split_joins_wrapped_lines_and_strips_citations(chunker):
+    assert chunker._sentences("松材线虫病\n危害严重[1,2]。病原为\nB. xylophilus [3-5]。") == [
+        "松材线虫病危害严重。",
+        "病原为 B. xylophilus。",
+    ]
+
+
+def test_fixture_document_boundaries(chunker):
+    chunks = chunker.chunk_text(DOC, "doc")
+
+    assert [(c["chunk_id"], c["section"], c["tokens"]) for c in chunks] == [
+        ("doc_0", "1 引言", 52),
+        ("doc_1", "1 引言", 32),
+        ("doc_2", "1 引言 > 1.1 症状", 58),
+        ("doc_3", "2 防治", 42),
+    ]
+    assert chunks[0]["text"] == (
+        "# 1 引言\n\n松材线虫病是松树的毁灭性病害。病原为松材线虫 B. xylophilus，由松褐天牛传播。"
+        "该病在 1982 年首次在南京发现。"
+    )
+    # 续写的块补上章节标题; 上一句超过重叠上限 (预算的 15%), 不重复
+    assert chunks[1]["text"] == "# 1 引言\n\n发病松树针叶在 40 天内全部枯黄。病木需在 3.5 个月内清理完毕。"
+    # 续写的表格重复表头行
+    assert chunks[2]["text"].endswith("表格内容：   0     1\n0  防治方法  药剂\n1  注干  阿维菌素")
+    assert chunks[3]["text"] == (
+        "# 1 引言\n\n## 1.1 症状\n\n表格内容：   0     1\n2  喷雾  噻虫啉\n3  熏蒸  磷化铝"
+        "\n\n# 2 防治\n\n清理病木并熏蒸处理。"
+    )
+    assert all(c["source_pdf"] == "doc" and c["concepts"] == [] for c in chunks)
+
+
+def test_references_are_skipped(chunker):
+    text = "\n".join(c["text"] for c in chunker.chunk_text(DOC, "doc"))
+
+    # 无标题的参考文献条目段落与 "# 参考文献" 章节都不进入任何块
+    assert "Mamiya" not in text
+    assert "Springer" not in text
+    assert "杨宝君" not in text
+    assert "参考文献" not in text
+
+
+def test_plain_reference_heading_skips_until_next_heading():
+    doc = ("Introduction text about pine wilt disease spreading across East Asia.\n\n"
+           "References\n\n"
+           "Mamiya Y. Pathology of the pine wilt disease. 1983.\n\n"
+           "# 2 Results\n\n"
+           "Results of the survey are described here in detail.")
+    chunks = StructureAwareChunker(max_tokens=100, min_chars=10).chunk_text(doc, "doc")
+
+    assert [c["text"] for c in chunks] == [
+        "Introduction text about pine wilt disease spreading across East Asia.\n\n"
+        "# 2 Results\n\nResults of the survey are described here in detail."
+    ]
+
+
+def test_markdown_table_header_repeated():
+    doc = "# 药剂\n\n| 药剂 | 用量 |\n|---|---|\n" + "\n".join(f"| 药剂{i} | {i}0 ml |" for i in range(1, 9))
+    chunks = StructureAwareChunker(max_tokens=40, min_chars=10).chunk_text(doc, "doc")
+
+    header = "# 药剂\n\n| 药剂 | 用量 |\n|---|---|\n"
+    assert [c["text"] for c in chunks] == [
+        header + "\n".join(f"| 药剂{i} | {i}0 ml |" for i in range(1, 5)),
+        header + "\n".join(f"| 药剂{i} | {i}0 ml |" for i in range(5, 9)),
+    ]
+
+
+STEPS = "# 方法\n\n" + "".join(f"第{i}步处理样品。" for i in range(1, 12)) + "\n\n另起一段说明结果。"
+
+
+@pytest.mark.parametrize("overlap, second", [
+    # 重叠 1 句 (7 token) 在预算的 15% (9 token) 以内
+    (1, "第7步处理样品。第8步"),
+    # 重叠 2 句超过上限, 整体不重叠
+    (2, "第8步处理样品。"),
+    (0, "第8步处理样品。"),
+])
+def test_overlap_limits(overlap, second):
+    chunks = StructureAwareChunker(max_tokens=60, min_chars=10, overlap_sentences=overlap).chunk_text(STEPS, "doc")
+
+    assert len(chunks) == 2
+    assert chunks[0]["text"].endswith("第6步处理样品。第7步处理样品。")
+    assert chunks[1]["text"].startswith("# 方法\n\n" + second)
+    # 段落之间不重叠
+    assert chunks[1]["text"].endswith("第11步处理样品。\n\n另起一段说明结果。")
+
+
+def test_ids_are_stable_per_document(chunker):
+    combined = chunker.chunk_documents({"a": DOC, "b": DOC})
+    alone = chunker.chunk_documents({"b": DOC})
+
+    assert [c["chunk_id"] for c in combined] == ["a_0", "a_1", "a_2", "a_3", "b_0", "b_1", "b_2", "b_3"]
+    # 同一文档的块不受其他文档影响, 重复运行结果相同
+    assert [c for c in combined if c["source_pdf"] == "b"] == alone
+    assert chunker.chunk_documents({"b": DOC}) == alone
+
+
+def test_signature_tracks_boundary_settings(chunker):
+    assert chunker.signature() == StructureAwareChunker(max_tokens=60, min_chars=10).signature()
+    assert chunker.signature() != StructureAwareChunker(max_tokens=60, min_chars=10, overlap_sentences=0).signature()
+    assert chunker.signature()["tokenizer"] == "estimate"
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""结构感知的文本分块
+
+替代按固定字符窗口 + 重叠滑动的切分方式。输入是 PDFExtractor._process_sections 输出的
+Markdown 风格文本 (`#` 标题、空行分隔的段落、_convert_table_to_text 生成的表格描述), 处理步骤:
+
+1. 按 `#` 标题解析章节层级, 跳过参考文献章节与成段的参考文献条目;
+2. 段落按中英文句末标点切分为句子, 表格 (Markdown 表格、"表格内容：" 块、"X为Y；..." 行) 按行切分;
+3. 以整句/整行为单位在 token 预算内贪心装箱: 块已装到一定比例时在章节边界处断开,
+   从章节中间续写的块前补上所在章节的标题路径, 续写的表格补上表头;
+4. 同一段落内续写时只重叠最后 N 句 (默认 1 句), 章节边界与表格不重叠;
+5. chunk_id 按文档内序号生成 (`{pdf_name}_{序号}`), 同一文本与配置下结果稳定, 不受其他文档影响。
+
+token 数默认用估算 (中日韩字符约 1 token/字, 其余约 4 字符/token); 配置 tokenizer 为
+HuggingFace 分词器名称或路径且安装了 transformers 时使用模型的真实分词器计数。
+
+用法:
+    chunker = StructureAwareChunker(max_tokens=1024, tokenizer='Qwen/Qwen2.5-7B-Instruct')
+    chunks = chunker.chunk_documents(pdf_texts)
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from transformers import AutoTokenizer
+    TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    TRANSFORMERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFERENCE_KEYWORDS = [
+    '参考文献', '引用文献', '文献引用', '参考资料',
+    'References', 'REFERENCES', 'Bibliography', 'Works Cited', 'Literature Cited',
+]
+
+
+class TokenCounter:
+    """按模型分词器计数 token; 未配置分词器或加载失败时退回估算"""
+
+    _CJK = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]')
+
+    def __init__(self, tokenizer: Optional[str] = None):
+        """
+        Args:
+            tokenizer: HuggingFace 分词器名称或本地路径 (应与 llm.model 同系列), 为空时使用估算
+        """
+        self.tokenizer = None
+        self.name = 'estimate'
+        if not tokenizer:
+            return
+        if not TRANSFORMERS_AVAILABLE:
+            logger.warning(f"transformers not installed, estimating tokens instead of using {tokenizer}")
+            return
+        try:
+            self.tokenizer = AutoTokenizer.from_pretrained(tokenizer)
+            self.name = tokenizer
+        except Exception as e:
+            logger.warning(f"Failed to load tokenizer {tokenizer}: {e}, estimating tokens instead")
+
+    @classmethod
+    def estimate(cls, text: str) -> int:
+        cjk = len(cls._CJK.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+
+    def count(self, text: str) -> int:
+        if self.tokenizer is None:
+            return self.estimate(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+
+@dataclass
+class _Unit:
+    """装箱的最小单位: 一个标题、一句话或一行表格"""
+    text: str
+    tokens: int
+    kind: str                        # heading | table_header | sentence | row
+    block: int                       # 所属段落/表格编号, 决定拼接时的分隔符
+    section: Tuple[str, ...]         # 所在章节的标题行路径
+    table_header: Optional[str] = None
+    section_start: bool = False      # 是否为某章节的第一个单位
+
+
+class StructureAwareChunker:
+    """按章节与句子边界在 token 预算内装箱的分块器"""
+
+    # 切分逻辑变化 (会改变同一文本的块边界) 时递增, 使旧的断点进度失效
+    VERSION = 1
+
+    _HEADING = re.compile(r'^(#{1,6})\s+(.+?)\s*#*$')
+    # 中文句末标点直接断开; 英文句点后需跟空白与大写字母/中文/数字, 避免拆开 "B. xylophilus"、"3.5"
+    _SENTENCE_END = re.compile(r'[。！？；!?;]+[”"’)）]*\s*|\.[”"’)）]*\s+(?=[A-Z\u4e00-\u9fff\d(（\[])')
+    _TABLE_ROW = re.compile(r'^[^。\n]{1,80}为[^。\n]*。$')
+    # 参考文献条目: [12] 开头, 或带 GB/T 7714 文献类型标识 [J]/[M]/..., 或含 et al.
+    _REFERENCE_ENTRY = re.compile(r'^\s*(?:\[\d+\]|［\d+］)|\[[JMDCRSPZN](?:/OL)?\]|\bet al\.')
+    _CONTEXT_KINDS = ('heading', 'table_header')
+    _CITATION = re.compile(r'\s?[\[［]\d+(?:\s*[,，\-–~]\s*\d+)*[\]］]')
+
+    def __init__(self, max_tokens: int = 1024, overlap_sentences: int = 1, section_break_ratio: float = 0.5,
+                 min_chars: int = 50, tokenizer: Optional[str] = None,
+                 reference_keywords: Optional[List[str]] = None, strip_citations: bool = True):
+        """
+        Args:
+            max_tokens: 每块文本的 token 上限 (需与系统提示词、输出一起放进 llm.num_ctx)
+            overlap_sentences: 同一段落内续写时重复的句子数, 0 表示不重叠
+            section_break_ratio: 块已达到预算的该比例时, 遇到新章节另起一块
+            min_chars: 正文少于该字符数的块丢弃 (页眉页脚残片等)
+            tokenizer: 计数用的 HuggingFace 分词器, 为空时估算
+            reference_keywords: 参考文献章节标题关键词
+            strip_citations: 去掉正文中的 [12]、[3-5] 等引用标号
+        """
+        self.max_tokens = max_tokens
+        self.overlap_sentences = overlap_sentences
+        self.section_break_ratio = section_break_ratio
+        self.min_chars = min_chars
+        self.counter = TokenCounter(tokenizer)
+        keywords = reference_keywords or DEFAULT_REFERENCE_KEYWORDS
+        self._reference_heading = re.compile(
+            r'^[\d.\s、一二三四五六七八九十]*(' + '|'.join(re.escape(k) for k in keywords) + r')\s*[:：]?\s*$',
+            re.IGNORECASE
+        )
+        self.strip_citations = strip_citations
+
+    def signature(self) -> Dict:
+        """决定切分结果的版本与参数; 任一项变化后 chunk_id 与旧的块不再对应 (断点续传据此校验)"""
+        return {
+            'chunker': type(self).__name__,
+            'version': self.VERSION,
+            'max_tokens': self.max_tokens,
+            'overlap_sentences': self.overlap_sentences,
+            'section_break_ratio': self.section_break_ratio,
+            'min_chars': self.min_chars,
+            'tokenizer': self.counter.name,
+            'strip_citations': self.strip_citations,
+        }
+
+    def chunk_documents(self, texts: Dict[str, str]) -> List[Dict]:
+        """对 {pdf_name: text} 逐篇分块, 返回与原 _create_chunks 相同结构的块列表"""
+        chunks = []
+        for pdf_name, text in texts.items():
+            chunks.extend(self.chunk_text(text, pdf_name))
+        return chunks
+
+    def chunk_text(self, text: str, pdf_name: str) -> List[Dict]:
+        """
+        Returns:
+            [{'text', 'chunk_id', 'source_pdf', 'section', 'tokens', 'concepts'}, ...],
+            chunk_id 为 `{pdf_name}_{文档内序号}`
+        """
+        chunks = []
+        for units in self._pack(self._units(text)):
+            body = self._render(units)
+            content = [u for u in units if u.kind not in self._CONTEXT_KINDS]
+            if len("".join(u.text for u in content).strip()) <= self.min_chars:
+                continue
+            chunks.append({
+                'text': body,
+                'chunk_id': f"{pdf_name}_{len(chunks)}",
+                'source_pdf': pdf_name,
+                'section': " > ".join(self._HEADING.match(h).group(2) for h in content[-1].section),
+                'tokens': sum(u.tokens for u in units),
+                'concepts': []
+            })
+        return chunks
+
+    # ---- 解析 ----
+
+    def _blocks(self, text: str):
+        """按空行切分段落, 产出 (章节路径, 段落文本 | 标题行); 跳过参考文献章节"""
+        section: List[Tuple[int, str]] = []
+        in_references = False
+        for block in re.split(r'\n\s*\n', text.replace('\r\n', '\n')):
+            lines = block.strip('\n').split('\n')
+            # 标题可能与正文只隔一个换行, 逐行拆出
+            paragraph: List[str] = []
+            for line in lines:
+                match = self._HEADING.match(line.strip())
+                plain_reference = not match and self._reference_heading.match(line.strip())
+                if not match and not plain_reference:
+                    if not in_references:
+                        paragraph.append(line)
+                    continue
+                if paragraph:
+                    yield tuple(h for _, h in section), "\n".join(paragraph)
+                    paragraph = []
+                title = match.group(2) if match else line.strip()
+                if self._reference_heading.match(title):
+                    in_references = True
+                    continue
+                in_references = False
+                level = len(match.group(1))
+                section = [(lvl, h) for lvl, h in section if lvl < level] + [(level, line.strip())]
+                yield tuple(h for _, h in section), None
+            if paragraph:
+                yield tuple(h for _, h in section), "\n".join(paragraph)
+
+    def _units(self, text: str) -> List[_Unit]:
+        units: List[_Unit] = []
+        section_start = True
+        for block_id, (section, paragraph) in enumerate(self._blocks(text)):
+            if paragraph is None:
+                heading = section[-1]
+                units.append(_Unit(heading, self.counter.count(heading), 'heading', block_id, section[:-1],
+                                   section_start=True))
+                section_start = False
+                continue
+            lines = [line for line in paragraph.split('\n') if line.strip()]
+            if not lines:
+                continue
+            # 无标题的参考文献条目 (多数行形如 "[12] Author ..."), 整段跳过
+            if sum(1 for line in lines if self._REFERENCE_ENTRY.match(line)) >= max(2, 0.6 * len(lines)):
+                continue
+
+            rows, header = self._table_rows(lines)
+            if rows is not None:
+                pieces = [(row, 'row') for row in rows]
+            else:
+                pieces = [(s, 'sentence') for s in self._sentences(paragraph)]
+            for piece, kind in pieces:
+                for part in self._split_oversized(piece):
+                    units.append(_Unit(part, self.counter.count(part), kind, block_id, section,
+                                       table_header=header, section_start=section_start))
+                    section_start = False
+        return units
+
+    def _table_rows(self, lines: List[str]) -> Tuple[Optional[List[str]], Optional[str]]:
+        """识别表格段落, 返回 (行列表, 续写时需重复的表头); 表头同时是第一行, 不是表格时返回 (None, None)"""
+        if lines[0].lstrip().startswith('表格内容：'):
+            # DataFrame.to_string 输出, 首行 (连同前缀) 为列号表头
+            return lines, lines[0]
+        if len(lines) >= 2 and sum(1 for line in lines if line.strip().startswith('|')) >= 0.8 * len(lines):
+            if re.match(r'^\s*\|[\s:\-|]+\|\s*$', lines[1]):
+                header = lines[0] + "\n" + lines[1]
+                return [header] + lines[2:], header
+            return lines, None
+        if len(lines) >= 2 and all(self._TABLE_ROW.match(line.strip()) for line in lines):
+            return lines, None
+        return None, None
+
+    def _sentences(self, paragraph: str) -> List[str]:
+        """切分句子, 保留句末空白以便原样拼回; 段内换行 (PDF 折行) 合并为空格或直接相连"""
+        paragraph = re.sub(r'(?<=[\u3000-\u9fff\uff00-\uffef])\n(?=[\u3000-\u9fff\uff00-\uffef])', '', paragraph)
+        paragraph = re.sub(r'\s*\n\s*', ' ', paragraph).strip()
+        if self.strip_citations:
+            paragraph = self._CITATION.sub('', paragraph)
+        sentences, start = [], 0
+        for match in self._SENTENCE_END.finditer(paragraph):
+            sentences.append(paragraph[start:match.end()])
+            start = match.end()
+        if start < len(paragraph):
+            sentences.append(paragraph[start:])
+        return [s for s in sentences if s.strip()]
+
+    def _split_oversized(self, text: str) -> List[str]:
+        """单句超出预算时 (如无标点的长段) 按 token 数二分截断为多段"""
+        budget = int(self.max_tokens * 0.9)
+        parts = []
+        while self.counter.count(text) > budget:
+            low, high = 1, len(text)
+            while low < high:
+                mid = (low + high + 1) // 2
+                if self.counter.count(text[:mid]) <= budget:
+                    low = mid
+                else:
+                    high = mid - 1
+            parts.append(text[:low])
+            text = text[low:]
+        if text.strip():
+            parts.append(text)
+        return parts
+
+    # ---- 装箱 ----
+
+    def _pack(self, units: List[_Unit]) -> List[List[_Unit]]:
+        chunks: List[List[_Unit]] = []
+        current: List[_Unit] = []
+        tokens = 0
+        for unit in units:
+            section_break = unit.section_start and tokens >= self.max_tokens * self.section_break_ratio
+            if (section_break or tokens + unit.tokens > self.max_tokens) and self._has_content(current):
+                # 标题不留在块尾, 随下一块带走
+                carry = []
+                while current[-1].kind in self._CONTEXT_KINDS:
+                    carry.insert(0, current.pop())
+                chunks.append(current)
+                current = self._continuation(current, carry[0] if carry else unit, section_break) + carry
+                tokens = sum(u.tokens for u in current)
+            current.append(unit)
+            tokens += unit.tokens
+        if self._has_content(current):
+            chunks.append(current)
+        return chunks
+
+    def _has_content(self, units: List[_Unit]) -> bool:
+        return any(u.kind not in self._CONTEXT_KINDS for u in units)
+
+    def _continuation(self, previous: List[_Unit], unit: _Unit, section_break: bool) -> List[_Unit]:
+        """新块的开头: 所在章节的标题路径; 续写表格时补表头, 同一段落内续写时重叠最后几句"""
+        prefix = [_Unit(h, self.counter.count(h), 'heading', -1, unit.section) for h in unit.section]
+        if unit.kind == 'row' and unit.table_header:
+            prefix.append(_Unit(unit.table_header, self.counter.count(unit.table_header), 'table_header',
+                                unit.block, unit.section))
+        elif unit.kind == 'sentence' and not section_break and self.overlap_sentences > 0:
+            tail = [u for u in previous if u.kind == 'sentence' and u.block == unit.block][-self.overlap_sentences:]
+            if sum(u.tokens for u in tail) <= self.max_tokens * 0.15:
+                prefix.extend(tail)
+        return prefix
+
+    @staticmethod
+    def _render(units: List[_Unit]) -> str:
+        """同一段落的句子直接相连, 表格行换行相连, 不同段落/标题之间空一行"""
+        parts = []
+        previous = None
+        for unit in units:
+            if previous is not None:
+                if unit.kind == 'heading' or previous.kind == 'heading' or unit.block != previous.block:
+                    parts.append("\n\n")
+                elif unit.kind == 'row' or previous.kind == 'table_header':
+                    parts.append("\n")
+            parts.append(unit.text.strip() if unit.kind != 'sentence' else unit.text)
+            previous = unit
+        return re.sub(r'[ \t]+\n', '\n', "".join(parts)).strip()
@@ -0,0 +1,286 @@
+"""
+只读接口响应缓存
+
+图谱数据只会在重新导入后变化, 因此对只读路由的响应做进程内缓存:
+- 缓存键 = 路由路径 + 规范化后的查询参数 + 图谱版本号
+- LRU 淘汰, 同时受条目数和总字节数上限约束
+- 基于响应体哈希生成 ETag, 支持 If-None-Match 返回 304
+- 按 Accept 头协商的响应格式分别缓存 (见 app.serialization)
+- 导入脚本更新图谱版本后, 下一次请求自动清空旧缓存
+"""
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.database import neo4j_connection
+from app.models import GraphData
+from app.serialization import (
+    FORMAT_JSON, FORMAT_NDJSON, MEDIA_TYPES, iter_ndjson, negotiate_format, render,
+)
+
+
+class GraphVersionTracker:
+    """
+    图谱版本追踪
+
+    优先读取导入脚本写出的版本文件 (GRAPH_VERSION_FILE);
+    文件不存在时退化为节点数/关系数指纹 (Neo4j 计数存储, O(1) 查询)。
+    为避免每个请求都访问文件系统或数据库, 版本在检查间隔内复用上一次结果。
+    """
+
+    def __init__(self, version_file: str, check_interval: float):
+        self.version_file = version_file
+        self.check_interval = check_interval
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+        self._file_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> str:
+        """返回当前图谱版本号"""
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._checked_at < self.check_interval:
+                return self._version
+            self._checked_at = now
+
+        version = self._read_version_file()
+        if version is None:
+            version = self._fingerprint()
+
+        with self._lock:
+            self._version = version
+        return version
+
+    def _read_version_file(self) -> Optional[str]:
+        try:
+            mtime = os.path.getmtime(self.version_file)
+        except OSError:
+            return None
+
+        # 文件未变化时直接复用
+        if self._version is not None and mtime == self._file_mtime:
+            return self._version
+
+        try:
+            with open(self.version_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            version = str(data.get('version') or mtime)
+        except (OSError, ValueError, AttributeError):
+            version = str(mtime)
+
+        self._file_mtime = mtime
+        return f"file:{version}"
+
+    def _fingerprint(self) -> str:
+        try:
+            node_count = neo4j_connection.execute_query(
+                "MATCH (n) RETURN count(n) as count"
+            )[0]['count']
+            rel_count = neo4j_connection.execute_query(
+                "MATCH ()-[r]->() RETURN count(r) as count"
+            )[0]['count']
+            return f"count:{node_count}:{rel_count}"
+        except Exception:
+            # 数据库不可用时沿用旧版本, 不影响请求本身的报错逻辑
+            return self._version or "unknown"
+
+
+class _CacheEntry:
+    __slots__ = ('body', 'media_type', 'etag', 'created_at')
+
+    def __init__(self, body: bytes, media_type: str, etag: str):
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+        self.created_at = time.monotonic()
+
+
+class ResponseCache:
+    """按字节数和条目数双重限制的 LRU 响应缓存"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._size = 0
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sync_version(self, version: str):
+        """版本号变化时整体失效"""
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._size = 0
+                self._version = version
+
+    def get(self, key: str) -> Optional[_CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self.ttl_seconds and time.monotonic() - entry.created_at > self.ttl_seconds:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, body: bytes, media_type: str) -> _CacheEntry:
+        entry = _CacheEntry(body, media_type, make_etag(body))
+        # 超过总容量的单个响应不缓存
+        if len(body) > self.max_bytes:
+            return entry
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._size += len(body)
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._size > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "version": self._version,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._size -= len(entry.body)
+
+
+def make_etag(body: bytes) -> str:
+    """根据响应体生成弱 ETag"""
+    return 'W/"%s"' % hashlib.sha1(body).hexdigest()[:20]
+
+
+def make_cache_key(request: Request, version: str, fmt: str = FORMAT_JSON) -> str:
+    """路由路径 + 排序后的非空查询参数 + 图谱版本 + 响应格式"""
+    params = sorted(
+        (k, v) for k, v in request.query_params.multi_items() if v != ""
+    )
+    query = "&".join(f"{k}={v}" for k, v in params)
+    return f"{version}|{fmt}|{request.url.path}?{query}"
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # 弱比较: 忽略 W/ 前缀
+    bare = etag[2:] if etag.startswith('W/') else etag
+    return any((c[2:] if c.startswith('W/') else c) == bare for c in candidates)
+
+
+graph_version = GraphVersionTracker(
+    settings.GRAPH_VERSION_FILE, settings.GRAPH_VERSION_CHECK_INTERVAL
+)
+response_cache = ResponseCache(
+    max_entries=settings.CACHE_MAX_ENTRIES,
+    max_bytes=settings.CACHE_MAX_BYTES,
+    ttl_seconds=settings.CACHE_TTL_SECONDS,
+)
+
+
+def _build_response(entry: _CacheEntry, request: Request, status: str) -> Response:
+    headers = {
+        "ETag": entry.etag,
+        # 浏览器可以缓存, 但每次都需要用 ETag 重新验证
+        "Cache-Control": "no-cache",
+        "Vary": "Accept",
+        "X-Cache": status,
+    }
+    if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+
+def _render_uncached(result: Any, fmt: str) -> Response:
+    """不经过缓存直接编码 (缓存关闭或流式输出)"""
+    if isinstance(result, Response):
+        return result
+    if fmt == FORMAT_NDJSON and isinstance(result, GraphData):
+        return StreamingResponse(
+            iter_ndjson(result, settings.STREAM_CHUNK_SIZE),
+            media_type=MEDIA_TYPES[FORMAT_NDJSON],
+            headers={"Vary": "Accept"},
+        )
+    body, media_type = render(result, fmt)
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
+
+
+def cached_response(func: Callable) -> Callable:
+    """
+    只读路由缓存装饰器
+
+    被装饰的路由函数需要声明 `request: Request` 参数。
+    路由抛出的异常 (如 404) 不会被缓存; 流式 (ndjson) 响应不缓存。
+
+    用法:
+        @router.get("/")
+        @cached_response
+        async def get_graph(request: Request, ...):
+            ...
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        request: Optional[Request] = kwargs.get("request")
+        if request is None:
+            return await func(*args, **kwargs)
+
+        fmt = negotiate_format(request)
+        if not settings.CACHE_ENABLED or fmt == FORMAT_NDJSON:
+            return _render_uncached(await func(*args, **kwargs), fmt)
+
+        version = graph_version.current()
+        response_cache.sync_version(version)
+        key = make_cache_key(request, version, fmt)
+
+        entry = response_cache.get(key)
+        if entry is not None:
+            return _build_response(entry, request, "HIT")
+
+        result = await func(*args, **kwargs)
+        if isinstance(result, Response):
+            return result
+
+        body, media_type = render(result, fmt)
+        entry = response_cache.put(key, body, media_type)
+        return _build_response(entry, request, "MISS")
+
+    return wrapper
@@ -3,7 +3,7 @@
 使用 Pydantic Settings 管理环境变量
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -33,6 +33,45 @@ class Settings(BaseSettings):
     DEFAULT_DEPTH: int = 1
     MAX_DEPTH: int = 3
     
+    # GraphRAG 配置
+    OLLAMA_HOST: str = "http://localhost:11434"
+    RAG_LLM_MODEL: str = "llama3.2:3b"
+    RAG_EMBEDDING_MODEL: str = "BAAI/bge-m3"
+    # 节点检索: hybrid (稠密 + BGE-M3 稀疏词项) 或 dense; 融合方式 linear (按 alpha 加权) 或 rrf
+    RAG_RETRIEVAL_MODE: str = "hybrid"
+    RAG_HYBRID_FUSION: str = "linear"
+    RAG_HYBRID_ALPHA: float = 0.7
+    # 答案缓存: 图谱版本变化时清空; 语义阈值为空时只复用完全相同的问题
+    RAG_ANSWER_CACHE_SIZE: int = 256
+    RAG_SEMANTIC_CACHE_THRESHOLD: Optional[float] = None
+    # 提示词上下文: 按 num_ctx 自动计算子图上下文预算, 也可直接指定 token 数
+    RAG_NUM_CTX: int = 8192
+    RAG_CONTEXT_TOKEN_BUDGET: Optional[int] = None
+    # 子图扩展预算: 加权最优优先扩展的最大节点数/关系数
+    RAG_MAX_SUBGRAPH_NODES: int = 60
+    RAG_MAX_SUBGRAPH_EDGES: int = 120
+    
+    # 响应缓存配置
+    CACHE_ENABLED: bool = True
+    CACHE_MAX_ENTRIES: int = 512
+    CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_TTL_SECONDS: int = 0  # 0 表示只依赖图谱版本失效
+    # 导入脚本写出的图谱版本文件 (docker 中 ./output 挂载到 /app/output)
+    GRAPH_VERSION_FILE: str = "output/graph_version.json"
+    GRAPH_VERSION_CHECK_INTERVAL: float = 2.0
+    
+    # 概览图: 导入脚本预计算的社区粗化图
+    OVERVIEW_GRAPH_FILE: str = "output/overview_graph.json"
+    
+    # 社区划分持久化目录 (按算法分别保存, 用于增量社区检测)
+    COMMUNITY_PARTITION_DIR: str = "output/cache"
+    
+    # 查询注册表: 启动时对全部查询模板执行 EXPLAIN 预热执行计划
+    QUERY_WARMUP: bool = True
+    
+    # 序列化配置: ndjson 流式输出时每行包含的节点/边数量
+    STREAM_CHUNK_SIZE: int = 500
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
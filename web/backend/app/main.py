@@ -7,8 +7,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.config import settings
-from app.database import neo4j_driver, close_neo4j_connection
+from app.database import neo4j_driver, neo4j_connection, close_neo4j_connection
+from app.queries import query_registry
 from app.routers import graph, nodes, stats, search, rag, feedback, multimodal
+from app.serialization import ORJSON_AVAILABLE
+
+if ORJSON_AVAILABLE:
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+else:
+    from fastapi.responses import JSONResponse as DefaultResponse
 
 
 @asynccontextmanager
@@ -22,6 +29,11 @@ async def lifespan(app: FastAPI):
     try:
         neo4j_driver.verify_connectivity()
         print("✅ Neo4j 连接成功")
+        
+        # 预热查询执行计划
+        if settings.QUERY_WARMUP:
+            ok, failed = query_registry.warmup(neo4j_connection)
+            print(f"🔥 查询计划预热完成: {ok} 条成功, {failed} 条失败")
     except Exception as e:
         print(f"❌ Neo4j 连接失败: {e}")
     
@@ -37,7 +49,8 @@ app = FastAPI(
     title="PWD Knowledge Graph API",
     description="松材线虫病知识图谱 RESTful API",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=DefaultResponse
 )
 
 # CORS 配置
@@ -45,6 +45,13 @@ class SearchResult(BaseModel):
     nodes: List[Node] = Field(default_factory=list, description="匹配的节点")
     total: int = Field(0, description="总匹配数")
     query: str = Field(..., description="搜索关键词")
+    next_cursor: Optional[str] = Field(None, description="下一页游标, 为空表示没有更多结果")
+
+
+class NodePage(BaseModel):
+    """节点列表分页结果"""
+    nodes: List[Node] = Field(default_factory=list, description="本页节点")
+    next_cursor: Optional[str] = Field(None, description="下一页游标, 为空表示没有更多结果")
 
 
 class PathResult(BaseModel):
@@ -0,0 +1,57 @@
+"""
+游标分页 (Keyset Pagination)
+
+节点列表和搜索结果都按 total_degree 降序排列。传统的 SKIP/LIMIT 需要先排序并跳过
+前面所有记录, 页码越深越慢; 游标分页记录上一页最后一条的 (total_degree, elementId),
+下一页直接从该位置之后开始, 借助 total_degree 上的范围索引, 任意一页的开销与第一页相同。
+
+游标对客户端是不透明的 base64url 字符串。
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# 第一页使用的起始位置: 大于任何实际度数, elementId 大于空串
+_FIRST_PAGE_DEGREE = 2 ** 62
+_FIRST_PAGE_ID = ""
+
+
+def encode_cursor(total_degree: int, element_id: str) -> str:
+    """将排序键编码为不透明游标"""
+    raw = json.dumps([total_degree, element_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Tuple[int, str]:
+    """
+    解析游标, 返回 (total_degree, elementId)
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    if not cursor:
+        return _FIRST_PAGE_DEGREE, _FIRST_PAGE_ID
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        degree, element_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return int(degree), str(element_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError(f"无效的分页游标: {cursor}")
+
+
+def cursor_params(cursor: Optional[str]) -> Dict[str, Any]:
+    """游标 -> 查询参数 (cursor_degree, cursor_id)"""
+    degree, element_id = decode_cursor(cursor)
+    return {"cursor_degree": degree, "cursor_id": element_id}
+
+
+def next_cursor(rows: List[Dict[str, Any]], limit: int) -> Optional[str]:
+    """
+    根据本页结果生成下一页游标
+
+    查询多取一条 (limit + 1) 判断是否还有下一页, 调用方只保留前 limit 条。
+    """
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(last.get("total_degree") or 0, last["id"])
@@ -0,0 +1,456 @@
+"""
+Cypher 查询注册表
+
+所有服务层查询都以固定的参数化模板登记在这里, 用户输入一律通过参数传递,
+保证同一个接口在任何参数下都发出完全相同的查询文本, 让 Neo4j 的执行计划缓存生效。
+
+Cypher 中无法参数化的部分 (节点标签、变长路径上限) 通过"变体"处理:
+模板中用 {placeholder} 占位, 只允许白名单中的取值, 每种取值预先渲染成一条固定文本。
+
+附带功能:
+- 启动时对全部模板及变体执行 EXPLAIN 预热执行计划 (QUERY_WARMUP)
+- 按查询名称统计调用次数、错误数和延迟分位数
+"""
+import threading
+import time
+from collections import deque
+from itertools import product
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import settings
+
+
+# 导入脚本 (import_to_neo4j_final.py) 写入的主类型标签及其父类标签
+NODE_LABELS = (
+    'Pathogen', 'Disease', 'Vector', 'Host', 'Location', 'Technology', 'Control',
+    'Environment', 'Other',
+    'Organism', 'Concept', 'Condition', 'Insect', 'Animal', 'Plant',
+    'GeographicEntity', 'Method', 'Treatment', 'Factor',
+)
+
+
+class QueryTemplate:
+    """参数化查询模板"""
+
+    def __init__(
+        self,
+        name: str,
+        cypher: str,
+        params: Dict[str, Any],
+        variants: Optional[Dict[str, Iterable[Any]]] = None,
+    ):
+        """
+        Args:
+            name: 查询名称 (用于统计)
+            cypher: 查询文本, 可含 {placeholder} 变体占位符
+            params: 查询参数及其示例值 (预热时使用, 调用时缺省参数填 None)
+            variants: 占位符 -> 允许的取值
+        """
+        self.name = name
+        self.cypher = cypher
+        self.params = params
+        self.variants = {k: tuple(v) for k, v in (variants or {}).items()}
+        self._rendered: Dict[Tuple, str] = {}
+
+    def render(self, **variant: Any) -> str:
+        """渲染指定变体的查询文本 (结果缓存, 保证文本完全一致)"""
+        key = tuple(sorted(variant.items()))
+        text = self._rendered.get(key)
+        if text is None:
+            if set(variant) != set(self.variants):
+                raise ValueError(f"查询 {self.name} 需要变体参数 {sorted(self.variants)}")
+            for placeholder, value in variant.items():
+                if value not in self.variants.get(placeholder, ()):
+                    raise ValueError(f"查询 {self.name} 不支持变体 {placeholder}={value!r}")
+            text = self.cypher.format(**variant) if variant else self.cypher
+            self._rendered[key] = text
+        return text
+
+    def all_variants(self) -> List[Dict[str, Any]]:
+        """列出全部变体组合"""
+        if not self.variants:
+            return [{}]
+        keys = list(self.variants)
+        return [dict(zip(keys, values)) for values in product(*self.variants.values())]
+
+
+class QueryMetrics:
+    """单个查询的延迟统计"""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._recent = deque(maxlen=window)
+
+    def record(self, elapsed_ms: float, error: bool = False):
+        self.count += 1
+        self.errors += int(error)
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self._recent.append(elapsed_ms)
+
+    def summary(self) -> Dict[str, Any]:
+        recent = sorted(self._recent)
+
+        def percentile(p: float) -> Optional[float]:
+            if not recent:
+                return None
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))], 2)
+
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class QueryRegistry:
+    """查询注册表: 统一执行、预热与统计"""
+
+    def __init__(self):
+        self._templates: Dict[str, QueryTemplate] = {}
+        self._metrics: Dict[str, QueryMetrics] = {}
+        self._lock = threading.Lock()
+
+    def register(self, template: QueryTemplate):
+        self._templates[template.name] = template
+        self._metrics[template.name] = QueryMetrics()
+
+    def get(self, name: str) -> QueryTemplate:
+        return self._templates[name]
+
+    def execute(
+        self,
+        connection,
+        name: str,
+        params: Optional[Dict[str, Any]] = None,
+        **variant: Any,
+    ) -> List[Dict[str, Any]]:
+        """
+        执行已注册的查询
+
+        Args:
+            connection: Neo4jConnection
+            name: 查询名称
+            params: 查询参数, 未提供的参数以 None 传入
+            **variant: 变体取值 (如 label=':Host', depth=2)
+        """
+        template = self._templates[name]
+        cypher = template.render(**variant)
+        full_params = {key: None for key in template.params}
+        full_params.update(params or {})
+
+        start = time.perf_counter()
+        error = False
+        try:
+            return connection.execute_query(cypher, full_params)
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self._metrics[name].record(elapsed_ms, error)
+
+    def warmup(self, connection) -> Tuple[int, int]:
+        """
+        对全部模板和变体执行 EXPLAIN, 让 Neo4j 提前编译并缓存执行计划
+
+        Returns:
+            (成功数, 失败数)
+        """
+        ok, failed = 0, 0
+        for template in self._templates.values():
+            for variant in template.all_variants():
+                try:
+                    connection.execute_query(
+                        "EXPLAIN " + template.render(**variant), dict(template.params)
+                    )
+                    ok += 1
+                except Exception as e:
+                    failed += 1
+                    print(f"⚠️  查询预热失败 {template.name} {variant}: {e}")
+        return ok, failed
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: m.summary() for name, m in self._metrics.items()}
+
+
+def label_variant(node_type: Optional[str]) -> str:
+    """节点类型 -> 标签变体; 不在白名单中的类型退化为无标签匹配 + 参数过滤"""
+    if node_type in NODE_LABELS:
+        return f":{node_type}"
+    return ""
+
+
+query_registry = QueryRegistry()
+
+_LABEL_VARIANTS = [""] + [f":{label}" for label in NODE_LABELS]
+_DEPTH_VARIANTS = range(1, settings.MAX_DEPTH + 1)
+_PATH_LENGTH_VARIANTS = range(1, 11)
+
+
+# ---------------------------------------------------------------------------
+# 图谱服务
+# ---------------------------------------------------------------------------
+
+query_registry.register(QueryTemplate(
+    "graph.nodes",
+    """
+    MATCH (n{label})
+    WHERE ($node_type IS NULL OR $node_type IN labels(n))
+      AND (NOT $exclude_other OR n.type <> 'Other')
+    RETURN elementId(n) as id, n.name as name,
+           COALESCE(n.type, labels(n)[0], 'Other') as category,
+           n.importance as importance,
+           COALESCE(n.total_degree, 0) as total_degree
+    ORDER BY
+        CASE WHEN n.type = 'Other' THEN 1 ELSE 0 END,
+        COALESCE(n.total_degree, 0) DESC
+    LIMIT $limit
+    """,
+    params={"node_type": None, "exclude_other": False, "limit": 100},
+    variants={"label": _LABEL_VARIANTS},
+))
+
+query_registry.register(QueryTemplate(
+    "graph.edges",
+    """
+    MATCH (n)-[r]->(m)
+    WHERE elementId(n) IN $node_ids AND elementId(m) IN $node_ids
+      AND ($relation_type IS NULL OR type(r) = $relation_type)
+    RETURN elementId(r) as id, elementId(n) as source, elementId(m) as target,
+           type(r) as relationship, r.weight as weight
+    """,
+    params={"node_ids": [], "relation_type": None},
+))
+
+query_registry.register(QueryTemplate(
+    "graph.community_nodes",
+    """
+    MATCH (n:Concept {community_id: $community_id})
+    RETURN elementId(n) as id, n.name as name,
+           COALESCE(n.type, labels(n)[0], 'Other') as category,
+           n.importance as importance,
+           COALESCE(n.total_degree, 0) as total_degree
+    ORDER BY total_degree DESC
+    LIMIT $limit
+    """,
+    params={"community_id": 0, "limit": 200},
+))
+
+query_registry.register(QueryTemplate(
+    "graph.node_detail",
+    """
+    MATCH (n)
+    WHERE elementId(n) = $node_id OR n.name = $node_id
+    RETURN elementId(n) as id, n.name as name, n.category as category,
+           n.importance as importance, n.total_degree as total_degree
+    """,
+    params={"node_id": ""},
+))
+
+query_registry.register(QueryTemplate(
+    "graph.node_detail_neighbors",
+    """
+    MATCH (n)-[]-(m)
+    WHERE elementId(n) = $node_id
+    RETURN DISTINCT elementId(m) as id, m.name as name, m.category as category,
+           m.importance as importance, m.total_degree as total_degree
+    LIMIT 20
+    """,
+    params={"node_id": ""},
+))
+
+query_registry.register(QueryTemplate(
+    "graph.node_detail_relationships",
+    """
+    MATCH (n)-[r]-(m)
+    WHERE elementId(n) = $node_id
+    RETURN elementId(r) as id, elementId(n) as source, elementId(m) as target,
+           type(r) as relationship, r.weight as weight
+    LIMIT 50
+    """,
+    params={"node_id": ""},
+))
+
+query_registry.register(QueryTemplate(
+    "graph.neighbors",
+    """
+    MATCH path = (n)-[*1..{depth}]-(m)
+    WHERE elementId(n) = $node_id OR n.name = $node_id
+    WITH nodes(path) as path_nodes, relationships(path) as path_rels
+    UNWIND path_nodes as node
+    WITH collect(DISTINCT {{
+        id: elementId(node),
+        name: node.name,
+        category: node.category,
+        importance: node.importance,
+        total_degree: node.total_degree
+    }}) as nodes_list, path_rels
+    UNWIND path_rels as rel
+    WITH nodes_list, collect(DISTINCT {{
+        id: elementId(rel),
+        source: elementId(startNode(rel)),
+        target: elementId(endNode(rel)),
+        relationship: type(rel),
+        weight: rel.weight
+    }}) as edges_list
+    RETURN nodes_list, edges_list
+    """,
+    params={"node_id": ""},
+    variants={"depth": _DEPTH_VARIANTS},
+))
+
+query_registry.register(QueryTemplate(
+    "graph.shortest_paths",
+    """
+    MATCH path = shortestPath((n)-[*..{max_length}]-(m))
+    WHERE n.name = $source AND m.name = $target
+    RETURN [node in nodes(path) | node.name] as path_names
+    LIMIT 10
+    """,
+    params={"source": "", "target": ""},
+    variants={"max_length": _PATH_LENGTH_VARIANTS},
+))
+
+# 节点列表与搜索结果按 (total_degree DESC, elementId ASC) 排序, 使用游标分页:
+# total_degree <= $cursor_degree 可走 Concept(total_degree) 范围索引,
+# 同度数的节点再按 elementId 跳过上一页已返回的部分 (见 app.pagination)
+_KEYSET_FILTER = """
+      AND n.total_degree <= $cursor_degree
+      AND (n.total_degree < $cursor_degree OR elementId(n) > $cursor_id)
+"""
+
+_NODE_FILTER = """
+    WHERE ($category IS NULL OR COALESCE(n.category, n.type) = $category)
+      AND ($min_importance IS NULL OR n.importance >= $min_importance)
+"""
+
+_NODE_RETURN = """
+    RETURN elementId(n) as id, n.name as name,
+           COALESCE(n.category, n.type, labels(n)[0], 'Other') as category,
+           n.importance as importance, n.total_degree as total_degree
+"""
+
+query_registry.register(QueryTemplate(
+    "graph.list_nodes",
+    "MATCH (n:Concept)" + _NODE_FILTER + _KEYSET_FILTER + _NODE_RETURN + """
+    ORDER BY n.total_degree DESC, elementId(n) ASC
+    LIMIT $limit
+    """,
+    params={
+        "category": None, "min_importance": None,
+        "cursor_degree": 0, "cursor_id": "", "limit": 100,
+    },
+))
+
+# 兼容旧客户端的 offset 分页
+query_registry.register(QueryTemplate(
+    "graph.list_nodes_offset",
+    "MATCH (n:Concept)" + _NODE_FILTER + _NODE_RETURN + """
+    ORDER BY n.total_degree DESC, elementId(n) ASC
+    SKIP $offset
+    LIMIT $limit
+    """,
+    params={"category": None, "min_importance": None, "offset": 0, "limit": 100},
+))
+
+# ---------------------------------------------------------------------------
+# 搜索服务
+# ---------------------------------------------------------------------------
+
+_SEARCH_FILTER = """
+    WHERE toLower(n.name) CONTAINS toLower($query)
+      AND ($category IS NULL OR COALESCE(n.category, n.type) = $category)
+      AND ($min_importance IS NULL OR n.importance >= $min_importance)
+"""
+
+query_registry.register(QueryTemplate(
+    "search.nodes",
+    "MATCH (n:Concept)" + _SEARCH_FILTER + _KEYSET_FILTER + _NODE_RETURN + """
+    ORDER BY n.total_degree DESC, elementId(n) ASC
+    LIMIT $limit
+    """,
+    params={
+        "query": "", "category": None, "min_importance": None,
+        "cursor_degree": 0, "cursor_id": "", "limit": 20,
+    },
+))
+
+query_registry.register(QueryTemplate(
+    "search.count",
+    "MATCH (n:Concept)" + _SEARCH_FILTER + """
+    RETURN count(n) as total
+    """,
+    params={"query": "", "category": None, "min_importance": None},
+))
+
+query_registry.register(QueryTemplate(
+    "search.suggest",
+    """
+    MATCH (n)
+    WHERE toLower(n.name) CONTAINS toLower($query)
+    RETURN DISTINCT n.name as name, n.category as category
+    ORDER BY length(n.name)
+    LIMIT $limit
+    """,
+    params={"query": "", "limit": 5},
+))
+
+# ---------------------------------------------------------------------------
+# 统计服务
+# ---------------------------------------------------------------------------
+
+query_registry.register(QueryTemplate(
+    "stats.counts",
+    """
+    MATCH (n)
+    WITH count(n) as node_count
+    MATCH ()-[r]->()
+    RETURN node_count, count(r) as edge_count
+    """,
+    params={},
+))
+
+query_registry.register(QueryTemplate(
+    "stats.node_distribution",
+    """
+    MATCH (n)
+    WITH COALESCE(labels(n)[0], 'Unknown') as category, count(n) as count
+    RETURN category, count
+    ORDER BY count DESC
+    """,
+    params={},
+))
+
+query_registry.register(QueryTemplate(
+    "stats.edge_distribution",
+    """
+    MATCH ()-[r]->()
+    RETURN type(r) as relationship, count(r) as count
+    ORDER BY count DESC
+    """,
+    params={},
+))
+
+query_registry.register(QueryTemplate(
+    "stats.top_nodes",
+    """
+    MATCH (n)
+    RETURN elementId(n) as id,
+           n.name as name,
+           COALESCE(labels(n)[0], 'Unknown') as category,
+           n.importance as importance,
+           n.total_degree as total_degree
+    ORDER BY n.total_degree DESC
+    LIMIT $limit
+    """,
+    params={"limit": 10},
+))
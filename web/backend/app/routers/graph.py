@@ -1,18 +1,21 @@
 """
 图谱相关 API 路由
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from typing import Optional
 
 from app.models import GraphData, PathResult, PathQueryParams
 from app.database import get_neo4j
+from app.cache import cached_response
 from app.services.graph_service import GraphService
 
 router = APIRouter()
 
 
 @router.get("/", response_model=GraphData)
+@cached_response
 async def get_graph(
+    request: Request,
     limit: int = Query(100, ge=1, le=1000, description="节点数量限制"),
     node_type: Optional[str] = Query(None, description="节点类型筛选"),
     relation_type: Optional[str] = Query(None, description="关系类型筛选"),
@@ -35,6 +38,46 @@ async def get_graph(
     )
 
 
+@router.get("/overview", response_model=GraphData)
+@cached_response
+async def get_overview(
+    request: Request,
+    neo4j = Depends(get_neo4j)
+):
+    """
+    获取概览图
+    
+    返回导入时预计算的社区粗化图: 节点为社区, 边为社区间聚合权重。
+    适合作为首屏视图, 无需对全图排序。
+    """
+    service = GraphService(neo4j)
+    overview = service.get_overview()
+    if overview is None:
+        raise HTTPException(
+            status_code=404,
+            detail="概览图尚未生成, 请先运行 import_to_neo4j_final.py"
+        )
+    return overview
+
+
+@router.get("/overview/{community_id}", response_model=GraphData)
+@cached_response
+async def get_community_subgraph(
+    request: Request,
+    community_id: int,
+    limit: int = Query(200, ge=1, le=1000, description="成员节点数量限制"),
+    neo4j = Depends(get_neo4j)
+):
+    """
+    概览图下钻: 获取指定社区的成员子图
+    
+    - **community_id**: 社区编号（概览图节点 properties.community_id）
+    - **limit**: 返回成员数量限制, 按度数降序
+    """
+    service = GraphService(neo4j)
+    return service.get_community_subgraph(community_id=community_id, limit=limit)
+
+
 @router.post("/path", response_model=PathResult)
 async def find_path(
     params: PathQueryParams,
@@ -56,7 +99,9 @@ async def find_path(
 
 
 @router.get("/subgraph/{node_name}", response_model=GraphData)
+@cached_response
 async def get_subgraph(
+    request: Request,
     node_name: str,
     depth: int = Query(1, ge=1, le=3, description="扩展深度"),
     neo4j = Depends(get_neo4j)
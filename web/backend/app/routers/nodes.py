@@ -1,18 +1,21 @@
 """
 节点相关 API 路由
 """
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
-from typing import Optional, List
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request
+from typing import Optional
 
-from app.models import Node, NodeDetail, GraphData
+from app.models import NodeDetail, NodePage, GraphData
 from app.database import get_neo4j
+from app.cache import cached_response
 from app.services.graph_service import GraphService
 
 router = APIRouter()
 
 
 @router.get("/{node_id}", response_model=NodeDetail)
+@cached_response
 async def get_node_detail(
+    request: Request,
     node_id: str = Path(..., description="节点ID"),
     neo4j = Depends(get_neo4j)
 ):
@@ -31,7 +34,9 @@ async def get_node_detail(
 
 
 @router.get("/{node_id}/neighbors", response_model=GraphData)
+@cached_response
 async def get_node_neighbors(
+    request: Request,
     node_id: str = Path(..., description="节点ID"),
     depth: int = Query(1, ge=1, le=3, description="邻居深度"),
     neo4j = Depends(get_neo4j)
@@ -46,10 +51,13 @@ async def get_node_neighbors(
     return service.get_node_neighbors(node_id, depth)
 
 
-@router.get("/", response_model=List[Node])
+@router.get("/", response_model=NodePage)
+@cached_response
 async def list_nodes(
+    request: Request,
     limit: int = Query(100, ge=1, le=1000, description="返回数量"),
-    offset: int = Query(0, ge=0, description="偏移量"),
+    cursor: Optional[str] = Query(None, description="分页游标（取自上一页的 next_cursor）"),
+    offset: int = Query(0, ge=0, description="偏移量（已弃用，请使用 cursor）"),
     category: Optional[str] = Query(None, description="节点类别"),
     min_importance: Optional[int] = Query(None, ge=1, le=5, description="最小重要性"),
     neo4j = Depends(get_neo4j)
@@ -57,12 +65,16 @@ async def list_nodes(
     """
     获取节点列表
     
-    支持分页和筛选
+    按总度数降序排列, 支持游标分页和筛选
     """
     service = GraphService(neo4j)
-    return service.list_nodes(
-        limit=limit,
-        offset=offset,
-        category=category,
-        min_importance=min_importance
-    )
+    try:
+        return service.list_nodes(
+            limit=limit,
+            offset=offset,
+            category=category,
+            min_importance=min_importance,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -3,21 +3,152 @@ GraphRAG 问答 API 路由
 提供 Local Search 和 Community Summary 功能
 """
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
+import asyncio
+import json
 import sys
+import threading
 from pathlib import Path
 
 # 添加项目根目录到路径
 project_root = Path(__file__).parent.parent.parent.parent.parent
 sys.path.insert(0, str(project_root))
 
+from app.config import settings
 from app.database import neo4j_driver
+from app.cache import graph_version
 
 router = APIRouter(prefix="/api/rag", tags=["GraphRAG"])
 
 
+# Local Search 引擎与图谱数据在进程内复用: 加载 Embedding 模型和构建节点索引
+# 都很耗时, 只在首次请求或图谱版本变化时重建
+_search_state: Dict[str, Any] = {
+    "engine": None, "version": None, "index_version": None, "concepts": None, "relationships": None
+}
+_search_lock = threading.Lock()
+
+
+def _load_graph_frames():
+    """从 Neo4j 加载节点和关系为 DataFrame"""
+    import pandas as pd
+    
+    with neo4j_driver.session() as session:
+        # 加载所有节点
+        nodes_result = session.run("""
+            MATCH (n)
+            RETURN n.name as entity, 
+                   labels(n)[0] as category,
+                   COALESCE(n.importance, 0) as importance,
+                   COALESCE(n.degree, 0) as degree
+        """)
+        concepts_df = pd.DataFrame([dict(record) for record in nodes_result])
+        
+        # 加载所有关系
+        rels_result = session.run("""
+            MATCH (n1)-[r]->(n2)
+            RETURN n1.name as node_1,
+                   n2.name as node_2,
+                   type(r) as edge,
+                   COALESCE(r.weight, 1.0) as weight
+        """)
+        relationships_df = pd.DataFrame([dict(record) for record in rels_result])
+    
+    return concepts_df, relationships_df
+
+
+def _get_graph_frames():
+    """
+    获取 (version, concepts_df, relationships_df)
+    
+    图谱数据按版本缓存, Local Search 与社区分析共用同一份数据。
+    """
+    with _search_lock:
+        version = graph_version.current()
+        if _search_state["version"] != version or _search_state["concepts"] is None:
+            concepts_df, relationships_df = _load_graph_frames()
+            if concepts_df.empty:
+                raise HTTPException(
+                    status_code=404,
+                    detail="图谱中没有数据，请先构建知识图谱"
+                )
+            _search_state.update(
+                version=version, concepts=concepts_df, relationships=relationships_df,
+                index_version=None
+            )
+        return version, _search_state["concepts"], _search_state["relationships"]
+
+
+def _get_search_state():
+    """
+    获取 (engine, concepts_df, relationships_df)
+    
+    图谱版本变化时重新加载数据并重建节点索引。
+    """
+    from graph_rag import LocalSearchEngine
+    
+    version, concepts_df, relationships_df = _get_graph_frames()
+    with _search_lock:
+        if _search_state["engine"] is None:
+            _search_state["engine"] = LocalSearchEngine(
+                model=settings.RAG_LLM_MODEL,
+                ollama_host=settings.OLLAMA_HOST,
+                embedding_model=settings.RAG_EMBEDDING_MODEL,
+                retrieval_mode=settings.RAG_RETRIEVAL_MODE,
+                fusion=settings.RAG_HYBRID_FUSION,
+                alpha=settings.RAG_HYBRID_ALPHA,
+                answer_cache_size=settings.RAG_ANSWER_CACHE_SIZE,
+                semantic_cache_threshold=settings.RAG_SEMANTIC_CACHE_THRESHOLD,
+                num_ctx=settings.RAG_NUM_CTX,
+                context_token_budget=settings.RAG_CONTEXT_TOKEN_BUDGET,
+                max_subgraph_nodes=settings.RAG_MAX_SUBGRAPH_NODES,
+                max_subgraph_edges=settings.RAG_MAX_SUBGRAPH_EDGES
+            )
+        
+        engine = _search_state["engine"]
+        if _search_state.get("index_version") != version:
+            engine.build_node_index(concepts_df, graph_version=version)
+            _search_state["index_version"] = version
+        
+        return engine, concepts_df, relationships_df
+
+
+def _format_relevant_nodes(relevant, concepts_df) -> List[Dict[str, Any]]:
+    """将 [(entity, score)] 转换为接口返回的节点信息"""
+    categories = dict(zip(concepts_df['entity'], concepts_df['category']))
+    return [
+        {
+            "id": entity,
+            "name": entity,
+            "category": categories.get(entity, '') or '',
+            "similarity": float(score)
+        }
+        for entity, score in relevant
+        if entity in categories
+    ]
+
+
+def _format_relevant_edges(subgraph_rels) -> List[Dict[str, Any]]:
+    """将子图关系 DataFrame 转换为接口返回的边信息"""
+    return [
+        {
+            "source": row['node_1'],
+            "target": row['node_2'],
+            "relationship": row['edge'],
+            "weight": float(row.get('weight', 1.0))
+        }
+        for _, row in subgraph_rels.iterrows()
+    ]
+
+
+def _sse(event: str, data: Any) -> str:
+    """编码一条 Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 class LocalSearchRequest(BaseModel):
     """Local Search 请求"""
     query: str
@@ -36,7 +167,8 @@ class LocalSearchResult(BaseModel):
 
 class CommunitySummaryRequest(BaseModel):
     """Community Summary 请求"""
-    algorithm: str = "louvain"  # louvain, leiden, label_propagation
+    # 取值与 graph_rag.CommunityDetector 支持的算法一致, 其他值返回 422 (也用于拼接划分文件名)
+    algorithm: Literal["louvain", "leiden", "label_propagation", "connected_components"] = "louvain"
     resolution: float = 1.0
 
 
@@ -55,57 +187,17 @@ async def local_search(request: LocalSearchRequest):
     Local Search 问答接口
     
     流程：
-    1. 从 Neo4j 加载图谱数据到 DataFrame
+    1. 从 Neo4j 加载图谱数据到 DataFrame（按图谱版本缓存）
     2. 向量检索：找到与问题最相关的 top_k 个节点
     3. 子图扩展：沿着关系扩展 expand_depth 层
     4. LLM 生成：基于召回的子图生成答案
     """
     try:
-        # 导入必要的模块
-        from graph_rag import LocalSearchEngine
-        import pandas as pd
-        
-        # 初始化搜索引擎
-        search_engine = LocalSearchEngine(
-            model="llama3.2:3b",
-            ollama_host="http://localhost:11434",
-            embedding_model="BAAI/bge-m3"
-        )
-        
-        # 从 Neo4j 加载数据
-        with neo4j_driver.session() as session:
-            # 加载所有节点
-            nodes_result = session.run("""
-                MATCH (n)
-                RETURN n.name as entity, 
-                       labels(n)[0] as category,
-                       COALESCE(n.importance, 0) as importance,
-                       COALESCE(n.degree, 0) as degree
-            """)
-            concepts_df = pd.DataFrame([dict(record) for record in nodes_result])
-            
-            # 加载所有关系
-            rels_result = session.run("""
-                MATCH (n1)-[r]->(n2)
-                RETURN n1.name as node_1,
-                       n2.name as node_2,
-                       type(r) as edge,
-                       COALESCE(r.weight, 1.0) as weight
-            """)
-            relationships_df = pd.DataFrame([dict(record) for record in rels_result])
-        
-        if concepts_df.empty:
-            raise HTTPException(
-                status_code=404,
-                detail="图谱中没有数据，请先构建知识图谱"
-            )
-        
-        # 构建索引（如果还没有）
-        if not search_engine.node_index:
-            search_engine.build_node_index(concepts_df)
+        search_engine, concepts_df, relationships_df = await asyncio.to_thread(_get_search_state)
         
         # 执行问答
-        answer_result = search_engine.answer_query(
+        answer_result = await asyncio.to_thread(
+            search_engine.answer_query,
             query=request.query,
             concepts_df=concepts_df,
             relationships_df=relationships_df,
@@ -123,25 +215,12 @@ async def local_search(request: LocalSearchRequest):
             )
         
         # 转换结果格式
-        relevant_nodes = []
-        for entity, score in answer_result.get("relevant_nodes", []):
-            node_info = concepts_df[concepts_df['entity'] == entity]
-            if not node_info.empty:
-                relevant_nodes.append({
-                    "id": entity,
-                    "name": entity,
-                    "category": node_info.iloc[0].get('category', ''),
-                    "similarity": float(score)
-                })
-        
-        relevant_edges = []
-        for _, row in answer_result.get("subgraph_relations", pd.DataFrame()).iterrows():
-            relevant_edges.append({
-                "source": row['node_1'],
-                "target": row['node_2'],
-                "relationship": row['edge'],
-                "weight": float(row.get('weight', 1.0))
-            })
+        relevant_nodes = _format_relevant_nodes(
+            answer_result.get("relevant_nodes", []), concepts_df
+        )
+        relevant_edges = _format_relevant_edges(
+            answer_result.get("subgraph_relations", relationships_df.iloc[0:0])
+        )
         
         return LocalSearchResult(
             answer=answer_result.get("answer", ""),
@@ -159,49 +238,135 @@ async def local_search(request: LocalSearchRequest):
         raise HTTPException(status_code=500, detail=f"Local Search 失败: {str(e)}")
 
 
+@router.post("/local-search/stream")
+async def local_search_stream(request: LocalSearchRequest, http_request: Request):
+    """
+    Local Search 流式问答接口 (Server-Sent Events)
+    
+    事件顺序：
+    1. retrieval: 检索完成后立即返回相关节点和子图关系
+    2. token: LLM 逐段生成的答案文本
+    3. done: 生成结束, 附带完整答案和来源
+    4. error: 出错时返回错误信息
+    
+    客户端断开连接时停止读取并关闭与 Ollama 的连接, 终止生成。
+    """
+    async def event_stream():
+        try:
+            engine, concepts_df, relationships_df = await asyncio.to_thread(_get_search_state)
+            retrieval = await asyncio.to_thread(
+                engine.retrieve,
+                request.query,
+                concepts_df,
+                relationships_df,
+                request.top_k,
+                request.expand_depth
+            )
+        except HTTPException as e:
+            yield _sse("error", {"detail": e.detail})
+            return
+        except Exception as e:
+            yield _sse("error", {"detail": f"Local Search 失败: {str(e)}"})
+            return
+        
+        relevant_nodes = _format_relevant_nodes(retrieval["relevant_nodes"], concepts_df)
+        yield _sse("retrieval", {
+            "relevant_nodes": relevant_nodes,
+            "relevant_edges": _format_relevant_edges(retrieval["subgraph_relations"]),
+            "sources": [node['name'] for node in relevant_nodes[:5]]
+        })
+        
+        # 同步生成器在线程中逐段读取, 每段之间检查客户端是否已断开
+        tokens = engine.stream_answer(retrieval)
+        answer_parts = []
+        finished = object()
+        try:
+            while True:
+                if await http_request.is_disconnected():
+                    return
+                token = await asyncio.to_thread(next, tokens, finished)
+                if token is finished:
+                    break
+                answer_parts.append(token)
+                yield _sse("token", {"content": token})
+        except Exception as e:
+            yield _sse("error", {"detail": f"答案生成失败: {str(e)}"})
+            return
+        finally:
+            # 关闭生成器会关闭到 Ollama 的 HTTP 连接, 终止后台生成;
+            # 若后台线程仍在读取 (任务被取消), 生成器会在该次读取返回后被回收并关闭连接
+            try:
+                tokens.close()
+            except ValueError:
+                pass
+        
+        yield _sse("done", {
+            "answer": "".join(answer_parts).strip(),
+            "confidence": 0.85
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/community-summary", response_model=List[Community])
 async def get_community_summary(request: CommunitySummaryRequest):
     """
     获取社区检测和摘要
     
     使用社区检测算法（Louvain/Leiden）划分图谱，
-    并为每个社区生成标题和摘要
+    并为每个社区生成标题和摘要。
+    社区划分按算法持久化, 图谱版本未变化时直接复用, 少量更新时只重算受影响的社区。
     """
     try:
         from graph_rag import CommunityDetector, CommunitySummarizer
         
-        driver = neo4j_driver
+        version, concepts_df, relationships_df = await asyncio.to_thread(_get_graph_frames)
         
         # 社区检测
-        detector = CommunityDetector(driver)
-        communities_data = detector.detect_communities(
-            algorithm=request.algorithm,
-            resolution=request.resolution
+        detector = CommunityDetector(algorithm=request.algorithm, resolution=request.resolution)
+        # 依赖缺失时检测器会回退到其他算法, 划分文件按实际使用的算法命名
+        detector.partition_path = str(
+            Path(settings.COMMUNITY_PARTITION_DIR) / f"community_partition_{detector.algorithm}.json"
+        )
+        communities = await asyncio.to_thread(
+            detector.detect_communities, concepts_df, relationships_df, version
         )
         
-        if not communities_data:
+        if not communities:
             return []
         
-        # 生成摘要
-        summarizer = CommunitySummarizer(driver)
-        summaries = summarizer.summarize_all_communities(communities_data)
+        # 生成摘要 (带持久化缓存, 未变化的社区不会重复调用 LLM)
+        summarizer = CommunitySummarizer(
+            model=settings.RAG_LLM_MODEL,
+            ollama_host=settings.OLLAMA_HOST
+        )
+        summaries_df = await asyncio.to_thread(
+            summarizer.summarize_all_communities, communities, concepts_df, relationships_df
+        )
         
         # 格式化输出
         result = []
-        for comm_id, summary_data in summaries.items():
+        for row in summaries_df.to_dict('records'):
+            comm_id = int(row['community_id'])
             result.append(Community(
                 id=comm_id,
-                title=summary_data.get("title", f"社区 {comm_id}"),
-                summary=summary_data.get("summary", ""),
-                size=summary_data.get("size", 0),
-                core_concepts=summary_data.get("core_concepts", [])[:5]
+                title=row.get("title") or f"社区 {comm_id}",
+                summary=row.get("summary") or "",
+                size=int(row.get("size") or 0),
+                core_concepts=list(row.get("core_concepts") or [])[:5]
             ))
         
         # 按大小排序
         result.sort(key=lambda x: x.size, reverse=True)
         
         return result
-        
+    
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"社区分析失败: {str(e)}")
 
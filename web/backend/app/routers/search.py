@@ -1,22 +1,26 @@
 """
 搜索相关 API 路由
 """
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from typing import Optional
 
 from app.models import SearchResult
 from app.database import get_neo4j
+from app.cache import cached_response
 from app.services.search_service import SearchService
 
 router = APIRouter()
 
 
 @router.get("/", response_model=SearchResult)
+@cached_response
 async def search_nodes(
+    request: Request,
     q: str = Query(..., min_length=1, description="搜索关键词"),
     category: Optional[str] = Query(None, description="节点类别筛选"),
     min_importance: Optional[int] = Query(None, ge=1, le=5, description="最小重要性"),
     limit: int = Query(20, ge=1, le=100, description="返回数量"),
+    cursor: Optional[str] = Query(None, description="分页游标（取自上一页的 next_cursor）"),
     neo4j = Depends(get_neo4j)
 ):
     """
@@ -28,18 +32,25 @@ async def search_nodes(
     - **category**: 节点类别筛选（可选）
     - **min_importance**: 最小重要性筛选（可选）
     - **limit**: 返回结果数量限制
+    - **cursor**: 分页游标（可选）
     """
     service = SearchService(neo4j)
-    return service.search_nodes(
-        query=q,
-        category=category,
-        min_importance=min_importance,
-        limit=limit
-    )
+    try:
+        return service.search_nodes(
+            query=q,
+            category=category,
+            min_importance=min_importance,
+            limit=limit,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/suggest")
+@cached_response
 async def search_suggestions(
+    request: Request,
     q: str = Query(..., min_length=1, description="搜索关键词"),
     limit: int = Query(5, ge=1, le=20, description="建议数量"),
     neo4j = Depends(get_neo4j)
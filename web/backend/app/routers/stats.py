@@ -1,17 +1,20 @@
 """
 统计相关 API 路由
 """
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 
 from app.models import StatsData
 from app.database import get_neo4j
+from app.cache import cached_response, response_cache
+from app.queries import query_registry
 from app.services.stats_service import StatsService
 
 router = APIRouter()
 
 
 @router.get("/", response_model=StatsData)
-async def get_statistics(neo4j = Depends(get_neo4j)):
+@cached_response
+async def get_statistics(request: Request, neo4j = Depends(get_neo4j)):
     """
     获取图谱统计数据
     
@@ -27,24 +30,40 @@ async def get_statistics(neo4j = Depends(get_neo4j)):
 
 
 @router.get("/distribution/nodes")
-async def get_node_distribution(neo4j = Depends(get_neo4j)):
+@cached_response
+async def get_node_distribution(request: Request, neo4j = Depends(get_neo4j)):
     """获取节点类型分布"""
     service = StatsService(neo4j)
     return service.get_node_distribution()
 
 
 @router.get("/distribution/edges")
-async def get_edge_distribution(neo4j = Depends(get_neo4j)):
+@cached_response
+async def get_edge_distribution(request: Request, neo4j = Depends(get_neo4j)):
     """获取关系类型分布"""
     service = StatsService(neo4j)
     return service.get_edge_distribution()
 
 
 @router.get("/top-nodes")
+@cached_response
 async def get_top_nodes(
+    request: Request,
     limit: int = 10,
     neo4j = Depends(get_neo4j)
 ):
     """获取核心节点排行"""
     service = StatsService(neo4j)
     return service.get_top_nodes(limit)
+
+
+@router.get("/cache")
+async def get_cache_stats():
+    """获取响应缓存状态（命中率、占用内存、当前图谱版本）"""
+    return response_cache.stats()
+
+
+@router.get("/queries")
+async def get_query_metrics():
+    """获取各注册查询的调用次数与延迟分位数"""
+    return query_registry.metrics()
@@ -0,0 +1,233 @@
+"""
+响应序列化与内容协商
+
+大图谱 (limit=1000 及其边) 按默认的对象数组 JSON 返回时, 大量重复的键名和
+elementId 字符串占据了绝大部分体积。这里提供三种可选格式, 通过 Accept 头协商:
+
+- application/json                      默认格式, 结构不变, 使用 orjson 编码
+- application/vnd.pwd.graph+json        列式 JSON: 平行数组 + 边用节点下标引用 + 类别字典编码
+- application/msgpack                   列式结构的 MessagePack 编码 (需安装 msgpack)
+- application/x-ndjson                  分块流式输出, 每行一个节点/边批次
+
+非 GraphData 的响应在列式/流式格式下退化为普通编码。
+"""
+import json
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app.models import GraphData
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+
+FORMAT_JSON = "json"
+FORMAT_COLUMNAR = "columnar"
+FORMAT_MSGPACK = "msgpack"
+FORMAT_NDJSON = "ndjson"
+
+MEDIA_TYPES = {
+    FORMAT_JSON: "application/json",
+    FORMAT_COLUMNAR: "application/vnd.pwd.graph+json",
+    FORMAT_MSGPACK: "application/msgpack",
+    FORMAT_NDJSON: "application/x-ndjson",
+}
+
+_ACCEPT_ALIASES = {
+    "application/json": FORMAT_JSON,
+    "application/vnd.pwd.graph+json": FORMAT_COLUMNAR,
+    "application/msgpack": FORMAT_MSGPACK,
+    "application/x-msgpack": FORMAT_MSGPACK,
+    "application/vnd.msgpack": FORMAT_MSGPACK,
+    "application/x-ndjson": FORMAT_NDJSON,
+}
+
+NODE_FIELDS = ["id", "name", "category", "importance", "total_degree"]
+EDGE_FIELDS = ["id", "source", "target", "relationship", "weight"]
+
+
+def negotiate_format(request: Request) -> str:
+    """
+    根据 Accept 头选择响应格式
+
+    按 q 值从高到低匹配第一个支持的格式; 未匹配或 msgpack 不可用时返回 json。
+    """
+    accept = request.headers.get("accept", "")
+    candidates: List[Tuple[float, int, str]] = []
+    for position, part in enumerate(accept.split(",")):
+        pieces = [p.strip() for p in part.split(";")]
+        media = pieces[0].lower()
+        quality = 1.0
+        for param in pieces[1:]:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        fmt = _ACCEPT_ALIASES.get(media)
+        if fmt and quality > 0:
+            candidates.append((-quality, position, fmt))
+
+    for _, _, fmt in sorted(candidates):
+        if fmt == FORMAT_MSGPACK and not MSGPACK_AVAILABLE:
+            continue
+        return fmt
+    return FORMAT_JSON
+
+
+def _to_plain(payload: Any) -> Any:
+    if isinstance(payload, BaseModel):
+        return payload.model_dump()
+    return payload
+
+
+def dumps_json(payload: Any) -> bytes:
+    """JSON 编码, 优先使用 orjson"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(_to_plain(payload), option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # orjson 不支持的类型交给 jsonable_encoder 处理
+            return orjson.dumps(jsonable_encoder(payload), option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def to_columnar(graph: GraphData) -> Dict[str, Any]:
+    """
+    将 GraphData 转换为列式结构
+
+    - 节点字段转为平行数组, category 做字典编码
+    - 边的 source/target 替换为节点数组下标, relationship 做字典编码
+    - 端点不在节点列表中的边保留原始 ID (source_ids/target_ids 中对应位置非空)
+    - properties 为稀疏列, 仅当至少一个节点/边带有非空 properties 时输出,
+      无属性的位置为 null (社区概览图依赖其中的 community_id、size 等字段)
+    """
+    categories: List[str] = []
+    category_codes: Dict[str, int] = {}
+    node_index: Dict[str, int] = {}
+
+    nodes = {
+        "id": [], "name": [], "category": [], "importance": [], "total_degree": [],
+    }
+    node_properties: List[Optional[Dict[str, Any]]] = []
+    for i, node in enumerate(graph.nodes):
+        node_index[node.id] = i
+        code = category_codes.get(node.category)
+        if code is None:
+            code = category_codes[node.category] = len(categories)
+            categories.append(node.category)
+        nodes["id"].append(node.id)
+        nodes["name"].append(node.name)
+        nodes["category"].append(code)
+        nodes["importance"].append(node.importance)
+        nodes["total_degree"].append(node.total_degree)
+        node_properties.append(node.properties or None)
+
+    relationships: List[str] = []
+    relationship_codes: Dict[str, int] = {}
+    edges = {
+        "id": [], "source": [], "target": [], "relationship": [], "weight": [],
+    }
+    edge_properties: List[Optional[Dict[str, Any]]] = []
+    external: Dict[str, List[Optional[str]]] = {"source_ids": [], "target_ids": []}
+    has_external = False
+
+    for edge in graph.edges:
+        code = relationship_codes.get(edge.relationship)
+        if code is None:
+            code = relationship_codes[edge.relationship] = len(relationships)
+            relationships.append(edge.relationship)
+        source = node_index.get(edge.source, -1)
+        target = node_index.get(edge.target, -1)
+        has_external = has_external or source < 0 or target < 0
+        edges["id"].append(edge.id)
+        edges["source"].append(source)
+        edges["target"].append(target)
+        edges["relationship"].append(code)
+        edges["weight"].append(edge.weight)
+        edge_properties.append(edge.properties or None)
+        external["source_ids"].append(edge.source if source < 0 else None)
+        external["target_ids"].append(edge.target if target < 0 else None)
+
+    if has_external:
+        edges.update(external)
+    if any(node_properties):
+        nodes["properties"] = node_properties
+    if any(edge_properties):
+        edges["properties"] = edge_properties
+
+    return {
+        "format": FORMAT_COLUMNAR,
+        "categories": categories,
+        "relationships": relationships,
+        "nodes": nodes,
+        "edges": edges,
+        "total_nodes": graph.total_nodes,
+        "total_edges": graph.total_edges,
+    }
+
+
+def render(payload: Any, fmt: str) -> Tuple[bytes, str]:
+    """按协商格式编码响应体, 返回 (body, media_type)"""
+    if isinstance(payload, GraphData) and fmt in (FORMAT_COLUMNAR, FORMAT_MSGPACK):
+        payload = to_columnar(payload)
+    elif fmt != FORMAT_MSGPACK:
+        fmt = FORMAT_JSON
+
+    if fmt == FORMAT_MSGPACK:
+        body = msgpack.packb(jsonable_encoder(_to_plain(payload)), use_bin_type=True)
+        return body, MEDIA_TYPES[FORMAT_MSGPACK]
+    return dumps_json(payload), MEDIA_TYPES[fmt]
+
+
+def iter_ndjson(graph: GraphData, chunk_size: int) -> Iterator[bytes]:
+    """
+    分块流式输出 GraphData
+
+    第一行为元信息 (字段名与总数), 随后是节点批次、边批次, 每行一个 JSON 对象。
+    批次内每条记录是按字段顺序排列的数组, 边的 source/target 为节点下标。
+    """
+    yield dumps_json({
+        "type": "meta",
+        "node_fields": NODE_FIELDS,
+        "edge_fields": EDGE_FIELDS,
+        "total_nodes": graph.total_nodes,
+        "total_edges": graph.total_edges,
+    }) + b"\n"
+
+    node_index: Dict[str, int] = {}
+    for start in range(0, len(graph.nodes), chunk_size):
+        rows = []
+        for i, node in enumerate(graph.nodes[start:start + chunk_size], start):
+            node_index[node.id] = i
+            rows.append([node.id, node.name, node.category, node.importance, node.total_degree])
+        yield dumps_json({"type": "nodes", "offset": start, "rows": rows}) + b"\n"
+
+    for start in range(0, len(graph.edges), chunk_size):
+        rows = [
+            [
+                edge.id,
+                node_index.get(edge.source, edge.source),
+                node_index.get(edge.target, edge.target),
+                edge.relationship,
+                edge.weight,
+            ]
+            for edge in graph.edges[start:start + chunk_size]
+        ]
+        yield dumps_json({"type": "edges", "offset": start, "rows": rows}) + b"\n"
+
+    yield dumps_json({"type": "end"}) + b"\n"
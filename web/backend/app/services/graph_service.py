@@ -2,9 +2,12 @@
 图谱服务
 处理图谱相关的业务逻辑
 """
-from typing import Optional, List
-from app.models import GraphData, Node, Edge, NodeDetail, PathResult
+import json
+from typing import Optional
+from app.models import GraphData, Node, Edge, NodeDetail, NodePage, PathResult
 from app.config import settings
+from app.queries import query_registry, label_variant
+from app.pagination import cursor_params, next_cursor
 
 
 class GraphService:
@@ -22,46 +25,24 @@ class GraphService:
     ) -> GraphData:
         """获取图谱数据"""
         
-        # 构建节点查询 - 使用labels()获取节点类型
+        # 节点查询: 白名单内的类型使用带标签的预编译变体, 其余类型走参数过滤
         # 优先返回非Other类型和高度数节点
-        filters = []
-        if node_type:
-            filters.append(f"'{node_type}' IN labels(n)")
-        if exclude_other:
-            filters.append("n.type <> 'Other'")
-        
-        node_filter = "WHERE " + " AND ".join(filters) if filters else ""
-        node_query = f"""
-        MATCH (n)
-        {node_filter}
-        RETURN elementId(n) as id, n.name as name, 
-               COALESCE(n.type, labels(n)[0], 'Other') as category,
-               n.importance as importance, 
-               COALESCE(n.total_degree, 0) as total_degree
-        ORDER BY 
-            CASE WHEN n.type = 'Other' THEN 1 ELSE 0 END,
-            COALESCE(n.total_degree, 0) DESC
-        LIMIT {limit}
-        """
-        
-        # 执行节点查询
-        nodes_data = self.neo4j.execute_query(node_query)
+        nodes_data = query_registry.execute(
+            self.neo4j,
+            "graph.nodes",
+            {"node_type": node_type, "exclude_other": exclude_other, "limit": limit},
+            label=label_variant(node_type),
+        )
         
         # 提取节点ID
         node_ids = [node['id'] for node in nodes_data]
         
-        # 构建关系查询
-        relation_filter = f"WHERE type(r) = '{relation_type}'" if relation_type else ""
-        edge_query = f"""
-        MATCH (n)-[r]->(m)
-        {relation_filter}
-        WHERE elementId(n) IN $node_ids AND elementId(m) IN $node_ids
-        RETURN elementId(r) as id, elementId(n) as source, elementId(m) as target,
-               type(r) as relationship, r.weight as weight
-        """
-        
-        # 查询关系
-        edges_data = self.neo4j.execute_query(edge_query, {'node_ids': node_ids})
+        # 查询节点之间的关系
+        edges_data = query_registry.execute(
+            self.neo4j,
+            "graph.edges",
+            {"node_ids": node_ids, "relation_type": relation_type},
+        )
         
         # 转换为模型
         nodes = [Node(**node) for node in nodes_data]
@@ -74,46 +55,65 @@ class GraphService:
             total_edges=len(edges)
         )
     
+    def get_overview(self) -> Optional[GraphData]:
+        """
+        获取概览图
+        
+        概览图由导入脚本预先计算: 每个社区是一个超级节点 (properties 中含规模、
+        类型分布和代表节点), 边为社区间聚合后的关系权重。文件不存在时返回 None。
+        """
+        try:
+            with open(settings.OVERVIEW_GRAPH_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        
+        return GraphData(
+            nodes=[Node(**n) for n in data.get('nodes', [])],
+            edges=[Edge(**e) for e in data.get('edges', [])],
+            total_nodes=data.get('total_nodes', 0),
+            total_edges=data.get('total_edges', 0)
+        )
+    
+    def get_community_subgraph(self, community_id: int, limit: int = 200) -> GraphData:
+        """获取社区成员子图 (概览图下钻)"""
+        
+        nodes_data = query_registry.execute(
+            self.neo4j,
+            "graph.community_nodes",
+            {"community_id": community_id, "limit": limit},
+        )
+        edges_data = query_registry.execute(
+            self.neo4j,
+            "graph.edges",
+            {"node_ids": [node['id'] for node in nodes_data]},
+        )
+        
+        return GraphData(
+            nodes=[Node(**n) for n in nodes_data],
+            edges=[Edge(**e) for e in edges_data],
+            total_nodes=len(nodes_data),
+            total_edges=len(edges_data)
+        )
+    
     def get_node_detail(self, node_id: str) -> Optional[NodeDetail]:
         """获取节点详情"""
         
         # 查询节点信息
-        node_query = """
-        MATCH (n)
-        WHERE id(n) = $node_id OR n.name = $node_id
-        RETURN id(n) as id, n.name as name, n.category as category,
-               n.importance as importance, n.total_degree as total_degree
-        """
-        
-        nodes = self.neo4j.execute_query(node_query, {'node_id': node_id})
+        nodes = query_registry.execute(self.neo4j, "graph.node_detail", {'node_id': node_id})
         if not nodes:
             return None
         
         node_data = nodes[0]
         
         # 查询邻居节点
-        neighbors_query = """
-        MATCH (n)-[]-(m)
-        WHERE id(n) = $node_id
-        RETURN DISTINCT id(m) as id, m.name as name, m.category as category,
-               m.importance as importance, m.total_degree as total_degree
-        LIMIT 20
-        """
-        
-        neighbors_data = self.neo4j.execute_query(neighbors_query, {'node_id': node_data['id']})
+        neighbors_data = query_registry.execute(
+            self.neo4j, "graph.node_detail_neighbors", {'node_id': node_data['id']}
+        )
         
         # 查询关联关系
-        relationships_query = """
-        MATCH (n)-[r]-(m)
-        WHERE id(n) = $node_id
-        RETURN id(r) as id, id(n) as source, id(m) as target,
-               type(r) as relationship, r.weight as weight
-        LIMIT 50
-        """
-        
-        relationships_data = self.neo4j.execute_query(
-            relationships_query,
-            {'node_id': node_data['id']}
+        relationships_data = query_registry.execute(
+            self.neo4j, "graph.node_detail_relationships", {'node_id': node_data['id']}
         )
         
         return NodeDetail(
@@ -125,30 +125,10 @@ class GraphService:
     def get_node_neighbors(self, node_id: str, depth: int = 1) -> GraphData:
         """获取节点邻居"""
         
-        query = f"""
-        MATCH path = (n)-[*1..{depth}]-(m)
-        WHERE id(n) = $node_id OR n.name = $node_id
-        WITH nodes(path) as path_nodes, relationships(path) as path_rels
-        UNWIND path_nodes as node
-        WITH collect(DISTINCT {{
-            id: id(node),
-            name: node.name,
-            category: node.category,
-            importance: node.importance,
-            total_degree: node.total_degree
-        }}) as nodes_list, path_rels
-        UNWIND path_rels as rel
-        WITH nodes_list, collect(DISTINCT {{
-            id: id(rel),
-            source: id(startNode(rel)),
-            target: id(endNode(rel)),
-            relationship: type(rel),
-            weight: rel.weight
-        }}) as edges_list
-        RETURN nodes_list, edges_list
-        """
-        
-        result = self.neo4j.execute_query(query, {'node_id': node_id})
+        # 变长路径上限无法参数化, 按深度使用预编译变体
+        result = query_registry.execute(
+            self.neo4j, "graph.neighbors", {'node_id': node_id}, depth=depth
+        )
         
         if not result:
             return GraphData(nodes=[], edges=[])
@@ -175,16 +155,11 @@ class GraphService:
     ) -> PathResult:
         """查找最短路径"""
         
-        query = f"""
-        MATCH path = shortestPath((n)-[*..{max_length}]-(m))
-        WHERE n.name = $source AND m.name = $target
-        RETURN [node in nodes(path) | node.name] as path_names
-        LIMIT 10
-        """
-        
-        result = self.neo4j.execute_query(
-            query,
-            {'source': source, 'target': target}
+        result = query_registry.execute(
+            self.neo4j,
+            "graph.shortest_paths",
+            {'source': source, 'target': target},
+            max_length=max_length,
         )
         
         paths = [r['path_names'] for r in result]
@@ -196,27 +171,32 @@ class GraphService:
         limit: int = 100,
         offset: int = 0,
         category: Optional[str] = None,
-        min_importance: Optional[int] = None
-    ) -> List[Node]:
-        """节点列表"""
-        
-        filters = []
-        if category:
-            filters.append(f"n.category = '{category}'")
-        if min_importance:
-            filters.append(f"n.importance >= {min_importance}")
-        
-        where_clause = "WHERE " + " AND ".join(filters) if filters else ""
-        
-        query = f"""
-        MATCH (n)
-        {where_clause}
-        RETURN id(n) as id, n.name as name, n.category as category,
-               n.importance as importance, n.total_degree as total_degree
-        ORDER BY n.total_degree DESC
-        SKIP {offset}
-        LIMIT {limit}
+        min_importance: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> NodePage:
         """
+        节点列表
         
-        result = self.neo4j.execute_query(query)
-        return [Node(**n) for n in result]
+        优先使用游标分页 (cursor); 仅在未提供游标且 offset > 0 时退回 SKIP 分页。
+        """
+        
+        params = {'category': category, 'min_importance': min_importance}
+        
+        if offset and not cursor:
+            result = query_registry.execute(
+                self.neo4j,
+                "graph.list_nodes_offset",
+                {**params, 'offset': offset, 'limit': limit + 1},
+            )
+        else:
+            # 多取一条用于判断是否还有下一页
+            result = query_registry.execute(
+                self.neo4j,
+                "graph.list_nodes",
+                {**params, **cursor_params(cursor), 'limit': limit + 1},
+            )
+        
+        return NodePage(
+            nodes=[Node(**n) for n in result[:limit]],
+            next_cursor=next_cursor(result, limit)
+        )
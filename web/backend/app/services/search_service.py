@@ -4,6 +4,8 @@
 """
 from typing import Optional, List, Dict
 from app.models import SearchResult, Node
+from app.queries import query_registry
+from app.pagination import cursor_params, next_cursor
 
 
 class SearchService:
@@ -17,59 +19,40 @@ class SearchService:
         query: str,
         category: Optional[str] = None,
         min_importance: Optional[int] = None,
-        limit: int = 20
+        limit: int = 20,
+        cursor: Optional[str] = None
     ) -> SearchResult:
-        """搜索节点"""
-        
-        # 构建筛选条件
-        filters = [f"toLower(n.name) CONTAINS toLower('{query}')"]
-        
-        if category:
-            filters.append(f"n.category = '{category}'")
-        if min_importance:
-            filters.append(f"n.importance >= {min_importance}")
-        
-        where_clause = " AND ".join(filters)
-        
-        # 查询
-        cypher_query = f"""
-        MATCH (n)
-        WHERE {where_clause}
-        RETURN id(n) as id, n.name as name, n.category as category,
-               n.importance as importance, n.total_degree as total_degree
-        ORDER BY n.total_degree DESC
-        LIMIT {limit}
-        """
-        
-        result = self.neo4j.execute_query(cypher_query)
-        nodes = [Node(**n) for n in result]
+        """搜索节点 (游标分页)"""
+        
+        params = {
+            'query': query,
+            'category': category,
+            'min_importance': min_importance,
+        }
+        
+        # 查询, 多取一条用于判断是否还有下一页
+        result = query_registry.execute(
+            self.neo4j,
+            "search.nodes",
+            {**params, **cursor_params(cursor), 'limit': limit + 1}
+        )
+        nodes = [Node(**n) for n in result[:limit]]
         
         # 获取总匹配数
-        count_query = f"""
-        MATCH (n)
-        WHERE {where_clause}
-        RETURN count(n) as total
-        """
-        
-        count_result = self.neo4j.execute_query(count_query)
+        count_result = query_registry.execute(self.neo4j, "search.count", params)
         total = count_result[0]['total'] if count_result else 0
         
         return SearchResult(
             nodes=nodes,
             total=total,
-            query=query
+            query=query,
+            next_cursor=next_cursor(result, limit)
         )
     
     def get_suggestions(self, query: str, limit: int = 5) -> List[Dict]:
         """获取搜索建议"""
         
-        cypher_query = f"""
-        MATCH (n)
-        WHERE toLower(n.name) CONTAINS toLower('{query}')
-        RETURN DISTINCT n.name as name, n.category as category
-        ORDER BY length(n.name)
-        LIMIT {limit}
-        """
-        
-        result = self.neo4j.execute_query(cypher_query)
+        result = query_registry.execute(
+            self.neo4j, "search.suggest", {'query': query, 'limit': limit}
+        )
         return [{'name': r['name'], 'category': r['category']} for r in result]
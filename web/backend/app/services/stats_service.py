@@ -4,6 +4,7 @@
 """
 from typing import Dict, List
 from app.models import StatsData, Node
+from app.queries import query_registry
 
 
 class StatsService:
@@ -16,14 +17,7 @@ class StatsService:
         """获取图谱统计数据"""
         
         # 总节点数和总边数
-        count_query = """
-        MATCH (n)
-        WITH count(n) as node_count
-        MATCH ()-[r]->()
-        RETURN node_count, count(r) as edge_count
-        """
-        
-        count_result = self.neo4j.execute_query(count_query)
+        count_result = query_registry.execute(self.neo4j, "stats.counts")
         total_nodes = count_result[0]['node_count'] if count_result else 0
         total_edges = count_result[0]['edge_count'] if count_result else 0
         
@@ -59,41 +53,17 @@ class StatsService:
     def get_node_distribution(self) -> Dict[str, int]:
         """获取节点类型分布"""
         
-        query = """
-        MATCH (n)
-        WITH COALESCE(labels(n)[0], 'Unknown') as category, count(n) as count
-        RETURN category, count
-        ORDER BY count DESC
-        """
-        
-        result = self.neo4j.execute_query(query)
+        result = query_registry.execute(self.neo4j, "stats.node_distribution")
         return {r['category']: r['count'] for r in result if r['category']}
     
     def get_edge_distribution(self) -> Dict[str, int]:
         """获取关系类型分布"""
         
-        query = """
-        MATCH ()-[r]->()
-        RETURN type(r) as relationship, count(r) as count
-        ORDER BY count DESC
-        """
-        
-        result = self.neo4j.execute_query(query)
+        result = query_registry.execute(self.neo4j, "stats.edge_distribution")
         return {r['relationship']: r['count'] for r in result if r['relationship']}
     
     def get_top_nodes(self, limit: int = 10) -> List[Node]:
         """获取核心节点"""
         
-        query = f"""
-        MATCH (n)
-        RETURN toString(id(n)) as id, 
-               n.name as name, 
-               COALESCE(labels(n)[0], 'Unknown') as category,
-               n.importance as importance, 
-               n.total_degree as total_degree
-        ORDER BY n.total_degree DESC
-        LIMIT {limit}
-        """
-        
-        result = self.neo4j.execute_query(query)
+        result = query_registry.execute(self.neo4j, "stats.top_nodes", {'limit': limit})
         return [Node(**n) for n in result]
@@ -19,7 +19,13 @@ import ImageGallery from "./components/ImageGallery";
 import FeedbackModal, { type FeedbackType } from "./components/FeedbackModal";
 import RAGPanel from "./components/RAGPanel";
 import { graphAPI, statsAPI } from "./services/api";
-import type { Node } from "./types/graph";
+import type { GraphData, Node } from "./types/graph";
+
+// 图谱视图: 社区概览 / 社区成员子图 / 按数量截取的全图
+type GraphView =
+  | { mode: "overview" }
+  | { mode: "community"; communityId: number; title: string }
+  | { mode: "full" };
 
 // 创建 QueryClient
 const queryClient = new QueryClient({
@@ -35,6 +41,7 @@ function KnowledgeGraphApp() {
   const [selectedNode, setSelectedNode] = useState<Node | null>(null);
   const [limit, setLimit] = useState(50);
   const [showAll, setShowAll] = useState(false);
+  const [view, setView] = useState<GraphView>({ mode: "overview" });
   const [searchQuery, setSearchQuery] = useState("");
   const [filters, setFilters] = useState<FilterState | null>(null);
   const [showStatsPanel, setShowStatsPanel] = useState(false);
@@ -50,15 +57,36 @@ function KnowledgeGraphApp() {
     data: {},
   });
 
-  // 获取图谱数据
+  // 获取图谱数据: 默认打开社区概览, 概览未生成时退回全图
   const {
-    data: graphData,
+    data: graphResult,
     isLoading: graphLoading,
     error: graphError,
   } = useQuery({
-    queryKey: ["graph", limit, showAll],
-    queryFn: () => graphAPI.getGraph({ limit, exclude_other: !showAll }),
+    queryKey: ["graph", view, limit, showAll],
+    queryFn: async (): Promise<{ graph: GraphData; view: GraphView }> => {
+      if (view.mode === "overview") {
+        const overview = await graphAPI.getOverview();
+        if (overview) {
+          return { graph: overview, view };
+        }
+      }
+      if (view.mode === "community") {
+        const graph = await graphAPI.getCommunitySubgraph(
+          view.communityId,
+          limit
+        );
+        return { graph, view };
+      }
+      const graph = await graphAPI.getGraph({
+        limit,
+        exclude_other: !showAll,
+      });
+      return { graph, view: { mode: "full" } };
+    },
   });
+  const graphData = graphResult?.graph;
+  const currentView = graphResult?.view ?? view;
 
   // 获取统计数据
   const { data: stats } = useQuery({
@@ -67,6 +95,13 @@ function KnowledgeGraphApp() {
   });
 
   const handleNodeClick = (node: Node) => {
+    // 概览图中的节点是社区超级节点, 点击下钻到社区成员子图
+    const communityId = node.properties?.community_id;
+    if (currentView.mode === "overview" && typeof communityId === "number") {
+      setSelectedNode(null);
+      setView({ mode: "community", communityId, title: node.name });
+      return;
+    }
     setSelectedNode(node);
     console.log("Selected node:", node);
   };
@@ -196,6 +231,37 @@ function KnowledgeGraphApp() {
                 <MessageSquare className="w-4 h-4" />
                 <span>知识问答</span>
               </button>
+              <div className="flex items-center gap-2 text-sm">
+                {currentView.mode === "community" && (
+                  <span className="text-gray-600">
+                    社区: {currentView.title}
+                  </span>
+                )}
+                <button
+                  onClick={() => {
+                    setSelectedNode(null);
+                    setView(
+                      currentView.mode === "full"
+                        ? { mode: "overview" }
+                        : { mode: "full" }
+                    );
+                  }}
+                  className="px-3 py-2 rounded-lg bg-white text-gray-700 shadow-md hover:bg-gray-50 transition-all"
+                >
+                  {currentView.mode === "full" ? "社区概览" : "全部节点"}
+                </button>
+                {currentView.mode === "community" && (
+                  <button
+                    onClick={() => {
+                      setSelectedNode(null);
+                      setView({ mode: "overview" });
+                    }}
+                    className="px-3 py-2 rounded-lg bg-white text-gray-700 shadow-md hover:bg-gray-50 transition-all"
+                  >
+                    返回概览
+                  </button>
+                )}
+              </div>
               <label className="flex items-center gap-2 text-sm cursor-pointer">
                 <input
                   type="checkbox"
@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import {
   MessageSquare,
   Send,
@@ -33,6 +33,10 @@ export default function RAGPanel({ onHighlightNodes }: RAGPanelProps) {
   const [loading, setLoading] = useState(false);
   const [result, setResult] = useState<SearchResult | null>(null);
   const [error, setError] = useState<string | null>(null);
+  // 当前流式请求, 新查询或组件卸载时中止, 后端随之停止生成
+  const abortRef = useRef<AbortController | null>(null);
+
+  useEffect(() => () => abortRef.current?.abort(), []);
 
   const exampleQueries = [
     "松材线虫病的主要传播媒介是什么？",
@@ -44,43 +48,97 @@ export default function RAGPanel({ onHighlightNodes }: RAGPanelProps) {
   const handleSearch = async () => {
     if (!query.trim()) return;
 
+    abortRef.current?.abort();
+    const controller = new AbortController();
+    abortRef.current = controller;
+
     setLoading(true);
     setError(null);
     setResult(null);
 
     try {
+      // 流式接口: 先返回检索结果, 再逐段返回答案 (Server-Sent Events)
       const response = await fetch(
-        "http://localhost:8000/api/rag/local-search",
+        "http://localhost:8000/api/rag/local-search/stream",
         {
           method: "POST",
           headers: {
             "Content-Type": "application/json",
+            Accept: "text/event-stream",
           },
           body: JSON.stringify({
             query: query.trim(),
             top_k: 5,
             expand_depth: 1,
           }),
+          signal: controller.signal,
         }
       );
 
-      if (!response.ok) {
-        const errorData = await response.json();
-        throw new Error(errorData.detail || "查询失败");
+      if (!response.ok || !response.body) {
+        throw new Error("查询失败");
       }
 
-      const data: SearchResult = await response.json();
-      setResult(data);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      const handleEvent = (event: string, data: any) => {
+        if (event === "retrieval") {
+          setResult({
+            answer: "",
+            relevant_nodes: data.relevant_nodes,
+            relevant_edges: data.relevant_edges,
+            confidence: 0,
+            sources: data.sources,
+          });
+          // 高亮相关节点
+          if (onHighlightNodes && data.relevant_nodes.length > 0) {
+            onHighlightNodes(data.relevant_nodes.map((n: any) => n.id));
+          }
+        } else if (event === "token") {
+          setResult((prev) =>
+            prev ? { ...prev, answer: prev.answer + data.content } : prev
+          );
+        } else if (event === "done") {
+          setResult((prev) =>
+            prev
+              ? { ...prev, answer: data.answer, confidence: data.confidence }
+              : prev
+          );
+        } else if (event === "error") {
+          throw new Error(data.detail || "查询失败");
+        }
+      };
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // 事件之间以空行分隔
+        let boundary = buffer.indexOf("\n\n");
+        while (boundary !== -1) {
+          const raw = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf("\n\n");
 
-      // 高亮相关节点
-      if (onHighlightNodes && data.relevant_nodes.length > 0) {
-        const nodeIds = data.relevant_nodes.map((n) => n.id);
-        onHighlightNodes(nodeIds);
+          let event = "message";
+          let data = "";
+          for (const line of raw.split("\n")) {
+            if (line.startsWith("event: ")) event = line.slice(7);
+            else if (line.startsWith("data: ")) data += line.slice(6);
+          }
+          if (data) handleEvent(event, JSON.parse(data));
+        }
       }
     } catch (err) {
+      if (controller.signal.aborted) return;
       setError(err instanceof Error ? err.message : "查询失败");
     } finally {
-      setLoading(false);
+      if (abortRef.current === controller) {
+        setLoading(false);
+      }
     }
   };
 
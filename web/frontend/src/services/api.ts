@@ -3,8 +3,10 @@
  */
 import axios from "axios";
 import type {
+  ColumnarGraphData,
   GraphData,
   NodeDetail,
+  NodePage,
   SearchResult,
   StatsData,
   PathResult,
@@ -19,6 +21,45 @@ const api = axios.create({
   },
 });
 
+// 列式图谱格式 (体积更小, 解析更快)
+const COLUMNAR_ACCEPT = "application/vnd.pwd.graph+json, application/json;q=0.5";
+
+// 将列式响应还原为 GraphData
+function decodeColumnarGraph(data: ColumnarGraphData | GraphData): GraphData {
+  if (!("format" in data) || data.format !== "columnar") {
+    return data as GraphData;
+  }
+  const { nodes, edges, categories, relationships } = data;
+  const nodeList = nodes.id.map((id, i) => ({
+    id,
+    name: nodes.name[i],
+    category: categories[nodes.category[i]],
+    importance: nodes.importance[i] ?? undefined,
+    total_degree: nodes.total_degree[i] ?? undefined,
+    properties: nodes.properties?.[i] ?? undefined,
+  }));
+  const edgeList = edges.id.map((id, i) => ({
+    id,
+    source:
+      edges.source[i] >= 0
+        ? nodes.id[edges.source[i]]
+        : (edges.source_ids?.[i] as string),
+    target:
+      edges.target[i] >= 0
+        ? nodes.id[edges.target[i]]
+        : (edges.target_ids?.[i] as string),
+    relationship: relationships[edges.relationship[i]],
+    weight: edges.weight[i] ?? undefined,
+    properties: edges.properties?.[i] ?? undefined,
+  }));
+  return {
+    nodes: nodeList,
+    edges: edgeList,
+    total_nodes: data.total_nodes,
+    total_edges: data.total_edges,
+  };
+}
+
 // 图谱API
 export const graphAPI = {
   // 获取图谱数据
@@ -28,24 +69,61 @@ export const graphAPI = {
     relation_type?: string;
     exclude_other?: boolean;
   }): Promise<GraphData> {
-    const response = await api.get<GraphData>("/api/graph/", {
-      params: {
-        exclude_other: true, // 默认排除Other类型节点
-        ...params,
-      },
-    });
-    return response.data;
+    const response = await api.get<ColumnarGraphData | GraphData>(
+      "/api/graph/",
+      {
+        params: {
+          exclude_other: true, // 默认排除Other类型节点
+          ...params,
+        },
+        headers: { Accept: COLUMNAR_ACCEPT },
+      }
+    );
+    return decodeColumnarGraph(response.data);
+  },
+
+  // 获取概览图 (社区超级节点 + 社区间聚合边, 导入时预计算)
+  // 尚未生成概览 (后端返回 404) 时返回 null
+  async getOverview(): Promise<GraphData | null> {
+    try {
+      const response = await api.get<ColumnarGraphData | GraphData>(
+        "/api/graph/overview",
+        { headers: { Accept: COLUMNAR_ACCEPT } }
+      );
+      return decodeColumnarGraph(response.data);
+    } catch (error) {
+      if (axios.isAxiosError(error) && error.response?.status === 404) {
+        return null;
+      }
+      throw error;
+    }
+  },
+
+  // 概览图下钻: 获取社区成员子图
+  async getCommunitySubgraph(
+    communityId: number,
+    limit: number = 200
+  ): Promise<GraphData> {
+    const response = await api.get<ColumnarGraphData | GraphData>(
+      `/api/graph/overview/${communityId}`,
+      {
+        params: { limit },
+        headers: { Accept: COLUMNAR_ACCEPT },
+      }
+    );
+    return decodeColumnarGraph(response.data);
   },
 
   // 获取子图
   async getSubgraph(nodeName: string, depth: number = 1): Promise<GraphData> {
-    const response = await api.get<GraphData>(
+    const response = await api.get<ColumnarGraphData | GraphData>(
       `/api/graph/subgraph/${nodeName}`,
       {
         params: { depth },
+        headers: { Accept: COLUMNAR_ACCEPT },
       }
     );
-    return response.data;
+    return decodeColumnarGraph(response.data);
   },
 
   // 查找路径
@@ -68,11 +146,11 @@ export const nodesAPI = {
   // 获取节点列表
   async listNodes(params?: {
     limit?: number;
-    offset?: number;
+    cursor?: string;
     category?: string;
     min_importance?: number;
-  }): Promise<any[]> {
-    const response = await api.get("/api/nodes/", { params });
+  }): Promise<NodePage> {
+    const response = await api.get<NodePage>("/api/nodes/", { params });
     return response.data;
   },
 
@@ -105,6 +183,7 @@ export const searchAPI = {
     category?: string;
     min_importance?: number;
     limit?: number;
+    cursor?: string;
   }): Promise<SearchResult> {
     const response = await api.get<SearchResult>("/api/search/", { params });
     return response.data;
@@ -27,6 +27,34 @@ export interface GraphData {
   total_edges: number;
 }
 
+// 列式图谱数据 (Accept: application/vnd.pwd.graph+json)
+// 节点字段为平行数组, 边的 source/target 为节点数组下标, category/relationship 为字典编码
+export interface ColumnarGraphData {
+  format: "columnar";
+  categories: string[];
+  relationships: string[];
+  nodes: {
+    id: string[];
+    name: string[];
+    category: number[];
+    importance: (number | null)[];
+    total_degree: (number | null)[];
+    properties?: (Record<string, any> | null)[];
+  };
+  edges: {
+    id: string[];
+    source: number[];
+    target: number[];
+    relationship: number[];
+    weight: (number | null)[];
+    source_ids?: (string | null)[];
+    target_ids?: (string | null)[];
+    properties?: (Record<string, any> | null)[];
+  };
+  total_nodes: number;
+  total_edges: number;
+}
+
 export interface NodeDetail {
   node: Node;
   neighbors: Node[];
@@ -37,6 +65,12 @@ export interface SearchResult {
   nodes: Node[];
   total: number;
   query: string;
+  next_cursor?: string | null;
+}
+
+export interface NodePage {
+  nodes: Node[];
+  next_cursor?: string | null;
 }
 
 export interface StatsData {